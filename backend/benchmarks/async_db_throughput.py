@@ -0,0 +1,96 @@
+# backend/benchmarks/async_db_throughput.py
+"""
+Concurrent-request throughput: blocking psycopg2 calls on the event loop vs. the DB executor.
+
+Each simulated request awaits one "query". In `blocking` mode the query runs directly in the
+coroutine (what `async def` handlers calling crud.* used to do); in `executor` mode it goes through
+`database.run_in_db_executor`. A ticker task measures event-loop lag while requests are in flight.
+
+Usage (from backend/):
+    python -m benchmarks.async_db_throughput                       # simulated 20ms queries
+    python -m benchmarks.async_db_throughput --real-db             # SELECT pg_sleep() via the pool
+    python -m benchmarks.async_db_throughput --requests 500 --concurrency 100 --latency-ms 5
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from src import database
+
+
+def _simulated_query(latency_s: float):
+    time.sleep(latency_s) # Releases the GIL like a socket read would
+
+def _real_query(latency_s: float):
+    conn = database.get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT pg_sleep(%s)", (latency_s,))
+        cursor.fetchall()
+    finally:
+        conn.close()
+
+
+async def _loop_lag_monitor(stop: asyncio.Event, samples: list, interval: float = 0.005):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        samples.append((time.perf_counter() - start - interval) * 1000)
+
+
+async def _run(mode: str, query_fn, n_requests: int, concurrency: int, latency_s: float) -> dict:
+    sem = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one_request():
+        async with sem:
+            start = time.perf_counter()
+            if mode == "blocking":
+                query_fn(latency_s)
+            else:
+                await database.run_in_db_executor(query_fn, latency_s)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    stop = asyncio.Event(); lag_samples = []
+    monitor = asyncio.create_task(_loop_lag_monitor(stop, lag_samples))
+    started = time.perf_counter()
+    await asyncio.gather(*(one_request() for _ in range(n_requests)))
+    elapsed = time.perf_counter() - started
+    stop.set(); await monitor
+
+    latencies.sort()
+    return {
+        "mode": mode,
+        "req_per_s": n_requests / elapsed,
+        "p50_ms": statistics.median(latencies),
+        "p99_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))],
+        "max_loop_lag_ms": max(lag_samples) if lag_samples else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="Per-query latency")
+    parser.add_argument("--real-db", action="store_true", help="Run SELECT pg_sleep() against the configured database")
+    args = parser.parse_args()
+
+    query_fn = _real_query if args.real_db else _simulated_query
+    latency_s = args.latency_ms / 1000
+    print(f"requests={args.requests} concurrency={args.concurrency} latency={args.latency_ms}ms "
+          f"executor_workers={database.DB_EXECUTOR_MAX_WORKERS} source={'postgres' if args.real_db else 'simulated'}")
+
+    results = [asyncio.run(_run(mode, query_fn, args.requests, args.concurrency, latency_s)) for mode in ("blocking", "executor")]
+    print(f"{'mode':<10}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'max loop lag ms':>18}")
+    for r in results:
+        print(f"{r['mode']:<10}{r['req_per_s']:>10.1f}{r['p50_ms']:>10.1f}{r['p99_ms']:>10.1f}{r['max_loop_lag_ms']:>18.1f}")
+    print(f"speedup: {results[1]['req_per_s'] / results[0]['req_per_s']:.1f}x")
+
+    database.shutdown_db_executor()
+    if args.real_db: database.close_pool()
+
+
+if __name__ == "__main__":
+    main()
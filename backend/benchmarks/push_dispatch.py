@@ -0,0 +1,93 @@
+# backend/benchmarks/push_dispatch.py
+"""
+Device push throughput: one provider request per device (what a naive per-notification send loop
+does) vs. PushDispatcher's platform batches sent in parallel.
+
+Both modes use StubPushProvider with --latency-ms per request, and an in-memory token table in place of
+Postgres (--devices-per-user tokens per recipient, alternating ios/android). Reported per mode:
+  wall time     from the first enqueue until every message has a result
+  requests      provider round trips
+  msgs/s        delivered messages per second
+
+Usage (from backend/):
+    python -m benchmarks.push_dispatch                                    # 5000 notifications
+    python -m benchmarks.push_dispatch --notifications 20000 --batch-size 500 --parallel 8
+    python -m benchmarks.push_dispatch --skip-naive --latency-ms 100
+"""
+import argparse
+import asyncio
+import time
+
+from src import push_dispatch
+from src.push_dispatch import PushDispatcher, StubPushProvider, _build_message
+
+
+def _fake_tables(args):
+    tokens = {}
+    for user_id in range(args.users):
+        tokens[user_id] = [
+            {"id": user_id * args.devices_per_user + d, "user_id": user_id,
+             "device_token": f"tok-{user_id}-{d}", "platform": "ios" if d % 2 == 0 else "android"}
+            for d in range(args.devices_per_user)
+        ]
+    notifications = [
+        {"id": i, "recipient_user_id": i % args.users, "type": "post_reply", "content_preview": "New reply"}
+        for i in range(args.notifications)
+    ]
+    return tokens, notifications
+
+
+def _naive(args, tokens, notifications):
+    """One send per (notification, device), in order."""
+    provider = StubPushProvider(latency_ms=args.latency_ms)
+    start = time.perf_counter(); sent = 0
+    for n in notifications:
+        for target in tokens[n["recipient_user_id"]]:
+            message = _build_message(n, target)
+            sent += provider.send(message["platform"], [message]).count(push_dispatch.PUSH_OK)
+    return time.perf_counter() - start, len(provider.requests), sent
+
+
+async def _batched(args, tokens, notifications):
+    push_dispatch.PUSH_BATCH_SIZE = args.batch_size
+    push_dispatch.PUSH_MAX_PARALLEL = args.parallel
+    push_dispatch.PUSH_FLUSH_MS = args.flush_ms
+    push_dispatch.PUSH_QUEUE_SIZE = max(push_dispatch.PUSH_QUEUE_SIZE, len(notifications))
+
+    def load_targets(batch):
+        return [_build_message(n, t) for n in batch for t in tokens[n["recipient_user_id"]]]
+
+    provider = StubPushProvider(latency_ms=args.latency_ms)
+    dispatcher = PushDispatcher(provider, load_targets=load_targets, record_results=lambda delivered, invalid: None)
+    dispatcher.start()
+    start = time.perf_counter()
+    for n in notifications: dispatcher.enqueue(n)
+    await dispatcher.stop()
+    return time.perf_counter() - start, len(provider.requests), dispatcher.stats["sent"]
+
+
+def _report(label, elapsed, requests, sent):
+    print(f"{label:<10} wall {elapsed * 1000:9.1f} ms   requests {requests:6d}   msgs/s {sent / elapsed if elapsed else 0:10.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--notifications", type=int, default=5000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--devices-per-user", type=int, default=2)
+    parser.add_argument("--latency-ms", type=float, default=40, help="Simulated provider round trip per request")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--parallel", type=int, default=8)
+    parser.add_argument("--flush-ms", type=float, default=50)
+    parser.add_argument("--skip-naive", action="store_true", help="The per-device loop is slow at high latency")
+    args = parser.parse_args()
+
+    tokens, notifications = _fake_tables(args)
+    print(f"{args.notifications} notifications -> {args.notifications * args.devices_per_user} device messages, "
+          f"{args.latency_ms} ms per provider request")
+    if not args.skip_naive: _report("naive", *_naive(args, tokens, notifications))
+    _report("batched", *asyncio.run(_batched(args, tokens, notifications)))
+
+
+if __name__ == "__main__":
+    main()
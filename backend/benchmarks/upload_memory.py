@@ -0,0 +1,105 @@
+# backend/benchmarks/upload_memory.py
+"""
+Peak memory of one upload vs. file size: whole-body buffering vs. utils.upload_file_to_minio streaming.
+
+`buffered` reproduces the old path (await file.read() + io.BytesIO + put_object); `streaming` calls
+utils.upload_file_to_minio. Both use the real minio-py client with its network calls stubbed out,
+so the part splitting / parallel part queue is minio's own code. Peak is measured with tracemalloc
+(Python-level allocations). --backend local writes through storage.LocalBackend to a temp dir instead.
+
+Usage (from backend/):
+    python -m benchmarks.upload_memory                          # 8, 64, 256 MiB files
+    python -m benchmarks.upload_memory --sizes-mb 16 512 --part-size-mb 8
+    python -m benchmarks.upload_memory --backend local
+"""
+import argparse
+import asyncio
+import io
+import os
+import tempfile
+import time
+import tracemalloc
+
+from minio import Minio
+from minio.helpers import ObjectWriteResult
+from starlette.datastructures import UploadFile
+
+from src import utils, storage
+
+
+class _NoNetworkMinio(Minio):
+    """Real put_object logic; the HTTP requests are replaced by no-ops."""
+
+    def bucket_exists(self, bucket_name):
+        return True
+
+    def _put_object(self, bucket_name, object_name, data, headers=None, query_params=None):
+        return ObjectWriteResult(bucket_name, object_name, None, "etag", None)
+
+    def _create_multipart_upload(self, bucket_name, object_name, headers):
+        return "upload-id"
+
+    def _upload_part(self, bucket_name, object_name, data, headers, upload_id, part_number):
+        time.sleep(0.002) # Pretend the part takes a moment to send
+        return f"etag-{part_number}"
+
+    def _complete_multipart_upload(self, bucket_name, object_name, upload_id, parts, ssec=None):
+        return ObjectWriteResult(bucket_name, object_name, None, "etag", None)
+
+
+def _spooled_upload(size: int) -> UploadFile:
+    spool = tempfile.SpooledTemporaryFile(max_size=1024 * 1024) # Starlette's spool threshold
+    chunk = os.urandom(1024 * 1024)
+    for _ in range(size // len(chunk)): spool.write(chunk)
+    spool.write(chunk[:size % len(chunk)]); spool.seek(0)
+    return UploadFile(file=spool, filename="bench.bin", headers={"content-type": "application/octet-stream"})
+
+
+async def _buffered(upload: UploadFile):
+    contents = await upload.read()
+    storage.get_storage().put_stream("bench/buffered.bin", io.BytesIO(contents), len(contents), "application/octet-stream",
+                                     part_size=utils.MINIO_UPLOAD_PART_SIZE)
+    await upload.close()
+
+
+async def _streaming(upload: UploadFile):
+    result = await utils.upload_file_to_minio(upload, "bench")
+    assert result is not None
+
+
+async def _measure(mode: str, size: int) -> float:
+    upload = _spooled_upload(size)
+    tracemalloc.start()
+    try:
+        await (_buffered(upload) if mode == "buffered" else _streaming(upload))
+        return tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+    finally:
+        tracemalloc.stop()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes-mb", type=int, nargs="+", default=[8, 64, 256])
+    parser.add_argument("--part-size-mb", type=int, default=utils.MINIO_UPLOAD_PART_SIZE // (1024 * 1024))
+    parser.add_argument("--backend", choices=["minio", "local"], default="minio")
+    args = parser.parse_args()
+
+    local_dir = tempfile.TemporaryDirectory(prefix="upload-bench-") if args.backend == "local" else None
+    if local_dir: storage.set_storage(storage.LocalBackend(local_dir.name))
+    else: storage.set_storage(storage.MinioBackend(_NoNetworkMinio("minio.invalid:9000", access_key="bench", secret_key="bench", secure=False)))
+    utils.MINIO_UPLOAD_PART_SIZE = max(args.part_size_mb, 5) * 1024 * 1024
+    utils.MINIO_UPLOAD_MAX_BYTES = max(args.sizes_mb) * 1024 * 1024
+
+    print(f"part size {utils.MINIO_UPLOAD_PART_SIZE // (1024 * 1024)} MiB, {utils.MINIO_UPLOAD_PARALLEL_PARTS} parts in flight")
+    print(f"{'file MiB':>9} {'buffered peak MiB':>18} {'streaming peak MiB':>19}")
+    for size_mb in args.sizes_mb:
+        size = size_mb * 1024 * 1024
+        buffered = await _measure("buffered", size)
+        streaming = await _measure("streaming", size)
+        print(f"{size_mb:>9} {buffered:>18.1f} {streaming:>19.1f}")
+    storage.shutdown_storage_executor()
+    if local_dir: local_dir.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,109 @@
+# backend/benchmarks/ws_broadcast.py
+"""
+Room broadcast latency with thousands of simulated sockets: the old sequential
+`await send_text` loop vs. ConnectionManager's per-connection queues and writer tasks.
+
+Each fake socket's send takes --send-ms; --slow-fraction of them stall for --slow-ms instead
+(a phone on a bad network). Reported per mode:
+  broadcast call   time until broadcast() returns (how long the sender / room is held up)
+  fast clients     time until every non-slow client has received all messages
+plus queue drops / slow-consumer disconnects for the queued mode.
+
+Usage (from backend/):
+    python -m benchmarks.ws_broadcast                                  # 5000 sockets, 1 room
+    python -m benchmarks.ws_broadcast --sockets 5000 --messages 20 --slow-fraction 0.02
+    python -m benchmarks.ws_broadcast --skip-sequential --queue-size 8 --policy drop_oldest
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from src import connection_manager
+from src.connection_manager import ConnectionManager
+
+
+class FakeSocket:
+    def __init__(self, send_seconds: float, expected: int):
+        self.send_seconds = send_seconds
+        self.expected = expected
+        self.received = 0
+        self.done = asyncio.Event()
+
+    async def send_text(self, message: str):
+        await asyncio.sleep(self.send_seconds)
+        self.received += 1
+        if self.received >= self.expected: self.done.set()
+
+    async def close(self, code: int = 1000, reason: str = ""):
+        self.done.set()
+
+
+def _make_sockets(args) -> list:
+    rng = random.Random(42)
+    return [FakeSocket(args.slow_ms / 1000 if rng.random() < args.slow_fraction else args.send_ms / 1000, args.messages)
+            for _ in range(args.sockets)]
+
+
+async def _sequential(args):
+    """The pre-queue ConnectionManager.broadcast: one awaited send per socket, in order."""
+    sockets = _make_sockets(args)
+    fast = [s for s in sockets if s.send_seconds < args.slow_ms / 1000]
+    start = time.perf_counter(); call_total = 0.0
+    for _ in range(args.messages):
+        call_start = time.perf_counter()
+        for ws in sockets: await ws.send_text("x" * args.message_bytes)
+        call_total += time.perf_counter() - call_start
+        await asyncio.sleep(args.interval_ms / 1000)
+    await asyncio.gather(*(s.done.wait() for s in fast))
+    return call_total / args.messages, time.perf_counter() - start, {}
+
+
+async def _queued(args):
+    manager = ConnectionManager()
+    sockets = _make_sockets(args)
+    fast = [s for s in sockets if s.send_seconds < args.slow_ms / 1000]
+    for ws in sockets: await manager.connect(ws, "community_1", None)
+    start = time.perf_counter(); call_total = 0.0
+    for _ in range(args.messages):
+        call_start = time.perf_counter()
+        await manager.broadcast("x" * args.message_bytes, "community_1")
+        call_total += time.perf_counter() - call_start
+        await asyncio.sleep(args.interval_ms / 1000) # Writer tasks drain between messages
+    await asyncio.gather(*(s.done.wait() for s in fast))
+    elapsed = time.perf_counter() - start
+    metrics = manager.get_metrics()
+    for ws in list(manager.active_connections.get("community_1", {})): manager.disconnect(ws, "community_1")
+    return call_total / args.messages, elapsed, metrics
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sockets", type=int, default=5000)
+    parser.add_argument("--messages", type=int, default=10)
+    parser.add_argument("--message-bytes", type=int, default=300)
+    parser.add_argument("--interval-ms", type=float, default=10.0, help="Gap between chat messages")
+    parser.add_argument("--send-ms", type=float, default=0.0, help="Per-send latency of a healthy client")
+    parser.add_argument("--slow-fraction", type=float, default=0.01)
+    parser.add_argument("--slow-ms", type=float, default=200.0, help="Per-send latency of a slow client")
+    parser.add_argument("--queue-size", type=int, default=connection_manager.WS_SEND_QUEUE_SIZE)
+    parser.add_argument("--policy", choices=["disconnect", "drop_oldest", "drop_new"], default=connection_manager.WS_SLOW_CONSUMER_POLICY)
+    parser.add_argument("--skip-sequential", action="store_true")
+    args = parser.parse_args()
+    connection_manager.WS_SEND_QUEUE_SIZE = args.queue_size
+    connection_manager.WS_SLOW_CONSUMER_POLICY = args.policy
+
+    print(f"{args.sockets} sockets, {args.messages} messages, {args.slow_fraction:.0%} slow ({args.slow_ms:.0f} ms/send), "
+          f"queue {args.queue_size}, policy {args.policy}")
+    print(f"{'mode':>10} {'broadcast call ms':>18} {'fast clients done s':>20}")
+    if not args.skip_sequential:
+        call, total, _ = await _sequential(args)
+        print(f"{'sequential':>10} {call * 1000:>18.1f} {total:>20.2f}")
+    call, total, metrics = await _queued(args)
+    print(f"{'queued':>10} {call * 1000:>18.1f} {total:>20.2f}")
+    print(f"queued: dropped {metrics['dropped']}, slow-consumer disconnects {metrics['slow_consumer_disconnects']}, "
+          f"max queue depth at end {metrics['max_queue_depth']}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
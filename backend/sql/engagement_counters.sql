@@ -0,0 +1,20 @@
+-- Denormalized engagement counters for posts and replies.
+-- Maintained incrementally by the vote/favorite/reply CRUD functions; the graph stays the
+-- source of truth. Rebuild/reconcile with: python -m utils.rebuild_engagement_counters
+
+CREATE TABLE IF NOT EXISTS public.post_stats (
+    post_id integer PRIMARY KEY REFERENCES public.posts(id) ON DELETE CASCADE,
+    reply_count integer NOT NULL DEFAULT 0,
+    upvotes integer NOT NULL DEFAULT 0,
+    downvotes integer NOT NULL DEFAULT 0,
+    favorite_count integer NOT NULL DEFAULT 0,
+    updated_at timestamp with time zone NOT NULL DEFAULT now()
+);
+
+CREATE TABLE IF NOT EXISTS public.reply_stats (
+    reply_id integer PRIMARY KEY REFERENCES public.replies(id) ON DELETE CASCADE,
+    upvotes integer NOT NULL DEFAULT 0,
+    downvotes integer NOT NULL DEFAULT 0,
+    favorite_count integer NOT NULL DEFAULT 0,
+    updated_at timestamp with time zone NOT NULL DEFAULT now()
+);
@@ -0,0 +1,28 @@
+-- Materialized home timelines for /feed/following (fan-out on write).
+-- Filled after a post commits, pruned on unfollow (rows for deleted posts cascade).
+-- Backfill / refresh with: python -m utils.backfill_home_timelines
+
+CREATE TABLE IF NOT EXISTS public.home_timelines (
+    user_id integer NOT NULL REFERENCES public.users(id) ON DELETE CASCADE,
+    post_id integer NOT NULL REFERENCES public.posts(id) ON DELETE CASCADE,
+    author_id integer NOT NULL,
+    created_at timestamp with time zone NOT NULL,
+    PRIMARY KEY (user_id, post_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_home_timelines_user_created
+    ON public.home_timelines (user_id, created_at DESC, post_id DESC);
+
+CREATE INDEX IF NOT EXISTS idx_home_timelines_user_author
+    ON public.home_timelines (user_id, author_id);
+
+-- Authors above TIMELINE_CELEBRITY_FOLLOWERS are not fanned out; their posts are merged in at read time.
+CREATE TABLE IF NOT EXISTS public.timeline_celebrity_authors (
+    author_id integer PRIMARY KEY REFERENCES public.users(id) ON DELETE CASCADE,
+    follower_count integer NOT NULL,
+    updated_at timestamp with time zone NOT NULL DEFAULT now()
+);
+
+-- Read-time merge for celebrity authors
+CREATE INDEX IF NOT EXISTS idx_posts_user_created
+    ON public.posts (user_id, created_at DESC, id DESC);
@@ -0,0 +1,10 @@
+-- Composite indexes backing keyset (cursor) pagination: WHERE (created_at, id) < (...) ORDER BY created_at DESC, id DESC
+
+CREATE INDEX IF NOT EXISTS idx_posts_created_id
+    ON public.posts (created_at DESC, id DESC);
+
+CREATE INDEX IF NOT EXISTS idx_replies_post_created_id
+    ON public.replies (post_id, created_at, id);
+
+CREATE INDEX IF NOT EXISTS idx_notifications_recipient_created_id
+    ON public.notifications (recipient_user_id, created_at DESC, id DESC);
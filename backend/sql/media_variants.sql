@@ -0,0 +1,11 @@
+-- Resized renditions of uploaded images (see src/image_variants.py).
+-- variant_objects is NULL until the variants job has run, {} when there is nothing to render
+-- (not an image, animated, undecodable), else {"thumb": {"object_name", "width", "height",
+-- "mime_type", "file_size_bytes"}, "medium": {...}, "large": {...}}.
+-- Render variants for existing images with: python -m utils.backfill_media_variants
+
+ALTER TABLE public.media_items ADD COLUMN IF NOT EXISTS variant_objects jsonb;
+
+-- Backfill scan
+CREATE INDEX IF NOT EXISTS idx_media_items_pending_variants
+    ON public.media_items (id) WHERE variant_objects IS NULL;
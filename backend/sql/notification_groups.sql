@@ -0,0 +1,54 @@
+-- Notification coalescing (see crud._notifications.create_notification).
+-- Votes, favorites, follows and replies on the same entity collapse into one unread row per
+-- recipient while the group is younger than NOTIFICATION_GROUP_WINDOW_HOURS: actor_count grows,
+-- the latest actors are kept in sample_actor_ids, and last_activity_at moves to the latest activity
+-- so the group resurfaces at the top of /notifications. created_at never changes; group_started_at
+-- bounds the window. /notifications pages on (last_activity_at, id).
+-- notification_group_actors holds every distinct actor of a group (the sample is only for display);
+-- actor_count grows only when an actor is inserted there for the first time. Concurrent events for
+-- the same group serialize on pg_advisory_xact_lock(hashtextextended(<group key>, 0)).
+
+ALTER TABLE public.notifications
+    ADD COLUMN IF NOT EXISTS actor_count integer NOT NULL DEFAULT 1,
+    ADD COLUMN IF NOT EXISTS sample_actor_ids integer[] NOT NULL DEFAULT '{}',
+    ADD COLUMN IF NOT EXISTS group_started_at timestamp with time zone NOT NULL DEFAULT now();
+
+UPDATE public.notifications
+SET group_started_at = created_at,
+    sample_actor_ids = CASE WHEN actor_user_id IS NULL THEN '{}' ELSE ARRAY[actor_user_id] END
+WHERE sample_actor_ids = '{}';
+
+-- Latest activity per row. Earlier versions of this migration moved created_at instead: carry that
+-- value over and restore created_at to when the group started.
+ALTER TABLE public.notifications ADD COLUMN IF NOT EXISTS last_activity_at timestamp with time zone;
+UPDATE public.notifications
+SET last_activity_at = created_at,
+    created_at = LEAST(created_at, group_started_at)
+WHERE last_activity_at IS NULL;
+ALTER TABLE public.notifications
+    ALTER COLUMN last_activity_at SET DEFAULT now(),
+    ALTER COLUMN last_activity_at SET NOT NULL;
+
+-- /notifications pages (newest activity first, keyset on last_activity_at, id)
+CREATE INDEX IF NOT EXISTS idx_notifications_recipient_activity_id
+    ON public.notifications (recipient_user_id, last_activity_at DESC, id DESC);
+
+-- Open-group lookup on every coalescible notification
+CREATE INDEX IF NOT EXISTS idx_notifications_open_group
+    ON public.notifications (recipient_user_id, type, related_entity_type, related_entity_id, group_started_at DESC)
+    WHERE is_read = FALSE;
+
+CREATE TABLE IF NOT EXISTS public.notification_group_actors (
+    notification_id bigint NOT NULL REFERENCES public.notifications(id) ON DELETE CASCADE,
+    actor_user_id integer NOT NULL REFERENCES public.users(id) ON DELETE CASCADE,
+    PRIMARY KEY (notification_id, actor_user_id)
+);
+
+-- Existing groups: only their sampled actors are known; repeats from older actors may still count once more
+INSERT INTO public.notification_group_actors (notification_id, actor_user_id)
+SELECT n.id, a.actor_user_id
+FROM public.notifications n
+CROSS JOIN LATERAL unnest(n.sample_actor_ids) AS a(actor_user_id)
+JOIN public.users u ON u.id = a.actor_user_id
+WHERE n.is_read = FALSE
+ON CONFLICT DO NOTHING;
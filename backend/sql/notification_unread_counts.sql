@@ -0,0 +1,14 @@
+-- Cached unread-notification counters (see crud._notifications).
+-- Adjusted in the same transaction as every notification insert / read-state change; rows are
+-- seeded from COUNT(*) on first use and corrected by the UNREAD_COUNT_RECONCILE_SECONDS pass.
+
+CREATE TABLE IF NOT EXISTS public.notification_unread_counts (
+    user_id integer PRIMARY KEY REFERENCES public.users(id) ON DELETE CASCADE,
+    unread_count integer NOT NULL DEFAULT 0,
+    updated_at timestamp with time zone NOT NULL DEFAULT now()
+);
+
+-- Seed existing users with unread notifications
+INSERT INTO public.notification_unread_counts (user_id, unread_count)
+SELECT recipient_user_id, COUNT(*) FROM public.notifications WHERE is_read = FALSE GROUP BY recipient_user_id
+ON CONFLICT (user_id) DO UPDATE SET unread_count = EXCLUDED.unread_count, updated_at = NOW();
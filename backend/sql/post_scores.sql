@@ -0,0 +1,18 @@
+-- Precomputed hot scores for /feed/discover and /posts/trending.
+-- Rescored on every post counter change (crud.adjust_stats) and refreshed by the background
+-- scorer every HOT_SCORE_REFRESH_SECONDS. Rebuild with: python -m utils.refresh_post_scores
+
+CREATE TABLE IF NOT EXISTS public.post_scores (
+    post_id integer PRIMARY KEY REFERENCES public.posts(id) ON DELETE CASCADE,
+    score double precision NOT NULL,
+    created_at timestamp with time zone NOT NULL,
+    updated_at timestamp with time zone NOT NULL DEFAULT now()
+);
+
+-- Top-K read (and keyset pages) walk this index
+CREATE INDEX IF NOT EXISTS idx_post_scores_rank
+    ON public.post_scores (score DESC, created_at DESC, post_id DESC);
+
+-- Window eviction
+CREATE INDEX IF NOT EXISTS idx_post_scores_created
+    ON public.post_scores (created_at);
@@ -0,0 +1,14 @@
+-- Oversized WebSocket backplane messages (see src/backplane.py, WS_BACKPLANE=postgres).
+-- NOTIFY payloads are capped at 8000 bytes, so larger room messages are stored here and the
+-- notification carries only their id. Rows are deleted by later oversized publishes once they
+-- are older than a few minutes; only needed when running the Postgres backplane.
+
+CREATE TABLE IF NOT EXISTS public.ws_backplane_payloads (
+    id text PRIMARY KEY,
+    payload text NOT NULL,
+    created_at timestamptz NOT NULL DEFAULT NOW()
+);
+
+-- Expiry sweep
+CREATE INDEX IF NOT EXISTS idx_ws_backplane_payloads_created_at
+    ON public.ws_backplane_payloads (created_at);
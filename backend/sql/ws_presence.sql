@@ -0,0 +1,16 @@
+-- Shared WebSocket presence counts (see src/presence.py, WS_BACKPLANE=postgres).
+-- Every API worker replaces its own rows every WS_PRESENCE_SYNC_SECONDS with the number of users
+-- it has online per room, and sums the other workers' fresh rows into its in-memory online_count.
+-- Rows of a worker that stopped syncing are ignored once stale; only needed with several workers.
+
+CREATE TABLE IF NOT EXISTS public.ws_presence (
+    node_id text NOT NULL,
+    room_key text NOT NULL,
+    online_count integer NOT NULL,
+    updated_at timestamptz NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (node_id, room_key)
+);
+
+-- Per-room totals over fresh rows
+CREATE INDEX IF NOT EXISTS idx_ws_presence_room_updated
+    ON public.ws_presence (room_key, updated_at);
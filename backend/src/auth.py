@@ -9,7 +9,7 @@ from jwt import PyJWTError, ExpiredSignatureError, InvalidTokenError
 from dotenv import load_dotenv
 
 # Import DB helpers (assuming direct usage or through crud)
-from .database import get_db_connection, update_last_seen
+from .database import get_db_connection, update_last_seen, schedule_last_seen_update
 # from . import crud # If crud functions are used within auth
 
 load_dotenv()
@@ -68,11 +68,9 @@ async def get_current_user(authorization: str = Header(...)) -> int:
         user_id = int(user_id_from_payload) # Convert to int
         print(f"Auth Success: Token validated for User ID: {user_id}")
 
-        # Update last_seen timestamp
-        # Note: Calling DB directly here might be less ideal than a background task
-        # Consider potential performance impact under heavy load.
+        # Update last_seen timestamp in the DB executor (doesn't block the event loop or the request)
         try:
-            update_last_seen(user_id)
+            schedule_last_seen_update(user_id)
         except Exception as db_err:
             # Log the error but don't fail the auth request itself
             print(f"Auth Warning: Failed to update last_seen for user {user_id}: {db_err}")
@@ -0,0 +1,301 @@
+# backend/src/backplane.py
+import os
+import re
+import json
+import uuid
+import select
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, List, Set, Any, Callable, Awaitable, Tuple
+
+import psycopg2
+import psycopg2.extensions
+
+from . import database
+
+# =========================================
+# Cross-worker pub/sub for WebSocket rooms
+# =========================================
+# ConnectionManager only knows the sockets of its own process. With several uvicorn workers or
+# hosts, a room message is broadcast locally and also published here; every other worker that
+# has sockets in that room receives it and relays it into its own ConnectionManager.broadcast.
+
+# "local" (single process, nothing to fan out) or "postgres" (LISTEN/NOTIFY, one channel per room)
+WS_BACKPLANE = os.getenv("WS_BACKPLANE", "local").lower()
+# Message ids remembered for de-duplication (own echoes, redelivery after a reconnect)
+WS_BACKPLANE_DEDUP_SIZE = int(os.getenv("WS_BACKPLANE_DEDUP_SIZE", 10000))
+# Pause between listener reconnect attempts after the LISTEN connection drops
+WS_BACKPLANE_RECONNECT_SECONDS = float(os.getenv("WS_BACKPLANE_RECONNECT_SECONDS", 2))
+
+# NOTIFY payloads are capped at 8000 bytes; bigger messages are parked in ws_backplane_payloads
+# (sql/ws_backplane.sql) and the notification only carries their id
+NOTIFY_MAX_PAYLOAD_BYTES = 7900
+# Parked payloads older than this are deleted by the next oversized publish
+OVERSIZE_PAYLOAD_TTL_SECONDS = 300
+
+Deliver = Callable[[str, str], Awaitable[None]] # (message, room_key), e.g. ConnectionManager.broadcast
+
+
+class Backplane:
+    """Interface: subscribe/unsubscribe rooms that have local sockets, publish room messages."""
+
+    def __init__(self):
+        self.node_id = uuid.uuid4().hex # Identifies this worker in published envelopes
+        self.stats: Dict[str, int] = {"published": 0, "received": 0, "relayed": 0, "duplicates": 0, "publish_failures": 0}
+        self._rooms: Set[str] = set()
+        self._rooms_lock = threading.Lock()
+        self._seen: "OrderedDict[str, None]" = OrderedDict()
+        self._seen_lock = threading.Lock()
+        self._deliver: Optional[Deliver] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    async def start(self, deliver: Deliver):
+        self._deliver = deliver
+        self._loop = asyncio.get_running_loop()
+
+    async def stop(self):
+        pass
+
+    def subscribe(self, room_key: str):
+        with self._rooms_lock: self._rooms.add(room_key)
+
+    def unsubscribe(self, room_key: str):
+        with self._rooms_lock: self._rooms.discard(room_key)
+
+    async def publish(self, room_key: str, message: str):
+        """Hands `message` to the other workers; never waits on the network."""
+
+    async def publish_many(self, items: List[Tuple[str, str]]):
+        """publish() for a batch of (room_key, message) pairs, e.g. one commit's notification frames."""
+        for room_key, message in items: await self.publish(room_key, message)
+
+    def _remember(self, message_id: str) -> bool:
+        """Records a message id; False if it was already seen."""
+        with self._seen_lock:
+            if message_id in self._seen:
+                self._seen.move_to_end(message_id)
+                return False
+            self._seen[message_id] = None
+            if len(self._seen) > WS_BACKPLANE_DEDUP_SIZE: self._seen.popitem(last=False)
+            return True
+
+    def _on_message(self, envelope: Dict[str, Any]):
+        """Called from the listener thread for every received envelope; relays it on the event loop."""
+        self.stats["received"] += 1
+        if envelope.get("origin") == self.node_id or not self._remember(envelope["id"]):
+            self.stats["duplicates"] += 1 # Our own publish echoed back, or delivered twice
+            return
+        room_key = envelope["room"]
+        with self._rooms_lock:
+            if room_key not in self._rooms: return # Unsubscribed after the NOTIFY was queued
+        if self._loop is None or self._deliver is None or self._loop.is_closed(): return
+        self._loop.call_soon_threadsafe(self._relay, envelope["message"], room_key)
+
+    def _relay(self, message: str, room_key: str):
+        self.stats["relayed"] += 1
+        asyncio.ensure_future(self._deliver(message, room_key))
+
+    def get_metrics(self) -> Dict[str, Any]:
+        with self._rooms_lock: rooms = len(self._rooms)
+        return {"backend": type(self).__name__, "subscribed_rooms": rooms, **self.stats}
+
+
+class LocalBackplane(Backplane):
+    """Single process: ConnectionManager.broadcast already reached every socket, nothing to send."""
+
+
+def channel_name(room_key: str) -> str:
+    """NOTIFY channel for a room: 'ws_<room_key>' when that is a short plain identifier, else a hash."""
+    if re.fullmatch(r"[a-z0-9_]{1,56}", room_key): return f"ws_{room_key}"
+    return "ws_" + hashlib.sha1(room_key.encode("utf-8")).hexdigest()
+
+
+class PostgresBackplane(Backplane):
+    """
+    LISTEN/NOTIFY backplane. A dedicated listener thread owns one autocommit connection and
+    LISTENs only on the channels of rooms with local sockets; a single publisher thread owns a
+    second connection, so NOTIFYs from this worker go out in the order they were published.
+    """
+
+    def __init__(self, connect_kwargs: Optional[Dict[str, Any]] = None):
+        super().__init__()
+        self._connect_kwargs = connect_kwargs or dict(
+            dbname=database.DB_NAME, user=database.DB_USER, password=database.DB_PASSWORD,
+            host=database.DB_HOST, port=database.DB_PORT,
+            keepalives=1, keepalives_idle=30, keepalives_interval=10, keepalives_count=3, # Notice dead peers
+        )
+        self.stats.update({"listener_connects": 0, "oversize_payloads": 0})
+        self._stopping = threading.Event()
+        self._listener: Optional[threading.Thread] = None
+        self._wake_r, self._wake_w = -1, -1
+        self._publisher: Optional[ThreadPoolExecutor] = None
+        self._publish_conn = None
+
+    def _connect(self):
+        conn = psycopg2.connect(**self._connect_kwargs)
+        conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        return conn
+
+    async def start(self, deliver: Deliver):
+        await super().start(deliver)
+        self._stopping.clear()
+        self._wake_r, self._wake_w = os.pipe()
+        os.set_blocking(self._wake_w, False)
+        self._publisher = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ws-backplane-publish")
+        self._listener = threading.Thread(target=self._listen_forever, name="ws-backplane-listen", daemon=True)
+        self._listener.start()
+        print(f"✅ WebSocket backplane: Postgres LISTEN/NOTIFY (node {self.node_id[:8]})")
+
+    async def stop(self):
+        self._stopping.set()
+        self._wake()
+        if self._listener is not None:
+            await asyncio.get_running_loop().run_in_executor(None, self._listener.join, 5)
+            self._listener = None
+        if self._publisher is not None:
+            self._publisher.submit(self._close_publish_conn)
+            await asyncio.get_running_loop().run_in_executor(None, self._publisher.shutdown, True) # Flush queued NOTIFYs
+            self._publisher = None
+        for fd in (self._wake_r, self._wake_w):
+            if fd >= 0: os.close(fd)
+        self._wake_r, self._wake_w = -1, -1
+
+    def _wake(self):
+        """Interrupts the listener's select() so subscription changes apply immediately."""
+        try:
+            if self._wake_w >= 0: os.write(self._wake_w, b"x")
+        except (BlockingIOError, OSError): pass # Pipe full: a wake-up is already pending
+
+    def subscribe(self, room_key: str):
+        super().subscribe(room_key); self._wake()
+
+    def unsubscribe(self, room_key: str):
+        super().unsubscribe(room_key); self._wake()
+
+    # --- Listener thread ---
+    def _listen_forever(self):
+        while not self._stopping.is_set():
+            conn = None
+            try:
+                conn = self._connect()
+                self.stats["listener_connects"] += 1
+                listening: Dict[str, str] = {} # room_key -> channel
+                while not self._stopping.is_set():
+                    self._sync_listens(conn, listening)
+                    ready, _, _ = select.select([conn, self._wake_r], [], [], 5.0)
+                    if self._wake_r in ready: os.read(self._wake_r, 4096)
+                    conn.poll()
+                    while conn.notifies:
+                        self._on_notify(conn, conn.notifies.pop(0).payload)
+            except Exception as e:
+                print(f"--- Backplane WARNING --- Listener connection failed ({type(e).__name__}: {e}); reconnecting.")
+            finally:
+                if conn is not None:
+                    try: conn.close()
+                    except Exception: pass
+            self._stopping.wait(WS_BACKPLANE_RECONNECT_SECONDS)
+
+    def _sync_listens(self, conn, listening: Dict[str, str]):
+        with self._rooms_lock: wanted = set(self._rooms)
+        cur = conn.cursor()
+        for room_key in wanted - listening.keys():
+            channel = channel_name(room_key)
+            cur.execute(f'LISTEN "{channel}";')
+            listening[room_key] = channel
+        for room_key in listening.keys() - wanted:
+            cur.execute(f'UNLISTEN "{listening.pop(room_key)}";')
+        cur.close()
+
+    def _on_notify(self, conn, payload: str):
+        try:
+            envelope = json.loads(payload)
+            if envelope.get("ref"): # Oversized message parked in ws_backplane_payloads
+                cur = conn.cursor()
+                cur.execute("SELECT payload FROM public.ws_backplane_payloads WHERE id = %s;", (envelope["id"],))
+                row = cur.fetchone(); cur.close()
+                if row is None: return # Expired before we got to it
+                envelope["message"] = row[0]
+            self._on_message(envelope)
+        except (ValueError, KeyError) as e:
+            print(f"--- Backplane WARNING --- Ignoring malformed notification: {e}")
+
+    # --- Publisher thread ---
+    async def publish(self, room_key: str, message: str):
+        message_id = uuid.uuid4().hex
+        self._remember(message_id)
+        envelope = {"id": message_id, "origin": self.node_id, "room": room_key, "message": message}
+        if self._publisher is None: return # Not started (tests / startup failed)
+        try: self._publisher.submit(self._notify, channel_name(room_key), envelope)
+        except RuntimeError as e: print(f"--- Backplane WARNING --- Publish to '{room_key}' skipped: {e}") # Shutting down
+
+    async def publish_many(self, items: List[Tuple[str, str]]):
+        batch = []
+        for room_key, message in items:
+            message_id = uuid.uuid4().hex
+            self._remember(message_id)
+            batch.append((channel_name(room_key), {"id": message_id, "origin": self.node_id, "room": room_key, "message": message}))
+        if self._publisher is None or not batch: return
+        try: self._publisher.submit(self._notify_many, batch)
+        except RuntimeError as e: print(f"--- Backplane WARNING --- Publish of {len(batch)} messages skipped: {e}")
+
+    def _notify_many(self, batch: List[Tuple[str, Dict[str, Any]]]):
+        """One round trip for the whole batch; oversized messages take the parked-payload path one by one."""
+        channels, payloads = [], []
+        for channel, envelope in batch:
+            payload = json.dumps(envelope, separators=(",", ":"))
+            if len(payload.encode("utf-8")) > NOTIFY_MAX_PAYLOAD_BYTES: self._notify(channel, envelope)
+            else: channels.append(channel); payloads.append(payload)
+        if not channels: return
+        for attempt in (1, 2):
+            try:
+                if self._publish_conn is None or self._publish_conn.closed: self._publish_conn = self._connect()
+                cur = self._publish_conn.cursor()
+                cur.execute("SELECT pg_notify(c, p) FROM unnest(%s::text[], %s::text[]) AS t(c, p);", (channels, payloads))
+                cur.close()
+                self.stats["published"] += len(channels)
+                return
+            except psycopg2.Error as e:
+                self._close_publish_conn()
+                if attempt == 2:
+                    self.stats["publish_failures"] += len(channels)
+                    print(f"--- Backplane ERROR --- Publish of {len(channels)} messages failed: {e}")
+
+    def _notify(self, channel: str, envelope: Dict[str, Any]):
+        for attempt in (1, 2): # Retry once on a fresh connection if the old one went away
+            try:
+                if self._publish_conn is None or self._publish_conn.closed: self._publish_conn = self._connect()
+                cur = self._publish_conn.cursor()
+                payload = json.dumps(envelope, separators=(",", ":"))
+                if len(payload.encode("utf-8")) > NOTIFY_MAX_PAYLOAD_BYTES:
+                    cur.execute("DELETE FROM public.ws_backplane_payloads WHERE created_at < NOW() - make_interval(secs => %s);",
+                                (OVERSIZE_PAYLOAD_TTL_SECONDS,))
+                    cur.execute("INSERT INTO public.ws_backplane_payloads (id, payload) VALUES (%s, %s);",
+                                (envelope["id"], envelope["message"]))
+                    payload = json.dumps({"id": envelope["id"], "origin": envelope["origin"], "room": envelope["room"], "ref": True},
+                                         separators=(",", ":"))
+                    self.stats["oversize_payloads"] += 1
+                cur.execute("SELECT pg_notify(%s, %s);", (channel, payload))
+                cur.close()
+                self.stats["published"] += 1
+                return
+            except psycopg2.Error as e:
+                self._close_publish_conn()
+                if attempt == 2:
+                    self.stats["publish_failures"] += 1
+                    print(f"--- Backplane ERROR --- Publish to '{channel}' failed: {e}")
+
+    def _close_publish_conn(self):
+        if self._publish_conn is not None:
+            try: self._publish_conn.close()
+            except Exception: pass
+            self._publish_conn = None
+
+
+def create_backplane() -> Backplane:
+    """Backplane selected by WS_BACKPLANE. Nothing connects until start()."""
+    if WS_BACKPLANE == "postgres": return PostgresBackplane()
+    if WS_BACKPLANE != "local": print(f"⚠️ Unknown WS_BACKPLANE '{WS_BACKPLANE}', using local.")
+    return LocalBackplane()
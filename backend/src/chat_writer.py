@@ -0,0 +1,116 @@
+# backend/src/chat_writer.py
+import os
+import asyncio
+import traceback
+from typing import Optional, List, Dict, Any, Tuple
+
+from . import crud, database
+
+# =========================================
+# Group-commit pipeline for WebSocket chat
+# =========================================
+# Inbound chat frames are queued here instead of each taking a pooled connection and a commit.
+# One flusher task collects whatever arrives within CHAT_WRITE_FLUSH_MS (up to CHAT_WRITE_MAX_BATCH
+# messages), saves it with a single multi-row INSERT ... RETURNING and one commit, and only then
+# resolves each sender's future so the handler can broadcast the stored message.
+
+CHAT_WRITE_FLUSH_MS = float(os.getenv("CHAT_WRITE_FLUSH_MS", 5)) # Max wait after the first queued message
+CHAT_WRITE_MAX_BATCH = int(os.getenv("CHAT_WRITE_MAX_BATCH", 200)) # Rows per INSERT
+CHAT_WRITE_QUEUE_SIZE = int(os.getenv("CHAT_WRITE_QUEUE_SIZE", 10000)) # submit() waits when this many are pending
+
+Pending = Tuple[Dict[str, Any], asyncio.Future]
+
+
+def _persist_batch(messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Blocking: one INSERT for the whole batch, one commit. Runs in the DB executor."""
+    conn = None
+    try:
+        conn = database.get_db_connection()
+        cursor = conn.cursor()
+        saved = crud.create_chat_messages_batch_db(cursor, messages)
+        conn.commit()
+        return saved
+    except Exception:
+        if conn: conn.rollback()
+        raise
+    finally:
+        if conn: conn.close()
+
+
+class ChatWriter:
+    def __init__(self):
+        self.stats: Dict[str, int] = {"queued": 0, "saved": 0, "failed": 0, "batches": 0, "fallback_batches": 0, "largest_batch": 0}
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is not None and not self._task.done(): return
+        self._queue = asyncio.Queue(maxsize=CHAT_WRITE_QUEUE_SIZE)
+        self._task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        """Flushes what is already queued, then stops the flusher."""
+        if self._task is None: return
+        await self._queue.join()
+        self._task.cancel()
+        try: await self._task
+        except asyncio.CancelledError: pass
+        self._task = None
+
+    async def submit(self, user_id: int, content: str, community_id: Optional[int], event_id: Optional[int]) -> Optional[Dict[str, Any]]:
+        """Queues one message and waits until its batch is committed; returns the stored message dict."""
+        self.start() # No-op once running; lets the writer come up on first use
+        future = asyncio.get_running_loop().create_future()
+        message = {"user_id": user_id, "content": content, "community_id": community_id, "event_id": event_id}
+        await self._queue.put((message, future))
+        self.stats["queued"] += 1
+        return await future
+
+    async def _flush_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch: List[Pending] = [await self._queue.get()]
+            deadline = loop.time() + CHAT_WRITE_FLUSH_MS / 1000
+            while len(batch) < CHAT_WRITE_MAX_BATCH:
+                timeout = deadline - loop.time()
+                if timeout <= 0: break
+                try: batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError: break
+            try:
+                await self._flush(batch)
+            except Exception:
+                traceback.print_exc()
+            finally:
+                for _ in batch: self._queue.task_done()
+
+    async def _flush(self, batch: List[Pending]):
+        self.stats["batches"] += 1
+        self.stats["largest_batch"] = max(self.stats["largest_batch"], len(batch))
+        messages = [message for message, _ in batch]
+        try:
+            saved = await database.run_in_background_executor(_persist_batch, messages)
+        except Exception as e:
+            # One bad row (e.g. a room deleted meanwhile) fails the whole INSERT; retry singly so only it fails
+            print(f"ChatWriter WARNING: batch of {len(batch)} failed ({type(e).__name__}: {e}); retrying one by one.")
+            self.stats["fallback_batches"] += 1
+            for message, future in batch:
+                try: self._resolve(future, (await database.run_in_background_executor(_persist_batch, [message]))[0])
+                except Exception as single_e: self._fail(future, single_e)
+            return
+        for (_, future), stored in zip(batch, saved):
+            self._resolve(future, stored)
+
+    def _resolve(self, future: asyncio.Future, stored: Dict[str, Any]):
+        self.stats["saved"] += 1
+        if not future.done(): future.set_result(stored) # Sender may have disconnected and cancelled
+
+    def _fail(self, future: asyncio.Future, error: Exception):
+        self.stats["failed"] += 1
+        if not future.done(): future.set_exception(error)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        pending = self._queue.qsize() if self._queue is not None else 0
+        return {"pending": pending, "flush_ms": CHAT_WRITE_FLUSH_MS, "max_batch": CHAT_WRITE_MAX_BATCH, **self.stats}
+
+
+chat_writer = ChatWriter()
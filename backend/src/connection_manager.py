@@ -1,88 +1,260 @@
 # backend/src/connection_manager.py
-from typing import Dict, Set, Tuple, Optional
-from fastapi import WebSocket
+import os
+import time
+import asyncio
+from typing import Dict, List, Set, Optional, Any, Tuple
+from fastapi import WebSocket, status
 import traceback
 
+from .backplane import Backplane, create_backplane
+from .presence import PresenceTracker, tracker as presence_tracker, is_presence_room
+
+# --- Outbound queues ---
+# Every socket gets a bounded queue drained by its own writer task, so broadcast is a
+# non-blocking enqueue per connection and one slow client never delays the rest of the room.
+WS_SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", 256))
+# What to do when a client's queue is full: "disconnect" (close 1013, client reconnects and
+# refetches history), "drop_oldest" (keep the newest messages) or "drop_new" (discard the message)
+WS_SLOW_CONSUMER_POLICY = os.getenv("WS_SLOW_CONSUMER_POLICY", "disconnect").lower()
+# A single send taking longer than this marks the client as stalled and closes it
+WS_SEND_TIMEOUT_SECONDS = float(os.getenv("WS_SEND_TIMEOUT_SECONDS", 10))
+# Sockets that send nothing (not even {"type": "ping"}) for this long are closed (1013, so clients reconnect)
+# and leave presence. Off by default: the app does not send application pings yet, and protocol-level
+# ping/pong frames are answered by the server and never reach us. Only enable for clients that ping.
+WS_HEARTBEAT_TIMEOUT_SECONDS = float(os.getenv("WS_HEARTBEAT_TIMEOUT_SECONDS", 0))
+
+
+class ClientConnection:
+    """One socket and the rooms it joined: its outbound queue and the writer task draining it."""
+
+    def __init__(self, websocket: WebSocket, user_id: Optional[int], manager: "ConnectionManager"):
+        self.websocket = websocket
+        self.rooms: Set[str] = set() # One room for /ws/{room_type}/{room_id}, any number for /ws
+        self.user_id = user_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=WS_SEND_QUEUE_SIZE)
+        self.dropped = 0
+        self.closing = False
+        self.last_active = time.monotonic() # Last inbound frame, for heartbeat liveness
+        self._manager = manager
+        self.writer = asyncio.create_task(self._write_loop())
+
+    async def _write_loop(self):
+        try:
+            while not self.closing: # Checked too because wait_for can swallow a cancel that races a finished send
+                message = await self.queue.get()
+                await asyncio.wait_for(self.websocket.send_text(message), timeout=WS_SEND_TIMEOUT_SECONDS)
+                self._manager.stats["sent"] += 1
+        except asyncio.CancelledError:
+            pass
+        except Exception as e: # Closed socket or stalled send
+            self._manager.stats["send_failures"] += 1
+            print(f"--- Manager WARNING --- Send to User {self.user_id} in {sorted(self.rooms)} failed ({type(e).__name__}); closing.")
+            self._manager._evict(self, code=status.WS_1011_INTERNAL_ERROR, reason="Send failed")
+
+    def enqueue(self, message: str) -> bool:
+        """Non-blocking; applies WS_SLOW_CONSUMER_POLICY when the queue is full. Returns False if not queued."""
+        if self.closing: return False
+        try:
+            self.queue.put_nowait(message)
+            return True
+        except asyncio.QueueFull:
+            pass
+        self.dropped += 1
+        self._manager.stats["dropped"] += 1
+        if WS_SLOW_CONSUMER_POLICY == "drop_oldest":
+            self.queue.get_nowait()
+            self.queue.put_nowait(message)
+            return True
+        if WS_SLOW_CONSUMER_POLICY == "disconnect":
+            self._manager.stats["slow_consumer_disconnects"] += 1
+            print(f"--- Manager WARNING --- User {self.user_id} in {sorted(self.rooms)} is too slow ({self.queue.qsize()} queued); disconnecting.")
+            self._manager._evict(self, code=status.WS_1013_TRY_AGAIN_LATER, reason="Too slow")
+        return False
+
+
 class ConnectionManager:
-    def __init__(self):
-        self.active_connections: Dict[str, Dict[WebSocket, Optional[int]]] = {}
+    def __init__(self, backplane: Optional[Backplane] = None, presence: Optional[PresenceTracker] = None):
+        self.active_connections: Dict[str, Dict[WebSocket, ClientConnection]] = {} # room_key -> sockets in it
+        self._clients: Dict[WebSocket, ClientConnection] = {} # Every registered socket, joined to rooms or not
+        # Other workers' messages for our rooms arrive through the backplane (see publish)
+        self.backplane = backplane if backplane is not None else create_backplane()
+        self.stats: Dict[str, int] = {"enqueued": 0, "sent": 0, "dropped": 0, "slow_consumer_disconnects": 0, "send_failures": 0, "heartbeat_timeouts": 0}
+        self._closing_tasks: Set[asyncio.Task] = set() # Strong refs; the loop only keeps weak ones
+        # Who is online where; joins/leaves are reported from connect/disconnect
+        self.presence = presence if presence is not None else PresenceTracker()
+        self._heartbeat_task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None # For publish_threadsafe
         print("--- Manager Initialized ---") # Log initialization
 
+    def register(self, websocket: WebSocket, user_id: Optional[int]) -> ClientConnection:
+        """Gives the socket its outbound queue/writer, once; rooms are added with connect()."""
+        if self._loop is None: self._loop = asyncio.get_running_loop()
+        client = self._clients.get(websocket)
+        if client is None: client = self._clients[websocket] = ClientConnection(websocket, user_id, self)
+        return client
+
     async def connect(self, websocket: WebSocket, room_key: str, user_id: Optional[int]):
-        print(f"--- Manager CONNECT Start --- User {user_id} / Room {room_key}")
+        # await websocket.accept() # Accept is done before calling connect
         try:
-            # await websocket.accept() # Accept is done before calling connect
-
-            # --- Add Detailed Check ---
-            if room_key not in self.active_connections:
-                print(f"--- Manager DEBUG --- Room '{room_key}' NOT found. Creating new entry.")
-                self.active_connections[room_key] = {}
-            else:
-                print(f"--- Manager DEBUG --- Room '{room_key}' ALREADY exists. Adding user {user_id}.")
-                # Log current users in room BEFORE adding new one
-                current_users = list(self.active_connections[room_key].values())
-                print(f"--- Manager DEBUG --- Users currently in room '{room_key}': {current_users}")
-            # --- End Detailed Check ---
-
-            # Add the new connection
-            self.active_connections[room_key][websocket] = user_id
-
-            # Log current users AFTER adding new one
-            current_users_after = list(self.active_connections[room_key].values())
-            count = len(self.active_connections[room_key])
-            print(f"--- Manager SUCCESS --- Stored User {user_id} in '{room_key}'. Current Users: {current_users_after}. Total: {count}")
-
+            client = self.register(websocket, user_id)
+            if room_key in client.rooms: return # Already subscribed
+            room = self.active_connections.get(room_key)
+            if room is None: # First local socket in the room: start receiving it from other workers
+                room = self.active_connections[room_key] = {}
+                self.backplane.subscribe(room_key)
+            room[websocket] = client
+            client.rooms.add(room_key)
+            if user_id is not None and is_presence_room(room_key): self.presence.join(room_key, user_id)
+            print(f"--- Manager CONNECT --- User {user_id} joined '{room_key}' ({len(room)} connected)")
         except Exception as e:
             print(f"--- !!! Manager ERROR during connect for User {user_id} / Room {room_key} !!! ---")
             print(f"Error Type: {type(e).__name__}"); print(f"Error Details: {e}"); print("Traceback:"); print(traceback.format_exc())
             raise # Re-raise
 
-    def disconnect(self, websocket: WebSocket, room_key: str):
-        print(f"--- Manager DISCONNECT Start --- Room {room_key}")
-        if room_key in self.active_connections:
-            if websocket in self.active_connections[room_key]:
-                user_id = self.active_connections[room_key].get(websocket, 'Unknown')
-                # --- Add Logging BEFORE delete ---
-                print(f"--- Manager DEBUG --- Removing User {user_id} (socket: {id(websocket)}) from room '{room_key}'.")
-                # --- End Logging ---
-                del self.active_connections[room_key][websocket]
-                count = len(self.active_connections[room_key])
-                print(f"--- Manager SUCCESS --- Removed User {user_id}. Remaining in '{room_key}': {count}")
-                if not self.active_connections[room_key]:
-                    del self.active_connections[room_key]
-                    print(f"--- Manager DEBUG --- Room '{room_key}' deleted as empty.")
-            else:
-                 # Log sockets currently in the room if the target wasn't found
-                 current_sockets = [id(ws) for ws in self.active_connections[room_key].keys()]
-                 print(f"--- Manager WARNING --- Socket {id(websocket)} not found in room '{room_key}' during disconnect. Current sockets: {current_sockets}")
-        else:
-             print(f"--- Manager WARNING --- Room '{room_key}' not found during disconnect.")
+    def leave(self, websocket: WebSocket, room_key: str) -> bool:
+        """Removes the socket from one room; the socket itself stays registered."""
+        room = self.active_connections.get(room_key)
+        client = room.pop(websocket, None) if room is not None else None
+        if client is None: return False
+        client.rooms.discard(room_key)
+        if client.user_id is not None and is_presence_room(room_key): self.presence.leave(room_key, client.user_id)
+        if not room:
+            del self.active_connections[room_key]
+            self.backplane.unsubscribe(room_key)
+        print(f"--- Manager LEAVE --- User {client.user_id} left '{room_key}' ({len(room)} remaining)")
+        return True
+
+    def disconnect(self, websocket: WebSocket, room_key: Optional[str] = None):
+        """Socket closed: leaves every room it joined and stops its writer. `room_key` is informational."""
+        client = self._clients.pop(websocket, None)
+        if client is None: return # Already evicted (slow consumer / failed send)
+        client.closing = True
+        if client.writer is not asyncio.current_task(): client.writer.cancel()
+        for joined in list(client.rooms): self.leave(websocket, joined)
+        print(f"--- Manager DISCONNECT --- User {client.user_id} socket closed")
+
+    def rooms_for(self, websocket: WebSocket) -> Set[str]:
+        client = self._clients.get(websocket)
+        return set(client.rooms) if client is not None else set()
 
+    def _evict(self, client: ClientConnection, code: int, reason: str):
+        """Drops a client from all its rooms and closes the socket in the background."""
+        if client.closing: return
+        self.disconnect(client.websocket)
+        async def _close():
+            try: await asyncio.wait_for(client.websocket.close(code=code, reason=reason), timeout=WS_SEND_TIMEOUT_SECONDS)
+            except Exception: pass # Already gone
+        task = asyncio.get_running_loop().create_task(_close())
+        self._closing_tasks.add(task); task.add_done_callback(self._closing_tasks.discard)
+
+    def touch(self, websocket: WebSocket):
+        """Marks the socket alive; call on every inbound frame (chat, control or ping)."""
+        client = self._clients.get(websocket)
+        if client is not None: client.last_active = time.monotonic()
+
+    def expire_idle(self, timeout: float) -> int:
+        """Closes sockets with no inbound frame for `timeout` seconds (1013: try again later); they leave presence immediately."""
+        cutoff = time.monotonic() - timeout
+        expired = 0
+        for client in list(self._clients.values()):
+            if client.last_active < cutoff:
+                self._evict(client, code=status.WS_1013_TRY_AGAIN_LATER, reason="Heartbeat timeout")
+                expired += 1
+        self.stats["heartbeat_timeouts"] += expired
+        return expired
+
+    async def _expire_idle_forever(self):
+        while True:
+            await asyncio.sleep(max(WS_HEARTBEAT_TIMEOUT_SECONDS / 3, 1))
+            self.expire_idle(WS_HEARTBEAT_TIMEOUT_SECONDS)
+
+    def send_to(self, websocket: WebSocket, message: str) -> bool:
+        """Queues a message for one socket (keeps its sends ordered with broadcasts)."""
+        client = self._clients.get(websocket)
+        if client is None: return False
+        queued = client.enqueue(message)
+        if queued: self.stats["enqueued"] += 1
+        return queued
 
     async def broadcast(self, message: str, room_key: str):
-         if room_key in self.active_connections:
-             current_connections = list(self.active_connections[room_key].keys()) # Get sockets
-             current_user_ids = list(self.active_connections[room_key].values()) # Get user IDs
-             print(f"--- Manager BROADCAST Start --- Room '{room_key}', Sending to {len(current_connections)} users: {current_user_ids}") # Log Users
-             # print(f"Broadcasting Message (first 100 chars): {message[:100]}...") # Log Message
-
-             disconnected_websockets = []
-             for connection in current_connections:
-                 user_id_for_conn = self.active_connections[room_key].get(connection, '?')
-                 try:
-                     await connection.send_text(message)
-                     # print(f"  Sent to User {user_id_for_conn}") # Can be very verbose
-                 except Exception as e:
-                     print(f"--- Manager ERROR --- Broadcast failed for User {user_id_for_conn} in '{room_key}': {e}")
-                     disconnected_websockets.append(connection)
-
-             if disconnected_websockets:
-                  print(f"--- Manager DEBUG --- Cleaning up {len(disconnected_websockets)} disconnected sockets from '{room_key}' after broadcast.")
-                  for ws in disconnected_websockets:
-                      self.disconnect(ws, room_key) # Ensure disconnect uses the correct room key
-             print(f"--- Manager BROADCAST End --- Room '{room_key}'")
-         else:
-             print(f"--- Manager WARNING --- Broadcast ignored, room '{room_key}' not found.")
+        """Queues `message` for every socket in the room; never waits on a client."""
+        room = self.active_connections.get(room_key)
+        if not room:
+            print(f"--- Manager WARNING --- Broadcast ignored, room '{room_key}' not found.")
+            return
+        queued = 0
+        for client in list(room.values()): # Copy: slow consumers may be evicted while enqueuing
+            if client.enqueue(message): queued += 1
+        self.stats["enqueued"] += queued
+        if queued < len(room): print(f"--- Manager BROADCAST --- '{room_key}': queued for {queued}, skipped {len(room) - queued}")
+
+    async def publish(self, message: str, room_key: str):
+        """Broadcasts to this worker's sockets in the room and to every other worker's via the backplane."""
+        if room_key in self.active_connections: await self.broadcast(message, room_key)
+        await self.backplane.publish(room_key, message)
+
+    def publish_threadsafe(self, message: str, room_key: str):
+        """publish() for code outside the event loop (sync handlers, DB executor, after-commit hooks); never blocks."""
+        loop = self._loop
+        if loop is None or loop.is_closed(): return # Not serving WebSockets (scripts, tests)
+        try: running = asyncio.get_running_loop()
+        except RuntimeError: running = None
+        if running is loop: asyncio.ensure_future(self.publish(message, room_key))
+        else: loop.call_soon_threadsafe(lambda: asyncio.ensure_future(self.publish(message, room_key)))
+
+    async def publish_many(self, items: List[Tuple[str, str]]):
+        """publish() for a batch of (message, room_key) pairs; the backplane sends them in one round trip."""
+        for message, room_key in items:
+            if room_key in self.active_connections: await self.broadcast(message, room_key)
+        await self.backplane.publish_many([(room_key, message) for message, room_key in items])
+
+    def publish_many_threadsafe(self, items: List[Tuple[str, str]]):
+        """publish_many() for code outside the event loop; never blocks."""
+        loop = self._loop
+        if loop is None or loop.is_closed(): return
+        try: running = asyncio.get_running_loop()
+        except RuntimeError: running = None
+        if running is loop: asyncio.ensure_future(self.publish_many(items))
+        else: loop.call_soon_threadsafe(lambda: asyncio.ensure_future(self.publish_many(items)))
+
+    async def _relay(self, message: str, room_key: str):
+        """Backplane delivery from another worker; the room may have emptied in the meantime."""
+        if room_key in self.active_connections: await self.broadcast(message, room_key)
+
+    async def start_backplane(self):
+        self._loop = asyncio.get_running_loop()
+        await self.backplane.start(self._relay)
+        for room_key in list(self.active_connections): self.backplane.subscribe(room_key)
+
+    async def stop_backplane(self):
+        await self.backplane.stop()
+
+    async def start_presence(self):
+        """Debounced presence frames go to local sockets only; each worker announces its own view."""
+        await self.presence.start(self.broadcast)
+        if WS_HEARTBEAT_TIMEOUT_SECONDS > 0 and self._heartbeat_task is None:
+            self._heartbeat_task = asyncio.create_task(self._expire_idle_forever())
+
+    async def stop_presence(self):
+        if self._heartbeat_task is not None: self._heartbeat_task.cancel(); self._heartbeat_task = None
+        await self.presence.stop()
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Connection counts, outbound queue depth and drop/disconnect counters."""
+        clients = list(self._clients.values())
+        depths = [client.queue.qsize() for client in clients]
+        return {
+            "rooms": len(self.active_connections),
+            "connections": len(clients),
+            "subscriptions": sum(len(client.rooms) for client in clients),
+            "queued_messages": sum(depths),
+            "max_queue_depth": max(depths, default=0),
+            "queue_capacity": WS_SEND_QUEUE_SIZE,
+            "slow_consumer_policy": WS_SLOW_CONSUMER_POLICY,
+            **self.stats,
+            "backplane": self.backplane.get_metrics(),
+            "presence": self.presence.get_metrics(),
+        }
 
 # Instantiate manager
-manager = ConnectionManager()
\ No newline at end of file
+manager = ConnectionManager(presence=presence_tracker)
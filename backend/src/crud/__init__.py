@@ -7,6 +7,7 @@ from ._user import (
     get_user_joined_communities_graph,
     get_user_participated_events_graph,
     check_is_following,
+    get_followed_ids,
     get_user_joined_communities_count,
     get_user_participated_events_count,
     get_post_ids_by_user,
@@ -20,6 +21,7 @@ from ._community import (
     get_trending_communities_db, get_community_details_db, delete_community_db,
     join_community_db, leave_community_db, add_post_to_community_db,
     remove_post_from_community_db, get_community_members_graph, check_is_member,
+    get_member_community_ids,
     get_community_member_ids,
     get_community_event_ids,
     get_post_ids_for_community,
@@ -29,8 +31,18 @@ from ._community import (
 from ._post import (
     create_post_db, get_post_by_id, get_post_counts, get_posts_db, delete_post_db,
     get_followed_posts_in_community_graph,
+    get_post_counts_bulk, get_post_community_links, hydrate_posts,
     get_reply_ids_for_post
 )
+from ._stats import (
+    adjust_stats, apply_vote_change, get_stats_bulk,
+    count_engagement_in_graph, reconcile_stats,
+    POST_STAT_FIELDS, REPLY_STAT_FIELDS
+)
+from ._scores import (
+    rescore_posts, refresh_post_scores, run_post_score_refresh, get_top_scored_posts,
+    HOT_SCORE_REFRESH_SECONDS
+)
 from ._reply import (
     create_reply_db, get_reply_by_id, get_reply_counts, get_replies_for_post_db, delete_reply_db
 )
@@ -39,32 +51,46 @@ from ._event import (
     get_events_for_community_db, update_event_db, delete_event_db, join_event_db, leave_event_db,
     get_event_participants_graph,
     check_is_participating,
+    get_participating_event_ids,
     get_event_participant_ids,
     get_nearby_events_db # Added for location
 )
 from ._chat import (
     create_chat_message_db,
-    get_chat_messages_db
+    create_chat_messages_batch_db,
+    get_chat_messages_db,
+    get_usernames_cached,
+    invalidate_username_cache,
+    get_username_cache_stats
 )
 
 from ._vote import (
     cast_vote_db,
     remove_vote_db,
-    get_viewer_vote_status )
+    set_vote_db,
+    toggle_vote_db,
+    get_viewer_vote_status,
+    get_viewer_vote_statuses )
 
 from ._favorite import (
     add_favorite_db,
     remove_favorite_db,
-    get_viewer_favorite_status )
+    get_viewer_favorite_status,
+    get_viewer_favorited_ids )
 
 from ._graph import (
     execute_cypher,
-    build_cypher_set_clauses,
+    build_cypher_set_params,
+    get_cypher_cache_stats,
 )
 
 from ._settings import (
     get_notification_settings,
-    update_notification_settings)
+    update_notification_settings,
+    get_notification_preferences,
+    invalidate_notification_preferences,
+    get_notification_preference_cache_stats,
+    NOTIFICATION_SETTING_COLUMNS)
 
 from ._block import (
     block_user_db,
@@ -75,24 +101,48 @@ from ._media import (
     create_media_item, link_media_to_post, link_media_to_reply, link_media_to_chat_message,
     set_user_profile_picture, set_community_logo,
     get_media_items_for_post,
+    get_media_items_for_posts,
     get_media_items_for_reply,
     get_media_items_for_chat_message,
     get_user_profile_picture_media, get_community_logo_media,
-    delete_media_item, get_media_item_by_id
+    delete_media_item, get_media_item_by_id,
+    set_media_variants, generate_media_variants, schedule_media_variants
 )
 
 from ._search import search_all
 
+from ._relationships import get_item_viewer_statuses, get_viewer_relationships
+
+from ._timeline import (
+    fan_out_post, schedule_timeline_fanout,
+    add_author_to_timeline, remove_author_from_timeline,
+    get_home_timeline_post_ids, get_celebrity_author_ids,
+    refresh_celebrity_authors, backfill_home_timeline
+)
+
 from ._feed import (
     get_following_feed,
     get_discover_feed)
 
 from ._notifications import (
     create_notification,
+    create_notifications_bulk,
     get_notifications_for_user,
     mark_notifications_as_read,
     mark_all_notifications_as_read,
     get_unread_notification_count,
+    reconcile_unread_counts,
+    run_unread_count_reconcile,
+    set_notification_publisher,
+    set_device_push_dispatcher,
+    get_cached_unread_count,
+    remember_unread_count,
+    filter_recipients_by_preference,
+    get_push_targets,
+    record_push_results,
+    NOTIFICATION_PREFERENCE_COLUMNS,
+    push_to_user,
+    UNREAD_COUNT_RECONCILE_SECONDS,
     register_user_device_token,
     unregister_user_device_token,
     get_user_device_tokens
@@ -0,0 +1,58 @@
+# backend/src/crud/_cache.py
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, List, Tuple
+
+# =========================================
+# Bounded TTL + LRU cache for per-user lookups
+# =========================================
+# Thread-safe (DB executor threads share it). Lookups return what is fresh and the keys to load,
+# so callers can fetch all misses with one query and put_many() the rows. Invalidation only reaches
+# this worker; other workers pick up changes when their entries expire.
+
+class TTLCache:
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict() # key -> (value, stored_at)
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+    def get_many(self, keys: Iterable[Hashable]) -> Tuple[Dict[Hashable, Any], List[Hashable]]:
+        """(fresh values by key, keys that are missing or expired)."""
+        now = time.monotonic()
+        found: Dict[Hashable, Any] = {}
+        missing: List[Hashable] = []
+        with self._lock:
+            for key in set(keys):
+                entry = self._entries.get(key)
+                if entry is not None and now - entry[1] < self.ttl_seconds:
+                    self._entries.move_to_end(key)
+                    found[key] = entry[0]
+                    self._stats["hits"] += 1
+                else:
+                    missing.append(key)
+                    self._stats["misses"] += 1
+        return found, missing
+
+    def put_many(self, values: Dict[Hashable, Any]):
+        now = time.monotonic()
+        with self._lock:
+            for key, value in values.items():
+                self._entries[key] = (value, now)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def invalidate(self, key: Hashable):
+        with self._lock:
+            if self._entries.pop(key, None) is not None: self._stats["invalidations"] += 1
+
+    def clear(self):
+        with self._lock: self._entries.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self._stats, "size": len(self._entries), "max_size": self.max_size}
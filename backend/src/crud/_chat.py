@@ -1,15 +1,41 @@
 # backend/src/crud/_chat.py
+import os
 import psycopg2
 import psycopg2.extras
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Iterable
 from datetime import datetime
 from .. import utils
+from ._cache import TTLCache
 # No graph imports needed
 
 # =========================================
 # Chat CRUD (Purely Relational)
 # =========================================
 
+# --- Username cache ---
+# Chat payloads carry the sender's username; caching it saves a users lookup per message.
+# Renames clear the entry on this worker (invalidate_username_cache); other workers catch up within the TTL.
+CHAT_USERNAME_CACHE_SIZE = int(os.getenv("CHAT_USERNAME_CACHE_SIZE", 10000))
+CHAT_USERNAME_CACHE_TTL_SECONDS = float(os.getenv("CHAT_USERNAME_CACHE_TTL_SECONDS", 300))
+
+_username_cache = TTLCache(CHAT_USERNAME_CACHE_SIZE, CHAT_USERNAME_CACHE_TTL_SECONDS) # user_id -> username
+
+def get_usernames_cached(cursor: psycopg2.extensions.cursor, user_ids: Iterable[int]) -> Dict[int, str]:
+    """user_id -> username, reading public.users once for all ids not in the cache."""
+    found, missing = _username_cache.get_many(user_ids)
+    if missing:
+        cursor.execute("SELECT id, username FROM public.users WHERE id = ANY(%s);", (missing,))
+        rows = {row['id']: row['username'] for row in cursor.fetchall()}
+        _username_cache.put_many(rows)
+        found.update(rows)
+    return found
+
+def invalidate_username_cache(user_id: int):
+    _username_cache.invalidate(user_id)
+
+def get_username_cache_stats() -> Dict[str, Any]:
+    return _username_cache.get_stats()
+
 def create_chat_message_db(
         cursor: psycopg2.extensions.cursor,
         user_id: int,
@@ -31,9 +57,7 @@ def create_chat_message_db(
         result = cursor.fetchone()
         if not result: return None
 
-        cursor.execute("SELECT username FROM public.users WHERE id = %s", (user_id,))
-        user_info = cursor.fetchone()
-        username = user_info['username'] if user_info else "Unknown"
+        username = get_usernames_cached(cursor, [user_id]).get(user_id, "Unknown")
 
         return {
             "message_id": result["id"],
@@ -51,6 +75,42 @@ def create_chat_message_db(
         print(f"Unexpected error in create_chat_message_db: {e}")
         raise
 
+def create_chat_messages_batch_db(
+        cursor: psycopg2.extensions.cursor,
+        messages: List[Dict[str, Any]]
+) -> List[Dict[str, Any]]:
+    """
+    Saves several chat messages with one multi-row INSERT (the chat write pipeline's group commit).
+    `messages` are dicts with user_id, content, community_id, event_id; results come back in the same order.
+    Requires the CALLING function to handle transaction commit/rollback.
+    """
+    if not messages: return []
+    rows = psycopg2.extras.execute_values(
+        cursor,
+        """
+        INSERT INTO public.chat_messages (community_id, event_id, user_id, content)
+        VALUES %s RETURNING id, "timestamp";
+        """,
+        [(m['community_id'], m['event_id'], m['user_id'], m['content']) for m in messages],
+        page_size=len(messages), # One statement, so RETURNING rows follow VALUES order
+        fetch=True
+    )
+    if len(rows) != len(messages):
+        raise psycopg2.DataError(f"Chat batch insert returned {len(rows)} rows for {len(messages)} messages")
+    usernames = get_usernames_cached(cursor, [m['user_id'] for m in messages])
+    return [
+        {
+            "message_id": row["id"],
+            "community_id": m['community_id'],
+            "event_id": m['event_id'],
+            "user_id": m['user_id'],
+            "username": usernames.get(m['user_id'], "Unknown"),
+            "content": m['content'],
+            "timestamp": row["timestamp"]
+        }
+        for m, row in zip(messages, rows)
+    ]
+
 def get_chat_messages_db(
         cursor: psycopg2.extensions.cursor,
         community_id: Optional[int],
@@ -3,12 +3,13 @@ import traceback
 
 import psycopg2
 import psycopg2.extras
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Set
 from datetime import datetime, timezone
 import re
 
-from ._graph import execute_cypher, build_cypher_set_clauses
+from ._graph import execute_cypher, build_cypher_set_params
 from .. import utils
+from ..presence import tracker as presence, community_room # Live online counts, no DB query
 
 def create_community_db(
         cursor: psycopg2.extensions.cursor, name: str, description: Optional[str],
@@ -44,24 +45,20 @@ def create_community_db(
             except: # nosec
                 pass
 
-        set_clauses_str = build_cypher_set_clauses('c', comm_props)
-        cypher_q_vertex = f"CREATE (c:Community {{id: {community_id}}})"
+        set_clauses_str, set_params = build_cypher_set_params('c', comm_props)
+        cypher_q_vertex = "CREATE (c:Community {id: $community_id})"
         if set_clauses_str: cypher_q_vertex += f" SET {set_clauses_str}"
-        execute_cypher(cursor, cypher_q_vertex)
-
-        created_at_quoted = utils.quote_cypher_string(created_at)
+        execute_cypher(cursor, cypher_q_vertex, params={'community_id': community_id, **set_params})
         cypher_q_edge = f"""
-            MATCH (u:User {{id: {created_by}}}) MATCH (c:Community {{id: {community_id}}})
-            MERGE (u)-[r:CREATED]->(c) SET r.created_at = {created_at_quoted}
+            MATCH (u:User {{id: $created_by}}) MATCH (c:Community {{id: $community_id}})
+            MERGE (u)-[r:CREATED]->(c) SET r.created_at = $created_at
         """
-        execute_cypher(cursor, cypher_q_edge)
-
-        joined_at_quoted = utils.quote_cypher_string(created_at)
+        execute_cypher(cursor, cypher_q_edge, params={'created_at': created_at, 'created_by': created_by, 'community_id': community_id})
         cypher_q_member = f"""
-            MATCH (u:User {{id: {created_by}}}) MATCH (c:Community {{id: {community_id}}})
-            MERGE (u)-[r:MEMBER_OF]->(c) SET r.joined_at = {joined_at_quoted}
+            MATCH (u:User {{id: $created_by}}) MATCH (c:Community {{id: $community_id}})
+            MERGE (u)-[r:MEMBER_OF]->(c) SET r.joined_at = $joined_at
         """
-        execute_cypher(cursor, cypher_q_member)
+        execute_cypher(cursor, cypher_q_member, params={'joined_at': created_at, 'created_by': created_by, 'community_id': community_id})
         return community_id
     except psycopg2.Error as db_err:
         print(f"CRUD DB Error creating community: {db_err}")
@@ -95,32 +92,42 @@ def get_communities_db(cursor: psycopg2.extensions.cursor, limit: int = 50, offs
     return cursor.fetchall()
 
 def get_community_counts(cursor: psycopg2.extensions.cursor, community_id: int) -> Dict[str, int]:
-    cypher_m = f"MATCH (member:User)-[:MEMBER_OF]->(c:Community {{id: {community_id}}}) RETURN count(member) as m_count"
+    cypher_m = "MATCH (member:User)-[:MEMBER_OF]->(c:Community {id: $community_id}) RETURN count(member) as m_count"
     expected = [('m_count', 'agtype')]
     member_count = 0
     try:
-        res_m = execute_cypher(cursor, cypher_m, fetch_one=True, expected_columns=expected)
+        res_m = execute_cypher(cursor, cypher_m, fetch_one=True, expected_columns=expected, params={'community_id': community_id})
         member_count = int(res_m.get('m_count', 0)) if res_m else 0
     except Exception as e: print(f"Warning: Failed getting member count for C:{community_id}: {e}")
-    return {"member_count": member_count, "online_count": 0}
+    return {"member_count": member_count, "online_count": presence.online_count(community_room(community_id))}
 
 def check_is_member(cursor: psycopg2.extensions.cursor, viewer_id: int, community_id: int) -> bool:
-    cypher_q = f"MATCH (viewer:User {{id: {viewer_id}}})-[:MEMBER_OF]->(community:Community {{id: {community_id}}}) RETURN viewer.id as vid"
+    cypher_q = "MATCH (viewer:User {id: $viewer_id})-[:MEMBER_OF]->(community:Community {id: $community_id}) RETURN viewer.id as vid"
     expected_cols_check_member = [('vid', 'agtype')]
     try:
-        result = execute_cypher(cursor, cypher_q, fetch_one=True, expected_columns=expected_cols_check_member)
+        result = execute_cypher(cursor, cypher_q, fetch_one=True, expected_columns=expected_cols_check_member, params={'viewer_id': viewer_id, 'community_id': community_id})
         return result is not None and result.get('vid') is not None
     except Exception as e: print(f"Error checking membership (U:{viewer_id}-C:{community_id}): {e}"); return False
 
+def get_member_community_ids(cursor: psycopg2.extensions.cursor, viewer_id: int, community_ids: List[int]) -> Set[int]:
+    """Bulk check_is_member: the subset of community_ids the viewer is a member of."""
+    if not community_ids: return set()
+    cypher_q = "MATCH (:User {id: $viewer_id})-[:MEMBER_OF]->(c:Community) WHERE c.id IN $community_ids RETURN c.id as cid"
+    try:
+        rows = execute_cypher(cursor, cypher_q, fetch_all=True, expected_columns=[('cid', 'agtype')],
+                              params={'viewer_id': viewer_id, 'community_ids': list(community_ids)}) or []
+        return {int(r['cid']) for r in rows if r.get('cid') is not None}
+    except Exception as e: print(f"Error checking bulk membership (U:{viewer_id}, {len(community_ids)} communities): {e}"); return set()
+
 def get_community_members_graph(cursor: psycopg2.extensions.cursor, community_id: int, limit: int, offset: int) -> List[Dict[str, Any]]:
     cypher_q = f"""
-        MATCH (u:User)-[:MEMBER_OF]->(c:Community {{id: {community_id}}})
+        MATCH (u:User)-[:MEMBER_OF]->(c:Community {{id: $community_id}})
         RETURN u.id as id, u.username as username, u.name as name, u.image_path as image_path
-        ORDER BY u.username SKIP {offset} LIMIT {limit}
+        ORDER BY u.username SKIP {int(offset)} LIMIT {int(limit)}
     """
     expected_cols_members_graph = [('id', 'agtype'), ('username', 'agtype'), ('name', 'agtype'), ('image_path', 'agtype')]
     try:
-        results = execute_cypher(cursor, cypher_q, fetch_all=True, expected_columns=expected_cols_members_graph) or []
+        results = execute_cypher(cursor, cypher_q, fetch_all=True, expected_columns=expected_cols_members_graph, params={'community_id': community_id}) or []
         return [r for r in results if isinstance(r, dict)]
     except Exception as e: print(f"CRUD Error getting community members graph for C:{community_id}: {e}"); raise
 
@@ -178,11 +185,11 @@ def update_community_details_db(
 
     # Update graph properties if any are staged and DB update was successful
     if graph_props_to_update and rows_affected > 0:
-        set_clauses_str = build_cypher_set_clauses('c', graph_props_to_update)
+        set_clauses_str, set_params = build_cypher_set_params('c', graph_props_to_update)
         if set_clauses_str:
-            cypher_q_graph_update = f"MATCH (c:Community {{id: {community_id}}}) SET {set_clauses_str}"
+            cypher_q_graph_update = f"MATCH (c:Community {{id: $community_id}}) SET {set_clauses_str}"
             try:
-                execute_cypher(cursor, cypher_q_graph_update)
+                execute_cypher(cursor, cypher_q_graph_update, params={'community_id': community_id, **set_params})
                 print(f"CRUD: AGE vertex updated for community {community_id}.")
             except Exception as age_err:
                 print(f"CRUD WARNING: Failed updating AGE vertex for community {community_id}: {age_err}")
@@ -260,9 +267,9 @@ def get_community_details_db(cursor: psycopg2.extensions.cursor, community_id: i
     return combined_data
 
 def delete_community_db(cursor: psycopg2.extensions.cursor, community_id: int) -> bool:
-    cypher_q = f"MATCH (c:Community {{id: {community_id}}}) DETACH DELETE c"
+    cypher_q = "MATCH (c:Community {id: $community_id}) DETACH DELETE c"
     try:
-        execute_cypher(cursor, cypher_q)
+        execute_cypher(cursor, cypher_q, params={'community_id': community_id})
     except Exception as age_err:
         print(f"CRUD WARNING: Failed to delete AGE vertex for community {community_id}: {age_err}")
         raise age_err
@@ -271,43 +278,41 @@ def delete_community_db(cursor: psycopg2.extensions.cursor, community_id: int) -
 
 def join_community_db(cursor: psycopg2.extensions.cursor, user_id: int, community_id: int) -> bool:
     now_iso = datetime.now(timezone.utc).isoformat()
-    joined_at_quoted = utils.quote_cypher_string(now_iso)
     cypher_q = f"""
-        MATCH (u:User {{id: {user_id}}}) MATCH (c:Community {{id: {community_id}}})
-        MERGE (u)-[r:MEMBER_OF]->(c) SET r.joined_at = {joined_at_quoted} """
-    try: return execute_cypher(cursor, cypher_q)
+        MATCH (u:User {{id: $user_id}}) MATCH (c:Community {{id: $community_id}})
+        MERGE (u)-[r:MEMBER_OF]->(c) SET r.joined_at = $joined_at """
+    try: return execute_cypher(cursor, cypher_q, params={'joined_at': now_iso, 'user_id': user_id, 'community_id': community_id})
     except Exception as e: print(f"Error joining community: {e}"); return False
 
 def leave_community_db(cursor: psycopg2.extensions.cursor, user_id: int, community_id: int) -> bool:
-    cypher_q = f"MATCH (u:User {{id: {user_id}}})-[r:MEMBER_OF]->(c:Community {{id: {community_id}}}) DELETE r"
-    try: return execute_cypher(cursor, cypher_q)
+    cypher_q = "MATCH (u:User {id: $user_id})-[r:MEMBER_OF]->(c:Community {id: $community_id}) DELETE r"
+    try: return execute_cypher(cursor, cypher_q, params={'user_id': user_id, 'community_id': community_id})
     except Exception as e: print(f"Error leaving community: {e}"); return False
 
 def add_post_to_community_db(cursor: psycopg2.extensions.cursor, community_id: int, post_id: int) -> bool:
     now_iso = datetime.now(timezone.utc).isoformat()
-    added_at_quoted = utils.quote_cypher_string(now_iso)
     cypher_q = f"""
-        MATCH (c:Community {{id: {community_id}}}) MATCH (p:Post {{id: {post_id}}})
-        MERGE (c)-[r:HAS_POST]->(p) SET r.added_at = {added_at_quoted} """
-    try: return execute_cypher(cursor, cypher_q)
+        MATCH (c:Community {{id: $community_id}}) MATCH (p:Post {{id: $post_id}})
+        MERGE (c)-[r:HAS_POST]->(p) SET r.added_at = $added_at """
+    try: return execute_cypher(cursor, cypher_q, params={'added_at': now_iso, 'community_id': community_id, 'post_id': post_id})
     except Exception as e: print(f"Error adding post to community: {e}"); return False
 
 def remove_post_from_community_db(cursor: psycopg2.extensions.cursor, community_id: int, post_id: int) -> bool:
-    cypher_q = f"MATCH (c:Community {{id: {community_id}}})-[r:HAS_POST]->(p:Post {{id: {post_id}}}) DELETE r"
-    try: return execute_cypher(cursor, cypher_q)
+    cypher_q = "MATCH (c:Community {id: $community_id})-[r:HAS_POST]->(p:Post {id: $post_id}) DELETE r"
+    try: return execute_cypher(cursor, cypher_q, params={'community_id': community_id, 'post_id': post_id})
     except Exception as e: print(f"Error removing post from community: {e}"); return False
 
 def get_community_member_ids(cursor: psycopg2.extensions.cursor, community_id: int, limit: int, offset: int) -> List[int]:
     cypher_q = f"""
-        MATCH (u:User)-[:MEMBER_OF]->(c:Community {{id: {community_id}}})
+        MATCH (u:User)-[:MEMBER_OF]->(c:Community {{id: $community_id}})
         RETURN u.id as id, u.username as username
         ORDER BY u.username ASC
-        SKIP {offset} LIMIT {limit}
+        SKIP {int(offset)} LIMIT {int(limit)}
     """
     # Note: Removed the problematic comment from here as well.
     expected_cols_member_ids = [('id', 'agtype'), ('username', 'agtype')]
     try:
-        results = execute_cypher(cursor, cypher_q, fetch_all=True, expected_columns=expected_cols_member_ids) or []
+        results = execute_cypher(cursor, cypher_q, fetch_all=True, expected_columns=expected_cols_member_ids, params={'community_id': community_id}) or []
         return [int(r['id']) for r in results if isinstance(r, dict) and r.get('id') is not None]
     except Exception as e:
         print(f"CRUD Error getting community member IDs for C:{community_id}: {e}")
@@ -332,14 +337,14 @@ def get_community_event_ids(cursor: psycopg2.extensions.cursor, community_id: in
 
 def get_post_ids_for_community(cursor: psycopg2.extensions.cursor, community_id: int, limit: int, offset: int) -> List[int]:
     cypher_q = f"""
-        MATCH (c:Community {{id: {community_id}}})-[:HAS_POST]->(p:Post)
+        MATCH (c:Community {{id: $community_id}})-[:HAS_POST]->(p:Post)
         RETURN p.id as id, p.created_at as created_at
         ORDER BY p.created_at DESC
-        SKIP {offset} LIMIT {limit}
+        SKIP {int(offset)} LIMIT {int(limit)}
     """
     expected_cols_post_ids = [('id', 'agtype'), ('created_at', 'agtype')]
     try:
-        results = execute_cypher(cursor, cypher_q, fetch_all=True, expected_columns=expected_cols_post_ids) or []
+        results = execute_cypher(cursor, cypher_q, fetch_all=True, expected_columns=expected_cols_post_ids, params={'community_id': community_id}) or []
         return [int(r['id']) for r in results if isinstance(r, dict) and r.get('id') is not None]
     except Exception as e:
         print(f"CRUD Error getting post IDs for community {community_id}: {e}")
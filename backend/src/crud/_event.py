@@ -3,12 +3,11 @@ import traceback
 
 import psycopg2
 import psycopg2.extras
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Set
 from datetime import datetime, timezone
 
 # Import graph helpers and utils
-from ._graph import execute_cypher, build_cypher_set_clauses#, get_graph_counts
-from .. import utils # Import root utils for quote_cypher_string
+from ._graph import execute_cypher, build_cypher_set_params#, get_graph_counts
 
 # =========================================
 # Event CRUD (Relational + Graph)
@@ -73,31 +72,29 @@ def create_event_db(
         except: # nosec
             pass # Ignore parsing errors for graph props
 
-    set_clauses_str = build_cypher_set_clauses('e', event_props)
-    cypher_q_vertex = f"CREATE (e:Event {{id: {event_id}}})"
+    set_clauses_str, set_params = build_cypher_set_params('e', event_props)
+    cypher_q_vertex = "CREATE (e:Event {id: $event_id})"
     if set_clauses_str: cypher_q_vertex += f" SET {set_clauses_str}"
-    execute_cypher(cursor, cypher_q_vertex)
+    execute_cypher(cursor, cypher_q_vertex, params={'event_id': event_id, **set_params})
     print(f"CRUD: AGE vertex created for event {event_id}.")
 
     # 3. Create :CREATED edge (User -> Event)
-    created_at_quoted = utils.quote_cypher_string(created_at)
     cypher_q_created = f"""
-        MATCH (u:User {{id: {creator_id}}})
-        MATCH (e:Event {{id: {event_id}}})
+        MATCH (u:User {{id: $creator_id}})
+        MATCH (e:Event {{id: $event_id}})
         MERGE (u)-[r:CREATED]->(e)
-        SET r.created_at = {created_at_quoted}
+        SET r.created_at = $created_at
     """
-    execute_cypher(cursor, cypher_q_created)
+    execute_cypher(cursor, cypher_q_created, params={'created_at': created_at, 'creator_id': creator_id, 'event_id': event_id})
 
     # 4. Add creator as participant (:PARTICIPATED_IN edge)
-    joined_at_quoted = utils.quote_cypher_string(created_at)
     cypher_q_participated = f"""
-        MATCH (u:User {{id: {creator_id}}})
-        MATCH (e:Event {{id: {event_id}}})
+        MATCH (u:User {{id: $creator_id}})
+        MATCH (e:Event {{id: $event_id}})
         MERGE (u)-[r:PARTICIPATED_IN]->(e)
-        SET r.joined_at = {joined_at_quoted}
+        SET r.joined_at = $joined_at
     """
-    execute_cypher(cursor, cypher_q_participated)
+    execute_cypher(cursor, cypher_q_participated, params={'joined_at': created_at, 'creator_id': creator_id, 'event_id': event_id})
 
     return {'id': event_id, 'created_at': created_at}
 
@@ -117,18 +114,18 @@ def get_event_participants_graph(cursor: psycopg2.extensions.cursor, event_id: i
     """Fetches participants (basic User info) of an event from the AGE graph."""
     # Select properties needed by the UserType GQL type
     cypher_q = f"""
-        MATCH (u:User)-[r:PARTICIPATED_IN]->(e:Event {{id: {event_id}}})
+        MATCH (u:User)-[r:PARTICIPATED_IN]->(e:Event {{id: $event_id}})
         RETURN u.id as id,
                u.username as username,
                u.name as name,
                u.image_path as image_path
                // Add other User vertex properties if needed by GQL type
         ORDER BY r.joined_at DESC // Order by join time (most recent first)
-        SKIP {offset}
-        LIMIT {limit}
+        SKIP {int(offset)}
+        LIMIT {int(limit)}
     """
     try:
-        results_agtype = execute_cypher(cursor, cypher_q, fetch_all=True, expected_columns=expected)
+        results_agtype = execute_cypher(cursor, cypher_q, fetch_all=True, expected_columns=expected, params={'event_id': event_id})
         # Results are list of maps like {'id': 1, 'username': 'x', ...}
         return results_agtype if isinstance(results_agtype, list) else []
     except Exception as e:
@@ -138,26 +135,38 @@ def get_event_participants_graph(cursor: psycopg2.extensions.cursor, event_id: i
 
 # --- Fetch event participant count from graph ---
 def get_event_participant_count(cursor: psycopg2.extensions.cursor, event_id: int) -> int:
-    cypher_q = f"MATCH (p:User)-[:PARTICIPATED_IN]->(e:Event {{id: {event_id}}}) RETURN count(p) as p_count"
+    cypher_q = "MATCH (p:User)-[:PARTICIPATED_IN]->(e:Event {id: $event_id}) RETURN count(p) as p_count"
     expected = [('p_count', 'agtype')]
     try:
-        result = execute_cypher(cursor, cypher_q, fetch_one=True, expected_columns=expected)
+        result = execute_cypher(cursor, cypher_q, fetch_one=True, expected_columns=expected, params={'event_id': event_id})
         return int(result.get('p_count', 0)) if result else 0
     except Exception as e: print(f"Warning: Failed getting participant count for event {event_id}: {e}"); return 0
 
 def check_is_participating(cursor: psycopg2.extensions.cursor, viewer_id: int, event_id: int) -> bool:
     """Checks if viewer is participating in event using graph."""
-    cypher_q = f"MATCH (viewer:User {{id: {viewer_id}}})-[:PARTICIPATED_IN]->(event:Event {{id: {event_id}}}) RETURN viewer.id as vid"
+    cypher_q = "MATCH (viewer:User {id: $viewer_id})-[:PARTICIPATED_IN]->(event:Event {id: $event_id}) RETURN viewer.id as vid"
     expected = [('vid', 'agtype')] # Defined
     try:
         # --- FIX: Add expected_columns argument ---
-        result = execute_cypher(cursor, cypher_q, fetch_one=True, expected_columns=expected)
+        result = execute_cypher(cursor, cypher_q, fetch_one=True, expected_columns=expected, params={'viewer_id': viewer_id, 'event_id': event_id})
         # --- End Fix ---
         return result is not None and result.get('vid') is not None
     except Exception as e:
         print(f"Error checking participation status (U:{viewer_id}-E:{event_id}): {e}")
         return False
 
+def get_participating_event_ids(cursor: psycopg2.extensions.cursor, viewer_id: int, event_ids: List[int]) -> Set[int]:
+    """Bulk check_is_participating: the subset of event_ids the viewer participates in."""
+    if not event_ids: return set()
+    cypher_q = "MATCH (:User {id: $viewer_id})-[:PARTICIPATED_IN]->(e:Event) WHERE e.id IN $event_ids RETURN e.id as eid"
+    try:
+        rows = execute_cypher(cursor, cypher_q, fetch_all=True, expected_columns=[('eid', 'agtype')],
+                              params={'viewer_id': viewer_id, 'event_ids': list(event_ids)}) or []
+        return {int(r['eid']) for r in rows if r.get('eid') is not None}
+    except Exception as e:
+        print(f"Error checking bulk participation status (U:{viewer_id}, {len(event_ids)} events): {e}")
+        return set()
+
 # --- Fetch event details including participant count ---
 def get_event_details_db(cursor: psycopg2.extensions.cursor, event_id: int) -> Optional[Dict[str, Any]]:
     # ... fetch relational data ...
@@ -235,10 +244,10 @@ def update_event_db(
 
     # 2. Update AGE Graph Vertex
     if graph_props_to_update and rows_affected > 0:
-        set_clauses_str = build_cypher_set_clauses('e', graph_props_to_update)
+        set_clauses_str, set_params = build_cypher_set_params('e', graph_props_to_update)
         if set_clauses_str:
-            cypher_q = f"MATCH (e:Event {{id: {event_id}}}) SET {set_clauses_str}"
-            execute_cypher(cursor, cypher_q)
+            cypher_q = f"MATCH (e:Event {{id: $event_id}}) SET {set_clauses_str}"
+            execute_cypher(cursor, cypher_q, params={'event_id': event_id, **set_params})
             print(f"CRUD: Updated AGE vertex for event {event_id}.")
 
     # Return updated details if successful
@@ -254,9 +263,9 @@ def delete_event_db(cursor: psycopg2.extensions.cursor, event_id: int) -> bool:
     Requires CALLING function to handle transaction commit/rollback.
     """
     # 1. Delete from AGE graph using DETACH DELETE
-    cypher_q = f"MATCH (e:Event {{id: {event_id}}}) DETACH DELETE e"
+    cypher_q = "MATCH (e:Event {id: $event_id}) DETACH DELETE e"
     print(f"CRUD: Deleting AGE vertex and edges for event {event_id}...")
-    execute_cypher(cursor, cypher_q) # Assumes raises on error
+    execute_cypher(cursor, cypher_q, params={'event_id': event_id}) # Assumes raises on error
     print(f"CRUD: AGE vertex/edges deleted for event {event_id}.")
 
     # 2. Delete from relational table
@@ -280,11 +289,10 @@ def join_event_db(cursor: psycopg2.extensions.cursor, event_id: int, user_id: in
 
         # 2. Create Edge
         now_iso = datetime.now(timezone.utc).isoformat()
-        joined_at_quoted = utils.quote_cypher_string(now_iso)
         cypher_q = f"""
-            MATCH (u:User {{id: {user_id}}}) MATCH (e:Event {{id: {event_id}}})
-            MERGE (u)-[r:PARTICIPATED_IN]->(e) SET r.joined_at = {joined_at_quoted} """
-        success = execute_cypher(cursor, cypher_q)
+            MATCH (u:User {{id: $user_id}}) MATCH (e:Event {{id: $event_id}})
+            MERGE (u)-[r:PARTICIPATED_IN]->(e) SET r.joined_at = $joined_at """
+        success = execute_cypher(cursor, cypher_q, params={'joined_at': now_iso, 'user_id': user_id, 'event_id': event_id})
         if success: print(f"CRUD: User {user_id} joined event {event_id}.")
         return success
     except ValueError as ve: # Catch specific errors
@@ -295,9 +303,9 @@ def join_event_db(cursor: psycopg2.extensions.cursor, event_id: int, user_id: in
 def leave_event_db(cursor: psycopg2.extensions.cursor, event_id: int, user_id: int) -> bool:
     """Deletes :PARTICIPATED_IN edge."""
     # Avoid count()
-    cypher_q = f"MATCH (u:User {{id: {user_id}}})-[r:PARTICIPATED_IN]->(e:Event {{id: {event_id}}}) DELETE r"
+    cypher_q = "MATCH (u:User {id: $user_id})-[r:PARTICIPATED_IN]->(e:Event {id: $event_id}) DELETE r"
     try:
-        success = execute_cypher(cursor, cypher_q)
+        success = execute_cypher(cursor, cypher_q, params={'user_id': user_id, 'event_id': event_id})
         print(f"CRUD: User {user_id} left event {event_id}. Success: {success}")
         return success # Return status based on execute_cypher
     except Exception as e: print(f"Error leaving event (U:{user_id}, E:{event_id}): {e}"); raise
@@ -308,14 +316,14 @@ def get_event_participant_ids(cursor: psycopg2.extensions.cursor, event_id: int,
     # Comment moved outside the Cypher string
     # Fetches join time for ordering
     cypher_q = f"""
-        MATCH (u:User)-[p:PARTICIPATED_IN]->(e:Event {{id: {event_id}}})
+        MATCH (u:User)-[p:PARTICIPATED_IN]->(e:Event {{id: $event_id}})
         RETURN u.id as id, p.joined_at as joined_at
         ORDER BY p.joined_at DESC 
-        SKIP {offset} LIMIT {limit}
+        SKIP {int(offset)} LIMIT {int(limit)}
     """
     expected_cols = [('id', 'agtype'), ('joined_at', 'agtype')]
     try:
-        results = execute_cypher(cursor, cypher_q, fetch_all=True, expected_columns=expected_cols) or []
+        results = execute_cypher(cursor, cypher_q, fetch_all=True, expected_columns=expected_cols, params={'event_id': event_id}) or []
         return [int(r['id']) for r in results if isinstance(r, dict) and r.get('id') is not None]
     except Exception as e:
         print(f"CRUD Error getting event participant IDs for E:{event_id}: {e}")
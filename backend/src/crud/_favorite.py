@@ -1,12 +1,13 @@
 # backend/src/crud/_favorite.py
 import psycopg2
 import psycopg2.extras
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Set
 from datetime import datetime, timezone
 
 # Import graph helpers and utils
 from ._graph import execute_cypher
-from .. import utils # Import root utils for quote_cypher_string
+from ._stats import adjust_stats
+from .. import utils
 
 # =========================================
 # Favorite CRUD (Purely Graph Operations)
@@ -30,18 +31,25 @@ def add_favorite_db(
         raise ValueError("Favorite target missing: Must provide post_id or reply_id")
 
     now_iso = datetime.now(timezone.utc).isoformat()
-    favorited_at_quoted = utils.quote_cypher_string(now_iso)
 
-    # MERGE finds or creates the edge, SET ensures properties are updated
-    cypher_q = f"""
-        MATCH (u:User {{id: {user_id}}})
-        MATCH (target:{target_label} {{id: {target_id}}})
+    # MERGE finds or creates the edge; a fresh edge has no favorited_at yet (=> count it)
+    merge_q = f"""
+        MATCH (u:User {{id: $user_id}})
+        MATCH (target:{target_label} {{id: $target_id}})
         MERGE (u)-[r:FAVORITED]->(target)
-        SET r.favorited_at = {favorited_at_quoted}
+        RETURN r.favorited_at as previous_favorited_at
+    """
+    set_q = f"""
+        MATCH (u:User {{id: $user_id}})-[r:FAVORITED]->(target:{target_label} {{id: $target_id}})
+        SET r.favorited_at = $favorited_at
     """
     try:
         print(f"CRUD: Adding favorite (U:{user_id} -> {target_label}:{target_id})...")
-        execute_cypher(cursor, cypher_q) # Assumes raises on error
+        graph_params = {'user_id': user_id, 'target_id': target_id}
+        merge_res = execute_cypher(cursor, merge_q, fetch_one=True, expected_columns=[('previous_favorited_at', 'agtype')], params=graph_params)
+        execute_cypher(cursor, set_q, params={**graph_params, 'favorited_at': now_iso}) # Assumes raises on error
+        if merge_res is not None and merge_res.get('previous_favorited_at') is None:
+            adjust_stats(cursor, target_label, target_id, favorite_count=1)
         print(f"CRUD: Favorite added/updated successfully.")
         return True
     except Exception as e:
@@ -66,16 +74,17 @@ def remove_favorite_db(
 
     # MATCH the specific edge and DELETE it
     cypher_q = f"""
-        MATCH (u:User {{id: {user_id}}})-[r:FAVORITED]->(target:{target_label} {{id: {target_id}}})
+        MATCH (u:User {{id: $user_id}})-[r:FAVORITED]->(target:{target_label} {{id: $target_id}})
         DELETE r
         RETURN count(r) as deleted_count
     """
     expected = [('deleted_count', 'agtype')] # Define expected column
     try:
         # ... (execute_cypher with expected_columns) ...
-        result_map = execute_cypher(cursor, cypher_q, fetch_one=True, expected_columns=expected) # Use map directly
+        result_map = execute_cypher(cursor, cypher_q, fetch_one=True, expected_columns=expected, params={'user_id': user_id, 'target_id': target_id}) # Use map directly
         deleted_count = int(result_map.get('deleted_count', 0)) if isinstance(result_map, dict) else 0
         print(f"CRUD: Favorite removal result - Deleted count: {deleted_count}")
+        if deleted_count > 0: adjust_stats(cursor, target_label, target_id, favorite_count=-deleted_count)
         return deleted_count > 0 # True if count is 1
     except Exception as e:
         print(f"CRUD Error removing favorite (U:{user_id} -> {target_label}:{target_id}): {e}")
@@ -88,13 +97,24 @@ def get_viewer_favorite_status(cursor, viewer_id: int, post_id: Optional[int] =
     if target_id is None: return False
 
     # Use MATCH and check if a result exists
-    cypher_fav = f"MATCH (:User {{id:{viewer_id}}})-[:FAVORITED]->(target:{target_label} {{id:{target_id}}}) RETURN target.id as tid"
+    cypher_fav = f"MATCH (:User {{id: $viewer_id}})-[:FAVORITED]->(target:{target_label} {{id: $target_id}}) RETURN target.id as tid"
     expected = [('tid', 'agtype')] # Define expected column
     try:
-        fav_res = execute_cypher(cursor, cypher_fav, fetch_one=True, expected_columns=expected)
+        fav_res = execute_cypher(cursor, cypher_fav, fetch_one=True, expected_columns=expected, params={'viewer_id': viewer_id, 'target_id': target_id})
         return fav_res is not None and fav_res.get('tid') is not None # Check parsed dict value
     except Exception as e:
         print(f"Error checking favorite status V:{viewer_id} -> {target_label}:{target_id} : {e}")
         return False
+def get_viewer_favorited_ids(cursor, viewer_id: int, target_ids: List[int], target_label: str = "Post") -> Set[int]:
+    """Bulk get_viewer_favorite_status: the subset of target_ids the viewer has favorited."""
+    if not target_ids: return set()
+    cypher_fav = f"MATCH (:User {{id: $viewer_id}})-[:FAVORITED]->(t:{target_label}) WHERE t.id IN $target_ids RETURN t.id as tid"
+    expected = [('tid', 'agtype')]
+    try:
+        rows = execute_cypher(cursor, cypher_fav, fetch_all=True, expected_columns=expected, params={'viewer_id': viewer_id, 'target_ids': list(target_ids)}) or []
+        return {int(r['tid']) for r in rows if r.get('tid') is not None}
+    except Exception as e:
+        print(f"Error checking bulk favorite status V:{viewer_id} on {len(target_ids)} {target_label}(s): {e}")
+        return set()
 # Note: Getting favorite counts is handled by get_post_counts and get_reply_counts
 # in their respective files (_post.py, _reply.py) via the get_graph_counts helper.
@@ -1,12 +1,68 @@
 # src/crud/_graph.py
+import os
+import json
+import itertools
+import threading
+from datetime import datetime, date
+from decimal import Decimal
 import psycopg2
 import psycopg2.extras
 from typing import Optional, Dict, Any, List, Tuple
 
 from .. import utils
+from ..database import AGE_SEARCH_PATH
 
 GRAPH_NAME = 'fiore'
 
+# Max prepared Cypher statements kept per connection (LRU, DEALLOCATE on evict)
+CYPHER_STMT_CACHE_SIZE = int(os.getenv("CYPHER_STMT_CACHE_SIZE", 256))
+
+# --- Prepared statement cache (per connection) + process-wide counters ---
+_stmt_names = itertools.count(1) # Unique names across the process => unique per connection
+_cache_stats_lock = threading.Lock()
+_cache_stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+def _bump_cache_stat(key: str):
+    with _cache_stats_lock:
+        _cache_stats[key] += 1
+
+def get_cypher_cache_stats() -> Dict[str, Any]:
+    with _cache_stats_lock:
+        stats = dict(_cache_stats)
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_ratio"] = round(stats["hits"] / lookups, 3) if lookups else 0.0
+    stats["max_per_connection"] = CYPHER_STMT_CACHE_SIZE
+    return stats
+
+def _agtype_json_default(value: Any):
+    if isinstance(value, (datetime, date)): return value.isoformat() # ISO 8601, as stored on existing vertices
+    if isinstance(value, Decimal): return float(value)
+    return str(value)
+
+def _prepare_cypher(cursor: psycopg2.extensions.cursor, template_sql: str) -> Tuple[str, bool]:
+    """
+    Returns (statement_name, is_transient). Prepared statements are cached on pooled
+    connections keyed by the SQL template; other connections get a one-off statement.
+    """
+    cache = getattr(cursor.connection, "cypher_stmt_cache", None)
+    if cache is not None:
+        stmt_name = cache.get(template_sql)
+        if stmt_name is not None:
+            cache.move_to_end(template_sql)
+            _bump_cache_stat("hits")
+            return stmt_name, False
+    _bump_cache_stat("misses")
+    stmt_name = f"fiore_cypher_{next(_stmt_names)}"
+    cursor.execute(f"PREPARE {stmt_name}(ag_catalog.agtype) AS {template_sql}")
+    if cache is None:
+        return stmt_name, True
+    cache[template_sql] = stmt_name
+    while len(cache) > CYPHER_STMT_CACHE_SIZE:
+        _, evicted_name = cache.popitem(last=False)
+        cursor.execute(f"DEALLOCATE {evicted_name}")
+        _bump_cache_stat("evictions")
+    return stmt_name, False
+
 # --- REVISED Helper to execute Cypher query ---
 def execute_cypher(
         cursor: psycopg2.extensions.cursor,
@@ -14,15 +70,21 @@ def execute_cypher(
         fetch_one=False,
         fetch_all=False,
         # Use specific column definitions for reads, or None for writes
-        expected_columns: Optional[List[Tuple[str, str]]] = None
+        expected_columns: Optional[List[Tuple[str, str]]] = None,
+        params: Optional[Dict[str, Any]] = None
 ):
     """
     Executes Cypher via AGE.
     - Requires `expected_columns` for fetch_one/fetch_all.
+    - With `params`, the query references them as `$name` and is run as a prepared
+      statement (agtype parameter), cached per connection by query template.
     - Uses a default dummy output for write operations (MERGE/CREATE/DELETE/SET).
+    - Skips LOAD 'age' / SET search_path on pooled connections already initialized by the pool hook.
     """
-    cursor.execute("LOAD 'age';")
-    cursor.execute("SET search_path = ag_catalog, '$user', public;")
+    if not getattr(cursor.connection, "age_initialized", False):
+        # Connection not prepared by database.init_age_session (e.g. a standalone script connection)
+        cursor.execute("LOAD 'age';")
+        cursor.execute(f"SET search_path = {AGE_SEARCH_PATH};")
 
     # --- Determine AS clause ---
     as_clause: str
@@ -41,40 +103,59 @@ def execute_cypher(
         # We don't actually use the result for writes, just check for errors.
         expected_columns = [('result', 'agtype')] # Set internally for processing logic below
 
-    sql = f"SELECT * FROM ag_catalog.cypher('{GRAPH_NAME}', $${query}$$) {as_clause};"
+    if params is None:
+        sql = f"SELECT * FROM ag_catalog.cypher('{GRAPH_NAME}', $${query}$$) {as_clause};"
+    else:
+        sql = f"SELECT * FROM ag_catalog.cypher('{GRAPH_NAME}', $${query}$$, $1) {as_clause}"
 
+    stmt_name = None; transient = False
     try:
         # print(f"DEBUG Cypher SQL: {sql.strip()}")
-        cursor.execute(sql)
+        if params is None:
+            cursor.execute(sql)
+        else:
+            stmt_name, transient = _prepare_cypher(cursor, sql)
+            cursor.execute(f"EXECUTE {stmt_name}(%s)", (json.dumps(params, default=_agtype_json_default),))
 
         if fetch_one:
             row = cursor.fetchone();
-            if not row: return None
-            row_dict = dict(row)
-            # Parse based on expected columns definition
-            return {col_name: utils.parse_agtype(row_dict.get(col_name)) for col_name, _ in expected_columns}
-
+            result = None
+            if row:
+                row_dict = dict(row)
+                # Parse based on expected columns definition
+                result = {col_name: utils.parse_agtype(row_dict.get(col_name)) for col_name, _ in expected_columns}
         elif fetch_all:
-            rows = cursor.fetchall(); results = []
+            rows = cursor.fetchall(); result = []
             for row in rows:
                 row_dict = dict(row)
-                results.append({col_name: utils.parse_agtype(row_dict.get(col_name)) for col_name, _ in expected_columns})
-            return results
+                result.append({col_name: utils.parse_agtype(row_dict.get(col_name)) for col_name, _ in expected_columns})
         else: # Write operation succeeded if no error
-            return True
+            result = True
+
+        if transient: cursor.execute(f"DEALLOCATE {stmt_name}")
+        return result
 
     except psycopg2.Error as db_err:
+        if db_err.pgcode == '26000' and stmt_name and not transient: # Statement vanished (e.g. DISCARD ALL)
+            cache = getattr(cursor.connection, "cypher_stmt_cache", None)
+            if cache is not None and cache.pop(sql, None): _bump_cache_stat("invalidations")
         print(f"!!! Cypher Execution Error ({db_err.pgcode}): {db_err}")
         print(f"    SQL: {sql}")
+        if params is not None: print(f"    Params: {params}")
         raise db_err # Re-raise
     except Exception as e:
         print(f"!!! Unexpected Error in execute_cypher: {e}")
         print(f"    SQL: {sql}")
         raise e
 
-# --- build_cypher_set_clauses remains the same ---
-def build_cypher_set_clauses(variable: str, props_dict: Dict[str, Any]) -> Optional[str]:
-    items = [];
+def build_cypher_set_params(variable: str, props_dict: Dict[str, Any], prefix: str = "") -> Tuple[Optional[str], Dict[str, Any]]:
+    """
+    Builds a SET list for Cypher writes: returns ("p.title = $title, ...", {"title": ...}).
+    Property keys come from code, never user input; values travel as agtype params.
+    """
+    items = []; params = {}
     for k, v in props_dict.items():
-        if k != 'id' and v is not None: items.append(f"{variable}.{k} = {utils.quote_cypher_string(v)}")
-    return ", ".join(items) if items else None
\ No newline at end of file
+        if k != 'id' and v is not None:
+            param_name = f"{prefix}{k}"
+            items.append(f"{variable}.{k} = ${param_name}"); params[param_name] = v
+    return (", ".join(items) if items else None), params
\ No newline at end of file
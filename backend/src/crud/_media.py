@@ -1,9 +1,13 @@
 # backend/src/crud/_media.py
+import io
+import traceback
+
 import psycopg2
 import psycopg2.extras
 from typing import List, Optional, Dict, Any
 
 from .. import utils # For get_minio_url
+from .. import database, image_variants, storage
 
 def create_media_item(
     cursor: psycopg2.extensions.cursor,
@@ -39,7 +43,7 @@ def get_media_item_by_id(cursor: psycopg2.extensions.cursor, media_id: int) -> O
     try:
         cursor.execute(
             """SELECT id, uploader_user_id, minio_object_name, mime_type, file_size_bytes,
-                      original_filename, created_at, width, height, duration_seconds
+                      original_filename, created_at, width, height, duration_seconds, variant_objects
                FROM public.media_items
                WHERE id = %s""",
             (media_id,)
@@ -111,9 +115,32 @@ def get_media_items_for_post(cursor: psycopg2.extensions.cursor, post_id: int) -
     for item in items:
         item_dict = dict(item)
         item_dict['url'] = utils.get_minio_url(item_dict.get('minio_object_name'))
+        item_dict['variants'] = utils.get_media_variant_urls(item_dict.get('variant_objects'))
         results.append(item_dict)
     return results
 
+def get_media_items_for_posts(cursor: psycopg2.extensions.cursor, post_ids: List[int]) -> Dict[int, List[Dict[str, Any]]]:
+    """Bulk variant of get_media_items_for_post: one query, results keyed by post id."""
+    media_by_post: Dict[int, List[Dict[str, Any]]] = {pid: [] for pid in post_ids}
+    if not post_ids: return media_by_post
+    cursor.execute(
+        """
+        SELECT mi.*, pm.display_order, pm.post_id AS linked_post_id
+        FROM public.media_items mi
+        JOIN public.post_media pm ON mi.id = pm.media_id
+        WHERE pm.post_id = ANY(%s)
+        ORDER BY pm.post_id, pm.display_order ASC, mi.created_at ASC;
+        """,
+        (list(post_ids),)
+    )
+    for item in cursor.fetchall():
+        item_dict = dict(item)
+        post_id = item_dict.pop('linked_post_id')
+        item_dict['url'] = utils.get_minio_url(item_dict.get('minio_object_name'))
+        item_dict['variants'] = utils.get_media_variant_urls(item_dict.get('variant_objects'))
+        media_by_post.setdefault(post_id, []).append(item_dict)
+    return media_by_post
+
 # Add similar get functions for replies, chat messages, profile picture, logo...
 def get_user_profile_picture_media(cursor: psycopg2.extensions.cursor, user_id: int) -> Optional[Dict[str, Any]]:
      cursor.execute(
@@ -129,6 +156,7 @@ def get_user_profile_picture_media(cursor: psycopg2.extensions.cursor, user_id:
      if item:
          item_dict = dict(item)
          item_dict['url'] = utils.get_minio_url(item_dict.get('minio_object_name'))
+         item_dict['variants'] = utils.get_media_variant_urls(item_dict.get('variant_objects'))
          return item_dict
      return None
 
@@ -146,6 +174,7 @@ def get_community_logo_media(cursor: psycopg2.extensions.cursor, community_id: i
      if item:
          item_dict = dict(item)
          item_dict['url'] = utils.get_minio_url(item_dict.get('minio_object_name'))
+         item_dict['variants'] = utils.get_media_variant_urls(item_dict.get('variant_objects'))
          return item_dict
      return None
 
@@ -178,6 +207,7 @@ def get_media_items_for_reply(cursor: psycopg2.extensions.cursor, reply_id: int)
     for item in items:
         item_dict = dict(item)
         item_dict['url'] = utils.get_minio_url(item_dict.get('minio_object_name'))
+        item_dict['variants'] = utils.get_media_variant_urls(item_dict.get('variant_objects'))
         results.append(item_dict)
     return results
 
@@ -198,5 +228,100 @@ def get_media_items_for_chat_message(cursor: psycopg2.extensions.cursor, message
     for item in items:
         item_dict = dict(item)
         item_dict['url'] = utils.get_minio_url(item_dict.get('minio_object_name'))
+        item_dict['variants'] = utils.get_media_variant_urls(item_dict.get('variant_objects'))
         results.append(item_dict)
     return results
+
+# --- Image variants (see image_variants.py and sql/media_variants.sql) ---
+def set_media_variants(
+        cursor: psycopg2.extensions.cursor, media_id: int,
+        width: Optional[int], height: Optional[int], variant_objects: Dict[str, Dict[str, Any]]
+) -> bool:
+    """Records rendered variants ({} = nothing to render) and fills in missing dimensions."""
+    cursor.execute(
+        """
+        UPDATE public.media_items
+        SET variant_objects = %s, width = COALESCE(width, %s), height = COALESCE(height, %s)
+        WHERE id = %s;
+        """,
+        (psycopg2.extras.Json(variant_objects), width, height, media_id)
+    )
+    return cursor.rowcount > 0
+
+def _load_media_for_variants(media_id: int) -> Optional[Dict[str, Any]]:
+    conn = None
+    try:
+        conn = database.get_db_connection(); cursor = conn.cursor()
+        cursor.execute("SELECT id, minio_object_name, mime_type, variant_objects FROM public.media_items WHERE id = %s;", (media_id,))
+        return cursor.fetchone()
+    finally:
+        if conn: conn.close()
+
+def _save_media_variants(media_id: int, width: Optional[int], height: Optional[int], variant_objects: Dict[str, Dict[str, Any]]) -> bool:
+    conn = None
+    try:
+        conn = database.get_db_connection(); cursor = conn.cursor()
+        updated = set_media_variants(cursor, media_id, width, height, variant_objects)
+        conn.commit()
+        return updated
+    except Exception:
+        if conn: conn.rollback()
+        raise
+    finally:
+        if conn: conn.close()
+
+def generate_media_variants(media_id: int) -> Optional[Dict[str, Dict[str, Any]]]:
+    """
+    Downloads an uploaded image, renders its variants in the media process pool, uploads them next
+    to the original and records them. No DB connection is held while rendering/uploading.
+    Non-image media are recorded as {} (nothing to render) so they do not stay pending.
+    Returns the recorded variant_objects, or None when skipped or failed.
+    """
+    media = _load_media_for_variants(media_id)
+    if not media or media.get('variant_objects') is not None: return None # Deleted, or already processed
+    if media['mime_type'] not in image_variants.MEDIA_VARIANT_MIME_TYPES:
+        return {} if _save_media_variants(media_id, None, None, {}) else None
+    backend = storage.get_storage()
+    if not backend: return None # No storage configured; left pending for a later run
+    object_name = media['minio_object_name']
+
+    data = backend.get_bytes(object_name) # Runs on the media job thread, not the event loop
+
+    try:
+        rendered = image_variants.get_media_executor().submit(
+            image_variants.render_variants, data, image_variants.MEDIA_VARIANT_SIZES, image_variants.MEDIA_VARIANT_FORMAT,
+            image_variants.MEDIA_VARIANT_QUALITY, image_variants.MEDIA_VARIANT_MAX_PIXELS
+        ).result()
+    except Exception as e: # Undecodable image: record "no variants" so it is not retried
+        print(f"WARN: Could not render variants for media {media_id} ({object_name}): {e}")
+        rendered = None
+    del data
+
+    variant_objects: Dict[str, Dict[str, Any]] = {}
+    for variant in (rendered or {}).get('variants', []):
+        variant_name = image_variants.variant_object_name(object_name, variant['name'])
+        backend.put_stream(variant_name, io.BytesIO(variant['data']), len(variant['data']), variant['mime_type'])
+        variant_objects[variant['name']] = {
+            'object_name': variant_name, 'width': variant['width'], 'height': variant['height'],
+            'mime_type': variant['mime_type'], 'file_size_bytes': len(variant['data']),
+        }
+
+    if not _save_media_variants(media_id, (rendered or {}).get('width'), (rendered or {}).get('height'), variant_objects):
+        for info in variant_objects.values(): utils.delete_from_minio(info['object_name']) # Media deleted meanwhile
+        return None
+    print(f"CRUD: Rendered {len(variant_objects)} variants for media {media_id} ({object_name}).")
+    return variant_objects
+
+def _run_media_variants_job(media_id: int):
+    try:
+        generate_media_variants(media_id)
+    except Exception as e:
+        print(f"ERROR: Image variants failed for media {media_id}: {e}")
+        traceback.print_exc()
+
+def schedule_media_variants(media_ids: List[int]):
+    """Fire-and-forget variant rendering off the request path; call after the media rows commit."""
+    for media_id in media_ids:
+        if media_id is None: continue
+        try: image_variants.get_media_job_executor().submit(_run_media_variants_job, media_id)
+        except RuntimeError as e: print(f"Could not schedule image variants for media {media_id}: {e}") # Executor shut down
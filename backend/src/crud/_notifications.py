@@ -1,12 +1,227 @@
 # backend/src/crud/_notifications.py
 
+import os
+import json
 import psycopg2
 import psycopg2.extras
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Callable, Tuple
 from datetime import datetime
 import traceback
 
 from .. import utils # For MinIO URL generation for actor avatar
+from .. import database
+from ..presence import user_room
+from ._settings import get_notification_preferences
+from ._cache import TTLCache
+
+# --- Unread counters (sql/notification_unread_counts.sql) ---
+# One row per user, adjusted in the same transaction as the notification change, so
+# /notifications/unread-count is a primary-key read instead of COUNT(*) over the user's rows.
+# A background pass (UNREAD_COUNT_RECONCILE_SECONDS) fixes any drift.
+UNREAD_COUNT_RECONCILE_SECONDS = int(os.getenv("UNREAD_COUNT_RECONCILE_SECONDS", 3600))
+# Last committed count per user on this worker, refreshed by every unread_count/notification push, so a
+# connecting socket gets its initial count without a DB read. Changes made on other workers only reach
+# this copy through the TTL.
+UNREAD_COUNT_CACHE_SIZE = int(os.getenv("UNREAD_COUNT_CACHE_SIZE", 50000))
+UNREAD_COUNT_CACHE_TTL_SECONDS = float(os.getenv("UNREAD_COUNT_CACHE_TTL_SECONDS", 60))
+_unread_count_cache = TTLCache(UNREAD_COUNT_CACHE_SIZE, UNREAD_COUNT_CACHE_TTL_SECONDS) # user_id -> unread_count
+
+def get_cached_unread_count(user_id: int) -> Optional[int]:
+    """The user's committed unread count if this worker saw it recently, else None (read the counter row)."""
+    found, _ = _unread_count_cache.get_many([user_id])
+    return found.get(user_id)
+
+def remember_unread_count(user_id: int, count: int):
+    """Records a committed count (call only after commit)."""
+    _unread_count_cache.put_many({user_id: count})
+
+# Pushes go to the users' WebSocket rooms after commit, one call per transaction; server.py wires this to
+# ConnectionManager.publish_many_threadsafe. ([(message, room_key), ...]) -> None, must not block.
+_publisher: Optional[Callable[[List[Tuple[str, str]]], None]] = None
+
+def set_notification_publisher(publisher: Optional[Callable[[List[Tuple[str, str]]], None]]):
+    global _publisher
+    _publisher = publisher
+
+def push_to_users(frames: List[Tuple[int, Dict[str, Any]]]):
+    """Publishes (user_id, frame) pairs to the users' private rooms in one batch."""
+    if _publisher is None or not frames: return
+    try: _publisher([(json.dumps(frame, default=str), user_room(user_id)) for user_id, frame in frames])
+    except Exception as e: print(f"WARN: Push to {len(frames)} users failed: {e}")
+
+def push_to_user(user_id: int, frame: Dict[str, Any]):
+    push_to_users([(user_id, frame)])
+
+# Device pushes: server.py wires this to push_dispatch.dispatcher.enqueue_many. ([notification dict, ...]) -> None, must not block.
+_device_push: Optional[Callable[[List[Dict[str, Any]]], None]] = None
+
+def set_device_push_dispatcher(enqueue_many: Optional[Callable[[List[Dict[str, Any]]], None]]):
+    global _device_push
+    _device_push = enqueue_many
+
+def _dispatch_device_push_after_commit(cursor: psycopg2.extensions.cursor, notification: Dict[str, Any]):
+    if _device_push is None: return
+    hook = getattr(getattr(cursor, 'connection', None), 'after_commit', None)
+    if hook is not None: hook(lambda: _device_push([notification]))
+
+def _push_count_after_commit(cursor: psycopg2.extensions.cursor, user_id: int, count: Optional[int], frame: Dict[str, Any]):
+    """Once the transaction commits (pooled connections only): remember the count (if known), then push the frame."""
+    hook = getattr(getattr(cursor, 'connection', None), 'after_commit', None)
+    if hook is None: return
+    def deliver():
+        if count is not None: remember_unread_count(user_id, count)
+        push_to_user(user_id, frame)
+    hook(deliver)
+
+def _push_unread_after_commit(cursor: psycopg2.extensions.cursor, user_id: int, count: int):
+    """Queues an unread_count frame for when the transaction commits."""
+    _push_count_after_commit(cursor, user_id, count, {"type": "unread_count", "count": count})
+
+def _push_notification_after_commit(cursor: psycopg2.extensions.cursor, user_id: int, notification: Dict[str, Any], unread_count: Optional[int]):
+    """Queues the real-time frame for a new or updated (coalesced) notification."""
+    _push_count_after_commit(cursor, user_id, unread_count, _notification_frame(notification, unread_count))
+
+def _notification_frame(notification: Dict[str, Any], unread_count: Optional[int]) -> Dict[str, Any]:
+    """
+    Compact real-time frame; clients key it by id and fetch GET /notifications only for full actor/entity details.
+    unread_count is left out when it is not known without a read (coalesced groups); the client keeps its badge.
+    """
+    frame = {
+        "type": "notification",
+        "notification": {
+            "id": notification['id'],
+            "type": notification['type'],
+            "actor_user_id": notification.get('actor_user_id'),
+            "actor_count": notification.get('actor_count', 1),
+            "related_entity": {"type": notification.get('related_entity_type'), "id": notification.get('related_entity_id')},
+            "content_preview": notification.get('content_preview'),
+            "created_at": notification.get('created_at'),
+            "last_activity_at": notification.get('last_activity_at', notification.get('created_at')),
+        },
+    }
+    if unread_count is not None: frame["unread_count"] = unread_count
+    return frame
+
+def _adjust_unread_count(cursor: psycopg2.extensions.cursor, user_id: int, delta: int, push: bool = True) -> int:
+    """Applies `delta` to the user's counter (seeding it from COUNT(*) the first time) and returns the new value."""
+    cursor.execute(
+        """
+        UPDATE public.notification_unread_counts
+        SET unread_count = GREATEST(unread_count + %s, 0), updated_at = NOW()
+        WHERE user_id = %s
+        RETURNING unread_count;
+        """,
+        (delta, user_id)
+    )
+    row = cursor.fetchone()
+    if row is None: # First change for this user: count once (already includes this change)
+        cursor.execute(
+            """
+            INSERT INTO public.notification_unread_counts (user_id, unread_count)
+            SELECT %s, COUNT(*) FROM public.notifications WHERE recipient_user_id = %s AND is_read = FALSE
+            ON CONFLICT (user_id) DO UPDATE SET unread_count = EXCLUDED.unread_count, updated_at = NOW()
+            RETURNING unread_count;
+            """,
+            (user_id, user_id)
+        )
+        row = cursor.fetchone()
+    count = row['unread_count'] if row else 0
+    if push: _push_unread_after_commit(cursor, user_id, count)
+    return count
+
+# Map notification type to user preference column (None: always delivered)
+NOTIFICATION_PREFERENCE_COLUMNS = {
+    'new_follower': None,
+    'post_reply': 'notify_new_reply_to_post',
+    'reply_reply': 'notify_new_reply_to_post',
+    'post_vote': None,
+    'reply_vote': None,
+    'post_favorite': None,
+    'reply_favorite': None,
+    'event_invite': None,
+    'event_reminder': 'notify_event_reminder',
+    'event_update': 'notify_event_update',
+    'community_invite': None,
+    'community_post': 'notify_new_post_in_community',
+    # 'new_event_in_community': 'notify_new_event_in_community', # Old mapping
+    'new_community_event': 'notify_new_event_in_community', # <-- CORRECTED MAPPING
+    'user_mention': None,
+}
+
+def filter_recipients_by_preference(cursor: psycopg2.extensions.cursor, user_ids: List[int], type: str) -> List[int]:
+    """The user_ids (order kept) that have not opted out of `type`; flags come from the preference cache."""
+    column = NOTIFICATION_PREFERENCE_COLUMNS.get(type)
+    if not column: return list(user_ids)
+    preferences = get_notification_preferences(cursor, user_ids)
+    # Only an explicit FALSE opts out; unknown users are left for the insert to reject
+    return [uid for uid in user_ids if preferences.get(uid, {}).get(column) is not False]
+
+# --- Coalescing (sql/notification_groups.sql) ---
+# Unread notifications of these types about the same entity collapse into one row per recipient.
+# Value: whether the related entity is part of the group key. new_follower points at the follower
+# itself, so all new followers of a recipient form one group.
+COALESCED_NOTIFICATION_TYPES = {
+    'post_vote': True, 'reply_vote': True,
+    'post_favorite': True, 'reply_favorite': True,
+    'post_reply': True, 'reply_reply': True,
+    'new_follower': False,
+}
+NOTIFICATION_GROUP_WINDOW_HOURS = float(os.getenv("NOTIFICATION_GROUP_WINDOW_HOURS", 24))
+NOTIFICATION_GROUP_SAMPLE_SIZE = int(os.getenv("NOTIFICATION_GROUP_SAMPLE_SIZE", 3)) # Latest actors kept per group
+
+def _coalesce_into_open_group(
+        cursor: psycopg2.extensions.cursor,
+        recipient_user_id: int, type: str, actor_user_id: Optional[int],
+        related_entity_type: Optional[str], related_entity_id: Optional[int],
+        content_preview: Optional[str]
+) -> Optional[Dict[str, Any]]:
+    """
+    Folds the notification into the recipient's open group for it; returns the updated group row or None if there is none.
+    Takes the group-key advisory lock first, so a concurrent first event waits and then finds this transaction's
+    group instead of inserting a second one (the caller inserts under the same lock). actor_count only grows
+    when the actor is new to notification_group_actors, which holds every distinct actor, not just the sample.
+    """
+    entity_in_key = COALESCED_NOTIFICATION_TYPES[type]
+    group_key = f"{recipient_user_id}:{type}" + (f":{related_entity_type}:{related_entity_id}" if entity_in_key else "")
+    cursor.execute("SELECT pg_advisory_xact_lock(hashtextextended(%s, 0));", (group_key,))
+    entity_filter = "AND related_entity_type = %s::public.notification_entity_type AND related_entity_id = %s" if entity_in_key else ""
+    entity_params = [related_entity_type, related_entity_id] if entity_in_key else []
+    cursor.execute(
+        f"""
+        WITH grp AS (
+            SELECT id FROM public.notifications
+            WHERE recipient_user_id = %s AND type = %s::public.notification_type AND is_read = FALSE
+              AND group_started_at > NOW() - make_interval(secs => %s)
+              {entity_filter}
+            ORDER BY group_started_at DESC LIMIT 1
+            FOR UPDATE
+        ), new_actor AS (
+            INSERT INTO public.notification_group_actors (notification_id, actor_user_id)
+            SELECT id, %s FROM grp WHERE %s::int IS NOT NULL
+            ON CONFLICT DO NOTHING
+            RETURNING notification_id
+        )
+        UPDATE public.notifications n SET
+            actor_count = n.actor_count + (SELECT COUNT(*) FROM new_actor),
+            sample_actor_ids = CASE WHEN %s::int IS NULL THEN n.sample_actor_ids
+                                    ELSE (ARRAY[%s::int] || array_remove(n.sample_actor_ids, %s::int))[1:%s] END,
+            actor_user_id = COALESCE(%s, n.actor_user_id),
+            related_entity_type = %s::public.notification_entity_type,
+            related_entity_id = %s,
+            content_preview = %s,
+            last_activity_at = NOW() -- The group resurfaces at the top; created_at stays put
+        FROM grp
+        WHERE n.id = grp.id
+        RETURNING n.id, n.actor_count, n.created_at, n.last_activity_at;
+        """,
+        (
+            recipient_user_id, type, NOTIFICATION_GROUP_WINDOW_HOURS * 3600, *entity_params,
+            actor_user_id, actor_user_id,
+            actor_user_id, actor_user_id, actor_user_id, NOTIFICATION_GROUP_SAMPLE_SIZE,
+            actor_user_id, related_entity_type, related_entity_id, content_preview,
+        )
+    )
+    return cursor.fetchone()
 
 def create_notification(
         cursor: psycopg2.extensions.cursor,
@@ -18,39 +233,17 @@ def create_notification(
         content_preview: Optional[str] = None
 ) -> Optional[int]:
     """
-    Inserts a new notification record into the database.
+    Inserts a new notification record into the database (or folds it into an open group).
     Checks user's notification preferences before creating.
+    Once the caller commits, the recipient's sockets get it as a "notification" frame with the unread count.
     """
     print(f"CRUD: Attempting to create notification - Recipient: {recipient_user_id}, Type: {type}, Actor: {actor_user_id}, Entity: {related_entity_type}:{related_entity_id}")
 
     # Check user's notification preferences
     try:
-        # Map notification type to user preference column
-        preference_column_map = {
-            'new_follower': None,
-            'post_reply': 'notify_new_reply_to_post',
-            'reply_reply': 'notify_new_reply_to_post',
-            'post_vote': None,
-            'reply_vote': None,
-            'post_favorite': None,
-            'reply_favorite': None,
-            'event_invite': None,
-            'event_reminder': 'notify_event_reminder',
-            'event_update': 'notify_event_update',
-            'community_invite': None,
-            'community_post': 'notify_new_post_in_community',
-            # 'new_event_in_community': 'notify_new_event_in_community', # Old mapping
-            'new_community_event': 'notify_new_event_in_community', # <-- CORRECTED MAPPING
-            'user_mention': None,
-        }
-        user_pref_column = preference_column_map.get(type)
-
-        if user_pref_column:
-            cursor.execute(f"SELECT {user_pref_column} FROM public.users WHERE id = %s", (recipient_user_id,))
-            user_pref = cursor.fetchone()
-            if user_pref and user_pref[user_pref_column] is False:
-                print(f"CRUD: Notification of type '{type}' suppressed for user {recipient_user_id} due to preferences.")
-                return None # User has opted out of this notification type
+        if not filter_recipients_by_preference(cursor, [recipient_user_id], type):
+            print(f"CRUD: Notification of type '{type}' suppressed for user {recipient_user_id} due to preferences.")
+            return None # User has opted out of this notification type
 
     except psycopg2.Error as db_err:
         print(f"!!! CRUD DB Error checking user preferences for notification: {db_err} (Code: {db_err.pgcode})")
@@ -60,13 +253,32 @@ def create_notification(
 
 
     try:
+        if type in COALESCED_NOTIFICATION_TYPES:
+            group = _coalesce_into_open_group(
+                cursor, recipient_user_id, type, actor_user_id, related_entity_type, related_entity_id, content_preview
+            )
+            if group is not None:
+                print(f"CRUD: Notification coalesced into group {group['id']}")
+                _push_notification_after_commit(cursor, recipient_user_id, {
+                    **group, 'type': type, 'actor_user_id': actor_user_id, 'content_preview': content_preview,
+                    'related_entity_type': related_entity_type, 'related_entity_id': related_entity_id,
+                }, get_cached_unread_count(recipient_user_id)) # Group was already unread: count unchanged, no read for it
+                return group['id']
+
         cursor.execute(
             """
-            INSERT INTO public.notifications
-                (recipient_user_id, actor_user_id, type, related_entity_type, related_entity_id, content_preview)
-            VALUES
-                (%s, %s, %s::public.notification_type, %s::public.notification_entity_type, %s, %s)
-            RETURNING id;
+            WITH created AS (
+                INSERT INTO public.notifications
+                    (recipient_user_id, actor_user_id, type, related_entity_type, related_entity_id, content_preview, sample_actor_ids)
+                VALUES
+                    (%s, %s, %s::public.notification_type, %s::public.notification_entity_type, %s, %s,
+                     CASE WHEN %s::int IS NULL THEN '{}'::int[] ELSE ARRAY[%s::int] END)
+                RETURNING id, created_at, last_activity_at
+            ), first_actor AS ( -- Seeds the group's distinct-actor set (coalesced types only)
+                INSERT INTO public.notification_group_actors (notification_id, actor_user_id)
+                SELECT id, %s FROM created WHERE %s::int IS NOT NULL AND %s
+            )
+            SELECT id, created_at, last_activity_at FROM created;
             """,
             (
                 recipient_user_id,
@@ -74,16 +286,23 @@ def create_notification(
                 type,
                 related_entity_type,
                 related_entity_id,
-                content_preview
+                content_preview,
+                actor_user_id, actor_user_id,
+                actor_user_id, actor_user_id, type in COALESCED_NOTIFICATION_TYPES
             )
         )
         result = cursor.fetchone()
         if result and 'id' in result:
             new_id = result['id']
             print(f"CRUD: Notification record created with ID: {new_id}")
-            # Placeholder for triggering actual push notification
-            # from ..tasks import send_push_notification_task
-            # send_push_notification_task.delay(new_id)
+            unread_count = _adjust_unread_count(cursor, recipient_user_id, +1, push=False) # Sent inside the notification frame
+            notification = {
+                **result, 'type': type, 'actor_user_id': actor_user_id, 'actor_count': 1, 'content_preview': content_preview,
+                'related_entity_type': related_entity_type, 'related_entity_id': related_entity_id,
+            }
+            _push_notification_after_commit(cursor, recipient_user_id, notification, unread_count)
+            # Device push for new rows only; a coalesced group must not buzz the phone on every vote
+            _dispatch_device_push_after_commit(cursor, {**notification, 'recipient_user_id': recipient_user_id})
             return new_id
         else:
             print("CRUD ERROR: Notification insert failed to return ID.")
@@ -99,17 +318,131 @@ def create_notification(
         traceback.print_exc()
         return None
 
+# --- Bulk creation (one recipient set, same notification) ---
+def _fan_out_notifications(
+        cursor: psycopg2.extensions.cursor,
+        recipients_sql: str, recipients_params: tuple,
+        type: str, actor_user_id: Optional[int],
+        related_entity_type: Optional[str], related_entity_id: Optional[int],
+        content_preview: Optional[str]
+) -> Dict[str, Any]:
+    """
+    Two statements for the whole recipient set. First, recipients without a counter row get one seeded from
+    COUNT(*) (ON CONFLICT DO NOTHING: a concurrent seed waits for ours and keeps it, so nothing is counted twice).
+    Then one statement INSERT ... SELECTs the notifications (skipping the actor and users who opted out) and adds
+    each recipient's GROUP BY count to the, now existing, counter row. `recipients_sql` must yield a user_id column.
+    Returns {"created": [{id, recipient_user_id, created_at, unread_count}], "scanned": n}.
+    Pushes, the unread-count cache and device pushes are queued as one batch for after commit.
+    """
+    column = NOTIFICATION_PREFERENCE_COLUMNS.get(type)
+    preference_filter = f"AND u.{column} IS NOT FALSE" if column else ""
+    cursor.execute(
+        f"""
+        INSERT INTO public.notification_unread_counts (user_id, unread_count)
+        SELECT r.user_id, (SELECT COUNT(*) FROM public.notifications n WHERE n.recipient_user_id = r.user_id AND n.is_read = FALSE)
+        FROM ({recipients_sql}) r
+        WHERE NOT EXISTS (SELECT 1 FROM public.notification_unread_counts x WHERE x.user_id = r.user_id)
+        ON CONFLICT (user_id) DO NOTHING;
+        """,
+        recipients_params
+    )
+    cursor.execute(
+        f"""
+        WITH recipients AS ({recipients_sql}),
+        created AS (
+            INSERT INTO public.notifications
+                (recipient_user_id, actor_user_id, type, related_entity_type, related_entity_id, content_preview, sample_actor_ids)
+            SELECT r.user_id, %s, %s::public.notification_type, %s::public.notification_entity_type, %s, %s,
+                   CASE WHEN %s::int IS NULL THEN '{{}}'::int[] ELSE ARRAY[%s::int] END
+            FROM recipients r JOIN public.users u ON u.id = r.user_id
+            WHERE r.user_id IS DISTINCT FROM %s::int {preference_filter}
+            ON CONFLICT DO NOTHING
+            RETURNING id, recipient_user_id, created_at
+        ), per_user AS (
+            SELECT recipient_user_id AS user_id, COUNT(*) AS added FROM created GROUP BY recipient_user_id
+        ), counters AS ( -- Rows exist after the seed; the row lock serializes concurrent increments
+            INSERT INTO public.notification_unread_counts AS c (user_id, unread_count)
+            SELECT p.user_id, p.added FROM per_user p
+            ON CONFLICT (user_id) DO UPDATE SET unread_count = c.unread_count + EXCLUDED.unread_count, updated_at = NOW()
+            RETURNING c.user_id, c.unread_count
+        )
+        SELECT
+            (SELECT COALESCE(json_agg(json_build_object(
+                        'id', cr.id, 'recipient_user_id', cr.recipient_user_id,
+                        'created_at', cr.created_at, 'unread_count', c.unread_count)), '[]'::json)
+             FROM created cr JOIN counters c ON c.user_id = cr.recipient_user_id) AS created,
+            (SELECT COUNT(*) FROM recipients) AS scanned;
+        """,
+        (
+            *recipients_params,
+            actor_user_id, type, related_entity_type, related_entity_id, content_preview,
+            actor_user_id, actor_user_id,
+            actor_user_id,
+        )
+    )
+    result = dict(cursor.fetchone())
+    notifications = [{
+        **row, 'type': type, 'actor_user_id': actor_user_id, 'actor_count': 1, 'content_preview': content_preview,
+        'related_entity_type': related_entity_type, 'related_entity_id': related_entity_id,
+    } for row in result['created']]
+    _deliver_batch_after_commit(cursor, notifications)
+    return result
+
+def _deliver_batch_after_commit(cursor: psycopg2.extensions.cursor, notifications: List[Dict[str, Any]]):
+    """One after-commit hook for the batch: cache the counts, one WebSocket publish, one device-push enqueue."""
+    hook = getattr(getattr(cursor, 'connection', None), 'after_commit', None)
+    if hook is None or not notifications: return
+    def deliver():
+        _unread_count_cache.put_many({n['recipient_user_id']: n['unread_count'] for n in notifications})
+        push_to_users([(n['recipient_user_id'], _notification_frame(n, n['unread_count'])) for n in notifications])
+        if _device_push is not None: _device_push(notifications)
+    hook(deliver)
+
+def create_notifications_bulk(
+        cursor: psycopg2.extensions.cursor,
+        recipient_user_ids: List[int],
+        type: str,
+        actor_user_id: Optional[int] = None,
+        related_entity_type: Optional[str] = None,
+        related_entity_id: Optional[int] = None,
+        content_preview: Optional[str] = None
+) -> List[int]:
+    """
+    create_notification() for many recipients of the same notification, in one statement.
+    Preferences and the actor are filtered in SQL. Coalesced types need a per-recipient group lookup, so they
+    are rejected; use create_notification() for those. Returns the new notification ids.
+    """
+    if type in COALESCED_NOTIFICATION_TYPES: raise ValueError(f"'{type}' notifications are coalesced; use create_notification")
+    if not recipient_user_ids: return []
+    try:
+        result = _fan_out_notifications(
+            cursor, "SELECT DISTINCT unnest(%s::int[]) AS user_id", (list(recipient_user_ids),),
+            type, actor_user_id, related_entity_type, related_entity_id, content_preview
+        )
+        print(f"CRUD: Created {len(result['created'])} '{type}' notifications for {result['scanned']} recipients")
+        return [row['id'] for row in result['created']]
+    except psycopg2.Error as db_err:
+        print(f"!!! CRUD DB Error creating '{type}' notifications in bulk: {db_err} (Code: {db_err.pgcode})")
+        return []
+
 def get_notifications_for_user(
         cursor: psycopg2.extensions.cursor,
         user_id: int,
         limit: int,
         offset: int,
-        unread_only: Optional[bool] = None
+        unread_only: Optional[bool] = None,
+        before: Optional[Dict[str, Any]] = None # Decoded page cursor; its timestamp is last_activity_at. Replaces offset
 ) -> List[Dict[str, Any]]:
-    """ Fetches notifications for a user, optionally filtered by read status. """
+    """
+    Fetches notifications for a user, newest activity first, optionally filtered by read status.
+    Coalesced groups come back as one item with actor_count and up to NOTIFICATION_GROUP_SAMPLE_SIZE sample_actors.
+    A group that gets new activity moves above any cursor already handed out, so a cursor walk neither
+    repeats it nor shifts the rows after it; the recipient hears about the activity through the pushed frame.
+    """
     query = """
         SELECT
-            n.id, n.type, n.is_read, n.created_at, n.content_preview,
+            n.id, n.type, n.is_read, n.created_at, n.last_activity_at, n.content_preview,
+            n.actor_count, n.sample_actor_ids,
             n.actor_user_id, act.username as actor_username, act.name as actor_name,
             act_pp.minio_object_name as actor_avatar_path,
             n.related_entity_type, n.related_entity_id,
@@ -137,13 +470,18 @@ def get_notifications_for_user(
         query += " AND n.is_read = FALSE"
     elif unread_only is False: # Explicitly asking for read ones
         query += " AND n.is_read = TRUE"
+    if before is not None:
+        query += " AND (n.last_activity_at, n.id) < (%s, %s)"
+        params.extend([before['created_at'], before['id']])
+        offset = 0
 
-    query += " ORDER BY n.created_at DESC LIMIT %s OFFSET %s;"
+    query += " ORDER BY n.last_activity_at DESC, n.id DESC LIMIT %s OFFSET %s;"
     params.extend([limit, offset])
 
     try:
         cursor.execute(query, tuple(params))
         notifications_db = cursor.fetchall()
+        sample_actors = _get_actor_infos(cursor, {uid for row in notifications_db for uid in (row.get('sample_actor_ids') or [])})
 
         results = []
         for row in notifications_db:
@@ -167,6 +505,7 @@ def get_notifications_for_user(
 
             notif_dict['actor'] = actor
             notif_dict['related_entity'] = related_entity
+            notif_dict['sample_actors'] = [sample_actors[uid] for uid in (notif_dict.pop('sample_actor_ids', None) or []) if uid in sample_actors]
             results.append(notif_dict)
         return results
 
@@ -177,24 +516,43 @@ def get_notifications_for_user(
         print(f"CRUD Unexpected Error fetching notifications for user {user_id}: {e}")
         raise
 
+def _get_actor_infos(cursor: psycopg2.extensions.cursor, user_ids: set) -> Dict[int, Dict[str, Any]]:
+    """Actor cards for every sample actor on a page, in one query."""
+    if not user_ids: return {}
+    cursor.execute(
+        """
+        SELECT u.id, u.username, u.name, mi.minio_object_name AS avatar_path
+        FROM public.users u
+        LEFT JOIN public.user_profile_picture upp ON u.id = upp.user_id
+        LEFT JOIN public.media_items mi ON upp.media_id = mi.id
+        WHERE u.id = ANY(%s);
+        """,
+        (list(user_ids),)
+    )
+    return {
+        row['id']: {'id': row['id'], 'username': row['username'], 'name': row.get('name'), 'avatar_url': utils.get_minio_url(row.get('avatar_path'))}
+        for row in cursor.fetchall()
+    }
+
 def mark_notifications_as_read(
         cursor: psycopg2.extensions.cursor,
         user_id: int,
         notification_ids: List[int],
         read_status: bool = True
 ) -> int:
-    """ Marks specified notifications as read or unread for a user. Returns number of rows affected. """
+    """ Marks specified notifications as read or unread for a user. Returns number of rows whose status changed. """
     if not notification_ids:
         return 0
     try:
         query = """
             UPDATE public.notifications
             SET is_read = %s
-            WHERE recipient_user_id = %s AND id = ANY(%s)
+            WHERE recipient_user_id = %s AND id = ANY(%s) AND is_read IS DISTINCT FROM %s
             RETURNING id; 
-        """ # Use RETURNING to count actual updates
-        cursor.execute(query, (read_status, user_id, notification_ids))
+        """ # Use RETURNING to count actual updates; rows already in that state don't move the counter
+        cursor.execute(query, (read_status, user_id, notification_ids, read_status))
         updated_count = len(cursor.fetchall()) # Count how many rows were actually returned
+        if updated_count: _adjust_unread_count(cursor, user_id, -updated_count if read_status else updated_count)
         return updated_count
     except psycopg2.Error as db_err:
         print(f"CRUD DB Error marking notifications read for user {user_id}: {db_err}")
@@ -218,6 +576,14 @@ def mark_all_notifications_as_read(
             (user_id,)
         )
         updated_count = len(cursor.fetchall())
+        cursor.execute(
+            """
+            INSERT INTO public.notification_unread_counts (user_id, unread_count) VALUES (%s, 0)
+            ON CONFLICT (user_id) DO UPDATE SET unread_count = 0, updated_at = NOW();
+            """,
+            (user_id,)
+        )
+        _push_unread_after_commit(cursor, user_id, 0)
         return updated_count
     except psycopg2.Error as db_err:
         print(f"CRUD DB Error marking all notifications read for user {user_id}: {db_err}")
@@ -229,11 +595,19 @@ def mark_all_notifications_as_read(
 def get_unread_notification_count(
         cursor: psycopg2.extensions.cursor, user_id: int
 ) -> int:
-    """ Gets the count of unread notifications for a user. """
+    """ Gets the count of unread notifications for a user from the counter row (seeded on first use; caller commits). """
     try:
+        cursor.execute("SELECT unread_count FROM public.notification_unread_counts WHERE user_id = %s", (user_id,))
+        result = cursor.fetchone()
+        if result: return result['unread_count']
         cursor.execute(
-            "SELECT COUNT(*) as unread_count FROM public.notifications WHERE recipient_user_id = %s AND is_read = FALSE",
-            (user_id,)
+            """
+            INSERT INTO public.notification_unread_counts (user_id, unread_count)
+            SELECT %s, COUNT(*) FROM public.notifications WHERE recipient_user_id = %s AND is_read = FALSE
+            ON CONFLICT (user_id) DO UPDATE SET unread_count = public.notification_unread_counts.unread_count
+            RETURNING unread_count;
+            """,
+            (user_id, user_id)
         )
         result = cursor.fetchone()
         return result['unread_count'] if result else 0
@@ -244,6 +618,46 @@ def get_unread_notification_count(
         print(f"CRUD Unexpected Error getting unread notification count for user {user_id}: {e}")
         raise
 
+def reconcile_unread_counts(cursor: psycopg2.extensions.cursor) -> int:
+    """Rewrites counters that drifted from the real unread COUNT(*); returns how many were fixed (and pushes them)."""
+    cursor.execute(
+        """
+        WITH actual AS (
+            SELECT c.user_id, COALESCE(n.unread, 0) AS unread
+            FROM public.notification_unread_counts c
+            LEFT JOIN (
+                SELECT recipient_user_id, COUNT(*)::int AS unread FROM public.notifications
+                WHERE is_read = FALSE GROUP BY recipient_user_id
+            ) n ON n.recipient_user_id = c.user_id
+        )
+        UPDATE public.notification_unread_counts c
+        SET unread_count = a.unread, updated_at = NOW()
+        FROM actual a
+        WHERE c.user_id = a.user_id AND c.unread_count <> a.unread
+        RETURNING c.user_id, c.unread_count;
+        """
+    )
+    fixed = cursor.fetchall()
+    for row in fixed: _push_unread_after_commit(cursor, row['user_id'], row['unread_count'])
+    if fixed: print(f"CRUD: Reconciled {len(fixed)} unread notification counters")
+    return len(fixed)
+
+def run_unread_count_reconcile() -> Optional[int]:
+    """One reconcile pass on its own pooled connection (background task)."""
+    conn = None
+    try:
+        conn = database.get_db_connection(); cursor = conn.cursor()
+        fixed = reconcile_unread_counts(cursor)
+        conn.commit()
+        return fixed
+    except Exception as e:
+        print(f"ERROR: Unread counter reconcile failed: {e}")
+        traceback.print_exc()
+        if conn: conn.rollback()
+        return None
+    finally:
+        if conn: conn.close()
+
 # --- Device Token CRUD ---
 def register_user_device_token(
         cursor: psycopg2.extensions.cursor, user_id: int, device_token: str, platform: str
@@ -294,4 +708,28 @@ def get_user_device_tokens(cursor: psycopg2.extensions.cursor, user_id: int) ->
         return cursor.fetchall()
     except psycopg2.Error as e:
         print(f"CRUD DB Error fetching device tokens for user {user_id}: {e}")
-        raise
\ No newline at end of file
+        raise
+
+def get_push_targets(cursor: psycopg2.extensions.cursor, user_ids: List[int], type: str) -> List[Dict[str, Any]]:
+    """Device tokens (id, user_id, device_token, platform) of the users that still allow `type` notifications, in one query."""
+    if not user_ids: return []
+    column = NOTIFICATION_PREFERENCE_COLUMNS.get(type)
+    pref_filter = f"AND u.{column} IS NOT FALSE" if column else ""
+    cursor.execute(
+        f"""
+        SELECT t.id, t.user_id, t.device_token, t.platform::text AS platform
+        FROM public.user_device_tokens t
+        JOIN public.users u ON u.id = t.user_id
+        WHERE t.user_id = ANY(%s) {pref_filter};
+        """,
+        (list(user_ids),)
+    )
+    return cursor.fetchall()
+
+def record_push_results(cursor: psycopg2.extensions.cursor, delivered_token_ids: List[int], invalid_token_ids: List[int]):
+    """Refreshes last_used_at for tokens that accepted a push and deletes the ones the provider rejected."""
+    if delivered_token_ids:
+        cursor.execute("UPDATE public.user_device_tokens SET last_used_at = NOW() WHERE id = ANY(%s);", (list(delivered_token_ids),))
+    if invalid_token_ids:
+        cursor.execute("DELETE FROM public.user_device_tokens WHERE id = ANY(%s);", (list(invalid_token_ids),))
+        print(f"CRUD: Pruned {cursor.rowcount} invalid device tokens")
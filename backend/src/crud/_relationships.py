@@ -0,0 +1,56 @@
+# backend/src/crud/_relationships.py
+import psycopg2
+from typing import List, Optional, Dict, Any, Iterable
+
+from ._vote import get_viewer_vote_statuses
+from ._favorite import get_viewer_favorited_ids
+from ._user import get_followed_ids
+from ._community import get_member_community_ids
+from ._event import get_participating_event_ids
+
+# =========================================
+# Viewer relationships (set-based viewer status for lists / GET /me/relationships)
+# =========================================
+def _vote_label(vote: Optional[bool]) -> Optional[str]:
+    return 'UP' if vote is True else ('DOWN' if vote is False else None)
+
+def get_item_viewer_statuses(
+        cursor: psycopg2.extensions.cursor, viewer_id: Optional[int], target_ids: List[int], target_label: str = "Post"
+) -> Dict[int, Dict[str, Any]]:
+    """{id: {viewer_vote_type, viewer_has_favorited}} for posts/replies, two graph queries for the whole list."""
+    target_ids = list(dict.fromkeys(target_ids))
+    votes: Dict[int, Optional[bool]] = {}; favorited = set()
+    if viewer_id is not None and target_ids:
+        votes = get_viewer_vote_statuses(cursor, viewer_id, target_ids, target_label)
+        favorited = get_viewer_favorited_ids(cursor, viewer_id, target_ids, target_label)
+    return {
+        tid: {'viewer_vote_type': _vote_label(votes.get(tid)), 'viewer_has_favorited': tid in favorited}
+        for tid in target_ids
+    }
+
+def get_viewer_relationships(
+        cursor: psycopg2.extensions.cursor,
+        viewer_id: int,
+        post_ids: Iterable[int] = (),
+        reply_ids: Iterable[int] = (),
+        user_ids: Iterable[int] = (),
+        community_ids: Iterable[int] = (),
+        event_ids: Iterable[int] = ()
+) -> Dict[str, Dict[int, Dict[str, Any]]]:
+    """
+    The viewer's relationship to every listed target, one query per relationship kind
+    (lists that are empty cost nothing). Targets that do not exist come back as "no relationship".
+    """
+    user_ids = list(dict.fromkeys(user_ids))
+    community_ids = list(dict.fromkeys(community_ids))
+    event_ids = list(dict.fromkeys(event_ids))
+    followed = get_followed_ids(cursor, viewer_id, user_ids)
+    member_of = get_member_community_ids(cursor, viewer_id, community_ids)
+    participating = get_participating_event_ids(cursor, viewer_id, event_ids)
+    return {
+        'posts': get_item_viewer_statuses(cursor, viewer_id, list(post_ids), "Post"),
+        'replies': get_item_viewer_statuses(cursor, viewer_id, list(reply_ids), "Reply"),
+        'users': {uid: {'is_following': uid in followed} for uid in user_ids},
+        'communities': {cid: {'is_member': cid in member_of} for cid in community_ids},
+        'events': {eid: {'is_participating': eid in participating} for eid in event_ids},
+    }
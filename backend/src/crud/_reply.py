@@ -7,7 +7,8 @@ from typing import List, Optional, Dict, Any
 from datetime import datetime, timezone
 
 # Import graph helpers and utils
-from ._graph import execute_cypher, build_cypher_set_clauses
+from ._graph import execute_cypher, build_cypher_set_params
+from ._stats import adjust_stats, get_stats_bulk
 from .. import utils
 from ._user import (get_user_by_id)
 # =========================================
@@ -42,11 +43,11 @@ def create_reply_db(
     # 2. Create :Reply vertex (Wrap in try/except)
     try:
         reply_props = {'id': reply_id, 'created_at': created_at}
-        set_clauses_str = build_cypher_set_clauses('r', reply_props)
-        cypher_q_vertex = f"CREATE (r:Reply {{id: {reply_id}}})"
+        set_clauses_str, set_params = build_cypher_set_params('r', reply_props)
+        cypher_q_vertex = "CREATE (r:Reply {id: $reply_id})"
         if set_clauses_str: cypher_q_vertex += f" SET {set_clauses_str}"
         print(f"CRUD: Creating AGE vertex for reply {reply_id}...")
-        execute_cypher(cursor, cypher_q_vertex)
+        execute_cypher(cursor, cypher_q_vertex, params={'reply_id': reply_id, **set_params})
         print(f"CRUD: AGE vertex created for reply {reply_id}.")
     except Exception as age_err:
         print(f"CRUD WARNING: Failed create AGE vertex reply {reply_id}: {age_err}")
@@ -54,11 +55,10 @@ def create_reply_db(
 
     # 3. Create :WROTE edge (User -> Reply) (Wrap in try/except)
     try:
-        created_at_quoted = utils.quote_cypher_string(created_at)
-        cypher_q_wrote = f"""
-            MATCH (u:User {{id: {user_id}}}) MATCH (rep:Reply {{id: {reply_id}}})
-            MERGE (u)-[r:WROTE]->(rep) SET r.created_at = {created_at_quoted} """
-        execute_cypher(cursor, cypher_q_wrote)
+        cypher_q_wrote = """
+            MATCH (u:User {id: $user_id}) MATCH (rep:Reply {id: $reply_id})
+            MERGE (u)-[r:WROTE]->(rep) SET r.created_at = $created_at """
+        execute_cypher(cursor, cypher_q_wrote, params={'user_id': user_id, 'reply_id': reply_id, 'created_at': created_at})
         print(f"CRUD: :WROTE edge created for reply {reply_id}.")
     except Exception as age_err:
         print(f"CRUD WARNING: Failed create :WROTE edge reply {reply_id}: {age_err}")
@@ -69,14 +69,18 @@ def create_reply_db(
         target_id = parent_reply_id if parent_reply_id is not None else post_id
         target_label = "Reply" if parent_reply_id is not None else "Post"
         cypher_q_replied = f"""
-            MATCH (child:Reply {{id: {reply_id}}}) MATCH (parent:{target_label} {{id: {target_id}}})
-            MERGE (child)-[r:REPLIED_TO]->(parent) SET r.created_at = {created_at_quoted} """
-        execute_cypher(cursor, cypher_q_replied)
+            MATCH (child:Reply {{id: $reply_id}}) MATCH (parent:{target_label} {{id: $target_id}})
+            MERGE (child)-[r:REPLIED_TO]->(parent) SET r.created_at = $created_at """
+        execute_cypher(cursor, cypher_q_replied, params={'reply_id': reply_id, 'target_id': target_id, 'created_at': created_at})
         print(f"CRUD: :REPLIED_TO edge created reply {reply_id} -> {target_label} {target_id}.")
     except Exception as age_err:
         print(f"CRUD WARNING: Failed create :REPLIED_TO edge reply {reply_id}: {age_err}")
         raise age_err
 
+    # 5. Counters: post reply_count tracks direct replies (same as the graph REPLIED_TO->Post count)
+    if parent_reply_id is None:
+        adjust_stats(cursor, "Post", post_id, reply_count=1)
+
     return reply_id # Return ID
 
 def get_reply_by_id(cursor: psycopg2.extensions.cursor, reply_id: int) -> Optional[Dict[str, Any]]:
@@ -87,55 +91,32 @@ def get_reply_by_id(cursor: psycopg2.extensions.cursor, reply_id: int) -> Option
     )
     return cursor.fetchone()
 
-# --- Fetch reply counts from graph (Python counting) ---
+# --- Fetch reply counts (reply_stats counter row) ---
 def get_reply_counts(cursor: psycopg2.extensions.cursor, reply_id: int) -> Dict[str, int]:
-    # --- Add this debug query ---
-    debug_vote_edges_q = f"MATCH ()-[r:VOTED]->(rep:Reply {{id: {reply_id}}}) RETURN r as edge_props"
-    debug_expected_edges = [('edge_props', 'agtype')]
-    try:
-        all_vote_edges = execute_cypher(cursor, debug_vote_edges_q, fetch_all=True, expected_columns=debug_expected_edges)
-        #print(f"DEBUG get_reply_counts R:{reply_id} - All VOTED edges found: {all_vote_edges}")
-        if all_vote_edges:
-            for edge_data_item in all_vote_edges:
-                parsed_edge_dict = edge_data_item.get('edge_props')
-                if isinstance(parsed_edge_dict, dict) and 'properties' in parsed_edge_dict:
-                    print(f"  Edge properties for Reply {reply_id}: {parsed_edge_dict.get('properties')}")
-                else:
-                    print(f"  Edge data for Reply {reply_id} (not expected dict or no props): {parsed_edge_dict}")
-    except Exception as debug_e:
-        print(f"DEBUG get_reply_counts R:{reply_id} - Error fetching raw edges: {debug_e}")
-    # --- End debug query ---
-
-    cypher_q = f"""
-        MATCH (rep:Reply {{id: {reply_id}}})
-        OPTIONAL MATCH (upvoter:User)-[v_up:VOTED]->(rep) WHERE v_up.vote_type = true
-        OPTIONAL MATCH (downvoter:User)-[v_down:VOTED]->(rep) WHERE v_down.vote_type = false
-        OPTIONAL MATCH (fv:User)-[:FAVORITED]->(rep)
-        RETURN count(DISTINCT upvoter) as upvotes,
-               count(DISTINCT downvoter) as downvotes,
-               count(DISTINCT fv) as favorite_count
-    """
-    expected_counts = [('upvotes', 'agtype'), ('downvotes', 'agtype'), ('favorite_count', 'agtype')]
     try:
-        result_map = execute_cypher(cursor, cypher_q, fetch_one=True, expected_columns=expected_counts)
-        #print(f"DEBUG get_reply_counts for R:{reply_id} - Raw result_map from graph count query: {result_map}")
-        if isinstance(result_map, dict):
-            return {
-                "upvotes": int(result_map.get('upvotes', 0) or 0),
-                "downvotes": int(result_map.get('downvotes', 0) or 0),
-                "favorite_count": int(result_map.get('favorite_count', 0) or 0)
-            }
-        else: return {"upvotes": 0, "downvotes": 0, "favorite_count": 0}
+        return get_stats_bulk(cursor, "Reply", [reply_id])[reply_id]
     except Exception as e:
-        print(f"Warning: Failed getting graph counts for reply {reply_id}: {e}")
+        print(f"Warning: Failed getting counts for reply {reply_id}: {e}")
         traceback.print_exc()
         return {"upvotes": 0, "downvotes": 0, "favorite_count": 0}
 
 # --- Fetch list of replies for a post (Combines relational + graph counts) ---
-def get_replies_for_post_db(cursor: psycopg2.extensions.cursor, post_id: int) -> List[Dict[str, Any]]:
-    """ Fetches replies from relational table, adds graph counts and author info."""
+def get_replies_for_post_db(
+        cursor: psycopg2.extensions.cursor,
+        post_id: int,
+        limit: Optional[int] = None, # None = every reply (previous behaviour)
+        offset: int = 0,
+        after: Optional[Dict[str, Any]] = None # Decoded page cursor (created_at, id); replaces offset
+) -> List[Dict[str, Any]]:
+    """ Fetches replies (oldest first) from relational table, adds graph counts and author info."""
     # Fetch relational reply data including author info
-    sql = """
+    keyset_sql = ""
+    params: List[Any] = [post_id]
+    if after is not None:
+        keyset_sql = "AND (r.created_at, r.id) > (%s, %s)"
+        params.extend([after['created_at'], after['id']])
+        offset = 0
+    sql = f"""
         SELECT
             r.id, r.post_id, r.user_id, r.content, r.parent_reply_id, r.created_at,
             u.username AS author_name,
@@ -143,13 +124,22 @@ def get_replies_for_post_db(cursor: psycopg2.extensions.cursor, post_id: int) ->
             u.id AS author_id
         FROM public.replies r
         JOIN public.users u ON r.user_id = u.id
-        WHERE r.post_id = %s
-        ORDER BY r.created_at ASC;
+        WHERE r.post_id = %s {keyset_sql}
+        ORDER BY r.created_at ASC, r.id ASC
     """
-    cursor.execute(sql, (post_id,))
+    if limit is not None:
+        sql += " LIMIT %s OFFSET %s"; params.extend([limit, offset])
+    elif offset:
+        sql += " OFFSET %s"; params.append(offset)
+    cursor.execute(sql + ";", params)
     replies_relational = cursor.fetchall()
 
     augmented_replies = []
+    counts_by_reply = {}
+    try:
+        counts_by_reply = get_stats_bulk(cursor, "Reply", [r['id'] for r in replies_relational])
+    except Exception as e:
+        print(f"CRUD Warning: Failed get counts for replies of post {post_id}: {e}")
     # Fetch author avatars in a batch for efficiency (Optional Optimization)
     # author_ids = {r['author_id'] for r in replies_relational if r.get('author_id')}
     # avatars = get_user_avatars(cursor, list(author_ids)) # Need a new batch fetch function
@@ -159,13 +149,7 @@ def get_replies_for_post_db(cursor: psycopg2.extensions.cursor, post_id: int) ->
         reply_id = reply_data['id']
         author_id = reply_data.get('author_id')
 
-        # Fetch counts for this reply
-        counts = {"upvotes": 0, "downvotes": 0, "favorite_count": 0}
-        try:
-            counts = get_reply_counts(cursor, reply_id)
-        except Exception as e:
-            print(f"CRUD Warning: Failed get counts for reply {reply_id}: {e}")
-        reply_data.update(counts)
+        reply_data.update(counts_by_reply.get(reply_id, {"upvotes": 0, "downvotes": 0, "favorite_count": 0}))
 
         # Fetch author avatar path (if not batch fetched)
         # Need to fetch user details to get image_path if not included above
@@ -185,11 +169,15 @@ def delete_reply_db(cursor: psycopg2.extensions.cursor, reply_id: int) -> bool:
     Deletes reply from public.replies AND AGE graph.
     Requires CALLING function to handle media item deletion.
     """
+    # Needed for the post's reply_count after the row is gone
+    cursor.execute("SELECT post_id, parent_reply_id FROM public.replies WHERE id = %s;", (reply_id,))
+    reply_row = cursor.fetchone()
+
     # 1. Delete from AGE graph
-    cypher_q = f"MATCH (r:Reply {{id: {reply_id}}}) DETACH DELETE r"
+    cypher_q = "MATCH (r:Reply {id: $reply_id}) DETACH DELETE r"
     print(f"CRUD: Deleting AGE vertex/edges for reply {reply_id}...")
     try:
-        execute_cypher(cursor, cypher_q)
+        execute_cypher(cursor, cypher_q, params={'reply_id': reply_id})
         print(f"CRUD: AGE vertex/edges deleted for reply {reply_id}.")
     except Exception as age_err:
         print(f"CRUD WARNING: Failed delete AGE vertex for reply {reply_id}: {age_err}")
@@ -199,5 +187,8 @@ def delete_reply_db(cursor: psycopg2.extensions.cursor, reply_id: int) -> bool:
     cursor.execute("DELETE FROM public.replies WHERE id = %s;", (reply_id,))
     rows_deleted = cursor.rowcount
     print(f"CRUD: Deleted reply {reply_id} from public.replies (Rows: {rows_deleted}).")
+    # reply_stats row goes with the FK cascade; only the parent post's counter needs a decrement
+    if rows_deleted > 0 and reply_row and reply_row['parent_reply_id'] is None:
+        adjust_stats(cursor, "Post", reply_row['post_id'], reply_count=-1)
 
     return rows_deleted > 0
\ No newline at end of file
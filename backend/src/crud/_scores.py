@@ -0,0 +1,123 @@
+# backend/src/crud/_scores.py
+import os
+import traceback
+
+import psycopg2
+from typing import List, Optional, Dict, Any
+
+from .. import database
+
+# =========================================
+# Hot scores for /feed/discover and /posts/trending (see sql/post_scores.sql)
+# =========================================
+# score = log2(1 + engagement) + hours_since_epoch(created_at) / half_life
+# i.e. engagement halves in weight every HOT_SCORE_HALF_LIFE_HOURS. Kept in log space against a
+# fixed epoch, so a stored score never goes stale: a row rescored now ranks consistently with
+# rows scored hours ago, and the ranking is a plain index read.
+HOT_SCORE_UPVOTE_WEIGHT = float(os.getenv("HOT_SCORE_UPVOTE_WEIGHT", 2))
+HOT_SCORE_DOWNVOTE_WEIGHT = float(os.getenv("HOT_SCORE_DOWNVOTE_WEIGHT", 1))
+HOT_SCORE_REPLY_WEIGHT = float(os.getenv("HOT_SCORE_REPLY_WEIGHT", 3))
+HOT_SCORE_FAVORITE_WEIGHT = float(os.getenv("HOT_SCORE_FAVORITE_WEIGHT", 2))
+HOT_SCORE_HALF_LIFE_HOURS = float(os.getenv("HOT_SCORE_HALF_LIFE_HOURS", 12))
+# Posts older than this drop out of the ranking
+HOT_SCORE_WINDOW_HOURS = int(os.getenv("HOT_SCORE_WINDOW_HOURS", 168))
+# How often the background scorer rescans the window (picks up weight changes, evicts old posts)
+HOT_SCORE_REFRESH_SECONDS = int(os.getenv("HOT_SCORE_REFRESH_SECONDS", 300))
+
+_SCORE_EXPR = """
+    ln(1 + GREATEST(
+        %(w_up)s * COALESCE(ps.upvotes, 0) - %(w_down)s * COALESCE(ps.downvotes, 0)
+        + %(w_reply)s * COALESCE(ps.reply_count, 0) + %(w_fav)s * COALESCE(ps.favorite_count, 0),
+    0)::float8) / ln(2.0)
+    + EXTRACT(EPOCH FROM p.created_at)::float8 / 3600.0 / %(half_life)s
+"""
+
+def _score_params() -> Dict[str, Any]:
+    return {
+        'w_up': HOT_SCORE_UPVOTE_WEIGHT, 'w_down': HOT_SCORE_DOWNVOTE_WEIGHT,
+        'w_reply': HOT_SCORE_REPLY_WEIGHT, 'w_fav': HOT_SCORE_FAVORITE_WEIGHT,
+        'half_life': HOT_SCORE_HALF_LIFE_HOURS, 'window_hours': HOT_SCORE_WINDOW_HOURS,
+    }
+
+# --- Incremental (call inside the writer's transaction) ---
+def rescore_posts(cursor: psycopg2.extensions.cursor, post_ids: List[int]) -> int:
+    """Recomputes hot scores for posts inside the window from post_stats. Returns rows written."""
+    if not post_ids: return 0
+    cursor.execute(
+        f"""
+        INSERT INTO public.post_scores (post_id, score, created_at)
+        SELECT p.id, {_SCORE_EXPR}, p.created_at
+        FROM public.posts p
+        LEFT JOIN public.post_stats ps ON ps.post_id = p.id
+        WHERE p.id = ANY(%(post_ids)s)
+          AND p.created_at >= now() - make_interval(hours => %(window_hours)s)
+        ON CONFLICT (post_id) DO UPDATE SET score = EXCLUDED.score, updated_at = now();
+        """,
+        {**_score_params(), 'post_ids': list(post_ids)}
+    )
+    return cursor.rowcount
+
+# --- Scheduled refresh ---
+def refresh_post_scores(cursor: psycopg2.extensions.cursor) -> Dict[str, int]:
+    """Evicts posts that left the window and rescores every post inside it. Caller commits."""
+    params = _score_params()
+    cursor.execute(
+        "DELETE FROM public.post_scores WHERE created_at < now() - make_interval(hours => %(window_hours)s);",
+        params
+    )
+    evicted = cursor.rowcount
+    cursor.execute(
+        f"""
+        INSERT INTO public.post_scores (post_id, score, created_at)
+        SELECT p.id, {_SCORE_EXPR}, p.created_at
+        FROM public.posts p
+        LEFT JOIN public.post_stats ps ON ps.post_id = p.id
+        WHERE p.created_at >= now() - make_interval(hours => %(window_hours)s)
+        ON CONFLICT (post_id) DO UPDATE SET score = EXCLUDED.score, updated_at = now()
+        WHERE post_scores.score IS DISTINCT FROM EXCLUDED.score;
+        """,
+        params
+    )
+    rescored = cursor.rowcount
+    print(f"CRUD: Refreshed post scores: rescored={rescored}, evicted={evicted}")
+    return {"rescored": rescored, "evicted": evicted}
+
+def run_post_score_refresh() -> Optional[Dict[str, int]]:
+    """One refresh pass on its own pooled connection (background scorer / maintenance script)."""
+    conn = None
+    try:
+        conn = database.get_db_connection(); cursor = conn.cursor()
+        result = refresh_post_scores(cursor)
+        conn.commit()
+        return result
+    except Exception as e:
+        print(f"ERROR: Post score refresh failed: {e}")
+        traceback.print_exc()
+        if conn: conn.rollback()
+        return None
+    finally:
+        if conn: conn.close()
+
+# --- Reads ---
+def get_top_scored_posts(
+        cursor: psycopg2.extensions.cursor,
+        limit: int = 20,
+        offset: int = 0,
+        before: Optional[Dict[str, Any]] = None # Decoded page cursor (score, created_at, id); replaces offset
+) -> List[Dict[str, Any]]:
+    """Top-K rows {post_id, score, created_at} by hot score, served from idx_post_scores_rank."""
+    keyset_sql, params = "", []
+    if before is not None:
+        keyset_sql = "WHERE (score, created_at, post_id) < (%s, %s, %s)"
+        params.extend([float(before.get('score', 0)), before['created_at'], before['id']])
+        offset = 0
+    cursor.execute(
+        f"""
+        SELECT post_id, score, created_at FROM public.post_scores
+        {keyset_sql}
+        ORDER BY score DESC, created_at DESC, post_id DESC
+        LIMIT %s OFFSET %s;
+        """,
+        (*params, limit, offset)
+    )
+    return cursor.fetchall()
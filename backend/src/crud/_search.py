@@ -11,11 +11,13 @@ def search_all(
     search_query: str,
     entity_type: Optional[str] = None, # 'user', 'community', 'post', or None for all
     limit: int = 20,
-    offset: int = 0
+    offset: int = 0,
+    before: Optional[Dict[str, Any]] = None # Decoded page cursor (rank, created_at, type, id); replaces offset
 ) -> List[Dict[str, Any]]:
     """
     Performs a full-text search across users, communities, and posts.
-    Returns a list of results suitable for the SearchResultItem schema.
+    Returns a list of results suitable for the SearchResultItem schema
+    (plus `rank` / `sort_created_at`, the keyset pagination key).
     """
     # Use websearch_to_tsquery for more flexibility with user input
     # Use 'english' config, consider making configurable or using 'simple'
@@ -98,10 +100,20 @@ def search_all(
     full_query = " UNION ALL ".join(select_parts)
 
     # Add ordering and pagination
+    # rank as float8 so it round-trips exactly through the cursor; NULL created_at sorts as the epoch
+    keyset_filter = ""
+    if before is not None:
+        keyset_filter = "WHERE (rank, sort_created_at, type, id) < (%s, %s, %s, %s)"
+        params.extend([before['rank'], before['created_at'], before['type'], before['id']])
+        offset = 0
     full_query = f"""
-        SELECT id, type, name, snippet, image_url_placeholder, author_name, community_name, created_at
-        FROM ({full_query}) AS combined_results
-        ORDER BY rank DESC, created_at DESC
+        SELECT * FROM (
+            SELECT id, type, name, snippet, image_url_placeholder, author_name, community_name, created_at,
+                   rank::float8 AS rank, COALESCE(created_at, 'epoch'::timestamptz) AS sort_created_at
+            FROM ({full_query}) AS combined_results
+        ) AS keyed_results
+        {keyset_filter}
+        ORDER BY rank DESC, sort_created_at DESC, type DESC, id DESC
         LIMIT %s OFFSET %s;
     """
     params.extend([limit, offset])
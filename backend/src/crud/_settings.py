@@ -1,26 +1,58 @@
 # backend/src/crud/_settings.py
+import os
 import psycopg2
 import psycopg2.extras
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Iterable
+
+from ._cache import TTLCache
+
+# --- Notification preference cache ---
+# create_notification checks the recipient's notify_* flag on every call and fan-out jobs check it
+# for every member, so all of a user's flags are loaded in one read and kept in a bounded LRU
+# (filter_recipients_by_preference in crud._notifications checks a whole member list in one read).
+# update_notification_settings clears the entry (again after commit, so a read racing the update
+# cannot re-cache the old row); other workers catch up within the TTL.
+NOTIFICATION_PREFERENCE_CACHE_SIZE = int(os.getenv("NOTIFICATION_PREFERENCE_CACHE_SIZE", 50000))
+NOTIFICATION_PREFERENCE_CACHE_TTL_SECONDS = float(os.getenv("NOTIFICATION_PREFERENCE_CACHE_TTL_SECONDS", 300))
+
+# Settings API key -> (users column, default when NULL)
+NOTIFICATION_SETTING_COLUMNS = {
+    "new_post_in_community": ("notify_new_post_in_community", True),
+    "new_reply_to_post": ("notify_new_reply_to_post", True),
+    "new_event_in_community": ("notify_new_event_in_community", True),
+    "event_reminder": ("notify_event_reminder", True),
+    "direct_message": ("notify_direct_message", False),
+    # Add other mappings...
+}
+# Every notify_* column, including ones not exposed through the settings API
+NOTIFICATION_FLAG_COLUMNS = tuple(column for column, _ in NOTIFICATION_SETTING_COLUMNS.values()) + ("notify_event_update",)
+
+_preference_cache = TTLCache(NOTIFICATION_PREFERENCE_CACHE_SIZE, NOTIFICATION_PREFERENCE_CACHE_TTL_SECONDS) # user_id -> {column: bool | None}
+
+def get_notification_preferences(cursor: psycopg2.extensions.cursor, user_ids: Iterable[int]) -> Dict[int, Dict[str, Optional[bool]]]:
+    """user_id -> raw notify_* flags (NULL stays None), reading public.users once for all ids not in the cache. Unknown users are absent."""
+    found, missing = _preference_cache.get_many(user_ids)
+    if missing:
+        cursor.execute(f"SELECT id, {', '.join(NOTIFICATION_FLAG_COLUMNS)} FROM public.users WHERE id = ANY(%s);", (missing,))
+        rows = {row['id']: {column: row[column] for column in NOTIFICATION_FLAG_COLUMNS} for row in cursor.fetchall()}
+        _preference_cache.put_many(rows)
+        found.update(rows)
+    return found
+
+def invalidate_notification_preferences(user_id: int):
+    _preference_cache.invalidate(user_id)
+
+def get_notification_preference_cache_stats() -> Dict[str, Any]:
+    return _preference_cache.get_stats()
 
 def get_notification_settings(cursor: psycopg2.extensions.cursor, user_id: int) -> Optional[Dict[str, Any]]:
-    # Adjust columns based on your actual users table schema for settings
-    # Example assumes boolean columns like notify_new_post, notify_reply exist
     try:
-        cursor.execute(
-            """SELECT
-                -- Define actual columns used for settings, provide defaults if nullable
-                COALESCE(notify_new_post_in_community, true) as new_post_in_community,
-                COALESCE(notify_new_reply_to_post, true) as new_reply_to_post,
-                COALESCE(notify_new_event_in_community, true) as new_event_in_community,
-                COALESCE(notify_event_reminder, true) as event_reminder,
-                COALESCE(notify_direct_message, false) as direct_message
-                -- Add other setting columns...
-            FROM public.users WHERE id = %s""",
-            (user_id,)
-        )
-        settings = cursor.fetchone()
-        return settings # Returns RealDictRow (acts like dict) or None
+        flags = get_notification_preferences(cursor, [user_id]).get(user_id)
+        if flags is None: return None
+        return {
+            key: default if flags[column] is None else flags[column]
+            for key, (column, default) in NOTIFICATION_SETTING_COLUMNS.items()
+        }
     except Exception as e:
         print(f"Error fetching notification settings for user {user_id}: {e}")
         # Decide: return None or raise? Returning None might be safer for GET.
@@ -31,17 +63,8 @@ def update_notification_settings(cursor: psycopg2.extensions.cursor, user_id: in
     # Update settings columns in the users table
     set_clauses = []
     params = []
-    # Map input keys (from schema) to DB column names
-    settings_map = {
-        "new_post_in_community": "notify_new_post_in_community",
-        "new_reply_to_post": "notify_new_reply_to_post",
-        "new_event_in_community": "notify_new_event_in_community",
-        "event_reminder": "notify_event_reminder",
-        "direct_message": "notify_direct_message",
-        # Add other mappings...
-    }
     for key, value in settings.items():
-        db_column = settings_map.get(key)
+        db_column = NOTIFICATION_SETTING_COLUMNS.get(key, (None,))[0]
         # Basic validation: ensure key is known and value is boolean
         if db_column and isinstance(value, bool):
             set_clauses.append(f"{db_column} = %s")
@@ -54,6 +77,9 @@ def update_notification_settings(cursor: psycopg2.extensions.cursor, user_id: in
     try:
         cursor.execute(sql, tuple(params))
         print(f"CRUD: Updated notification settings for user {user_id}")
+        invalidate_notification_preferences(user_id)
+        after_commit = getattr(getattr(cursor, 'connection', None), 'after_commit', None)
+        if after_commit is not None: after_commit(lambda: invalidate_notification_preferences(user_id))
         # rowcount > 0 means the WHERE clause matched (user exists)
         # It doesn't guarantee values actually changed if they were already set.
         return cursor.rowcount > 0
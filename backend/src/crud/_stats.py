@@ -0,0 +1,151 @@
+# backend/src/crud/_stats.py
+import psycopg2
+import psycopg2.extras
+from typing import List, Optional, Dict, Any
+
+from ._graph import execute_cypher
+from ._scores import rescore_posts
+
+# =========================================
+# Engagement counters (post_stats / reply_stats, see sql/engagement_counters.sql)
+# =========================================
+# Column sets per table; also whitelists the column names interpolated into SQL below.
+POST_STAT_FIELDS = ("reply_count", "upvotes", "downvotes", "favorite_count")
+REPLY_STAT_FIELDS = ("upvotes", "downvotes", "favorite_count")
+
+_STATS_TABLES = {
+    "Post": ("public.post_stats", "post_id", POST_STAT_FIELDS),
+    "Reply": ("public.reply_stats", "reply_id", REPLY_STAT_FIELDS),
+}
+
+# --- Incremental maintenance (call inside the writer's transaction) ---
+def adjust_stats(cursor: psycopg2.extensions.cursor, target_label: str, target_id: int, **deltas: int) -> Optional[Dict[str, int]]:
+    """
+    Adds deltas to a post/reply counter row, creating it if needed. Counters never go below 0.
+    Returns the updated counters (None when there was nothing to add).
+    """
+    table, key_col, fields = _STATS_TABLES[target_label]
+    deltas = {k: int(v) for k, v in deltas.items() if v}
+    unknown = set(deltas) - set(fields)
+    if unknown: raise ValueError(f"Unknown {target_label} stat field(s): {sorted(unknown)}")
+    if not deltas: return None
+
+    cols = list(deltas)
+    insert_vals = ", ".join(["GREATEST(%s, 0)"] * len(cols))
+    updates = ", ".join(f"{c} = GREATEST(s.{c} + %s, 0)" for c in cols)
+    cursor.execute(
+        f"""
+        INSERT INTO {table} AS s ({key_col}, {", ".join(cols)})
+        VALUES (%s, {insert_vals})
+        ON CONFLICT ({key_col}) DO UPDATE SET {updates}, updated_at = now()
+        RETURNING {", ".join(fields)};
+        """,
+        (target_id, *deltas.values(), *deltas.values())
+    )
+    row = cursor.fetchone()
+    if target_label == "Post": rescore_posts(cursor, [target_id]) # Keep the discover ranking current
+    return {f: int(row[f] or 0) for f in fields} if row else None
+
+def apply_vote_change(cursor: psycopg2.extensions.cursor, target_label: str, target_id: int,
+                      old_vote: Optional[bool], new_vote: Optional[bool]) -> Optional[Dict[str, int]]:
+    """Counter deltas for a vote going from old_vote to new_vote (None = no vote). Returns the updated counters."""
+    if old_vote == new_vote: return None
+    deltas = {"upvotes": 0, "downvotes": 0}
+    if old_vote is not None: deltas["upvotes" if old_vote else "downvotes"] -= 1
+    if new_vote is not None: deltas["upvotes" if new_vote else "downvotes"] += 1
+    return adjust_stats(cursor, target_label, target_id, **deltas)
+
+# --- Reads ---
+def get_stats_bulk(cursor: psycopg2.extensions.cursor, target_label: str, target_ids: List[int]) -> Dict[int, Dict[str, int]]:
+    """{target_id: counters} with one indexed lookup. Targets without a row get zeros."""
+    table, key_col, fields = _STATS_TABLES[target_label]
+    stats = {tid: dict.fromkeys(fields, 0) for tid in target_ids}
+    if not target_ids: return stats
+    cursor.execute(
+        f"SELECT {key_col} AS target_id, {', '.join(fields)} FROM {table} WHERE {key_col} = ANY(%s);",
+        (list(target_ids),)
+    )
+    for row in cursor.fetchall():
+        stats[row['target_id']] = {f: int(row[f] or 0) for f in fields}
+    return stats
+
+# --- Rebuild / reconcile from the graph ---
+_GRAPH_COUNT_QUERIES = {
+    "Post": """
+        MATCH (p:Post) WHERE p.id IN $target_ids
+        OPTIONAL MATCH (reply:Reply)-[:REPLIED_TO]->(p)
+        OPTIONAL MATCH (upvoter:User)-[v_up:VOTED {vote_type: true}]->(p)
+        OPTIONAL MATCH (downvoter:User)-[v_down:VOTED {vote_type: false}]->(p)
+        OPTIONAL MATCH (favUser:User)-[:FAVORITED]->(p)
+        RETURN p.id as target_id,
+               count(DISTINCT reply) as reply_count,
+               count(DISTINCT upvoter) as upvotes,
+               count(DISTINCT downvoter) as downvotes,
+               count(DISTINCT favUser) as favorite_count
+    """,
+    "Reply": """
+        MATCH (rep:Reply) WHERE rep.id IN $target_ids
+        OPTIONAL MATCH (upvoter:User)-[v_up:VOTED]->(rep) WHERE v_up.vote_type = true
+        OPTIONAL MATCH (downvoter:User)-[v_down:VOTED]->(rep) WHERE v_down.vote_type = false
+        OPTIONAL MATCH (fv:User)-[:FAVORITED]->(rep)
+        RETURN rep.id as target_id,
+               count(DISTINCT upvoter) as upvotes,
+               count(DISTINCT downvoter) as downvotes,
+               count(DISTINCT fv) as favorite_count
+    """,
+}
+
+def count_engagement_in_graph(cursor: psycopg2.extensions.cursor, target_label: str, target_ids: List[int]) -> Dict[int, Dict[str, int]]:
+    """Authoritative counts from the graph (the old per-render query), for a batch of targets."""
+    _, _, fields = _STATS_TABLES[target_label]
+    counts = {tid: dict.fromkeys(fields, 0) for tid in target_ids}
+    if not target_ids: return counts
+    expected = [('target_id', 'agtype')] + [(f, 'agtype') for f in fields]
+    rows = execute_cypher(cursor, _GRAPH_COUNT_QUERIES[target_label], fetch_all=True,
+                          expected_columns=expected, params={'target_ids': list(target_ids)}) or []
+    for row in rows:
+        if row.get('target_id') is None: continue
+        counts[int(row['target_id'])] = {f: int(row.get(f) or 0) for f in fields}
+    return counts
+
+def reconcile_stats(
+        cursor: psycopg2.extensions.cursor,
+        target_label: str,
+        target_ids: Optional[List[int]] = None,
+        batch_size: int = 500,
+        dry_run: bool = False
+) -> Dict[str, Any]:
+    """
+    Recomputes counters from the graph and rewrites rows that drifted (or are missing).
+    target_ids=None walks every post/reply. Caller commits.
+    """
+    table, key_col, fields = _STATS_TABLES[target_label]
+    if target_ids is None:
+        source_table = "public.posts" if target_label == "Post" else "public.replies"
+        cursor.execute(f"SELECT id FROM {source_table} ORDER BY id;")
+        target_ids = [row['id'] for row in cursor.fetchall()]
+
+    checked = 0; drifted = []
+    for start in range(0, len(target_ids), batch_size):
+        chunk = target_ids[start:start + batch_size]
+        graph_counts = count_engagement_in_graph(cursor, target_label, chunk)
+        cursor.execute(f"SELECT {key_col} AS target_id, {', '.join(fields)} FROM {table} WHERE {key_col} = ANY(%s);", (chunk,))
+        stored = {row['target_id']: {f: row[f] for f in fields} for row in cursor.fetchall()}
+        rows_to_write = [
+            (tid, *[graph_counts[tid][f] for f in fields])
+            for tid in chunk if stored.get(tid) != graph_counts[tid]
+        ]
+        checked += len(chunk)
+        drifted.extend(r[0] for r in rows_to_write)
+        if rows_to_write and not dry_run:
+            psycopg2.extras.execute_values(
+                cursor,
+                f"""
+                INSERT INTO {table} ({key_col}, {', '.join(fields)}) VALUES %s
+                ON CONFLICT ({key_col}) DO UPDATE SET
+                    {', '.join(f'{f} = EXCLUDED.{f}' for f in fields)}, updated_at = now();
+                """,
+                rows_to_write
+            )
+    print(f"CRUD: Reconciled {target_label} stats: checked={checked}, drifted={len(drifted)}, dry_run={dry_run}")
+    return {"checked": checked, "drifted": len(drifted), "drifted_ids": drifted[:50], "dry_run": dry_run}
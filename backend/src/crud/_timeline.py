@@ -0,0 +1,231 @@
+# backend/src/crud/_timeline.py
+import os
+import traceback
+
+import psycopg2
+import psycopg2.extras
+from typing import List, Optional, Dict, Any
+from datetime import datetime
+
+from ._graph import execute_cypher
+from .. import database
+
+# =========================================
+# Home timelines (fan-out on write, see sql/home_timelines.sql)
+# =========================================
+# Max entries kept per user; deeper /feed/following pages fall back to the live graph query
+TIMELINE_MAX_ENTRIES = int(os.getenv("TIMELINE_MAX_ENTRIES", 800))
+# Authors with more followers than this are merged in at read time instead of fanned out
+TIMELINE_CELEBRITY_FOLLOWERS = int(os.getenv("TIMELINE_CELEBRITY_FOLLOWERS", 5000))
+# Followers written per INSERT/trim statement during fan-out
+TIMELINE_FANOUT_BATCH_SIZE = int(os.getenv("TIMELINE_FANOUT_BATCH_SIZE", 1000))
+
+
+def _trim_timelines(cursor: psycopg2.extensions.cursor, user_ids: List[int]) -> int:
+    """Drops entries past TIMELINE_MAX_ENTRIES for the given users."""
+    if not user_ids: return 0
+    cursor.execute(
+        """
+        DELETE FROM public.home_timelines ht
+        USING (
+            SELECT user_id, post_id FROM (
+                SELECT user_id, post_id,
+                       row_number() OVER (PARTITION BY user_id ORDER BY created_at DESC, post_id DESC) AS rn
+                FROM public.home_timelines WHERE user_id = ANY(%s)
+            ) ranked WHERE rn > %s
+        ) overflow
+        WHERE ht.user_id = overflow.user_id AND ht.post_id = overflow.post_id;
+        """,
+        (list(user_ids), TIMELINE_MAX_ENTRIES)
+    )
+    return cursor.rowcount
+
+def get_celebrity_author_ids(cursor: psycopg2.extensions.cursor) -> List[int]:
+    cursor.execute("SELECT author_id FROM public.timeline_celebrity_authors;")
+    return [row['author_id'] for row in cursor.fetchall()]
+
+def _mark_celebrity(cursor: psycopg2.extensions.cursor, author_id: int, follower_count: int):
+    cursor.execute(
+        """
+        INSERT INTO public.timeline_celebrity_authors (author_id, follower_count) VALUES (%s, %s)
+        ON CONFLICT (author_id) DO UPDATE SET follower_count = EXCLUDED.follower_count, updated_at = now();
+        """,
+        (author_id, follower_count)
+    )
+
+# --- Write path ---
+def fan_out_post(
+        cursor: psycopg2.extensions.cursor, post_id: int, author_id: int, created_at: datetime
+) -> Dict[str, Any]:
+    """
+    Inserts a committed post into its author's followers' timelines.
+    Celebrity authors (more than TIMELINE_CELEBRITY_FOLLOWERS followers) are recorded and skipped.
+    """
+    # LIMIT threshold+1 tells us whether the author is a celebrity without reading every follower
+    cypher_q = f"MATCH (f:User)-[:FOLLOWS]->(:User {{id: $author_id}}) RETURN f.id as id LIMIT {TIMELINE_CELEBRITY_FOLLOWERS + 1}"
+    rows = execute_cypher(cursor, cypher_q, fetch_all=True, expected_columns=[('id', 'agtype')], params={'author_id': author_id}) or []
+    follower_ids = [int(r['id']) for r in rows if r.get('id') is not None]
+
+    if len(follower_ids) > TIMELINE_CELEBRITY_FOLLOWERS:
+        _mark_celebrity(cursor, author_id, len(follower_ids))
+        print(f"CRUD: Post {post_id} by celebrity author {author_id} not fanned out (read-time merge).")
+        return {"post_id": post_id, "followers": len(follower_ids), "fanned_out": 0, "celebrity": True}
+
+    trimmed = 0
+    for start in range(0, len(follower_ids), TIMELINE_FANOUT_BATCH_SIZE):
+        chunk = follower_ids[start:start + TIMELINE_FANOUT_BATCH_SIZE]
+        cursor.execute(
+            """
+            INSERT INTO public.home_timelines (user_id, post_id, author_id, created_at)
+            SELECT follower_id, %s, %s, %s FROM unnest(%s::int[]) AS follower_id
+            ON CONFLICT (user_id, post_id) DO NOTHING;
+            """,
+            (post_id, author_id, created_at, chunk)
+        )
+        trimmed += _trim_timelines(cursor, chunk)
+    print(f"CRUD: Fanned out post {post_id} to {len(follower_ids)} timelines (trimmed {trimmed}).")
+    return {"post_id": post_id, "followers": len(follower_ids), "fanned_out": len(follower_ids), "celebrity": False}
+
+def _run_fanout_job(post_id: int):
+    conn = None
+    try:
+        conn = database.get_db_connection(); cursor = conn.cursor()
+        cursor.execute("SELECT user_id, created_at FROM public.posts WHERE id = %s;", (post_id,))
+        post = cursor.fetchone()
+        if not post: return # Deleted before the job ran
+        fan_out_post(cursor, post_id, post['user_id'], post['created_at'])
+        conn.commit()
+    except Exception as e:
+        print(f"ERROR: Timeline fan-out failed for post {post_id}: {e}")
+        traceback.print_exc()
+        if conn: conn.rollback()
+    finally:
+        if conn: conn.close()
+
+def schedule_timeline_fanout(post_id: int):
+    """Fire-and-forget fan-out on the background executor; call after the post's transaction commits."""
+    try: database.get_background_executor().submit(_run_fanout_job, post_id)
+    except RuntimeError as e: print(f"Could not schedule timeline fan-out for post {post_id}: {e}") # Executor shut down
+
+def add_author_to_timeline(cursor: psycopg2.extensions.cursor, user_id: int, author_id: int) -> int:
+    """On follow: pulls the author's recent posts into the follower's timeline (celebrities are read-time)."""
+    cursor.execute(
+        """
+        INSERT INTO public.home_timelines (user_id, post_id, author_id, created_at)
+        SELECT %s, p.id, p.user_id, p.created_at
+        FROM public.posts p
+        WHERE p.user_id = %s
+          AND NOT EXISTS (SELECT 1 FROM public.timeline_celebrity_authors c WHERE c.author_id = p.user_id)
+        ORDER BY p.created_at DESC, p.id DESC
+        LIMIT %s
+        ON CONFLICT (user_id, post_id) DO NOTHING;
+        """,
+        (user_id, author_id, TIMELINE_MAX_ENTRIES)
+    )
+    added = cursor.rowcount
+    if added: _trim_timelines(cursor, [user_id])
+    return added
+
+def remove_author_from_timeline(cursor: psycopg2.extensions.cursor, user_id: int, author_id: int) -> int:
+    """On unfollow: drops the author's posts from the follower's timeline."""
+    cursor.execute("DELETE FROM public.home_timelines WHERE user_id = %s AND author_id = %s;", (user_id, author_id))
+    return cursor.rowcount
+
+# --- Read path ---
+def _followed_celebrity_ids(cursor: psycopg2.extensions.cursor, viewer_id: int) -> List[int]:
+    celebrity_ids = get_celebrity_author_ids(cursor)
+    if not celebrity_ids: return []
+    cypher_q = "MATCH (:User {id: $viewer_id})-[:FOLLOWS]->(a:User) WHERE a.id IN $celebrity_ids RETURN a.id as id"
+    rows = execute_cypher(cursor, cypher_q, fetch_all=True, expected_columns=[('id', 'agtype')],
+                          params={'viewer_id': viewer_id, 'celebrity_ids': celebrity_ids}) or []
+    return [int(r['id']) for r in rows if r.get('id') is not None]
+
+def get_home_timeline_post_ids(
+        cursor: psycopg2.extensions.cursor, viewer_id: int, limit: int = 20, offset: int = 0,
+        before: Optional[Dict[str, Any]] = None
+) -> Optional[List[int]]:
+    """
+    Post IDs for a /feed/following page, newest first: materialized entries merged with
+    followed celebrity authors' posts. `before` is a decoded page cursor (created_at, id) and
+    replaces offset. Returns None when the page lies past the timeline cap (caller falls back
+    to the live graph query).
+    """
+    if before is None:
+        window = offset + limit
+        if window > TIMELINE_MAX_ENTRIES: return None
+        keyset_sql, keyset_params = "", ()
+    else:
+        window = limit; offset = 0
+        keyset_sql, keyset_params = "AND (created_at, {id_col}) < (%s, %s)", (before['created_at'], before['id'])
+
+    cursor.execute(
+        f"""
+        SELECT post_id, created_at FROM public.home_timelines
+        WHERE user_id = %s {keyset_sql.format(id_col='post_id')}
+        ORDER BY created_at DESC, post_id DESC
+        LIMIT %s;
+        """,
+        (viewer_id, *keyset_params, window)
+    )
+    entries = {row['post_id']: row['created_at'] for row in cursor.fetchall()}
+
+    if before is not None and len(entries) < window:
+        # Short page: older entries may have been trimmed off a full timeline
+        cursor.execute("SELECT count(*) AS n FROM public.home_timelines WHERE user_id = %s;", (viewer_id,))
+        if cursor.fetchone()['n'] >= TIMELINE_MAX_ENTRIES: return None
+
+    celebrity_ids = _followed_celebrity_ids(cursor, viewer_id)
+    if celebrity_ids:
+        cursor.execute(
+            f"""
+            SELECT id AS post_id, created_at FROM public.posts
+            WHERE user_id = ANY(%s) {keyset_sql.format(id_col='id')}
+            ORDER BY created_at DESC, id DESC
+            LIMIT %s;
+            """,
+            (celebrity_ids, *keyset_params, window)
+        )
+        for row in cursor.fetchall(): entries.setdefault(row['post_id'], row['created_at'])
+
+    ordered = sorted(entries.items(), key=lambda item: (item[1], item[0]), reverse=True)
+    return [post_id for post_id, _ in ordered[offset:offset + limit]]
+
+# --- Maintenance (utils/backfill_home_timelines.py) ---
+def refresh_celebrity_authors(cursor: psycopg2.extensions.cursor) -> List[int]:
+    """Recomputes the celebrity set from follower counts in the graph. Returns the new author IDs."""
+    cypher_q = """
+        MATCH (f:User)-[:FOLLOWS]->(a:User)
+        WITH a, count(f) AS followers
+        WHERE followers > $threshold
+        RETURN a.id as id, followers
+    """
+    rows = execute_cypher(cursor, cypher_q, fetch_all=True, expected_columns=[('id', 'agtype'), ('followers', 'agtype')],
+                          params={'threshold': TIMELINE_CELEBRITY_FOLLOWERS}) or []
+    celebrities = {int(r['id']): int(r['followers']) for r in rows if r.get('id') is not None}
+    cursor.execute("DELETE FROM public.timeline_celebrity_authors WHERE NOT (author_id = ANY(%s));", (list(celebrities),))
+    for author_id, follower_count in celebrities.items(): _mark_celebrity(cursor, author_id, follower_count)
+    # Celebrity posts are merged at read time; drop any materialized copies
+    if celebrities: cursor.execute("DELETE FROM public.home_timelines WHERE author_id = ANY(%s);", (list(celebrities),))
+    return list(celebrities)
+
+def backfill_home_timeline(cursor: psycopg2.extensions.cursor, user_id: int) -> int:
+    """Rebuilds one user's timeline from the posts of everyone they follow (minus celebrities)."""
+    cypher_q = "MATCH (:User {id: $user_id})-[:FOLLOWS]->(a:User) RETURN a.id as id"
+    rows = execute_cypher(cursor, cypher_q, fetch_all=True, expected_columns=[('id', 'agtype')], params={'user_id': user_id}) or []
+    followed_ids = [int(r['id']) for r in rows if r.get('id') is not None]
+
+    cursor.execute("DELETE FROM public.home_timelines WHERE user_id = %s;", (user_id,))
+    if not followed_ids: return 0
+    cursor.execute(
+        """
+        INSERT INTO public.home_timelines (user_id, post_id, author_id, created_at)
+        SELECT %s, p.id, p.user_id, p.created_at
+        FROM public.posts p
+        WHERE p.user_id = ANY(%s)
+          AND NOT EXISTS (SELECT 1 FROM public.timeline_celebrity_authors c WHERE c.author_id = p.user_id)
+        ORDER BY p.created_at DESC, p.id DESC
+        LIMIT %s;
+        """,
+        (user_id, followed_ids, TIMELINE_MAX_ENTRIES)
+    )
+    return cursor.rowcount
@@ -3,12 +3,14 @@ import traceback
 
 import psycopg2
 import psycopg2.extras
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Set
 import bcrypt
 from datetime import datetime, timezone
 
 # Import graph helpers and utils
-from ._graph import execute_cypher, build_cypher_set_clauses
+from ._graph import execute_cypher, build_cypher_set_params
+from ._timeline import add_author_to_timeline, remove_author_from_timeline
+from ._chat import invalidate_username_cache
 from .. import utils
 # Import media CRUD functions
 from ._media import set_user_profile_picture, get_user_profile_picture_media # Keep this
@@ -96,11 +98,11 @@ def create_user(
         # If you decide to store image_path on the graph vertex (derived from media table later):
         # user_props['image_path'] = None # Initialize, can be updated by another process if profile pic changes
 
-        set_clauses_str = build_cypher_set_clauses('u', user_props)
-        cypher_q = f"CREATE (u:User {{id: {user_id}}})"
+        set_clauses_str, set_params = build_cypher_set_params('u', user_props)
+        cypher_q = "CREATE (u:User {id: $user_id})"
         if set_clauses_str: cypher_q += f" SET {set_clauses_str}"
         print(f"CRUD: Creating AGE vertex for user {user_id}...")
-        execute_cypher(cursor, cypher_q) # No expected_columns needed for CREATE
+        execute_cypher(cursor, cypher_q, params={'user_id': user_id, **set_params}) # No expected_columns needed for CREATE
         print(f"CRUD: AGE vertex created for user {user_id}.")
     except Exception as age_err:
         print(f"CRUD WARNING: Failed to create AGE vertex for new user {user_id}: {age_err}")
@@ -154,6 +156,7 @@ def update_user_profile(
             cursor.execute(sql, tuple(relational_params))
             rows_affected = cursor.rowcount
             print(f"CRUD: Updated public.users for user {user_id} (Rows affected: {rows_affected}).")
+            if 'username' in update_data: invalidate_username_cache(user_id)
         except psycopg2.Error as e:
             print(f"CRUD ERROR updating public.users for user {user_id}: {e}")
             raise # Re-raise for transaction rollback
@@ -167,12 +170,12 @@ def update_user_profile(
 
     # 2. Update AGE Graph Vertex (if there are graph-relevant props and relational update was successful or user exists)
     if graph_props_to_update and rows_affected > 0:
-        set_clauses_str = build_cypher_set_clauses('u', graph_props_to_update)
+        set_clauses_str, set_params = build_cypher_set_params('u', graph_props_to_update)
         if set_clauses_str:
-            cypher_q = f"MATCH (u:User {{id: {user_id}}}) SET {set_clauses_str}"
+            cypher_q = f"MATCH (u:User {{id: $user_id}}) SET {set_clauses_str}"
             try:
                 print(f"CRUD: Updating AGE vertex for user {user_id}...")
-                execute_cypher(cursor, cypher_q) # No expected_columns needed for SET
+                execute_cypher(cursor, cypher_q, params={'user_id': user_id, **set_params}) # No expected_columns needed for SET
                 print(f"CRUD: AGE vertex updated for user {user_id}.")
             except Exception as age_err:
                 print(f"CRUD WARNING: Failed to update AGE vertex for user {user_id}: {age_err}")
@@ -196,10 +199,10 @@ def delete_user(cursor: psycopg2.extensions.cursor, user_id: int) -> bool:
     Media item deletion (profile pic, user-uploaded content) should be handled by the router.
     """
     # 1. Delete from AGE graph first
-    cypher_q = f"MATCH (u:User {{id: {user_id}}}) DETACH DELETE u"
+    cypher_q = "MATCH (u:User {id: $user_id}) DETACH DELETE u"
     print(f"CRUD: Deleting AGE vertex/edges for user {user_id}...")
     try:
-        execute_cypher(cursor, cypher_q) # No expected_columns needed for DELETE
+        execute_cypher(cursor, cypher_q, params={'user_id': user_id}) # No expected_columns needed for DELETE
         print(f"CRUD: AGE vertex/edges deleted for user {user_id}.")
     except Exception as age_err:
         print(f"CRUD ERROR: Failed to delete AGE vertex/edges for user {user_id}: {age_err}")
@@ -212,6 +215,7 @@ def delete_user(cursor: psycopg2.extensions.cursor, user_id: int) -> bool:
     cursor.execute("DELETE FROM public.users WHERE id = %s;", (user_id,))
     rows_deleted = cursor.rowcount
     print(f"CRUD: Deleted user {user_id} from public.users (Rows affected: {rows_deleted}).")
+    invalidate_username_cache(user_id)
 
     return rows_deleted > 0
 
@@ -219,15 +223,15 @@ def delete_user(cursor: psycopg2.extensions.cursor, user_id: int) -> bool:
 
 def get_user_graph_counts(cursor: psycopg2.extensions.cursor, user_id: int) -> Dict[str, int]:
     """Fetches follower/following counts using graph."""
-    cypher_q = f"""
-        MATCH (u:User {{id: {user_id}}})
+    cypher_q = """
+        MATCH (u:User {id: $user_id})
         OPTIONAL MATCH (follower:User)-[:FOLLOWS]->(u)
         OPTIONAL MATCH (u)-[:FOLLOWS]->(following:User)
         RETURN count(DISTINCT follower) as followers_count, count(DISTINCT following) as following_count
     """
     expected = [('followers_count', 'int8'), ('following_count', 'int8')]
     try:
-        result_map = execute_cypher(cursor, cypher_q, fetch_one=True, expected_columns=expected)
+        result_map = execute_cypher(cursor, cypher_q, fetch_one=True, expected_columns=expected, params={'user_id': user_id})
         if isinstance(result_map, dict):
             return {
                 "followers_count": result_map.get('followers_count', 0) or 0, # Ensure 0 if None
@@ -240,28 +244,30 @@ def get_user_graph_counts(cursor: psycopg2.extensions.cursor, user_id: int) -> D
 
 def follow_user(cursor: psycopg2.extensions.cursor, follower_id: int, following_id: int) -> bool:
     action_timestamp_iso = datetime.now(timezone.utc).isoformat()
-    cypher_q = f"""
-        MATCH (f:User {{id: {follower_id}}})
-        MATCH (t:User {{id: {following_id}}})
+    cypher_q = """
+        MATCH (f:User {id: $follower_id})
+        MATCH (t:User {id: $following_id})
         MERGE (f)-[r:FOLLOWS]->(t)
-        SET r.followed_at = '{action_timestamp_iso}'
+        SET r.followed_at = $action_timestamp_iso
         RETURN r IS NOT NULL AS created_or_matched
     """
     expected_cols = [('created_or_matched', 'agtype')] # agtype can represent boolean
     try:
         print(f"CRUD follow_user: Executing for {follower_id} -> {following_id}")
-        result = execute_cypher(cursor, cypher_q, fetch_one=True, expected_columns=expected_cols)
+        result = execute_cypher(cursor, cypher_q, fetch_one=True, expected_columns=expected_cols, params={'follower_id': follower_id, 'following_id': following_id, 'action_timestamp_iso': action_timestamp_iso})
         print(f"CRUD follow_user: MERGE result: {result}")
         # utils.parse_agtype should correctly parse the boolean value from agtype
-        return result is not None and result.get('created_or_matched') is True
+        followed = result is not None and result.get('created_or_matched') is True
+        if followed: add_author_to_timeline(cursor, follower_id, following_id)
+        return followed
     except Exception as e:
         print(f"CRUD Error following user ({follower_id} -> {following_id}): {e}")
         traceback.print_exc()
         raise
 
 def unfollow_user(cursor: psycopg2.extensions.cursor, follower_id: int, following_id: int) -> bool:
-    cypher_q = f"""
-        MATCH (f:User {{id: {follower_id}}})-[r:FOLLOWS]->(t:User {{id: {following_id}}})
+    cypher_q = """
+        MATCH (f:User {id: $follower_id})-[r:FOLLOWS]->(t:User {id: $following_id})
         DELETE r
     """
     # To confirm deletion, we'd ideally return something or check if the edge still exists.
@@ -270,7 +276,8 @@ def unfollow_user(cursor: psycopg2.extensions.cursor, follower_id: int, followin
     # The router should handle the "not following" case by checking before calling.
     try:
         print(f"CRUD unfollow_user: Executing DELETE for {follower_id} -> {following_id}")
-        execute_cypher(cursor, cypher_q) # Returns True on success (no DB error)
+        execute_cypher(cursor, cypher_q, params={'follower_id': follower_id, 'following_id': following_id}) # Returns True on success (no DB error)
+        remove_author_from_timeline(cursor, follower_id, following_id)
         print(f"CRUD unfollow_user: DELETE executed (assumed success if no error).")
         return True
     except Exception as e:
@@ -281,26 +288,38 @@ def unfollow_user(cursor: psycopg2.extensions.cursor, follower_id: int, followin
 
 def check_is_following(cursor: psycopg2.extensions.cursor, viewer_id: int, target_user_id: int) -> bool:
     """Checks if viewer follows target using graph."""
-    cypher_q = f"MATCH (viewer:User {{id: {viewer_id}}})-[:FOLLOWS]->(target:User {{id: {target_user_id}}}) RETURN viewer.id as vid"
+    cypher_q = "MATCH (viewer:User {id: $viewer_id})-[:FOLLOWS]->(target:User {id: $target_user_id}) RETURN viewer.id as vid"
     expected = [('vid', 'agtype')]
     try:
-        result = execute_cypher(cursor, cypher_q, fetch_one=True, expected_columns=expected)
+        result = execute_cypher(cursor, cypher_q, fetch_one=True, expected_columns=expected, params={'viewer_id': viewer_id, 'target_user_id': target_user_id})
         return result is not None and result.get('vid') is not None
     except Exception as e:
         print(f"Error checking follow status ({viewer_id}->{target_user_id}): {e}")
         return False
 
+def get_followed_ids(cursor: psycopg2.extensions.cursor, viewer_id: int, target_user_ids: List[int]) -> Set[int]:
+    """Bulk check_is_following: the subset of target_user_ids the viewer follows."""
+    if not target_user_ids: return set()
+    cypher_q = "MATCH (:User {id: $viewer_id})-[:FOLLOWS]->(target:User) WHERE target.id IN $target_ids RETURN target.id as tid"
+    try:
+        rows = execute_cypher(cursor, cypher_q, fetch_all=True, expected_columns=[('tid', 'agtype')],
+                              params={'viewer_id': viewer_id, 'target_ids': list(target_user_ids)}) or []
+        return {int(r['tid']) for r in rows if r.get('tid') is not None}
+    except Exception as e:
+        print(f"Error checking bulk follow status ({viewer_id} -> {len(target_user_ids)} users): {e}")
+        return set()
+
 def get_following(cursor: psycopg2.extensions.cursor, user_id: int, limit: int = 500, offset: int = 0) -> List[Dict[str, Any]]: # Added limit/offset defaults
     # Fetch IDs and usernames from graph for correct ordering first
     id_username_query = f"""
-        MATCH (u:User {{id: {user_id}}})-[:FOLLOWS]->(f:User)
+        MATCH (u:User {{id: $user_id}})-[:FOLLOWS]->(f:User)
         RETURN f.id as id, f.username as username 
         ORDER BY f.username 
-        SKIP {offset} LIMIT {limit} 
+        SKIP {int(offset)} LIMIT {int(limit)} 
     """
     expected_id_usernames = [('id', 'agtype'), ('username', 'agtype')]
     try:
-        following_basic_info = execute_cypher(cursor, id_username_query, fetch_all=True, expected_columns=expected_id_usernames) or []
+        following_basic_info = execute_cypher(cursor, id_username_query, fetch_all=True, expected_columns=expected_id_usernames, params={'user_id': user_id}) or []
         following_ids = [int(m['id']) for m in following_basic_info if isinstance(m, dict) and m.get('id') is not None]
 
         if not following_ids: return []
@@ -330,14 +349,14 @@ def get_following(cursor: psycopg2.extensions.cursor, user_id: int, limit: int =
 
 def get_followers(cursor: psycopg2.extensions.cursor, user_id: int, limit: int = 500, offset: int = 0) -> List[Dict[str, Any]]: # Added limit/offset defaults
     id_username_query = f"""
-        MATCH (f:User)-[:FOLLOWS]->(:User {{id: {user_id}}})
+        MATCH (f:User)-[:FOLLOWS]->(:User {{id: $user_id}})
         RETURN f.id as id, f.username as username
         ORDER BY f.username
-        SKIP {offset} LIMIT {limit}
+        SKIP {int(offset)} LIMIT {int(limit)}
     """
     expected_id_usernames_followers = [('id', 'agtype'), ('username', 'agtype')]
     try:
-        follower_basic_info = execute_cypher(cursor, id_username_query, fetch_all=True, expected_columns=expected_id_usernames_followers) or []
+        follower_basic_info = execute_cypher(cursor, id_username_query, fetch_all=True, expected_columns=expected_id_usernames_followers, params={'user_id': user_id}) or []
         follower_ids = [int(m['id']) for m in follower_basic_info if isinstance(m, dict) and m.get('id') is not None]
 
         if not follower_ids: return []
@@ -368,13 +387,13 @@ def get_user_joined_communities_graph(cursor: psycopg2.extensions.cursor, user_i
     """Fetches basic info of communities joined by the user."""
     # Community vertex also doesn't store logo_path by default.
     cypher_q = f"""
-        MATCH (u:User {{id: {user_id}}})-[:MEMBER_OF]->(c:Community)
+        MATCH (u:User {{id: $user_id}})-[:MEMBER_OF]->(c:Community)
         RETURN c.id as id, c.name as name, c.interest as interest
-        ORDER BY c.name SKIP {offset} LIMIT {limit}
+        ORDER BY c.name SKIP {int(offset)} LIMIT {int(limit)}
      """
     expected = [('id', 'agtype'), ('name', 'agtype'), ('interest', 'agtype')]
     try:
-        results = execute_cypher(cursor, cypher_q, fetch_all=True, expected_columns=expected) or []
+        results = execute_cypher(cursor, cypher_q, fetch_all=True, expected_columns=expected, params={'user_id': user_id}) or []
         return [r for r in results if isinstance(r, dict)]
     except Exception as e:
         print(f"CRUD Error getting user joined communities graph: {e}")
@@ -384,13 +403,13 @@ def get_user_participated_events_graph(cursor: psycopg2.extensions.cursor, user_
     """Fetches basic info of events the user participated in."""
     # Event vertex also doesn't store image_url by default.
     cypher_q = f"""
-        MATCH (u:User {{id: {user_id}}})-[p:PARTICIPATED_IN]->(e:Event)
+        MATCH (u:User {{id: $user_id}})-[p:PARTICIPATED_IN]->(e:Event)
         RETURN e.id as id, e.title as title, e.event_timestamp as event_timestamp
-        ORDER BY e.event_timestamp DESC SKIP {offset} LIMIT {limit}
+        ORDER BY e.event_timestamp DESC SKIP {int(offset)} LIMIT {int(limit)}
     """
     expected = [('id', 'agtype'), ('title', 'agtype'), ('event_timestamp', 'agtype')]
     try:
-        results = execute_cypher(cursor, cypher_q, fetch_all=True, expected_columns=expected) or []
+        results = execute_cypher(cursor, cypher_q, fetch_all=True, expected_columns=expected, params={'user_id': user_id}) or []
         return [r for r in results if isinstance(r, dict)]
     except Exception as e:
         print(f"CRUD Error getting user participated events graph: {e}")
@@ -398,10 +417,10 @@ def get_user_participated_events_graph(cursor: psycopg2.extensions.cursor, user_
 
 def get_user_joined_communities_count(cursor: psycopg2.extensions.cursor, user_id: int) -> int:
     """Counts communities joined by the user using graph."""
-    cypher_q = f"MATCH (:User {{id: {user_id}}})-[:MEMBER_OF]->(c:Community) RETURN count(c) as c_count"
+    cypher_q = "MATCH (:User {id: $user_id})-[:MEMBER_OF]->(c:Community) RETURN count(c) as c_count"
     expected = [('c_count', 'int8')]
     try:
-        result = execute_cypher(cursor, cypher_q, fetch_one=True, expected_columns=expected)
+        result = execute_cypher(cursor, cypher_q, fetch_one=True, expected_columns=expected, params={'user_id': user_id})
         return result.get('c_count', 0) if result else 0
     except Exception as e:
         print(f"Warning: Failed getting joined communities count for user {user_id}: {e}")
@@ -409,10 +428,10 @@ def get_user_joined_communities_count(cursor: psycopg2.extensions.cursor, user_i
 
 def get_user_participated_events_count(cursor: psycopg2.extensions.cursor, user_id: int) -> int:
     """Counts events participated in by the user using graph."""
-    cypher_q = f"MATCH (:User {{id: {user_id}}})-[:PARTICIPATED_IN]->(e:Event) RETURN count(e) as e_count"
+    cypher_q = "MATCH (:User {id: $user_id})-[:PARTICIPATED_IN]->(e:Event) RETURN count(e) as e_count"
     expected = [('e_count', 'int8')]
     try:
-        result = execute_cypher(cursor, cypher_q, fetch_one=True, expected_columns=expected)
+        result = execute_cypher(cursor, cypher_q, fetch_one=True, expected_columns=expected, params={'user_id': user_id})
         return result.get('e_count', 0) if result else 0
     except Exception as e:
         print(f"Warning: Failed getting participated events count for user {user_id}: {e}")
@@ -421,14 +440,14 @@ def get_user_participated_events_count(cursor: psycopg2.extensions.cursor, user_
 def get_post_ids_by_user(cursor: psycopg2.extensions.cursor, user_id: int, limit: int, offset: int) -> List[int]:
     """Fetches IDs of posts written by a user, ordered by creation time."""
     cypher_q = f"""
-        MATCH (u:User {{id: {user_id}}})-[:WROTE]->(p:Post)
+        MATCH (u:User {{id: $user_id}})-[:WROTE]->(p:Post)
         RETURN p.id as id, p.created_at as created_at
         ORDER BY created_at DESC
-        SKIP {offset} LIMIT {limit}
+        SKIP {int(offset)} LIMIT {int(limit)}
     """
     expected_cols = [('id', 'agtype'), ('created_at', 'agtype')]
     try:
-        results = execute_cypher(cursor, cypher_q, fetch_all=True, expected_columns=expected_cols) or []
+        results = execute_cypher(cursor, cypher_q, fetch_all=True, expected_columns=expected_cols, params={'user_id': user_id}) or []
         return [int(r['id']) for r in results if isinstance(r, dict) and r.get('id') is not None]
     except Exception as e:
         print(f"CRUD Error getting post IDs by user {user_id}: {e}")
@@ -437,14 +456,14 @@ def get_post_ids_by_user(cursor: psycopg2.extensions.cursor, user_id: int, limit
 def get_community_ids_joined_by_user(cursor: psycopg2.extensions.cursor, user_id: int, limit: int, offset: int) -> List[int]:
     """Fetches IDs of communities joined by a user, ordered by name."""
     cypher_q = f"""
-        MATCH (u:User {{id: {user_id}}})-[:MEMBER_OF]->(c:Community)
+        MATCH (u:User {{id: $user_id}})-[:MEMBER_OF]->(c:Community)
         RETURN c.id as id, c.name as name
         ORDER BY name ASC
-        SKIP {offset} LIMIT {limit}
+        SKIP {int(offset)} LIMIT {int(limit)}
     """
     expected_cols = [('id', 'agtype'), ('name', 'agtype')]
     try:
-        results = execute_cypher(cursor, cypher_q, fetch_all=True, expected_columns=expected_cols) or []
+        results = execute_cypher(cursor, cypher_q, fetch_all=True, expected_columns=expected_cols, params={'user_id': user_id}) or []
         return [int(r['id']) for r in results if isinstance(r, dict) and r.get('id') is not None]
     except Exception as e:
         print(f"CRUD Error getting community IDs joined by user {user_id}: {e}")
@@ -453,14 +472,14 @@ def get_community_ids_joined_by_user(cursor: psycopg2.extensions.cursor, user_id
 def get_event_ids_participated_by_user(cursor: psycopg2.extensions.cursor, user_id: int, limit: int, offset: int) -> List[int]:
     """Fetches IDs of events participated in by a user, ordered by event time."""
     cypher_q = f"""
-        MATCH (u:User {{id: {user_id}}})-[:PARTICIPATED_IN]->(e:Event)
+        MATCH (u:User {{id: $user_id}})-[:PARTICIPATED_IN]->(e:Event)
         RETURN e.id as id, e.event_timestamp as event_time
         ORDER BY event_time DESC
-        SKIP {offset} LIMIT {limit}
+        SKIP {int(offset)} LIMIT {int(limit)}
     """
     expected_cols = [('id', 'agtype'), ('event_time', 'agtype')]
     try:
-        results = execute_cypher(cursor, cypher_q, fetch_all=True, expected_columns=expected_cols) or []
+        results = execute_cypher(cursor, cypher_q, fetch_all=True, expected_columns=expected_cols, params={'user_id': user_id}) or []
         return [int(r['id']) for r in results if isinstance(r, dict) and r.get('id') is not None]
     except Exception as e:
         print(f"CRUD Error getting event IDs participated by user {user_id}: {e}")
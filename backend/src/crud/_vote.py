@@ -1,120 +1,127 @@
 # backend/src/crud/_vote.py
 import psycopg2
 import psycopg2.extras
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 from datetime import datetime, timezone
 import traceback
 import json
 
 from ._graph import execute_cypher
+from ._stats import apply_vote_change, get_stats_bulk
 from .. import utils
 
-def cast_vote_db(
-        cursor: psycopg2.extensions.cursor,
-        user_id: int,
-        post_id: Optional[int],
-        reply_id: Optional[int],
-        vote_type: bool
-) -> bool:
+def _vote_target(post_id: Optional[int], reply_id: Optional[int]):
     target_id = post_id if post_id is not None else reply_id
     target_label = "Post" if post_id is not None else "Reply"
     if target_id is None:
         raise ValueError("Vote target missing: Must provide post_id or reply_id")
+    return target_label, target_id
 
-    now_iso = datetime.now(timezone.utc).isoformat()
-    created_at_cypher = utils.quote_cypher_string(now_iso)
-    vote_type_cypher = utils.quote_cypher_string(vote_type)
-
-    # Step 1: Ensure the edge exists. MERGE also acts as a MATCH if the edge exists.
-    # We don't need to return anything from this if the next step will explicitly set and return.
-    merge_q = f"""
-        MATCH (u:User {{id: {user_id}}})
-        MATCH (target:{target_label} {{id: {target_id}}})
-        MERGE (u)-[r:VOTED]->(target)
+def set_vote_db(
+        cursor: psycopg2.extensions.cursor,
+        user_id: int,
+        post_id: Optional[int],
+        reply_id: Optional[int],
+        vote_type: Optional[bool] # None removes the vote
+) -> Optional[Dict[str, Any]]:
     """
+    Puts the user's vote on a post/reply into the requested state with a single graph statement
+    (upsert returning the previous value, or delete), then adjusts the counters.
+    Returns {"previous_vote_type", "vote_type", "counts"}; None if the user/target does not exist.
+    """
+    target_label, target_id = _vote_target(post_id, reply_id)
+    # Label comes from a fixed set; ids and values travel as agtype params
+    graph_params = {'user_id': user_id, 'target_id': target_id}
+
+    if vote_type is None:
+        cypher_q = f"""
+            MATCH (u:User {{id: $user_id}})-[r:VOTED]->(target:{target_label} {{id: $target_id}})
+            WITH r, r.vote_type AS previous_vote_type
+            DELETE r
+            RETURN previous_vote_type, null AS vote_type
+        """
+    else:
+        cypher_q = f"""
+            MATCH (u:User {{id: $user_id}})
+            MATCH (target:{target_label} {{id: $target_id}})
+            MERGE (u)-[r:VOTED]->(target)
+            WITH r, r.vote_type AS previous_vote_type
+            SET r.vote_type = $vote_type, r.created_at = $created_at
+            RETURN previous_vote_type, r.vote_type AS vote_type
+        """
+        graph_params.update(vote_type=bool(vote_type), created_at=datetime.now(timezone.utc).isoformat())
+    expected_cols = [('previous_vote_type', 'agtype'), ('vote_type', 'agtype')]
     try:
-        print(f"CRUD cast_vote_db (Step 1 - MERGE): Ensuring VOTED edge exists (U:{user_id} to {target_label}:{target_id})")
-        execute_cypher(cursor, merge_q) # No fetch needed, just ensure it runs
-        print(f"CRUD cast_vote_db (Step 1 - MERGE): Edge ensured.")
-    except Exception as e_merge:
-        print(f"CRUD Error during MERGE in cast_vote_db: {e_merge}")
+        result_map = execute_cypher(cursor, cypher_q, fetch_one=True, expected_columns=expected_cols, params=graph_params)
+    except Exception as e:
+        print(f"CRUD Error setting vote (U:{user_id} on {target_label}:{target_id} -> {vote_type}): {e}")
         traceback.print_exc()
         raise
 
-        # Step 2: Explicitly SET properties on the matched/merged edge and then RETURN the property.
-    # This ensures we are reading the property after the SET operation.
-    set_and_return_q = f"""
-        MATCH (u:User {{id: {user_id}}})-[r:VOTED]->(target:{target_label} {{id: {target_id}}})
-        SET r.vote_type = {vote_type_cypher}, r.created_at = {created_at_cypher}
-        RETURN r.vote_type as set_vote_type
+    if vote_type is not None and not result_map:
+        print(f"CRUD set_vote_db: User {user_id} or {target_label} {target_id} not found.")
+        return None
+    previous_vote = result_map.get('previous_vote_type') if result_map else None
+    if not isinstance(previous_vote, bool): previous_vote = None
+
+    # Counter upsert returns the new counts, so callers never re-read them
+    counts = apply_vote_change(cursor, target_label, target_id, previous_vote, vote_type)
+    if counts is None: counts = get_stats_bulk(cursor, target_label, [target_id])[target_id]
+    return {"previous_vote_type": previous_vote, "vote_type": vote_type, "counts": counts}
+
+def toggle_vote_db(
+        cursor: psycopg2.extensions.cursor,
+        user_id: int,
+        post_id: Optional[int],
+        reply_id: Optional[int],
+        vote_type: bool
+) -> Optional[Dict[str, Any]]:
     """
-    expected_cols = [('set_vote_type', 'agtype')]
-    try:
-        print(f"CRUD cast_vote_db (Step 2 - SET & RETURN): Setting properties. vote_type = {vote_type_cypher}")
-        result_map = execute_cypher(cursor, set_and_return_q, fetch_one=True, expected_columns=expected_cols)
-        print(f"CRUD cast_vote_db (Step 2 - SET & RETURN): Raw result from graph: {result_map}")
+    POST /votes semantics: casts/changes the vote, or removes it when the same vote is sent again.
+    Adds "action" ("cast/updated" or "removed") to set_vote_db's result.
+    """
+    result = set_vote_db(cursor, user_id, post_id, reply_id, vote_type)
+    if result is None: return None
+    if result["previous_vote_type"] == bool(vote_type):
+        # Same button pressed again: the upsert was a no-op, take the vote off instead
+        result = set_vote_db(cursor, user_id, post_id, reply_id, None)
+        result["action"] = "removed"
+    else:
+        result["action"] = "cast/updated"
+    return result
 
-        if result_map and 'set_vote_type' in result_map:
-            persisted_vote_type = result_map.get('set_vote_type')
-            if persisted_vote_type == vote_type:
-                print(f"CRUD cast_vote_db: Successfully SET and VERIFIED vote_type to {persisted_vote_type}")
-                return True
-            else:
-                print(f"ERROR CRUD cast_vote_db: SET vote_type mismatch. Persisted: {persisted_vote_type} (type: {type(persisted_vote_type)}), Expected: {vote_type}")
-                return False
-        else:
-            print(f"ERROR CRUD cast_vote_db: SET properties query did not return 'set_vote_type'. Result: {result_map}")
-            # This could happen if the MATCH in step 2 failed, which implies the MERGE in step 1 also had an issue.
-            return False
-    except Exception as e_set:
-        print(f"CRUD Error during SET & RETURN in cast_vote_db (U:{user_id} on {target_label}:{target_id}): {e_set}")
-        traceback.print_exc()
-        raise
+def cast_vote_db(
+        cursor: psycopg2.extensions.cursor,
+        user_id: int,
+        post_id: Optional[int],
+        reply_id: Optional[int],
+        vote_type: bool
+) -> bool:
+    return set_vote_db(cursor, user_id, post_id, reply_id, bool(vote_type)) is not None
 
-# --- remove_vote_db and get_viewer_vote_status remain unchanged from the previous successful iteration ---
 def remove_vote_db(
         cursor: psycopg2.extensions.cursor,
         user_id: int,
         post_id: Optional[int],
         reply_id: Optional[int]
 ) -> bool:
-    target_id = post_id if post_id is not None else reply_id
-    target_label = "Post" if post_id is not None else "Reply"
-    if target_id is None: raise ValueError("Vote target missing")
-
-    cypher_q_remove = f"""
-        MATCH (u:User {{id: {user_id}}})-[r:VOTED]->(target:{target_label} {{id: {target_id}}})
-        DELETE r
-        RETURN true AS was_deleted 
-    """
-    expected_cols_remove = [('was_deleted', 'agtype')]
+    """True if a vote existed and was deleted."""
     try:
-        print(f"CRUD: Removing vote (U:{user_id} -> {target_label}:{target_id})...")
-        result_map = execute_cypher(cursor, cypher_q_remove, fetch_one=True, expected_columns=expected_cols_remove)
-
-        if result_map and result_map.get('was_deleted') is True:
-            print(f"CRUD: remove_vote_db executed. Edge was found and deleted.")
-            return True
-        else:
-            print(f"CRUD: remove_vote_db executed. No edge found to delete or 'was_deleted' not true. Result: {result_map}")
-            return False
+        result = set_vote_db(cursor, user_id, post_id, reply_id, None)
+        return result is not None and result["previous_vote_type"] is not None
     except psycopg2.Error as db_err:
         print(f"CRUD DB Error removing vote: {db_err} (Code: {db_err.pgcode}).")
         return False
-    except Exception as e:
-        print(f"CRUD Generic Error removing vote: {e}")
-        traceback.print_exc()
-        raise
 
 def get_viewer_vote_status(cursor: psycopg2.extensions.cursor, viewer_id: int, post_id: Optional[int] = None, reply_id: Optional[int] = None) -> Optional[bool]:
     target_id = post_id if post_id is not None else reply_id
     target_label = "Post" if post_id is not None else "Reply"
     if target_id is None: return None
 
-    cypher_vote = f"MATCH (:User {{id:{viewer_id}}})-[r:VOTED]->(:{target_label} {{id:{target_id}}}) RETURN r.vote_type as vt"
+    cypher_vote = f"MATCH (:User {{id: $viewer_id}})-[r:VOTED]->(:{target_label} {{id: $target_id}}) RETURN r.vote_type as vt"
     expected = [('vt', 'agtype')]
     try:
-        result_map = execute_cypher(cursor, cypher_vote, fetch_one=True, expected_columns=expected)
+        result_map = execute_cypher(cursor, cypher_vote, fetch_one=True, expected_columns=expected, params={'viewer_id': viewer_id, 'target_id': target_id})
 
         if result_map is not None and 'vt' in result_map:
             vote_value = result_map['vt']
@@ -134,4 +141,16 @@ def get_viewer_vote_status(cursor: psycopg2.extensions.cursor, viewer_id: int, p
     except Exception as e:
         print(f"Error checking vote status V:{viewer_id} -> {target_label}:{target_id} : {e}")
         traceback.print_exc()
-        return None
\ No newline at end of file
+        return None
+
+def get_viewer_vote_statuses(cursor: psycopg2.extensions.cursor, viewer_id: int, target_ids: List[int], target_label: str = "Post") -> Dict[int, Optional[bool]]:
+    """Bulk get_viewer_vote_status: {target_id: True/False} for targets the viewer voted on (others absent)."""
+    if not target_ids: return {}
+    cypher_q = f"MATCH (:User {{id: $viewer_id}})-[r:VOTED]->(t:{target_label}) WHERE t.id IN $target_ids RETURN t.id as tid, r.vote_type as vt"
+    expected = [('tid', 'agtype'), ('vt', 'agtype')]
+    try:
+        rows = execute_cypher(cursor, cypher_q, fetch_all=True, expected_columns=expected, params={'viewer_id': viewer_id, 'target_ids': list(target_ids)}) or []
+        return {int(r['tid']): r['vt'] for r in rows if r.get('tid') is not None and isinstance(r.get('vt'), bool)}
+    except Exception as e:
+        print(f"CRUD Error getting bulk vote status V:{viewer_id} on {len(target_ids)} {target_label}(s): {e}")
+        return {}
@@ -1,5 +1,13 @@
 import os
+import time
+import threading
+import asyncio
+import functools
+from collections import deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, Deque, Tuple, Callable, TypeVar
 import psycopg2
+import psycopg2.extensions
 from psycopg2.extras import RealDictCursor
 from dotenv import load_dotenv
 import datetime # Add this import
@@ -14,17 +22,393 @@ DB_HOST = os.getenv("DB_HOST", "localhost")
 DB_NAME = os.getenv("DB_NAME")
 DB_PORT = os.getenv("DB_PORT", 5432)
 
-# Connect to PostgreSQL
+# Connection pool settings
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", 2))
+# Connection budget: every thread that can hold a pooled connection comes out of DB_POOL_MAX_SIZE, split as
+#   DB_EXECUTOR_MAX_WORKERS    async handlers (GraphQL resolvers, /ws) via run_in_db_executor
+#   DB_BACKGROUND_MAX_WORKERS  jobs off the request path: timeline fan-out, push token loads/results, chat
+#                              group commits, presence sync, last_seen, score refresh and counter reconcile
+#   DB_SYNC_HANDLER_THREADS    sync (def) route handlers holding a get_db / get_db_connection connection
+# With the three summing to at most DB_POOL_MAX_SIZE, neither side can starve the other into PoolTimeout.
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", 20))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 10)) # Seconds to wait for a free connection
+DB_POOL_MAX_LIFETIME = float(os.getenv("DB_POOL_MAX_LIFETIME", 1800)) # Recycle physical connections after N seconds
+DB_POOL_HEALTH_CHECK_IDLE = float(os.getenv("DB_POOL_HEALTH_CHECK_IDLE", 30)) # Ping connections idle longer than N seconds
+DB_EXECUTOR_MAX_WORKERS = int(os.getenv("DB_EXECUTOR_MAX_WORKERS", 6))
+DB_BACKGROUND_MAX_WORKERS = int(os.getenv("DB_BACKGROUND_MAX_WORKERS", 4))
+DB_SYNC_HANDLER_THREADS = int(os.getenv("DB_SYNC_HANDLER_THREADS",
+                                        max(DB_POOL_MAX_SIZE - DB_EXECUTOR_MAX_WORKERS - DB_BACKGROUND_MAX_WORKERS, 1)))
+if DB_EXECUTOR_MAX_WORKERS + DB_BACKGROUND_MAX_WORKERS + DB_SYNC_HANDLER_THREADS > DB_POOL_MAX_SIZE:
+    print(f"⚠️ DB thread budget ({DB_EXECUTOR_MAX_WORKERS} + {DB_BACKGROUND_MAX_WORKERS} + {DB_SYNC_HANDLER_THREADS}) "
+          f"exceeds DB_POOL_MAX_SIZE={DB_POOL_MAX_SIZE}; expect PoolTimeout under load")
+
+AGE_SEARCH_PATH = "ag_catalog, '$user', public"
+
+T = TypeVar("T")
+
+
+class PoolTimeout(psycopg2.OperationalError):
+    """Raised when no pooled connection becomes available within DB_POOL_TIMEOUT."""
+    pass
+
+
+class PooledConnection(psycopg2.extensions.connection):
+    """
+    psycopg2 connection that returns itself to its pool on close().
+    Existing `conn.close()` calls in routers keep working unchanged.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._pool: Optional["ConnectionPool"] = None
+        self._checked_out = False
+        self._created_at = time.monotonic()
+        self._last_used_at = self._created_at
+        self.age_initialized = False # Set once LOAD 'age' + search_path have been applied to this session
+        self.cypher_stmt_cache: "OrderedDict[str, str]" = OrderedDict() # SQL template -> prepared statement name
+        self._after_commit: list = [] # Callbacks queued by CRUD code for the current transaction
+
+    def after_commit(self, callback: Callable[[], Any]):
+        """Runs `callback` once the current transaction commits; dropped on rollback."""
+        self._after_commit.append(callback)
+
+    def commit(self):
+        super().commit()
+        callbacks, self._after_commit = self._after_commit, []
+        for callback in callbacks:
+            try: callback()
+            except Exception as e: print(f"DB: after-commit callback failed: {e}")
+
+    def rollback(self):
+        self._after_commit = []
+        super().rollback()
+
+    def close(self):
+        if self._pool is not None and self._checked_out:
+            self._pool.release(self)
+        elif self._pool is None:
+            super().close()
+        # else: already returned to the pool, ignore double close
+
+    def close_physical(self):
+        try:
+            super().close()
+        except Exception:
+            pass
+
+
+class ConnectionPool:
+    """
+    Bounded, thread-safe pool of psycopg2 connections.
+    - Keeps at least `min_size` physical connections open.
+    - Blocks up to `timeout` seconds when `max_size` connections are checked out.
+    - Pings connections that sat idle longer than `health_check_idle` before handing them out.
+    - Recycles connections older than `max_lifetime`.
+    - Runs `configure(conn)` once per physical connection, right after it is opened.
+    """
+    def __init__(self, min_size: int, max_size: int, timeout: float,
+                 max_lifetime: float, health_check_idle: float,
+                 configure: Optional[Callable[[PooledConnection], None]] = None, **connect_kwargs):
+        self.min_size = max(0, min_size)
+        self.max_size = max(1, max_size, self.min_size)
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.health_check_idle = health_check_idle
+        self._configure = configure
+        self._connect_kwargs = connect_kwargs
+        self._idle: Deque[PooledConnection] = deque()
+        self._size = 0 # Physical connections open or being opened
+        self._in_use = 0
+        self._waiting = 0
+        self._closed = False
+        self._cond = threading.Condition(threading.Lock())
+        self._stats = {
+            "checkouts": 0, "timeouts": 0, "connections_created": 0,
+            "connections_recycled": 0, "health_check_failures": 0, "configure_failures": 0,
+            "total_wait_ms": 0.0, "max_wait_ms": 0.0,
+        }
+
+    # --- Physical connection handling ---
+    def _connect(self) -> PooledConnection:
+        conn = psycopg2.connect(connection_factory=PooledConnection, **self._connect_kwargs)
+        conn._pool = self
+        configured = True
+        if self._configure is not None:
+            try:
+                self._configure(conn)
+            except Exception as e:
+                # Keep the connection; callers fall back to per-query setup (see crud._graph.execute_cypher)
+                print(f"DB Pool: Connection configure hook failed: {e}")
+                configured = False
+                try: conn.rollback()
+                except Exception: pass
+        with self._cond:
+            self._stats["connections_created"] += 1
+            if not configured: self._stats["configure_failures"] += 1
+        return conn
+
+    def _discard(self, conn: PooledConnection, recycled: bool = False):
+        conn.close_physical()
+        with self._cond:
+            self._size -= 1
+            if recycled: self._stats["connections_recycled"] += 1
+            self._cond.notify()
+
+    def _is_expired(self, conn: PooledConnection, now: float) -> bool:
+        return self.max_lifetime > 0 and (now - conn._created_at) > self.max_lifetime
+
+    def _is_healthy(self, conn: PooledConnection, now: float) -> bool:
+        if conn.closed: return False
+        if (now - conn._last_used_at) < self.health_check_idle: return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except Exception as e:
+            print(f"DB Pool: Health check failed, dropping connection: {e}")
+            with self._cond:
+                self._stats["health_check_failures"] += 1
+            return False
+
+    def open(self):
+        """Opens `min_size` connections up front. Failures are logged, not raised."""
+        while True:
+            with self._cond:
+                if self._closed or self._size >= self.min_size: return
+                self._size += 1
+            try:
+                conn = self._connect()
+            except Exception as e:
+                with self._cond:
+                    self._size -= 1
+                print(f"❌ DB Pool: Failed to pre-open connection: {e}")
+                return
+            with self._cond:
+                self._idle.append(conn)
+                self._cond.notify()
+
+    # --- Checkout / Release ---
+    def getconn(self) -> PooledConnection:
+        start = time.monotonic()
+        deadline = start + self.timeout
+        while True:
+            conn = None
+            create_new = False
+            with self._cond:
+                if self._closed:
+                    raise psycopg2.OperationalError("Connection pool is closed")
+                while not self._idle and self._size >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats["timeouts"] += 1
+                        raise PoolTimeout(f"Timed out after {self.timeout}s waiting for a database connection (pool size {self.max_size})")
+                    self._waiting += 1
+                    try: self._cond.wait(remaining)
+                    finally: self._waiting -= 1
+                if self._idle:
+                    conn = self._idle.pop() # LIFO keeps hot connections hot
+                else:
+                    self._size += 1
+                    create_new = True
+
+            if create_new:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+            else:
+                now = time.monotonic()
+                if self._is_expired(conn, now):
+                    self._discard(conn, recycled=True); continue
+                if not self._is_healthy(conn, now):
+                    self._discard(conn); continue
+
+            waited_ms = (time.monotonic() - start) * 1000
+            with self._cond:
+                self._in_use += 1
+                self._stats["checkouts"] += 1
+                self._stats["total_wait_ms"] += waited_ms
+                self._stats["max_wait_ms"] = max(self._stats["max_wait_ms"], waited_ms)
+            conn._checked_out = True
+            return conn
+
+    def release(self, conn: PooledConnection):
+        conn._checked_out = False
+        conn._after_commit = [] # Never carry callbacks into the next checkout
+        with self._cond:
+            self._in_use -= 1
+        # Reset any transaction the caller left open (read-only handlers never commit)
+        if not conn.closed:
+            try:
+                if conn.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except Exception as e:
+                print(f"DB Pool: Rollback on release failed, dropping connection: {e}")
+                self._discard(conn); return
+        if conn.closed or self._closed:
+            self._discard(conn); return
+        now = time.monotonic()
+        if self._is_expired(conn, now):
+            self._discard(conn, recycled=True); return
+        conn._last_used_at = now
+        with self._cond:
+            self._idle.append(conn)
+            self._cond.notify()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            idle = list(self._idle); self._idle.clear()
+        for conn in idle:
+            self._discard(conn)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            checkouts = self._stats["checkouts"]
+            return {
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "size": self._size,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "waiting": self._waiting,
+                "saturation": round(self._in_use / self.max_size, 3),
+                "checkouts": checkouts,
+                "timeouts": self._stats["timeouts"],
+                "connections_created": self._stats["connections_created"],
+                "connections_recycled": self._stats["connections_recycled"],
+                "health_check_failures": self._stats["health_check_failures"],
+                "configure_failures": self._stats["configure_failures"],
+                "avg_wait_ms": round(self._stats["total_wait_ms"] / checkouts, 3) if checkouts else 0.0,
+                "max_wait_ms": round(self._stats["max_wait_ms"], 3),
+            }
+
+
+# --- Per-connection session setup ---
+def init_age_session(conn: PooledConnection):
+    """
+    Pool configure hook: loads Apache AGE and sets the search_path once per physical connection.
+    Committed so a later rollback on the same connection doesn't undo the SET.
+    """
+    with conn.cursor() as cur:
+        cur.execute("LOAD 'age';")
+        cur.execute(f"SET search_path = {AGE_SEARCH_PATH};")
+    conn.commit()
+    conn.age_initialized = True
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+
+def get_pool() -> ConnectionPool:
+    """Returns the process-wide pool, creating it on first use."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                pool = ConnectionPool(
+                    min_size=DB_POOL_MIN_SIZE, max_size=DB_POOL_MAX_SIZE, timeout=DB_POOL_TIMEOUT,
+                    max_lifetime=DB_POOL_MAX_LIFETIME, health_check_idle=DB_POOL_HEALTH_CHECK_IDLE,
+                    configure=init_age_session,
+                    dbname=DB_NAME, user=DB_USER, password=DB_PASSWORD, host=DB_HOST, port=DB_PORT,
+                    cursor_factory=RealDictCursor # Returns results as dictionaries
+                )
+                pool.open()
+                print(f"✅ DB connection pool ready (min={pool.min_size}, max={pool.max_size})")
+                _pool = pool
+    return _pool
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+            print("DB connection pool closed.")
+
+def get_pool_stats() -> Dict[str, Any]:
+    return _pool.stats() if _pool is not None else {"initialized": False}
+
+# Connect to PostgreSQL (pooled). Callers still call conn.close(), which returns it to the pool.
 def get_db_connection():
-    conn = psycopg2.connect(
-        dbname=DB_NAME,
-        user=DB_USER,
-        password=DB_PASSWORD,
-        host=DB_HOST,
-        port=DB_PORT,
-        cursor_factory=RealDictCursor  # Returns results as dictionaries
-    )
-    return conn
+    return get_pool().getconn()
+
+# --- FastAPI dependency: one connection / transaction per request ---
+def get_db():
+    """
+    Yields a pooled connection for the lifetime of the request.
+    Commits if the handler returns normally, rolls back on any exception.
+    """
+    conn = get_db_connection()
+    try:
+        yield conn
+        if not conn.closed: conn.commit()
+    except Exception:
+        if not conn.closed: conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+# --- Executor for blocking DB work called from async code ---
+_db_executor: Optional[ThreadPoolExecutor] = None
+_db_executor_lock = threading.Lock()
+
+def get_db_executor() -> ThreadPoolExecutor:
+    """Returns the bounded thread pool that async handlers use for psycopg2 calls."""
+    global _db_executor
+    if _db_executor is None:
+        with _db_executor_lock:
+            if _db_executor is None:
+                _db_executor = ThreadPoolExecutor(max_workers=DB_EXECUTOR_MAX_WORKERS, thread_name_prefix="db")
+    return _db_executor
+
+def shutdown_db_executor():
+    global _db_executor
+    with _db_executor_lock:
+        if _db_executor is not None:
+            _db_executor.shutdown(wait=True)
+            _db_executor = None
+
+# --- Executor for background DB jobs (capped separately so they never take request connections) ---
+_background_executor: Optional[ThreadPoolExecutor] = None
+
+def get_background_executor() -> ThreadPoolExecutor:
+    """Thread pool for DB work nobody is waiting on in a request (fire-and-forget jobs, periodic tasks)."""
+    global _background_executor
+    if _background_executor is None:
+        with _db_executor_lock:
+            if _background_executor is None:
+                _background_executor = ThreadPoolExecutor(max_workers=DB_BACKGROUND_MAX_WORKERS, thread_name_prefix="db-bg")
+    return _background_executor
+
+def shutdown_background_executor():
+    global _background_executor
+    with _db_executor_lock:
+        if _background_executor is not None:
+            _background_executor.shutdown(wait=True)
+            _background_executor = None
+
+async def run_in_background_executor(fn: Callable[..., T], *args, **kwargs) -> T:
+    """run_in_db_executor() for background jobs."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_background_executor(), functools.partial(fn, *args, **kwargs))
+
+async def run_in_db_executor(fn: Callable[..., T], *args, **kwargs) -> T:
+    """Runs a blocking DB function (e.g. a crud.* call chain) without blocking the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_db_executor(), functools.partial(fn, *args, **kwargs))
+
+def in_db_executor(fn: Callable[..., T]) -> Callable[..., Any]:
+    """
+    Decorator turning a blocking function into a coroutine function that runs in the DB executor.
+    Keeps the wrapped signature so GraphQL resolvers / DataLoader batch functions can use it.
+    """
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        return await run_in_db_executor(fn, *args, **kwargs)
+    return wrapper
 
 # Helper to update last_seen timestamp
 def update_last_seen(user_id: int):
@@ -44,4 +428,9 @@ def update_last_seen(user_id: int):
             conn.rollback()
     finally:
         if conn:
-            conn.close()
\ No newline at end of file
+            conn.close()
+
+def schedule_last_seen_update(user_id: int):
+    """Fire-and-forget last_seen update on the background executor so auth never waits on it."""
+    try: get_background_executor().submit(update_last_seen, user_id)
+    except RuntimeError as e: print(f"Could not schedule last_seen update for user {user_id}: {e}") # Executor shut down
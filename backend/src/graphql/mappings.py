@@ -6,7 +6,7 @@ from datetime import datetime, timezone
 # Import utils for parsing, URL generation etc.
 from .. import utils
 # Import GQL Types (use forward references/strings if needed, but direct import is fine here if definitions exist)
-from .types import UserType, CommunityType, PostType, ReplyType, EventType, LocationType, MediaItemDisplay, UserStats, VoteTypeEnum
+from .types import UserType, CommunityType, PostType, ReplyType, EventType, LocationType, MediaItemDisplay, MediaVariantType, UserStats, VoteTypeEnum
 
 # --- Mapping Helper Functions ---
 
@@ -224,7 +224,8 @@ def map_db_media_to_gql_media(db_media: Optional[Dict[str, Any]]) -> Optional[Me
         id=strawberry.ID(str(media_id)), url=url, mime_type=mime_type,
         file_size_bytes=media_data.get('file_size_bytes'), original_filename=media_data.get('original_filename'),
         width=media_data.get('width'), height=media_data.get('height'),
-        duration_seconds=media_data.get('duration_seconds'), created_at=created_at )
+        duration_seconds=media_data.get('duration_seconds'), created_at=created_at,
+        variants=[MediaVariantType(**v) for v in utils.get_media_variant_urls(media_data.get('variant_objects'))] )
 
 def map_db_user_stats_to_gql(db_stats: Optional[Dict[str, Any]]) -> Optional[UserStats]:
     if not db_stats: return None
@@ -10,7 +10,7 @@ from aiodataloader import DataLoader # For type hinting if needed
 # --- Local Imports ---
 # Need access to CRUD functions and DB connection
 from ... import crud
-from ...database import get_db_connection
+from ...database import get_db_connection, in_db_executor
 # Need access to GQL Types for return type hinting and mapping functions
 # Import types directly from the consolidated types file
 from ..types import UserType, CommunityType, PostType, ReplyType, EventType, MediaItemDisplay
@@ -28,7 +28,8 @@ def _map_results_to_keys(keys: List[Any], results_map: Dict[Any, Any]) -> List[A
 
 # --- Batch Loading Functions ---
 
-async def batch_load_users_fn(user_ids: List[int]) -> List[Optional[UserType]]:
+@in_db_executor # Blocking psycopg2 work runs in the DB thread pool
+def batch_load_users_fn(user_ids: List[int]) -> List[Optional[UserType]]:
     """Batch loads User objects by their IDs."""
     print(f"DataLoader: Batch loading users for IDs: {user_ids}")
     if not user_ids: return []
@@ -73,7 +74,8 @@ async def batch_load_users_fn(user_ids: List[int]) -> List[Optional[UserType]]:
         if conn: conn.close()
 
 
-async def batch_load_communities_fn(community_ids: List[int]) -> List[Optional[CommunityType]]:
+@in_db_executor
+def batch_load_communities_fn(community_ids: List[int]) -> List[Optional[CommunityType]]:
     """Batch loads Community objects by their IDs."""
     print(f"DataLoader: Batch loading communities for IDs: {community_ids}")
     if not community_ids: return []
@@ -111,7 +113,8 @@ async def batch_load_communities_fn(community_ids: List[int]) -> List[Optional[C
         if conn: conn.close()
 
 
-async def batch_load_media_items_fn(media_ids: List[int]) -> List[Optional[MediaItemDisplay]]:
+@in_db_executor
+def batch_load_media_items_fn(media_ids: List[int]) -> List[Optional[MediaItemDisplay]]:
     """Batch loads MediaItemDisplay objects by their IDs."""
     print(f"DataLoader: Batch loading media items for IDs: {media_ids}")
     if not media_ids: return []
@@ -132,7 +135,8 @@ async def batch_load_media_items_fn(media_ids: List[int]) -> List[Optional[Media
         if conn: conn.close()
 
 
-async def batch_load_post_media_fn(post_ids: List[int]) -> List[List[MediaItemDisplay]]:
+@in_db_executor
+def batch_load_post_media_fn(post_ids: List[int]) -> List[List[MediaItemDisplay]]:
     """Batch loads lists of MediaItemDisplay for multiple post IDs."""
     print(f"DataLoader: Batch loading media for Post IDs: {post_ids}")
     if not post_ids: return [[] for _ in post_ids]
@@ -156,7 +160,8 @@ async def batch_load_post_media_fn(post_ids: List[int]) -> List[List[MediaItemDi
         if conn: conn.close()
 
 
-async def batch_load_reply_media_fn(reply_ids: List[int]) -> List[List[MediaItemDisplay]]:
+@in_db_executor
+def batch_load_reply_media_fn(reply_ids: List[int]) -> List[List[MediaItemDisplay]]:
     """Batch loads lists of MediaItemDisplay for multiple reply IDs."""
     print(f"DataLoader: Batch loading media for Reply IDs: {reply_ids}")
     if not reply_ids: return [[] for _ in reply_ids]
@@ -184,7 +189,8 @@ async def batch_load_reply_media_fn(reply_ids: List[int]) -> List[List[MediaItem
 # These still have N+1 calls for counts/viewer status internally
 # Viewer status MUST be handled/added by the calling resolver using info.context
 
-async def batch_load_posts_fn(post_ids: List[int]) -> List[Optional[PostType]]:
+@in_db_executor
+def batch_load_posts_fn(post_ids: List[int]) -> List[Optional[PostType]]:
     print(f"DataLoader: Batch loading posts for IDs: {post_ids} (N+1 fallback)")
     if not post_ids: return []
     # viewer_id = info.context.get("user_id") # CANNOT get viewer_id here easily
@@ -195,8 +201,8 @@ async def batch_load_posts_fn(post_ids: List[int]) -> List[Optional[PostType]]:
         sql_posts = "SELECT * FROM public.posts WHERE id = ANY(%s)"
         cursor.execute(sql_posts, (list(set(post_ids)),))
         db_posts = {p['id']: p for p in cursor.fetchall()}
-        # Batch fetch counts (N+1 per post still)
-        counts_by_id = {pid: crud.get_post_counts(cursor, pid) for pid in list(set(post_ids))}
+        # Batch fetch counts (single Cypher query for the whole batch)
+        counts_by_id = crud.get_post_counts_bulk(cursor, list(set(post_ids)))
 
         for post_id in post_ids: # Iterate original list for order
             db_post = db_posts.get(post_id)
@@ -216,7 +222,8 @@ async def batch_load_posts_fn(post_ids: List[int]) -> List[Optional[PostType]]:
 
 
 # Remove 'info: Info' from the function definition
-async def batch_load_replies_fn(reply_ids: List[int]) -> List[Optional[ReplyType]]:
+@in_db_executor
+def batch_load_replies_fn(reply_ids: List[int]) -> List[Optional[ReplyType]]:
     print(f"DataLoader: Batch loading replies for IDs: {reply_ids} (N+1 fallback)")
     if not reply_ids: return []
     results = []
@@ -244,7 +251,8 @@ async def batch_load_replies_fn(reply_ids: List[int]) -> List[Optional[ReplyType
 
 
 # Remove 'info: Info' from the function definition
-async def batch_load_events_fn(event_ids: List[int]) -> List[Optional[EventType]]:
+@in_db_executor
+def batch_load_events_fn(event_ids: List[int]) -> List[Optional[EventType]]:
     print(f"DataLoader: Batch loading events for IDs: {event_ids} (N+1 fallback)")
     if not event_ids: return []
     results = []
@@ -8,7 +8,7 @@ from strawberry.types import Info
 
 # --- Imports ---
 from ... import crud, utils, schemas, auth
-from ...database import get_db_connection
+from ...database import get_db_connection, in_db_executor, run_in_db_executor
 from ..types import ( # Import GQL Types and Inputs
     UserType, CommunityType, PostType, ReplyType, EventType, LocationType, MediaItemDisplay,
     PostCreateInput, ReplyCreateInput, CommunityCreateInput, EventCreateInput, VoteInput
@@ -36,16 +36,29 @@ async def create_post_resolver(info: Info, post_input: PostCreateInput) -> PostT
     # ... implementation ...
     print(f"GraphQL Mutation: create_post")
     user_id = _get_authenticated_user_id(info)
-    conn = None; post_id = None; comm_exists = None
+    post_id = None
+
+    def _create() -> int: # Runs in the DB executor
+        conn = None
+        try:
+            conn = get_db_connection(); cursor = conn.cursor()
+            if post_input.community_id:
+                comm_exists = crud.get_community_by_id(cursor, post_input.community_id)
+                if not comm_exists: raise ValueError(f"Community {post_input.community_id} not found.")
+            new_post_id = crud.create_post_db(cursor, user_id=user_id, title=post_input.title, content=post_input.content)
+            if not new_post_id: raise Exception("Failed to create post record.")
+            if post_input.community_id: crud.add_post_to_community_db(cursor, post_input.community_id, new_post_id)
+            conn.commit()
+            crud.schedule_timeline_fanout(new_post_id)
+            return new_post_id
+        except Exception:
+            if conn: conn.rollback()
+            raise
+        finally:
+            if conn: conn.close()
+
     try:
-        conn = get_db_connection(); cursor = conn.cursor()
-        if post_input.community_id:
-            comm_exists = crud.get_community_by_id(cursor, post_input.community_id)
-            if not comm_exists: raise ValueError(f"Community {post_input.community_id} not found.")
-        post_id = crud.create_post_db(cursor, user_id=user_id, title=post_input.title, content=post_input.content)
-        if not post_id: raise Exception("Failed to create post record.")
-        if post_input.community_id: crud.add_post_to_community_db(cursor, post_input.community_id, post_id)
-        conn.commit()
+        post_id = await run_in_db_executor(_create)
         created_post_gql = await get_post_resolver(info, strawberry.ID(str(post_id)))
         if not created_post_gql: raise Exception("Failed to fetch created post details via resolver.")
         ws_manager_instance = info.context.get("ws_manager")
@@ -55,11 +68,10 @@ async def create_post_resolver(info: Info, post_input: PostCreateInput) -> PostT
             except Exception as ws_err: print(f"GQL WARN: Failed WS broadcast for new post {post_id}: {ws_err}")
         return created_post_gql
     except (ValueError, Exception, psycopg2.Error) as e:
-        if conn: conn.rollback(); print(f"Error in create_post_resolver: {e}"); traceback.print_exc(); raise Exception(f"Could not create post: {e}") from e
-    finally:
-        if conn: conn.close()
+        print(f"Error in create_post_resolver: {e}"); traceback.print_exc(); raise Exception(f"Could not create post: {e}") from e
 
-async def delete_post_resolver(info: Info, post_id: strawberry.ID) -> bool:
+@in_db_executor # Blocking psycopg2 work runs in the DB thread pool
+def delete_post_resolver(info: Info, post_id: strawberry.ID) -> bool:
     # ... implementation ...
     print(f"GraphQL Mutation: delete_post(id={post_id})")
     user_id = _get_authenticated_user_id(info)
@@ -84,76 +96,96 @@ async def delete_post_resolver(info: Info, post_id: strawberry.ID) -> bool:
 async def create_reply_resolver(info: Info, reply_input: ReplyCreateInput) -> ReplyType:
     print(f"GraphQL Mutation: create_reply")
     user_id = _get_authenticated_user_id(info) # This is the actor
-    conn = None; reply_id = None
-    try:
-        conn = get_db_connection(); cursor = conn.cursor()
+    reply_id = None
 
-        # Validation
-        parent_post = crud.get_post_by_id(cursor, reply_input.post_id)
-        if not parent_post: raise ValueError(f"Parent post {reply_input.post_id} not found.")
-        parent_post_author_id = parent_post['user_id'] # Get author ID
-
-        parent_reply_author_id = None
-        if reply_input.parent_reply_id:
-            parent_reply = crud.get_reply_by_id(cursor, reply_input.parent_reply_id)
-            if not parent_reply: raise ValueError(f"Parent reply {reply_input.parent_reply_id} not found.")
-            if parent_reply.get('post_id') != reply_input.post_id: raise ValueError("Parent reply belongs to a different post.")
-            parent_reply_author_id = parent_reply['user_id'] # Get parent reply author
-
-        # Create reply base
-        reply_id = crud.create_reply_db(
-            cursor, post_id=reply_input.post_id, user_id=user_id,
-            content=reply_input.content, parent_reply_id=reply_input.parent_reply_id
-        )
-        if not reply_id: raise Exception("Failed to create reply record.")
-
-        # --- Create Notifications (BEFORE commit) ---
-        content_preview = reply_input.content[:100] + ('...' if len(reply_input.content) > 100 else '')
-
-        # 1. Notify Original Post Author (if not the replier and not replying to own post)
-        if parent_post_author_id != user_id:
-            notif_id_post = crud.create_notification(
-                cursor=cursor,
-                recipient_user_id=parent_post_author_id,
-                actor_user_id=user_id,
-                type='post_reply', # Specific type for direct reply to post
-                related_entity_type='post',
-                related_entity_id=reply_input.post_id,
-                # Optionally link secondary entity (the reply itself)? Or just use preview.
-                # related_entity_2_type='reply',
-                # related_entity_2_id=reply_id,
-                content_preview=content_preview
-            )
-            if notif_id_post: print(f"Notification created (ID: {notif_id_post}) for post author {parent_post_author_id}.")
-            else: print(f"WARN: Failed to create notification for post author.")
-            # TODO: Trigger Push/WS for notif_id_post
-
-        # 2. Notify Parent Reply Author (if applicable and different from replier and OP)
-        if parent_reply_author_id is not None and \
-                parent_reply_author_id != user_id and \
-                parent_reply_author_id != parent_post_author_id: # Avoid double-notifying OP
-            notif_id_reply = crud.create_notification(
-                cursor=cursor,
-                recipient_user_id=parent_reply_author_id,
-                actor_user_id=user_id,
-                type='reply_reply', # Specific type for reply to reply
-                related_entity_type='reply', # Link to the parent reply
-                related_entity_id=reply_input.parent_reply_id,
-                # Optionally link secondary entity (the new reply)?
-                # related_entity_2_type='reply',
-                # related_entity_2_id=reply_id,
-                content_preview=content_preview
+    def _create(): # Runs in the DB executor; returns (reply_id, community_id for the WS room)
+        conn = None
+        try:
+            conn = get_db_connection(); cursor = conn.cursor()
+
+            # Validation
+            parent_post = crud.get_post_by_id(cursor, reply_input.post_id)
+            if not parent_post: raise ValueError(f"Parent post {reply_input.post_id} not found.")
+            parent_post_author_id = parent_post['user_id'] # Get author ID
+
+            parent_reply_author_id = None
+            if reply_input.parent_reply_id:
+                parent_reply = crud.get_reply_by_id(cursor, reply_input.parent_reply_id)
+                if not parent_reply: raise ValueError(f"Parent reply {reply_input.parent_reply_id} not found.")
+                if parent_reply.get('post_id') != reply_input.post_id: raise ValueError("Parent reply belongs to a different post.")
+                parent_reply_author_id = parent_reply['user_id'] # Get parent reply author
+
+            # Create reply base
+            reply_id = crud.create_reply_db(
+                cursor, post_id=reply_input.post_id, user_id=user_id,
+                content=reply_input.content, parent_reply_id=reply_input.parent_reply_id
             )
-            if notif_id_reply: print(f"Notification created (ID: {notif_id_reply}) for parent reply author {parent_reply_author_id}.")
-            else: print(f"WARN: Failed to create notification for parent reply author.")
-            # TODO: Trigger Push/WS for notif_id_reply
-
-        # TODO: Handle User Mentions (@username) by parsing content, finding user IDs,
-        # and creating 'user_mention' notifications.
+            if not reply_id: raise Exception("Failed to create reply record.")
+
+            # --- Create Notifications (BEFORE commit) ---
+            content_preview = reply_input.content[:100] + ('...' if len(reply_input.content) > 100 else '')
+
+            # 1. Notify Original Post Author (if not the replier and not replying to own post)
+            if parent_post_author_id != user_id:
+                notif_id_post = crud.create_notification(
+                    cursor=cursor,
+                    recipient_user_id=parent_post_author_id,
+                    actor_user_id=user_id,
+                    type='post_reply', # Specific type for direct reply to post
+                    related_entity_type='post',
+                    related_entity_id=reply_input.post_id,
+                    # Optionally link secondary entity (the reply itself)? Or just use preview.
+                    # related_entity_2_type='reply',
+                    # related_entity_2_id=reply_id,
+                    content_preview=content_preview
+                )
+                if notif_id_post: print(f"Notification created (ID: {notif_id_post}) for post author {parent_post_author_id}.")
+                else: print(f"WARN: Failed to create notification for post author.")
+                # TODO: Trigger Push/WS for notif_id_post
+
+            # 2. Notify Parent Reply Author (if applicable and different from replier and OP)
+            if parent_reply_author_id is not None and \
+                    parent_reply_author_id != user_id and \
+                    parent_reply_author_id != parent_post_author_id: # Avoid double-notifying OP
+                notif_id_reply = crud.create_notification(
+                    cursor=cursor,
+                    recipient_user_id=parent_reply_author_id,
+                    actor_user_id=user_id,
+                    type='reply_reply', # Specific type for reply to reply
+                    related_entity_type='reply', # Link to the parent reply
+                    related_entity_id=reply_input.parent_reply_id,
+                    # Optionally link secondary entity (the new reply)?
+                    # related_entity_2_type='reply',
+                    # related_entity_2_id=reply_id,
+                    content_preview=content_preview
+                )
+                if notif_id_reply: print(f"Notification created (ID: {notif_id_reply}) for parent reply author {parent_reply_author_id}.")
+                else: print(f"WARN: Failed to create notification for parent reply author.")
+                # TODO: Trigger Push/WS for notif_id_reply
+
+            # TODO: Handle User Mentions (@username) by parsing content, finding user IDs,
+            # and creating 'user_mention' notifications.
+
+            # --- End Notifications ---
+
+            conn.commit() # Commit reply creation AND notification inserts
+
+            # Room for the reply broadcast (post's community, if any)
+            community_id = None
+            try:
+                cypher_q_comm = "MATCH (c:Community)-[:HAS_POST]->(:Post {id: $post_id}) RETURN c.id as id LIMIT 1"; expected_comm = [('id', 'agtype')]
+                comm_res = crud.execute_cypher(cursor, cypher_q_comm, fetch_one=True, expected_columns=expected_comm, params={'post_id': reply_input.post_id})
+                if comm_res and comm_res.get('id'): community_id = comm_res['id']
+            except Exception as e: print(f"WARN: Failed to get room key for reply broadcast: {e}")
+            return reply_id, community_id
+        except Exception:
+            if conn: conn.rollback()
+            raise
+        finally:
+            if conn: conn.close()
 
-        # --- End Notifications ---
-
-        conn.commit() # Commit reply creation AND notification inserts
+    try:
+        reply_id, community_id_for_broadcast = await run_in_db_executor(_create)
 
         # Fetch created reply details
         created_reply_gql = await get_reply_resolver(info, strawberry.ID(str(reply_id)))
@@ -162,12 +194,7 @@ async def create_reply_resolver(info: Info, reply_input: ReplyCreateInput) -> Re
         # Broadcast WebSocket event for the new reply itself (separate from notification system)
         # ... (Keep existing WS broadcast logic for the reply content) ...
         ws_manager_instance = info.context.get("ws_manager")
-        room_key = None; community_id_for_broadcast = None
-        try:
-            cypher_q_comm = f"MATCH (c:Community)-[:HAS_POST]->(:Post {{id: {reply_input.post_id}}}) RETURN c.id as id LIMIT 1"; expected_comm = [('id', 'agtype')]
-            comm_res = crud.execute_cypher(cursor, cypher_q_comm, fetch_one=True, expected_columns=expected_comm)
-            if comm_res and comm_res.get('id'): community_id_for_broadcast = comm_res['id']; room_key = f"community_{community_id_for_broadcast}"
-        except Exception as e: print(f"WARN: Failed to get room key for reply broadcast: {e}")
+        room_key = f"community_{community_id_for_broadcast}" if community_id_for_broadcast else None
         if ws_manager_instance and room_key:
             broadcast_payload = {"type": "new_reply", "data": { "post_id": reply_input.post_id, "reply_id": reply_id, "parent_reply_id": reply_input.parent_reply_id, "user_id": user_id, "community_id": community_id_for_broadcast, "content_snippet": reply_input.content[:50] + ('...' if len(reply_input.content)>50 else '')}}
             try: await ws_manager_instance.broadcast(json.dumps(broadcast_payload), room_key)
@@ -175,13 +202,11 @@ async def create_reply_resolver(info: Info, reply_input: ReplyCreateInput) -> Re
         return created_reply_gql
 
     except (ValueError, Exception, psycopg2.Error) as e:
-        if conn: conn.rollback()
         print(f"Error in create_reply_resolver: {e}"); traceback.print_exc()
         raise Exception(f"Could not create reply: {e}") from e
-    finally:
-        if conn: conn.close()
 
-async def delete_reply_resolver(info: Info, reply_id: strawberry.ID) -> bool:
+@in_db_executor
+def delete_reply_resolver(info: Info, reply_id: strawberry.ID) -> bool:
     # ... implementation ...
     print(f"GraphQL Mutation: delete_reply(id={reply_id})")
     user_id = _get_authenticated_user_id(info); conn = None; media_to_delete = []
@@ -204,24 +229,35 @@ async def delete_reply_resolver(info: Info, reply_id: strawberry.ID) -> bool:
 async def create_community_resolver(info: Info, community_input: CommunityCreateInput) -> CommunityType:
     # ... implementation ...
     print(f"GraphQL Mutation: create_community")
-    user_id = _get_authenticated_user_id(info); conn = None; community_id = None
+    user_id = _get_authenticated_user_id(info); community_id = None
+
+    def _create() -> int: # Runs in the DB executor
+        conn = None
+        try:
+            conn = get_db_connection(); cursor = conn.cursor()
+            db_location = utils.format_location_for_db(community_input.primary_location)
+            new_community_id = crud.create_community_db(cursor, name=community_input.name, description=community_input.description, created_by=user_id, primary_location_str=db_location, interest=community_input.interest)
+            if not new_community_id: raise Exception("Failed to create community.")
+            conn.commit()
+            return new_community_id
+        except Exception:
+            if conn: conn.rollback()
+            raise
+        finally:
+            if conn: conn.close()
+
     try:
-        conn = get_db_connection(); cursor = conn.cursor()
-        db_location = utils.format_location_for_db(community_input.primary_location)
-        community_id = crud.create_community_db(cursor, name=community_input.name, description=community_input.description, created_by=user_id, primary_location_str=db_location, interest=community_input.interest)
-        if not community_id: raise Exception("Failed to create community.")
-        conn.commit()
+        community_id = await run_in_db_executor(_create)
         created_community_gql = await get_community_resolver(info, strawberry.ID(str(community_id)))
         if not created_community_gql: raise Exception("Failed to fetch created community.")
         return created_community_gql
     except (ValueError, Exception, psycopg2.Error) as e:
-        if conn: conn.rollback(); print(f"Error in create_community_resolver: {e}"); traceback.print_exc(); detail = f"Could not create community: {e}";
+        print(f"Error in create_community_resolver: {e}"); traceback.print_exc(); detail = f"Could not create community: {e}";
         if hasattr(e, 'pgcode') and e.pgcode == '23505': detail = "Community name already exists."
         raise Exception(detail) from e
-    finally:
-        if conn: conn.close()
 
-async def join_community_resolver(info: Info, community_id: strawberry.ID) -> bool:
+@in_db_executor
+def join_community_resolver(info: Info, community_id: strawberry.ID) -> bool:
     # ... implementation ...
     print(f"GraphQL Mutation: join_community(id={community_id})")
     user_id = _get_authenticated_user_id(info); conn = None
@@ -236,7 +272,8 @@ async def join_community_resolver(info: Info, community_id: strawberry.ID) -> bo
     finally:
         if conn: conn.close()
 
-async def leave_community_resolver(info: Info, community_id: strawberry.ID) -> bool:
+@in_db_executor
+def leave_community_resolver(info: Info, community_id: strawberry.ID) -> bool:
     # ... implementation ...
     print(f"GraphQL Mutation: leave_community(id={community_id})")
     user_id = _get_authenticated_user_id(info); conn = None
@@ -252,24 +289,34 @@ async def leave_community_resolver(info: Info, community_id: strawberry.ID) -> b
 async def create_event_resolver(info: Info, event_input: EventCreateInput) -> EventType:
     # ... implementation ...
     print(f"GraphQL Mutation: create_event")
-    user_id = _get_authenticated_user_id(info); conn = None; event_id = None
+    user_id = _get_authenticated_user_id(info); event_id = None
+
+    def _create() -> int: # Runs in the DB executor
+        conn = None
+        try:
+            conn = get_db_connection(); cursor = conn.cursor()
+            comm = crud.get_community_by_id(cursor, event_input.community_id)
+            if not comm: raise ValueError(f"Community {event_input.community_id} not found.")
+            event_info = crud.create_event_db(cursor, community_id=event_input.community_id, creator_id=user_id, title=event_input.title, description=event_input.description, location=event_input.location, event_timestamp=event_input.event_timestamp, max_participants=event_input.max_participants or 100, image_url=None)
+            if not event_info or 'id' not in event_info: raise Exception("Failed to create event.")
+            conn.commit()
+            return event_info['id']
+        except Exception:
+            if conn: conn.rollback()
+            raise
+        finally:
+            if conn: conn.close()
+
     try:
-        conn = get_db_connection(); cursor = conn.cursor()
-        comm = crud.get_community_by_id(cursor, event_input.community_id)
-        if not comm: raise ValueError(f"Community {event_input.community_id} not found.")
-        event_info = crud.create_event_db(cursor, community_id=event_input.community_id, creator_id=user_id, title=event_input.title, description=event_input.description, location=event_input.location, event_timestamp=event_input.event_timestamp, max_participants=event_input.max_participants or 100, image_url=None)
-        if not event_info or 'id' not in event_info: raise Exception("Failed to create event.")
-        event_id = event_info['id']
-        conn.commit()
+        event_id = await run_in_db_executor(_create)
         created_event_gql = await get_event_resolver(info, strawberry.ID(str(event_id)))
         if not created_event_gql: raise Exception("Failed to fetch created event.")
         return created_event_gql
     except (ValueError, Exception, psycopg2.Error) as e:
-        if conn: conn.rollback(); print(f"Error in create_event_resolver: {e}"); traceback.print_exc(); raise Exception(f"Could not create event: {e}") from e
-    finally:
-        if conn: conn.close()
+        print(f"Error in create_event_resolver: {e}"); traceback.print_exc(); raise Exception(f"Could not create event: {e}") from e
 
-async def join_event_resolver(info: Info, event_id: strawberry.ID) -> bool:
+@in_db_executor
+def join_event_resolver(info: Info, event_id: strawberry.ID) -> bool:
     # ... implementation ...
     print(f"GraphQL Mutation: join_event(id={event_id})")
     user_id = _get_authenticated_user_id(info); conn = None
@@ -284,7 +331,8 @@ async def join_event_resolver(info: Info, event_id: strawberry.ID) -> bool:
     finally:
         if conn: conn.close()
 
-async def leave_event_resolver(info: Info, event_id: strawberry.ID) -> bool:
+@in_db_executor
+def leave_event_resolver(info: Info, event_id: strawberry.ID) -> bool:
     # ... implementation ...
     print(f"GraphQL Mutation: leave_event(id={event_id})")
     user_id = _get_authenticated_user_id(info); conn = None
@@ -297,7 +345,8 @@ async def leave_event_resolver(info: Info, event_id: strawberry.ID) -> bool:
     finally:
         if conn: conn.close()
 
-async def follow_user_resolver(info: Info, user_id: strawberry.ID) -> bool:
+@in_db_executor
+def follow_user_resolver(info: Info, user_id: strawberry.ID) -> bool:
     print(f"GraphQL Mutation: follow_user(id={user_id})")
     follower_id = _get_authenticated_user_id(info) # This is the actor
     conn = None
@@ -346,7 +395,8 @@ async def follow_user_resolver(info: Info, user_id: strawberry.ID) -> bool:
     finally:
         if conn: conn.close()
 
-async def unfollow_user_resolver(info: Info, user_id: strawberry.ID) -> bool:
+@in_db_executor
+def unfollow_user_resolver(info: Info, user_id: strawberry.ID) -> bool:
     # ... implementation ...
     print(f"GraphQL Mutation: unfollow_user(id={user_id})")
     follower_id = _get_authenticated_user_id(info); conn = None
@@ -359,7 +409,8 @@ async def unfollow_user_resolver(info: Info, user_id: strawberry.ID) -> bool:
     finally:
         if conn: conn.close()
 
-async def cast_vote_resolver(info: Info, vote_input: VoteInput) -> bool:
+@in_db_executor
+def cast_vote_resolver(info: Info, vote_input: VoteInput) -> bool:
     # ... implementation ...
     print(f"GraphQL Mutation: cast_vote")
     user_id = _get_authenticated_user_id(info); conn = None
@@ -375,7 +426,8 @@ async def cast_vote_resolver(info: Info, vote_input: VoteInput) -> bool:
     finally:
         if conn: conn.close()
 
-async def remove_vote_resolver(info: Info, post_id: Optional[strawberry.ID] = None, reply_id: Optional[strawberry.ID] = None) -> bool:
+@in_db_executor
+def remove_vote_resolver(info: Info, post_id: Optional[strawberry.ID] = None, reply_id: Optional[strawberry.ID] = None) -> bool:
     # ... implementation ...
     print(f"GraphQL Mutation: remove_vote")
     user_id = _get_authenticated_user_id(info); conn = None
@@ -392,7 +444,8 @@ async def remove_vote_resolver(info: Info, post_id: Optional[strawberry.ID] = No
     finally:
         if conn: conn.close()
 
-async def add_favorite_resolver(info: Info, post_id: Optional[strawberry.ID] = None, reply_id: Optional[strawberry.ID] = None) -> bool:
+@in_db_executor
+def add_favorite_resolver(info: Info, post_id: Optional[strawberry.ID] = None, reply_id: Optional[strawberry.ID] = None) -> bool:
     # ... implementation ...
     print(f"GraphQL Mutation: add_favorite")
     user_id = _get_authenticated_user_id(info); conn = None
@@ -409,7 +462,8 @@ async def add_favorite_resolver(info: Info, post_id: Optional[strawberry.ID] = N
     finally:
         if conn: conn.close()
 
-async def remove_favorite_resolver(info: Info, post_id: Optional[strawberry.ID] = None, reply_id: Optional[strawberry.ID] = None) -> bool:
+@in_db_executor
+def remove_favorite_resolver(info: Info, post_id: Optional[strawberry.ID] = None, reply_id: Optional[strawberry.ID] = None) -> bool:
     # ... implementation ...
     print(f"GraphQL Mutation: remove_favorite")
     user_id = _get_authenticated_user_id(info); conn = None
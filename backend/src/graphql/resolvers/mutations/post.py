@@ -115,7 +115,7 @@ async def _delete_post_impl(info: Info, post_id: strawberry.ID) -> bool:
         deleted = crud.delete_post_db(cursor, post_id_int)
         if not deleted: raise Exception("Post deletion failed.")
         conn.commit()
-        for item in media_to_delete: utils.delete_media_item_db_and_file(item.get("id"), item.get("minio_object_name"))
+        for item in media_to_delete: await utils.delete_media_item_db_and_file_async(item.get("id"), item.get("minio_object_name"))
         return True
     except (ValueError, Exception, psycopg2.Error) as e:
         if conn: conn.rollback()
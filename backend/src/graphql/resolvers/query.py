@@ -7,7 +7,7 @@ from strawberry.types import Info
 
 # --- Local Imports ---
 from ... import crud, utils, schemas
-from ...database import get_db_connection
+from ...database import get_db_connection, in_db_executor
 # Import GQL Types needed for return types (from the new structure)
 from ..types import UserType, CommunityType, PostType, ReplyType, EventType
 # Import Mapping functions
@@ -37,7 +37,8 @@ def _get_viewer_status_for_item(cursor, viewer_id: Optional[int], post_id: Optio
 # Note: These functions are now standalone async functions.
 # Strawberry will automatically map them to fields in the Query class below.
 
-async def get_user_resolver(info: Info, id: strawberry.ID) -> Optional[UserType]:
+@in_db_executor # Blocking psycopg2 work runs in the DB thread pool
+def get_user_resolver(info: Info, id: strawberry.ID) -> Optional[UserType]:
     """ Fetches a specific user by their ID, including counts and viewer follow status. """
     print(f"GraphQL Resolver: get_user(id={id})")
     conn = None
@@ -70,7 +71,8 @@ async def get_viewer(info: Info) -> Optional[UserType]:
         return None # Return None if not authenticated
     return await get_user_resolver(info, strawberry.ID(str(viewer_id)))
 
-async def get_posts_resolver(info: Info, id: strawberry.ID) -> Optional[PostType]:
+@in_db_executor
+def get_posts_resolver(info: Info, id: strawberry.ID) -> Optional[PostType]:
     """ Fetches a single post by ID. """
     print(f"GraphQL Resolver: get_post(id={id})")
     conn = None
@@ -116,7 +118,8 @@ async def get_posts_resolver(info: Info, id: strawberry.ID) -> Optional[PostType
     finally:
         if conn: conn.close()
 
-async def get_post_resolver(info: Info, id: strawberry.ID) -> Optional[PostType]:
+@in_db_executor
+def get_post_resolver(info: Info, id: strawberry.ID) -> Optional[PostType]:
     """ Fetches a single post by ID. """
     print(f"GraphQL Resolver: get_post(id={id})")
     conn = None
@@ -146,7 +149,8 @@ async def get_post_resolver(info: Info, id: strawberry.ID) -> Optional[PostType]
     finally:
         if conn: conn.close()
 
-async def get_community_resolver(info: Info, id: strawberry.ID) -> Optional[CommunityType]:
+@in_db_executor
+def get_community_resolver(info: Info, id: strawberry.ID) -> Optional[CommunityType]:
     """ Fetches a specific community by ID, including counts and viewer status. """
     print(f"GraphQL Resolver: get_community(id={id})")
     conn = None
@@ -168,7 +172,8 @@ async def get_community_resolver(info: Info, id: strawberry.ID) -> Optional[Comm
     finally:
         if conn: conn.close()
 
-async def get_communities(info: Info, limit: int = 50, offset: int = 0) -> List[CommunityType]:
+@in_db_executor
+def get_communities(info: Info, limit: int = 50, offset: int = 0) -> List[CommunityType]:
     """ Fetches a list of all communities. """
     print(f"GraphQL Resolver: get_communities (Limit: {limit})")
     conn = None
@@ -177,15 +182,14 @@ async def get_communities(info: Info, limit: int = 50, offset: int = 0) -> List[
         conn = get_db_connection(); cursor = conn.cursor()
         db_communities = crud.get_communities_db(cursor) # Add limit/offset here?
         gql_communities: List[CommunityType] = []
-        for db_comm in db_communities[offset:offset+limit]:
+        page = db_communities[offset:offset+limit]
+        member_of = crud.get_member_community_ids(cursor, viewer_id, [c['id'] for c in page]) if viewer_id else set()
+        for db_comm in page:
             comm_id = db_comm['id']
             # Augment N+1
             counts = crud.get_community_counts(cursor, comm_id)
             logo_media = crud.get_community_logo_media(cursor, comm_id)
-            is_member = None
-            if viewer_id:
-                try: is_member = crud.check_is_member(cursor, viewer_id, comm_id)
-                except Exception: pass
+            is_member = (comm_id in member_of) if viewer_id else None
             gql_comm = map_db_community_to_gql_community(db_comm, counts=counts, logo_media=logo_media, is_member_by_viewer=is_member)
             if gql_comm: gql_communities.append(gql_comm)
         return gql_communities
@@ -193,7 +197,8 @@ async def get_communities(info: Info, limit: int = 50, offset: int = 0) -> List[
     finally:
         if conn: conn.close()
 
-async def get_trending_communities_resolver(info: Info, limit: int = 15) -> List[CommunityType]:
+@in_db_executor
+def get_trending_communities_resolver(info: Info, limit: int = 15) -> List[CommunityType]:
     """ Fetches trending communities. """
     print(f"GraphQL Resolver: get_trending_communities (Limit: {limit})")
     conn = None
@@ -202,15 +207,13 @@ async def get_trending_communities_resolver(info: Info, limit: int = 15) -> List
         conn = get_db_connection(); cursor = conn.cursor()
         db_communities = crud.get_trending_communities_db(cursor) # Limit applied in CRUD
         gql_communities: List[CommunityType] = []
+        member_of = crud.get_member_community_ids(cursor, viewer_id, [c['id'] for c in db_communities]) if viewer_id else set()
         for db_comm in db_communities:
             comm_id = db_comm['id']
             # Augment N+1
             counts = crud.get_community_counts(cursor, comm_id)
             logo_media = crud.get_community_logo_media(cursor, comm_id)
-            is_member = None
-            if viewer_id:
-                try: is_member = crud.check_is_member(cursor, viewer_id, comm_id)
-                except Exception: pass
+            is_member = (comm_id in member_of) if viewer_id else None
             combined_data = dict(db_comm); combined_data.update(counts) # Combine counts
             gql_comm = map_db_community_to_gql_community(combined_data, counts=combined_data, logo_media=logo_media, is_member_by_viewer=is_member)
             if gql_comm: gql_communities.append(gql_comm)
@@ -219,7 +222,8 @@ async def get_trending_communities_resolver(info: Info, limit: int = 15) -> List
     finally:
         if conn: conn.close()
 
-async def get_event_resolver(info: Info, id: strawberry.ID) -> Optional[EventType]:
+@in_db_executor
+def get_event_resolver(info: Info, id: strawberry.ID) -> Optional[EventType]:
     """ Fetches a specific event by ID, including counts and viewer status. """
     print(f"GraphQL Resolver: get_event(id={id})")
     conn = None
@@ -240,7 +244,8 @@ async def get_event_resolver(info: Info, id: strawberry.ID) -> Optional[EventTyp
     finally:
         if conn: conn.close()
 
-async def get_replies_resolver(
+@in_db_executor
+def get_replies_resolver(
         info: Info, post_id: int, limit: int = 20, offset: int = 0,
         viewer_id_if_different: Optional[int] = None # Not typically needed here
 ) -> List[ReplyType]:
@@ -253,15 +258,17 @@ async def get_replies_resolver(
         replies_db = crud.get_replies_for_post_db(cursor, post_id) # Includes counts, basic author
         gql_replies: List[ReplyType] = []
         paginated_replies = replies_db[offset : offset + limit]
+        viewer_statuses = crud.get_item_viewer_statuses(cursor, viewer_id, [r['id'] for r in paginated_replies], "Reply")
         for db_reply_dict in paginated_replies:
             reply_id = db_reply_dict['id']
-            viewer_status = _get_viewer_status_for_item(cursor, viewer_id, reply_id=reply_id)
+            viewer_status = viewer_statuses[reply_id]
             try: # Fetch media
                 db_media = crud.get_media_items_for_reply(cursor, reply_id)
                 gql_media = [map_db_media_to_gql_media(m) for m in db_media]
                 media_list = [m for m in gql_media if m is not None]
             except Exception as e: print(f"WARN GQL replies: Failed getting media R:{reply_id}: {e}"); media_list = []
-            gql_reply = map_db_reply_to_gql_reply(db_reply_dict, viewer_vote_status=viewer_status['vote_type'], viewer_favorite_status=viewer_status['is_favorited'])
+            viewer_vote = {'UP': True, 'DOWN': False}.get(viewer_status['viewer_vote_type'])
+            gql_reply = map_db_reply_to_gql_reply(db_reply_dict, viewer_vote_status=viewer_vote, viewer_favorite_status=viewer_status['viewer_has_favorited'])
             if gql_reply:
                 gql_reply.media = media_list # Assign mapped media
                 gql_replies.append(gql_reply)
@@ -270,7 +277,8 @@ async def get_replies_resolver(
     finally:
         if conn: conn.close()
 
-async def get_reply_resolver(info: Info, id: strawberry.ID) -> Optional[ReplyType]:
+@in_db_executor
+def get_reply_resolver(info: Info, id: strawberry.ID) -> Optional[ReplyType]:
     """ Fetches a single reply by ID. """
     print(f"GraphQL Resolver: get_reply(id={id})")
     conn = None
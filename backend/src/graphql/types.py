@@ -10,7 +10,17 @@ from aiodataloader import DataLoader
 from strawberry.types import Info
 
 from .. import crud, utils
-from ..database import get_db_connection
+from ..database import get_db_connection, run_in_db_executor
+
+async def _fetch_ids(crud_fn, *args) -> List[int]:
+    """ Runs a crud id-lookup on a pooled connection in the DB executor (keeps the loop free). """
+    def _run():
+        conn = get_db_connection()
+        try:
+            return crud_fn(conn.cursor(), *args)
+        finally:
+            conn.close()
+    return await run_in_db_executor(_run)
 
 # --- Common Types ---
 
@@ -19,6 +29,14 @@ class LocationType:
     longitude: float
     latitude: float
 
+@strawberry.type
+class MediaVariantType:
+    name: str
+    url: str = strawberry.field(description="Pre-signed URL")
+    width: Optional[int] = None
+    height: Optional[int] = None
+    mime_type: Optional[str] = None
+
 @strawberry.type
 class MediaItemDisplay:
     id: strawberry.ID
@@ -30,6 +48,7 @@ class MediaItemDisplay:
     height: Optional[int] = None
     duration_seconds: Optional[float] = None
     created_at: datetime
+    variants: List[MediaVariantType] = strawberry.field(default_factory=list, description="Resized renditions, smallest first")
 
 @strawberry.enum
 class VoteTypeEnum(enum.Enum):
@@ -128,11 +147,7 @@ class UserType:
         loader = info.context.get("post_loader")
         if not loader:
             raise Exception("Post DataLoader not found.")
-        conn = get_db_connection()
-        try:
-            ids = crud.get_post_ids_by_user(conn.cursor(), int(self.id), limit, offset)
-        finally:
-            conn.close()
+        ids = await _fetch_ids(crud.get_post_ids_by_user, int(self.id), limit, offset)
         return [p for p in await loader.load_many(ids) if p]
 
     @strawberry.field
@@ -140,11 +155,7 @@ class UserType:
         loader = info.context.get("community_loader")
         if not loader:
             raise Exception("Community DataLoader not found.")
-        conn = get_db_connection()
-        try:
-            ids = crud.get_community_ids_joined_by_user(conn.cursor(), int(self.id), limit, offset)
-        finally:
-            conn.close()
+        ids = await _fetch_ids(crud.get_community_ids_joined_by_user, int(self.id), limit, offset)
         return [c for c in await loader.load_many(ids) if c]
 
     @strawberry.field
@@ -152,11 +163,7 @@ class UserType:
         loader = info.context.get("event_loader")
         if not loader:
             raise Exception("Event DataLoader not found.")
-        conn = get_db_connection()
-        try:
-            ids = crud.get_event_ids_participated_by_user(conn.cursor(), int(self.id), limit, offset)
-        finally:
-            conn.close()
+        ids = await _fetch_ids(crud.get_event_ids_participated_by_user, int(self.id), limit, offset)
         return [e for e in await loader.load_many(ids) if e]
 
 @strawberry.type
@@ -181,31 +188,19 @@ class CommunityType:
     @strawberry.field
     async def posts(self, info: Info, limit: int = 10, offset: int = 0) -> List[PostType]:
         loader = info.context.get("post_loader")
-        conn = get_db_connection()
-        try:
-            ids = crud.get_post_ids_for_community(conn.cursor(), int(self.id), limit, offset)
-        finally:
-            conn.close()
+        ids = await _fetch_ids(crud.get_post_ids_for_community, int(self.id), limit, offset)
         return [p for p in await loader.load_many(ids) if p]
 
     @strawberry.field
     async def members(self, info: Info, limit: int = 10, offset: int = 0) -> List[UserType]:
         loader = info.context.get("user_loader")
-        conn = get_db_connection()
-        try:
-            ids = crud.get_community_member_ids(conn.cursor(), int(self.id), limit, offset)
-        finally:
-            conn.close()
+        ids = await _fetch_ids(crud.get_community_member_ids, int(self.id), limit, offset)
         return [u for u in await loader.load_many(ids) if u]
 
     @strawberry.field
     async def events(self, info: Info, limit: int = 10, offset: int = 0) -> List[EventType]:
         loader = info.context.get("event_loader")
-        conn = get_db_connection()
-        try:
-            ids = crud.get_community_event_ids(conn.cursor(), int(self.id), limit, offset)
-        finally:
-            conn.close()
+        ids = await _fetch_ids(crud.get_community_event_ids, int(self.id), limit, offset)
         return [e for e in await loader.load_many(ids) if e]
 
 @strawberry.type
@@ -236,11 +231,7 @@ class EventType:
     @strawberry.field
     async def participants(self, info: Info, limit: int = 10, offset: int = 0) -> List[UserType]:
         loader = info.context.get("user_loader")
-        conn = get_db_connection()
-        try:
-            ids = crud.get_event_participant_ids(conn.cursor(), int(self.id), limit, offset)
-        finally:
-            conn.close()
+        ids = await _fetch_ids(crud.get_event_participant_ids, int(self.id), limit, offset)
         return [u for u in await loader.load_many(ids) if u]
 
 @strawberry.type
@@ -273,11 +264,7 @@ class PostType:
     @strawberry.field
     async def replies(self, info: Info, limit: int = 10, offset: int = 0) -> List[ReplyType]:
         loader = info.context.get("reply_loader")
-        conn = get_db_connection()
-        try:
-            ids = crud.get_reply_ids_for_post(conn.cursor(), int(self.id), limit, offset)
-        finally:
-            conn.close()
+        ids = await _fetch_ids(crud.get_reply_ids_for_post, int(self.id), limit, offset)
         return [r for r in await loader.load_many(ids) if r]
 
     @strawberry.field
@@ -0,0 +1,117 @@
+# backend/src/image_variants.py
+import io
+import os
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Optional, Dict, Any, List
+
+from PIL import Image, ImageOps, features
+
+# =========================================
+# Image variants (thumb/medium/large renditions of uploaded images)
+# =========================================
+# Rendering is CPU-bound, so it runs in a process pool instead of the upload/DB threads.
+# Each image is decoded once; variants are resized largest-first from the previous rendition,
+# re-encoded without EXIF/XMP, and never upscaled.
+
+# name:longest-edge pairs
+MEDIA_VARIANT_SIZES: Dict[str, int] = {
+    name.strip(): int(edge)
+    for name, edge in (pair.split(":") for pair in os.getenv("MEDIA_VARIANT_SIZES", "thumb:160,medium:640,large:1280").split(",") if pair.strip())
+}
+MEDIA_VARIANT_FORMAT = os.getenv("MEDIA_VARIANT_FORMAT", "webp").lower() # webp | jpeg
+if MEDIA_VARIANT_FORMAT == "webp" and not features.check("webp"): MEDIA_VARIANT_FORMAT = "jpeg"
+MEDIA_VARIANT_QUALITY = int(os.getenv("MEDIA_VARIANT_QUALITY", 80))
+MEDIA_VARIANT_WORKERS = int(os.getenv("MEDIA_VARIANT_WORKERS", 2))
+# Decompression bomb guard; larger images keep only their original
+MEDIA_VARIANT_MAX_PIXELS = int(os.getenv("MEDIA_VARIANT_MAX_PIXELS", 50_000_000))
+# Animated GIFs and formats Pillow cannot decode are left alone
+MEDIA_VARIANT_MIME_TYPES = {"image/jpeg", "image/png", "image/webp", "image/gif", "image/bmp", "image/tiff"}
+
+_FORMATS = {"webp": ("WEBP", "image/webp", "webp"), "jpeg": ("JPEG", "image/jpeg", "jpg")}
+
+_media_executor: Optional[ProcessPoolExecutor] = None
+# Download/upload/DB side of each job; one thread per render process, kept apart from the upload
+# executor so a burst of images never delays request-path uploads
+_media_job_executor: Optional[ThreadPoolExecutor] = None
+_media_executor_lock = threading.Lock()
+
+def get_media_executor() -> ProcessPoolExecutor:
+    global _media_executor
+    if _media_executor is None:
+        with _media_executor_lock:
+            if _media_executor is None:
+                # spawn: forking a process that runs threads (uvicorn, DB/upload pools) is unsafe
+                _media_executor = ProcessPoolExecutor(max_workers=MEDIA_VARIANT_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _media_executor
+
+def get_media_job_executor() -> ThreadPoolExecutor:
+    global _media_job_executor
+    if _media_job_executor is None:
+        with _media_executor_lock:
+            if _media_job_executor is None:
+                _media_job_executor = ThreadPoolExecutor(max_workers=MEDIA_VARIANT_WORKERS, thread_name_prefix="media-variants")
+    return _media_job_executor
+
+def shutdown_media_executor():
+    global _media_executor, _media_job_executor
+    with _media_executor_lock:
+        if _media_job_executor is not None: # Jobs first: they wait on the process pool
+            _media_job_executor.shutdown(wait=True)
+            _media_job_executor = None
+        if _media_executor is not None:
+            _media_executor.shutdown(wait=True)
+            _media_executor = None
+
+# --- Rendering (runs in the process pool; pure bytes in, bytes out) ---
+def render_variants(
+        data: bytes,
+        sizes: Dict[str, int],
+        fmt: str = "webp",
+        quality: int = 80,
+        max_pixels: int = 50_000_000
+) -> Optional[Dict[str, Any]]:
+    """
+    Decodes an image once and encodes one rendition per entry in `sizes` (longest edge).
+    Returns {width, height, variants: [{name, width, height, mime_type, data}]} where width/height
+    are the upright original dimensions, or None for animated or oversized images.
+    Renditions that would not be smaller than a larger one already produced are skipped.
+    """
+    pil_format, mime_type, _ = _FORMATS[fmt]
+    with Image.open(io.BytesIO(data)) as img:
+        if getattr(img, "is_animated", False): return None
+        if img.width * img.height > max_pixels: return None
+        width, height = img.size
+        if img.getexif().get(0x0112, 1) in (5, 6, 7, 8): width, height = height, width # Rotated 90/270
+
+        largest = max(sizes.values())
+        img.draft("RGB", (largest, largest)) # JPEG: decode at a reduced DCT scale when much larger
+        base = ImageOps.exif_transpose(img)
+        icc_profile = img.info.get("icc_profile")
+
+    has_alpha = base.mode in ("RGBA", "LA") or (base.mode == "P" and "transparency" in base.info)
+    base = base.convert("RGBA" if has_alpha and pil_format == "WEBP" else "RGB")
+    base.info = {} # Drop EXIF/XMP/comments carried over from the source
+
+    variants: List[Dict[str, Any]] = []
+    current = base
+    for name, edge in sorted(sizes.items(), key=lambda item: item[1], reverse=True):
+        scale = min(edge / max(current.size), 1.0)
+        target = (max(1, round(current.width * scale)), max(1, round(current.height * scale)))
+        if variants and target == (variants[-1]["width"], variants[-1]["height"]): continue
+        if target != current.size: current = current.resize(target, Image.Resampling.LANCZOS, reducing_gap=3.0)
+        out = io.BytesIO()
+        save_kwargs = {"quality": quality, "icc_profile": icc_profile}
+        if pil_format == "WEBP": save_kwargs["method"] = 4
+        else: save_kwargs.update(optimize=True, progressive=True)
+        current.save(out, format=pil_format, **{k: v for k, v in save_kwargs.items() if v is not None})
+        variants.append({"name": name, "width": current.width, "height": current.height, "mime_type": mime_type, "data": out.getvalue()})
+    return {"width": width, "height": height, "variants": variants}
+
+def variant_object_name(object_name: str, variant_name: str, fmt: str = MEDIA_VARIANT_FORMAT) -> str:
+    """media/posts/7/abc.jpg -> media/posts/7/abc.jpg.variants/thumb.webp (deleted with the original)"""
+    return f"{variant_prefix(object_name)}{variant_name}.{_FORMATS[fmt][2]}"
+
+def variant_prefix(object_name: str) -> str:
+    return f"{object_name}.variants/"
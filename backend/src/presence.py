@@ -0,0 +1,216 @@
+# backend/src/presence.py
+import os
+import json
+import asyncio
+import uuid
+from typing import Dict, Set, Optional, Any, Callable, Awaitable
+
+from . import database
+from .backplane import WS_BACKPLANE
+
+# =========================================
+# Live presence for WebSocket rooms
+# =========================================
+# ConnectionManager reports every socket join/leave here. We keep room -> users and user -> rooms
+# indexes (with socket counts, so a user with two tabs stays online until both close), which makes
+# online_count(room_key) a dict lookup. Community/event responses read it instead of the DB.
+#
+# Changes are announced to the room as {"type": "presence_update", "room_key", "online_count"} frames
+# (the shape frontend/lib/services/websocket_service.dart parses), debounced so a burst of
+# joins/leaves costs one frame per room. With WS_BACKPLANE=postgres each worker also writes its
+# per-room counts to ws_presence (sql/ws_presence.sql) every WS_PRESENCE_SYNC_SECONDS and reads the
+# other workers' totals back; a user connected to two workers counts once per worker.
+
+WS_PRESENCE_DEBOUNCE_SECONDS = float(os.getenv("WS_PRESENCE_DEBOUNCE_SECONDS", 1))
+WS_PRESENCE_SYNC_SECONDS = float(os.getenv("WS_PRESENCE_SYNC_SECONDS", 5))
+# Rows from workers that stopped syncing (crashed) are ignored after this many sync intervals
+WS_PRESENCE_STALE_INTERVALS = 3
+
+Announce = Callable[[str, str], Awaitable[None]] # (message, room_key), e.g. ConnectionManager.broadcast
+
+
+def community_room(community_id: int) -> str:
+    return f"community_{community_id}"
+
+
+def event_room(event_id: int) -> str:
+    return f"event_{event_id}"
+
+
+def user_room(user_id: int) -> str:
+    """Private room every authenticated socket joins; per-user pushes (unread counts) go here."""
+    return f"user_{user_id}"
+
+
+def presence_frame(room_key: str, online_count: int) -> str:
+    """Wire format of a presence announcement; the app matches on type "presence_update" and "room_key"."""
+    return json.dumps({"type": "presence_update", "room_key": room_key, "online_count": online_count})
+
+
+def is_presence_room(room_key: str) -> bool:
+    return not room_key.startswith("user_")
+
+
+class PresenceTracker:
+    def __init__(self, node_id: Optional[str] = None, shared: bool = False):
+        self.node_id = node_id or uuid.uuid4().hex
+        self.shared = shared
+        self.stats: Dict[str, int] = {"announcements": 0, "syncs": 0, "sync_failures": 0}
+        self._room_users: Dict[str, Dict[int, int]] = {} # room_key -> user_id -> sockets
+        self._user_rooms: Dict[int, Dict[str, int]] = {} # user_id -> room_key -> sockets
+        self._remote_counts: Dict[str, int] = {} # room_key -> users on other workers (shared mode)
+        self._announced: Dict[str, int] = {} # Last online_count sent to each room
+        self._dirty: Set[str] = set()
+        self._announce: Optional[Announce] = None
+        self._debounce: Optional[asyncio.TimerHandle] = None
+        self._sync_task: Optional[asyncio.Task] = None
+
+    # --- Index maintenance (event loop only) ---
+    def join(self, room_key: str, user_id: int):
+        users = self._room_users.setdefault(room_key, {})
+        users[user_id] = users.get(user_id, 0) + 1
+        rooms = self._user_rooms.setdefault(user_id, {})
+        rooms[room_key] = rooms.get(room_key, 0) + 1
+        if users[user_id] == 1: self._mark_dirty(room_key) # User came online in this room
+
+    def leave(self, room_key: str, user_id: int):
+        users = self._room_users.get(room_key)
+        if not users or user_id not in users: return
+        users[user_id] -= 1
+        rooms = self._user_rooms[user_id]
+        rooms[room_key] -= 1
+        if rooms[room_key] == 0: del rooms[room_key]
+        if not rooms: del self._user_rooms[user_id]
+        if users[user_id] == 0:
+            del users[user_id]
+            if not users: del self._room_users[room_key]
+            self._mark_dirty(room_key)
+
+    # --- Reads (safe from DB executor threads) ---
+    def online_count(self, room_key: str) -> int:
+        return len(self._room_users.get(room_key, ())) + self._remote_counts.get(room_key, 0)
+
+    def local_online_count(self, room_key: str) -> int:
+        return len(self._room_users.get(room_key, ()))
+
+    def users_in_room(self, room_key: str) -> Set[int]:
+        return set(self._room_users.get(room_key, ()))
+
+    def rooms_for_user(self, user_id: int) -> Set[str]:
+        return set(self._user_rooms.get(user_id, ()))
+
+    def is_online(self, user_id: int) -> bool:
+        return user_id in self._user_rooms
+
+    # --- Debounced announcements ---
+    def _mark_dirty(self, room_key: str):
+        self._dirty.add(room_key)
+        if self._announce is None or self._debounce is not None: return
+        try: loop = asyncio.get_running_loop()
+        except RuntimeError: return # Called outside the loop; picked up by the next change or sync
+        self._debounce = loop.call_later(WS_PRESENCE_DEBOUNCE_SECONDS, self._flush_dirty)
+
+    def _flush_dirty(self):
+        self._debounce = None
+        dirty, self._dirty = self._dirty, set()
+        for room_key in dirty:
+            count = self.online_count(room_key)
+            if self._announced.get(room_key) == count: continue
+            if self.local_online_count(room_key) == 0: # No local listeners left to tell
+                self._announced.pop(room_key, None); continue
+            self._announced[room_key] = count
+            self.stats["announcements"] += 1
+            message = presence_frame(room_key, count)
+            asyncio.ensure_future(self._announce(message, room_key))
+
+    # --- Lifecycle ---
+    async def start(self, announce: Announce):
+        self._announce = announce
+        if self._dirty: self._mark_dirty(next(iter(self._dirty)))
+        if self.shared and WS_PRESENCE_SYNC_SECONDS > 0 and self._sync_task is None:
+            self._sync_task = asyncio.create_task(self._sync_forever())
+
+    async def stop(self):
+        if self._debounce is not None: self._debounce.cancel(); self._debounce = None
+        if self._sync_task is not None:
+            self._sync_task.cancel()
+            try: await self._sync_task
+            except asyncio.CancelledError: pass
+            self._sync_task = None
+            try: await database.run_in_background_executor(self._clear_shared_counts)
+            except Exception as e: print(f"--- Presence WARNING --- Could not clear shared counts: {e}")
+        self._announce = None
+
+    # --- Shared counters (multi-worker) ---
+    async def _sync_forever(self):
+        while True:
+            local = {room_key: len(users) for room_key, users in self._room_users.items()}
+            try:
+                remote = await database.run_in_background_executor(self._sync_shared_counts, local)
+                self.stats["syncs"] += 1
+                for room_key in remote.keys() | self._remote_counts.keys():
+                    if remote.get(room_key, 0) != self._remote_counts.get(room_key, 0): self._mark_dirty(room_key)
+                self._remote_counts = remote
+            except Exception as e:
+                self.stats["sync_failures"] += 1
+                print(f"--- Presence WARNING --- Shared count sync failed ({type(e).__name__}: {e})")
+            await asyncio.sleep(WS_PRESENCE_SYNC_SECONDS)
+
+    def _sync_shared_counts(self, local: Dict[str, int]) -> Dict[str, int]:
+        """Blocking: replaces this node's rows in ws_presence and returns other nodes' live totals per room."""
+        conn = None
+        try:
+            conn = database.get_db_connection()
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM public.ws_presence WHERE node_id = %s;", (self.node_id,))
+            if local:
+                cursor.execute(
+                    """
+                    INSERT INTO public.ws_presence (node_id, room_key, online_count, updated_at)
+                    SELECT %s, room_key, online_count, NOW()
+                    FROM unnest(%s::text[], %s::int[]) AS t(room_key, online_count);
+                    """,
+                    (self.node_id, list(local.keys()), list(local.values()))
+                )
+            cursor.execute(
+                """
+                SELECT room_key, SUM(online_count)::int AS online_count FROM public.ws_presence
+                WHERE node_id <> %s AND updated_at > NOW() - make_interval(secs => %s)
+                GROUP BY room_key;
+                """,
+                (self.node_id, WS_PRESENCE_SYNC_SECONDS * WS_PRESENCE_STALE_INTERVALS)
+            )
+            remote = {row['room_key']: row['online_count'] for row in cursor.fetchall()}
+            conn.commit()
+            return remote
+        except Exception:
+            if conn: conn.rollback()
+            raise
+        finally:
+            if conn: conn.close()
+
+    def _clear_shared_counts(self):
+        conn = None
+        try:
+            conn = database.get_db_connection()
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM public.ws_presence WHERE node_id = %s;", (self.node_id,))
+            conn.commit()
+        except Exception:
+            if conn: conn.rollback()
+            raise
+        finally:
+            if conn: conn.close()
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return {
+            "shared": self.shared,
+            "rooms": len(self._room_users),
+            "online_users": len(self._user_rooms),
+            "remote_rooms": len(self._remote_counts),
+            **self.stats,
+        }
+
+
+# Process-wide tracker fed by connection_manager.manager; crud reads online counts from it
+tracker = PresenceTracker(shared=(WS_BACKPLANE == "postgres"))
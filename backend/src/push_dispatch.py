@@ -0,0 +1,288 @@
+# backend/src/push_dispatch.py
+import os
+import time
+import asyncio
+import traceback
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, List, Dict, Any, Callable, Set
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from . import crud, database
+
+# =========================================
+# Device push dispatch
+# =========================================
+# create_notification hands every newly committed notification to dispatcher.enqueue() (from an
+# after-commit hook, so possibly on a DB executor thread). A flusher task collects what arrives within
+# PUSH_FLUSH_MS, loads all recipients' device tokens in one query per notification type (users who
+# turned that type off are filtered out there), groups the messages by platform, and sends them in
+# PUSH_BATCH_SIZE chunks, up to PUSH_MAX_PARALLEL chunks at a time, through the configured provider.
+# Afterwards one transaction refreshes last_used_at for delivered tokens and deletes the tokens the
+# provider reported as invalid. Chunks the provider asks to retry are resent up to PUSH_MAX_ATTEMPTS.
+#
+# PUSH_PROVIDER: "none" (default, nothing is queued), "stub" (records sends in memory; local dev and
+# benchmarks/push_dispatch.py) or "webhook" (POSTs each chunk as JSON to PUSH_WEBHOOK_URL, e.g. a
+# small gateway in front of APNs/FCM).
+
+PUSH_PROVIDER = os.getenv("PUSH_PROVIDER", "none").lower()
+PUSH_WEBHOOK_URL = os.getenv("PUSH_WEBHOOK_URL")
+PUSH_BATCH_SIZE = int(os.getenv("PUSH_BATCH_SIZE", 500)) # Messages per provider request
+PUSH_MAX_PARALLEL = int(os.getenv("PUSH_MAX_PARALLEL", 8)) # Provider requests in flight
+PUSH_FLUSH_MS = float(os.getenv("PUSH_FLUSH_MS", 50)) # Max wait after the first queued notification
+PUSH_QUEUE_SIZE = int(os.getenv("PUSH_QUEUE_SIZE", 10000)) # Notifications beyond this are dropped, not pushed
+PUSH_MAX_ATTEMPTS = int(os.getenv("PUSH_MAX_ATTEMPTS", 3))
+PUSH_RETRY_BACKOFF_MS = float(os.getenv("PUSH_RETRY_BACKOFF_MS", 200)) # Multiplied by the attempt number
+
+# Per-message outcomes a provider reports, in request order
+PUSH_OK, PUSH_INVALID, PUSH_RETRY, PUSH_FAILED = "ok", "invalid", "retry", "failed"
+
+
+# --- Providers ---
+class PushProvider(ABC):
+    """Sends one chunk of messages for one platform. Blocking; runs on the dispatcher's thread pool."""
+    @abstractmethod
+    def send(self, platform: str, messages: List[Dict[str, Any]]) -> List[str]:
+        """One result (PUSH_OK / PUSH_INVALID / PUSH_RETRY / PUSH_FAILED) per message, in order."""
+
+
+class StubPushProvider(PushProvider):
+    """Delivers nothing; records each request. latency_ms simulates the provider's round trip."""
+    def __init__(self, latency_ms: float = 0, invalid_tokens: Optional[Set[str]] = None):
+        self.latency_ms = latency_ms
+        self.invalid_tokens = set(invalid_tokens or ())
+        self.requests: List[Dict[str, Any]] = []
+
+    def send(self, platform: str, messages: List[Dict[str, Any]]) -> List[str]:
+        if self.latency_ms: time.sleep(self.latency_ms / 1000)
+        self.requests.append({"platform": platform, "messages": messages})
+        return [PUSH_INVALID if m["device_token"] in self.invalid_tokens else PUSH_OK for m in messages]
+
+
+class WebhookPushProvider(PushProvider):
+    """POSTs {"platform", "messages": [...]} and expects {"results": ["ok" | "invalid" | "retry", ...]}."""
+    def __init__(self, url: str, timeout: float = 10):
+        self.url = url
+        self.timeout = timeout
+        self.session = requests.Session() # Keep-alive connections, one pool slot per parallel sender
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=PUSH_MAX_PARALLEL)
+        self.session.mount("http://", adapter); self.session.mount("https://", adapter)
+
+    def send(self, platform: str, messages: List[Dict[str, Any]]) -> List[str]:
+        payload = {"platform": platform, "messages": [
+            {"token": m["device_token"], "title": m["title"], "body": m["body"], "data": m["data"]} for m in messages
+        ]}
+        try:
+            response = self.session.post(self.url, json=payload, timeout=self.timeout)
+        except requests.RequestException as e:
+            print(f"Push WARNING: {platform} request failed ({type(e).__name__}: {e})")
+            return [PUSH_RETRY] * len(messages)
+        if response.status_code >= 500 or response.status_code == 429:
+            return [PUSH_RETRY] * len(messages)
+        if response.status_code >= 400:
+            print(f"Push WARNING: {platform} request rejected ({response.status_code}): {response.text[:200]}")
+            return [PUSH_FAILED] * len(messages)
+        try: body = response.json()
+        except ValueError: # Not JSON: resending would get the same answer
+            print(f"Push WARNING: {platform} response is not JSON ({response.status_code}): {response.text[:200]}")
+            return [PUSH_FAILED] * len(messages)
+        results = (body.get("results") if isinstance(body, dict) else None) or []
+        return (results + [PUSH_FAILED] * len(messages))[:len(messages)]
+
+
+def create_push_provider() -> Optional[PushProvider]:
+    if PUSH_PROVIDER == "stub": return StubPushProvider()
+    if PUSH_PROVIDER == "webhook":
+        if not PUSH_WEBHOOK_URL:
+            print("--- Push WARNING --- PUSH_PROVIDER=webhook but PUSH_WEBHOOK_URL is not set; pushes disabled.")
+            return None
+        return WebhookPushProvider(PUSH_WEBHOOK_URL)
+    if PUSH_PROVIDER != "none": print(f"--- Push WARNING --- Unknown PUSH_PROVIDER '{PUSH_PROVIDER}'; pushes disabled.")
+    return None
+
+
+# --- DB steps (blocking; run in the background DB executor) ---
+def _build_message(notification: Dict[str, Any], target: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "token_id": target["id"], "user_id": target["user_id"],
+        "device_token": target["device_token"], "platform": target["platform"],
+        "title": notification["type"].replace("_", " ").capitalize(),
+        "body": notification.get("content_preview") or "",
+        "data": {
+            "notification_id": notification.get("id"), "type": notification["type"],
+            "related_entity_type": notification.get("related_entity_type"),
+            "related_entity_id": notification.get("related_entity_id"),
+        },
+    }
+
+
+def _load_targets(notifications: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """One token query per notification type in the batch; returns one message per (notification, device)."""
+    by_type: Dict[str, List[Dict[str, Any]]] = {}
+    for n in notifications: by_type.setdefault(n["type"], []).append(n)
+    conn = None
+    try:
+        conn = database.get_db_connection()
+        cursor = conn.cursor()
+        messages = []
+        for notification_type, group in by_type.items():
+            tokens_by_user: Dict[int, List[Dict[str, Any]]] = {}
+            for target in crud.get_push_targets(cursor, list({n["recipient_user_id"] for n in group}), notification_type):
+                tokens_by_user.setdefault(target["user_id"], []).append(target)
+            for n in group:
+                messages.extend(_build_message(n, t) for t in tokens_by_user.get(n["recipient_user_id"], ()))
+        return messages
+    finally:
+        if conn: conn.close()
+
+
+def _record_results(delivered_token_ids: List[int], invalid_token_ids: List[int]):
+    conn = None
+    try:
+        conn = database.get_db_connection()
+        cursor = conn.cursor()
+        crud.record_push_results(cursor, delivered_token_ids, invalid_token_ids)
+        conn.commit()
+    except Exception:
+        if conn: conn.rollback()
+        raise
+    finally:
+        if conn: conn.close()
+
+
+# --- Dispatcher ---
+class PushDispatcher:
+    def __init__(self, provider: Optional[PushProvider] = None,
+                 load_targets: Callable[[List[Dict[str, Any]]], List[Dict[str, Any]]] = _load_targets,
+                 record_results: Callable[[List[int], List[int]], None] = _record_results):
+        self.provider = provider
+        self._load_targets = load_targets
+        self._record_results = record_results
+        self.stats: Dict[str, int] = {
+            "queued": 0, "dropped": 0, "batches": 0, "requests": 0, "sent": 0,
+            "invalid_pruned": 0, "retried": 0, "failed": 0,
+        }
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.provider is not None
+
+    def start(self):
+        if not self.enabled or (self._task is not None and not self._task.done()): return
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue(maxsize=PUSH_QUEUE_SIZE)
+        self._executor = ThreadPoolExecutor(max_workers=PUSH_MAX_PARALLEL, thread_name_prefix="push")
+        self._task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        """Sends what is already queued, then stops the flusher."""
+        if self._task is None: return
+        await self._queue.join()
+        self._task.cancel()
+        try: await self._task
+        except asyncio.CancelledError: pass
+        self._task = None
+        self._executor.shutdown(wait=False); self._executor = None
+
+    def enqueue(self, notification: Dict[str, Any]):
+        """Queues a committed notification for device pushes. Thread-safe and never blocks."""
+        loop = self._loop
+        if loop is None or loop.is_closed(): return # Not started (pushes disabled, scripts, tests)
+        try: running = asyncio.get_running_loop()
+        except RuntimeError: running = None
+        if running is loop: self._put(notification)
+        else: loop.call_soon_threadsafe(self._put, notification)
+
+    def enqueue_many(self, notifications: List[Dict[str, Any]]):
+        """enqueue() for one commit's notifications, with a single hop onto the event loop."""
+        loop = self._loop
+        if loop is None or loop.is_closed() or not notifications: return
+        try: running = asyncio.get_running_loop()
+        except RuntimeError: running = None
+        if running is loop: self._put_many(notifications)
+        else: loop.call_soon_threadsafe(self._put_many, notifications)
+
+    def _put_many(self, notifications: List[Dict[str, Any]]):
+        for notification in notifications: self._put(notification)
+
+    def _put(self, notification: Dict[str, Any]):
+        try:
+            self._queue.put_nowait(notification)
+            self.stats["queued"] += 1
+        except asyncio.QueueFull:
+            self.stats["dropped"] += 1 # A missed buzz beats unbounded memory; the in-app notification still exists
+
+    async def _flush_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + PUSH_FLUSH_MS / 1000
+            while True:
+                timeout = deadline - loop.time()
+                if timeout <= 0: break
+                try: batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError: break
+            try:
+                await self._flush(batch)
+            except Exception:
+                traceback.print_exc()
+            finally:
+                for _ in batch: self._queue.task_done()
+
+    async def _flush(self, notifications: List[Dict[str, Any]]):
+        self.stats["batches"] += 1
+        pending = await database.run_in_background_executor(self._load_targets, notifications)
+        delivered: List[int] = []; invalid: List[int] = []
+        for attempt in range(1, PUSH_MAX_ATTEMPTS + 1):
+            if not pending: break
+            if attempt > 1:
+                self.stats["retried"] += len(pending)
+                await asyncio.sleep(PUSH_RETRY_BACKOFF_MS * (attempt - 1) / 1000)
+            retry = []
+            for message, result in await self._send_all(pending):
+                if result == PUSH_OK: delivered.append(message["token_id"])
+                elif result == PUSH_INVALID: invalid.append(message["token_id"])
+                elif result == PUSH_RETRY: retry.append(message)
+                else: self.stats["failed"] += 1
+            pending = retry
+        self.stats["failed"] += len(pending) # Still asking for a retry after the last attempt
+        self.stats["sent"] += len(delivered)
+        self.stats["invalid_pruned"] += len(invalid)
+        if delivered or invalid:
+            await database.run_in_background_executor(self._record_results, delivered, invalid)
+
+    async def _send_all(self, messages: List[Dict[str, Any]]):
+        """Groups by platform, chunks, sends chunks in parallel; returns (message, result) pairs."""
+        by_platform: Dict[str, List[Dict[str, Any]]] = {}
+        for m in messages: by_platform.setdefault(m["platform"], []).append(m)
+        chunks = [(platform, group[i:i + PUSH_BATCH_SIZE])
+                  for platform, group in by_platform.items() for i in range(0, len(group), PUSH_BATCH_SIZE)]
+        loop = asyncio.get_running_loop()
+        results = await asyncio.gather(
+            *(loop.run_in_executor(self._executor, self.provider.send, platform, chunk) for platform, chunk in chunks),
+            return_exceptions=True
+        )
+        self.stats["requests"] += len(chunks)
+        pairs = []
+        for (platform, chunk), outcome in zip(chunks, results):
+            if isinstance(outcome, Exception):
+                print(f"Push WARNING: {platform} chunk of {len(chunk)} raised ({type(outcome).__name__}: {outcome})")
+                outcome = [PUSH_RETRY] * len(chunk)
+            pairs.extend(zip(chunk, outcome))
+        return pairs
+
+    def get_metrics(self) -> Dict[str, Any]:
+        pending = self._queue.qsize() if self._queue is not None else 0
+        return {
+            "provider": type(self.provider).__name__ if self.provider else None, "pending": pending,
+            "batch_size": PUSH_BATCH_SIZE, "max_parallel": PUSH_MAX_PARALLEL, **self.stats,
+        }
+
+
+dispatcher = PushDispatcher(create_push_provider())
@@ -5,6 +5,7 @@ from fastapi import (
 )
 from typing import List, Optional, Dict, Any # Added Dict, Any
 import psycopg2
+import anyio # Calls back into the event loop from threadpool handlers
 import bcrypt
 import os
 import traceback # <-- ADDED IMPORT
@@ -13,7 +14,7 @@ import traceback # <-- ADDED IMPORT
 from pydantic import BaseModel, Field
 
 # Use the central crud import AND import specific auth functions
-from .. import schemas, crud, utils, auth # Relative imports
+from .. import schemas, crud, utils, auth, storage # Relative imports
 from ..database import get_db_connection
 # Ensure MINIO related config/client is accessible
 from ..utils import ( # Import specific utils needed
@@ -23,7 +24,6 @@ from ..utils import ( # Import specific utils needed
     delete_media_item_db_and_file,
     format_location_for_db,
     parse_point_string,
-    minio_client, # Import the client instance
     MINIO_BUCKET, # Import specific config vars if needed for checks
     MINIO_ENDPOINT
 )
@@ -36,7 +36,7 @@ router = APIRouter(
 
 # Alternative: JSON body login
 @router.post("/login", response_model=schemas.TokenData)
-async def login(request: schemas.LoginRequest):
+def login(request: schemas.LoginRequest):
     conn = None
     try:
         conn = get_db_connection()
@@ -77,7 +77,7 @@ async def login(request: schemas.LoginRequest):
 # This endpoint needs review - currently saves image locally using utils.save_image_multipart
 # which likely doesn't exist anymore. Should use MinIO.
 @router.post("/signup", status_code=status.HTTP_201_CREATED, response_model=schemas.TokenData)
-async def signup(
+def signup(
         name: str = Form(...),
         username: str = Form(...),
         email: str = Form(...),
@@ -117,8 +117,7 @@ async def signup(
         final_image_url = None
         if image:
             minio_properly_configured = (
-                    utils.minio_client is not None and
-                    MINIO_ENDPOINT and
+                    storage.is_configured() and
                     MINIO_BUCKET
             )
             if not minio_properly_configured:
@@ -126,7 +125,7 @@ async def signup(
                 print("WARN Signup: MinIO not configured, skipping image upload.")
             else:
                 object_name_prefix = f"users/{username}/profile" # Use username for path
-                upload_info = await upload_file_to_minio(image, object_name_prefix)
+                upload_info = anyio.from_thread.run(upload_file_to_minio, image, object_name_prefix)
 
                 if upload_info and 'minio_object_name' in upload_info:
                     minio_object_name = upload_info['minio_object_name']
@@ -146,6 +145,7 @@ async def signup(
 
         # --- Commit transaction ---
         conn.commit()
+        crud.schedule_media_variants([new_media_id])
         print(f"✅ User created with ID: {user_id}, Image URL: {final_image_url}")
 
         # Create token for the new user
@@ -178,7 +178,7 @@ async def signup(
 
 
 @router.get("/me", response_model=schemas.UserDisplay)
-async def read_users_me(current_user_id: int = Depends(auth.get_current_user)):
+def read_users_me(current_user_id: int = Depends(auth.get_current_user)):
     """Fetches details for the currently authenticated user."""
     conn = None
     try:
@@ -220,7 +220,7 @@ async def read_users_me(current_user_id: int = Depends(auth.get_current_user)):
 
 
 @router.put("/me", response_model=schemas.UserDisplay)
-async def update_user_profile_endpoint(
+def update_user_profile_endpoint(
         current_user_id: int = Depends(auth.get_current_user),
         name: Optional[str] = Form(None),
         username: Optional[str] = Form(None),
@@ -258,11 +258,10 @@ async def update_user_profile_endpoint(
         if image:
             # --- Refined Check ---
             minio_properly_configured = (
-                    utils.minio_client is not None and
-                    MINIO_ENDPOINT and # Check config directly too
+                    storage.is_configured() and
                     MINIO_BUCKET
             )
-            print(f"DEBUG PUT /auth/me: Image provided. Checking MinIO config. Client exists: {utils.minio_client is not None}. Endpoint set: {bool(MINIO_ENDPOINT)}. Bucket set: {bool(MINIO_BUCKET)}")
+            print(f"DEBUG PUT /auth/me: Image provided. Checking MinIO config. Storage configured: {storage.is_configured()}. Bucket set: {bool(MINIO_BUCKET)}")
 
             if not minio_properly_configured:
                 print("ERROR PUT /auth/me: MinIO check failed. Client or config missing.")
@@ -280,7 +279,7 @@ async def update_user_profile_endpoint(
 
             # 2. Upload new image
             object_name_prefix = f"users/{current_username}/profile"
-            upload_info = await upload_file_to_minio(image, object_name_prefix)
+            upload_info = anyio.from_thread.run(upload_file_to_minio, image, object_name_prefix)
 
             if upload_info and 'minio_object_name' in upload_info:
                 new_minio_object_name = upload_info['minio_object_name']
@@ -324,6 +323,7 @@ async def update_user_profile_endpoint(
         # Commit transaction if text fields updated OR new image was successfully linked
         if update_data or (image and new_media_id):
             conn.commit()
+            crud.schedule_media_variants([new_media_id])
             print(f"DEBUG PUT /auth/me: Transaction committed.")
         else:
             print(f"DEBUG PUT /auth/me: No DB changes to commit.")
@@ -379,7 +379,7 @@ class PasswordChangeRequest(BaseModel):
     new_password: str = Field(..., min_length=6)
 
 @router.put("/me/password", status_code=status.HTTP_204_NO_CONTENT)
-async def change_password(
+def change_password(
         request: PasswordChangeRequest,
         current_user_id: int = Depends(auth.get_current_user)
 ):
@@ -420,7 +420,7 @@ async def change_password(
 
 # --- DELETE /me ---
 @router.delete("/me", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_account(
+def delete_account(
         current_user_id: int = Depends(auth.get_current_user)
 ):
     """Deletes the current user's account."""
@@ -451,7 +451,7 @@ async def delete_account(
         # and MinIO file
         if media_id_to_delete:
             print(f"Attempting post-delete cleanup for profile pic media ID: {media_id_to_delete}, Path: {minio_path_to_delete}")
-            await delete_media_item_db_and_file(media_id_to_delete, minio_path_to_delete)
+            delete_media_item_db_and_file(media_id_to_delete, minio_path_to_delete)
 
         # TODO: Loop through other user-uploaded media and delete them
 
@@ -18,7 +18,7 @@ router = APIRouter(
 # e.g., blocked_id, blocked_at, blocked_username, blocked_name, blocked_user_avatar_url
 
 @router.get("/blocked", response_model=List[schemas.BlockedUserDisplay])
-async def get_blocked_users_route(current_user_id: int = Depends(auth.get_current_user)):
+def get_blocked_users_route(current_user_id: int = Depends(auth.get_current_user)):
     """Gets the list of users blocked by the current user."""
     conn = None
     try:
@@ -37,7 +37,7 @@ async def get_blocked_users_route(current_user_id: int = Depends(auth.get_curren
     finally:
         if conn: conn.close()
 @router.post("/block/{user_id_to_block}", status_code=status.HTTP_204_NO_CONTENT)
-async def block_user_route(
+def block_user_route(
     user_id_to_block: int,
     current_user_id: int = Depends(auth.get_current_user)
 ):
@@ -70,7 +70,7 @@ async def block_user_route(
         if conn: conn.close()
 
 @router.delete("/unblock/{user_id_to_unblock}", status_code=status.HTTP_204_NO_CONTENT)
-async def unblock_user_route(
+def unblock_user_route(
     user_id_to_unblock: int,
     current_user_id: int = Depends(auth.get_current_user)
 ):
@@ -2,6 +2,7 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query, Form, File, UploadFile
 from typing import List, Optional, Dict, Any
 import psycopg2
+import anyio # Calls back into the event loop from threadpool handlers
 import traceback
 import json
 
@@ -17,7 +18,7 @@ router = APIRouter(
 )
 
 @router.post("/messages", status_code=status.HTTP_201_CREATED, response_model=schemas.ChatMessageData)
-async def send_chat_message_http(
+def send_chat_message_http(
         # Requires user auth
         current_user_id: int = Depends(auth.get_current_user),
         # Use Form fields for multipart
@@ -45,7 +46,7 @@ async def send_chat_message_http(
             if file and file.filename:
                 room_type = "communities" if community_id else "events"; room_id_for_path = community_id if community_id else event_id
                 object_name_prefix = f"media/{room_type}/{room_id_for_path}/chat/{message_id}"
-                upload_info = await utils.upload_file_to_minio(file, object_name_prefix)
+                upload_info = anyio.from_thread.run(utils.upload_file_to_minio, file, object_name_prefix)
                 if upload_info:
                     minio_objects_created.append(upload_info['minio_object_name'])
                     media_id = crud.create_media_item(cursor, uploader_user_id=current_user_id, **upload_info)
@@ -58,6 +59,7 @@ async def send_chat_message_http(
                 else: print(f"WARN: Failed upload for chat {message_id}")
 
         conn.commit() # Commit message and media links
+        crud.schedule_media_variants(media_ids_created)
         print(f"✅ Message {message_id} saved to DB via HTTP.")
 
         # Prepare response data
@@ -73,7 +75,7 @@ async def send_chat_message_http(
         room_identifier = f"{room_type_ws}_{room_id_ws}"
         broadcast_message = chat_message_obj.model_dump_json(exclude_none=True) if hasattr(chat_message_obj, 'model_dump_json') else chat_message_obj.json(exclude_none=True) # Exclude nulls for cleaner broadcast?
         print(f"📢 Broadcasting HTTP message to WS room {room_identifier}")
-        await manager.broadcast(broadcast_message, room_identifier)
+        anyio.from_thread.run(manager.publish, broadcast_message, room_identifier)
 
         return chat_message_obj
 
@@ -98,7 +100,7 @@ async def send_chat_message_http(
 
 
 @router.get("/messages", response_model=List[schemas.ChatMessageData])
-async def get_chat_messages(
+def get_chat_messages(
         # Auth optional for reading history? Depends on requirements.
         # current_user_id: Optional[int] = Depends(auth.get_current_user_optional),
         community_id: Optional[int] = Query(None),
@@ -3,13 +3,14 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Form, UploadFile, File, Query
 from typing import List, Optional, Dict, Any # Added Dict, Any
 import psycopg2
+import anyio # Calls back into the event loop from threadpool handlers
 from datetime import datetime
 import traceback # Ensure import
 from .. import utils # Ensure import
 import uuid # <-- ADD IMPORT
 
 # Use the central crud import
-from .. import schemas, crud, auth, utils
+from .. import schemas, crud, auth, utils, storage
 from ..database import get_db_connection
 from ..utils import upload_file_to_minio, get_minio_url, delete_from_minio, delete_media_item_db_and_file
 
@@ -24,7 +25,7 @@ router = APIRouter(
 )
 
 @router.post("", status_code=status.HTTP_201_CREATED, response_model=schemas.CommunityDisplay)
-async def create_community(
+def create_community(
         current_user_id: int = Depends(auth.get_current_user),
         name: str = Form(...),
         description: Optional[str] = Form(None),
@@ -47,11 +48,11 @@ async def create_community(
         raise HTTPException(status_code=422, detail="Both latitude and longitude must be provided if one is set.")
 
     try:
-        if logo and utils.minio_client:
+        if logo and storage.is_configured():
             safe_name = name.replace(' ', '_').lower()
             safe_name = ''.join(c for c in safe_name if c.isalnum() or c in ['_','-']) or f"comm_{uuid.uuid4()}"
             object_name_prefix = f"communities/{safe_name}/logo"
-            upload_result_dict = await utils.upload_file_to_minio(logo, object_name_prefix)
+            upload_result_dict = anyio.from_thread.run(utils.upload_file_to_minio, logo, object_name_prefix)
             if upload_result_dict is None or 'minio_object_name' not in upload_result_dict:
                 print(f"⚠️ Warning: MinIO community logo upload failed for {name}. Proceeding without logo.")
                 upload_result_dict = None
@@ -90,6 +91,7 @@ async def create_community(
         if created_media_id:
             logo_media_for_response = crud.get_media_item_by_id(cursor, created_media_id)
         conn.commit()
+        crud.schedule_media_variants([created_media_id])
 
         response_data = dict(created_community_db)
         # Convert raw lon/lat from DB (if present) to LocationDataOutput for response
@@ -134,7 +136,7 @@ async def create_community(
 
 
 @router.get("/{community_id}/details", response_model=schemas.CommunityDisplay)
-async def get_community_details(
+def get_community_details(
         community_id: int,
         current_user_id: Optional[int] = Depends(auth.get_current_user_optional)
 ):
@@ -179,7 +181,7 @@ async def get_community_details(
 
 
 @router.put("/{community_id}", response_model=schemas.CommunityDisplay)
-async def update_community_details(
+def update_community_details(
         community_id: int,
         # Use Form data for PUT to match create and logo update
         name: Optional[str] = Form(None),
@@ -259,7 +261,7 @@ async def update_community_details(
 
 
 @router.get("", response_model=List[schemas.CommunityDisplay])
-async def get_communities(
+def get_communities(
         current_user_id: Optional[int] = Depends(auth.get_current_user_optional),
         limit: int = Query(50, ge=1, le=200), # Added limit/offset
         offset: int = Query(0, ge=0)
@@ -268,6 +270,8 @@ async def get_communities(
     try:
         conn = get_db_connection(); cursor = conn.cursor()
         communities_relational = crud.get_communities_db(cursor, limit=limit, offset=offset)
+        # Viewer membership for the whole page in one graph query
+        member_of = crud.get_member_community_ids(cursor, current_user_id, [c['id'] for c in communities_relational]) if current_user_id else set()
         processed_communities = []
         for comm_rel_dict in communities_relational:
             comm_data = dict(comm_rel_dict) # Ensure it's a mutable dict
@@ -289,10 +293,7 @@ async def get_communities(
                 del comm_data['longitude']
                 del comm_data['latitude']
 
-            if current_user_id:
-                comm_data['is_member_by_viewer'] = crud.check_is_member(cursor, current_user_id, comm_id)
-            else:
-                comm_data['is_member_by_viewer'] = False
+            comm_data['is_member_by_viewer'] = comm_id in member_of
 
             processed_communities.append(schemas.CommunityDisplay(**comm_data))
 
@@ -305,7 +306,7 @@ async def get_communities(
         if conn: conn.close()
 
 @router.get("/trending", response_model=List[schemas.CommunityDisplay])
-async def get_trending_communities(
+def get_trending_communities(
         current_user_id: Optional[int] = Depends(auth.get_current_user_optional),
         limit: int = Query(15, ge=1, le=50) # Added limit
 ):
@@ -313,6 +314,8 @@ async def get_trending_communities(
     try:
         conn = get_db_connection(); cursor = conn.cursor()
         communities_db = crud.get_trending_communities_db(cursor, limit=limit)
+        # Viewer membership for the whole list in one graph query
+        member_of = crud.get_member_community_ids(cursor, current_user_id, [c['id'] for c in communities_db]) if current_user_id else set()
         processed_communities = []
         for comm_dict_db in communities_db:
             comm_data = dict(comm_dict_db)
@@ -334,10 +337,7 @@ async def get_trending_communities(
                 del comm_data['longitude']
                 del comm_data['latitude']
 
-            if current_user_id:
-                comm_data['is_member_by_viewer'] = crud.check_is_member(cursor, current_user_id, comm_id)
-            else:
-                comm_data['is_member_by_viewer'] = False
+            comm_data['is_member_by_viewer'] = comm_id in member_of
 
             processed_communities.append(schemas.CommunityDisplay(**comm_data))
         return processed_communities
@@ -349,7 +349,7 @@ async def get_trending_communities(
         if conn: conn.close()
 
 @router.post("/{community_id}/logo", response_model=schemas.CommunityDisplay)
-async def update_community_logo(
+def update_community_logo(
         community_id: int,
         current_user_id: int = Depends(auth.get_current_user),
         logo: UploadFile = File(...),
@@ -372,11 +372,11 @@ async def update_community_logo(
 
         # 2. Upload New Logo to MinIO
         # ... (same as before) ...
-        if not utils.minio_client: raise HTTPException(status_code=500, detail="MinIO not configured")
+        if not storage.is_configured(): raise HTTPException(status_code=500, detail="MinIO not configured")
         safe_name = community_name.replace(' ', '_').lower()
         safe_name = ''.join(c for c in safe_name if c.isalnum() or c in ['_','-'])
         object_name_prefix = f"communities/{safe_name}/logo"
-        upload_info = await utils.upload_file_to_minio(logo, object_name_prefix)
+        upload_info = anyio.from_thread.run(utils.upload_file_to_minio, logo, object_name_prefix)
         if not upload_info or 'minio_object_name' not in upload_info:
             raise HTTPException(status_code=500, detail="Failed to upload new logo to storage")
         new_minio_object_name = upload_info['minio_object_name']
@@ -400,6 +400,7 @@ async def update_community_logo(
 
         # If we reach here without exception, commit the transaction
         conn.commit()
+        crud.schedule_media_variants([new_media_id])
         print(f"Router: DB transaction committed (new media item created, link set).")
         # --- Transaction End ---
 
@@ -463,7 +464,7 @@ async def update_community_logo(
         if conn: conn.close()
 
 @router.delete("/{community_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_community(
+def delete_community(
         community_id: int,
         current_user_id: int = Depends(auth.get_current_user) # Require auth
 ):
@@ -504,7 +505,7 @@ async def delete_community(
 
 # --- Membership (Graph Operations) ---
 @router.post("/{community_id}/join", status_code=status.HTTP_200_OK, response_model=Dict[str, Any])
-async def join_community(
+def join_community(
         community_id: int,
         current_user_id: int = Depends(auth.get_current_user) # Require auth
 ):
@@ -537,7 +538,7 @@ async def join_community(
 
 
 @router.delete("/{community_id}/leave", status_code=status.HTTP_200_OK, response_model=Dict[str, Any])
-async def leave_community(
+def leave_community(
         community_id: int,
         current_user_id: int = Depends(auth.get_current_user) # Require auth
 ):
@@ -567,7 +568,7 @@ async def leave_community(
 
 # --- Community Post Linking (Graph Operations) ---
 @router.post("/{community_id}/posts/{post_id}", status_code=status.HTTP_201_CREATED, response_model=Dict[str, Any]) # Changed endpoint slightly
-async def add_post_to_community(
+def add_post_to_community(
         community_id: int,
         post_id: int,
         current_user_id: int = Depends(auth.get_current_user) # Require auth & maybe check membership/ownership
@@ -595,7 +596,7 @@ async def add_post_to_community(
 
 
 @router.delete("/{community_id}/posts/{post_id}", status_code=status.HTTP_200_OK, response_model=Dict[str, Any])
-async def remove_post_from_community(
+def remove_post_from_community(
         community_id: int,
         post_id: int,
         current_user_id: int = Depends(auth.get_current_user) # Require auth & permission check
@@ -620,7 +621,7 @@ async def remove_post_from_community(
 
 # --- List Events for Community (Moved from events router, uses updated CRUD) ---
 @router.get("/{community_id}/events", response_model=List[schemas.EventDisplay])
-async def list_community_events(
+def list_community_events(
         community_id: int,
         current_user_id: Optional[int] = Depends(auth.get_current_user_optional) # Optional auth
 ):
@@ -650,7 +651,7 @@ async def list_community_events(
 # --- Create Event in Community (Moved from events router, uses updated CRUD) ---
 # --- Add Event in Community ---
 @router.post("/{community_id}/events", status_code=status.HTTP_201_CREATED, response_model=schemas.EventDisplay)
-async def create_event_in_community(
+def create_event_in_community(
         community_id: int,
         current_user_id: int = Depends(auth.get_current_user),
         title: str = Form(...),
@@ -684,8 +685,8 @@ async def create_event_in_community(
         safe_community_name = ''.join(c for c in safe_community_name if c.isalnum() or c in ['_','-'])
         object_name_prefix = f"media/communities/{safe_community_name}/events"
 
-        if image and utils.minio_client:
-            upload_info = await utils.upload_file_to_minio(image, object_name_prefix)
+        if image and storage.is_configured():
+            upload_info = anyio.from_thread.run(utils.upload_file_to_minio, image, object_name_prefix)
             if upload_info and 'minio_object_name' in upload_info:
                 minio_object_name = upload_info['minio_object_name']
             else:
@@ -718,6 +719,7 @@ async def create_event_in_community(
         # --- Notify Community Members ---
         # CAVEAT: This can be slow for large communities. Consider async fan-out.
         community_member_ids = crud.get_community_member_ids(cursor, community_id, limit=10000, offset=0)
+        community_member_ids = crud.filter_recipients_by_preference(cursor, community_member_ids, 'new_community_event')
         if community_member_ids: # Check if there are members to notify
             community_name_for_notif = community_db_info.get('name', 'your community')
             content_preview = f"New event in {community_name_for_notif}: \"{title[:50]}...\""
@@ -4,11 +4,12 @@ import traceback
 from fastapi import APIRouter, Depends, HTTPException, status, Form, UploadFile, File
 from typing import List, Optional, Dict, Any # Added Dict, Any
 import psycopg2
+import anyio # Calls back into the event loop from threadpool handlers
 from datetime import datetime
 import os
 
 # Use the central crud import
-from .. import schemas, crud, auth, utils
+from .. import schemas, crud, auth, utils, storage
 from ..database import get_db_connection
 from ..utils import get_minio_url, delete_from_minio, upload_file_to_minio # Added upload/delete
 
@@ -24,7 +25,7 @@ router = APIRouter(
 
 
 @router.get("/{event_id}", response_model=schemas.EventDisplay)
-async def get_event_details(
+def get_event_details(
         event_id: int,
         current_user_id: Optional[int] = Depends(auth.get_current_user_optional)
 ):
@@ -74,7 +75,7 @@ async def get_event_details(
 
 
 @router.put("/{event_id}", response_model=schemas.EventDisplay)
-async def update_event(
+def update_event(
         event_id: int,
         current_user_id: int = Depends(auth.get_current_user),
         title: Optional[str] = Form(None),
@@ -109,11 +110,11 @@ async def update_event(
         if event_db['creator_id'] != current_user_id: raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized")
         old_minio_object_name = event_db.get('image_url')
 
-        if image and utils.minio_client:
+        if image and storage.is_configured():
             comm_info = crud.get_community_by_id(cursor, event_db['community_id'])
             community_name = comm_info.get('name', f'community_{event_db["community_id"]}') if comm_info else f'community_{event_db["community_id"]}'
             object_name_prefix = f"media/communities/{community_name.replace(' ', '_').lower()}/events"
-            upload_info = await utils.upload_file_to_minio(image, object_name_prefix)
+            upload_info = anyio.from_thread.run(utils.upload_file_to_minio, image, object_name_prefix)
 
             if upload_info and 'minio_object_name' in upload_info:
                 new_minio_object_name = upload_info['minio_object_name']
@@ -141,13 +142,10 @@ async def update_event(
             event_title_for_notif = updated_event_db.get('title', event_db.get('title', 'your event'))
             content_preview = f"Event Updated: \"{event_title_for_notif[:50]}...\" Details may have changed."
             print(f"Attempting to notify {len(participant_ids_before_update)} participants of event {event_id} update.")
-            for p_id in participant_ids_before_update:
-                if p_id != current_user_id:
-                    crud.create_notification(
-                        cursor=cursor, recipient_user_id=p_id, actor_user_id=current_user_id,
-                        type='event_update', related_entity_type='event', related_entity_id=event_id,
-                        content_preview=content_preview
-                    )
+            crud.create_notifications_bulk( # Skips the editor and participants who opted out
+                cursor, participant_ids_before_update, 'event_update', actor_user_id=current_user_id,
+                related_entity_type='event', related_entity_id=event_id, content_preview=content_preview
+            )
         conn.commit()
 
         if new_minio_object_name and old_minio_object_name and new_minio_object_name != old_minio_object_name:
@@ -184,7 +182,7 @@ async def update_event(
         if conn: conn.close()
 
 @router.delete("/{event_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_event(
+def delete_event(
         event_id: int,
         current_user_id: int = Depends(auth.get_current_user) # Require auth
 ):
@@ -236,7 +234,7 @@ async def delete_event(
 
 # --- Event Participation ---
 @router.post("/{event_id}/join", status_code=status.HTTP_200_OK, response_model=Dict[str, Any])
-async def join_event(
+def join_event(
         event_id: int,
         current_user_id: int = Depends(auth.get_current_user)
 ):
@@ -281,7 +279,7 @@ async def join_event(
 
 
 @router.delete("/{event_id}/leave", status_code=status.HTTP_200_OK, response_model=Dict[str, Any])
-async def leave_event(
+def leave_event(
         event_id: int,
         current_user_id: int = Depends(auth.get_current_user) # Require auth
 ):
@@ -1,12 +1,12 @@
 # src/routers/feed.py
 
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
 from typing import List, Optional, Dict, Any
 import psycopg2
 import traceback
 
 from .. import schemas, crud, auth, utils, security
-from ..database import get_db_connection
+from ..database import get_db
 
 router = APIRouter(
     prefix="/feed",
@@ -15,16 +15,21 @@ router = APIRouter(
 )
 
 @router.get("/following", response_model=List[schemas.PostDisplay])
-async def get_feed_following(
+def get_feed_following(
+        response: Response,
         current_user_id: int = Depends(auth.get_current_user), # Requires auth
         limit: int = Query(20, ge=1, le=100),
         offset: int = Query(0, ge=0),
+        page_cursor: Optional[str] = Query(None, alias="cursor", description="X-Next-Cursor from the previous page; overrides offset"),
+        conn = Depends(get_db), # Request-scoped pooled connection
 ):
     # ... (Implementation from previous step) ...
-    conn = None
+    before = utils.parse_page_cursor(page_cursor)
     try:
-        conn = get_db_connection(); cursor = conn.cursor()
-        feed_items_db = crud.get_following_feed(cursor, current_user_id, limit, offset)
+        cursor = conn.cursor()
+        feed_items_db = crud.get_following_feed(cursor, current_user_id, limit, offset, before=before)
+        next_cursor = utils.next_page_cursor(feed_items_db, limit)
+        if next_cursor: response.headers["X-Next-Cursor"] = next_cursor
         processed_feed: List[schemas.PostDisplay] = []
         for item_db in feed_items_db:
             post_data = dict(item_db); post_id = post_data['id']
@@ -35,41 +40,37 @@ async def get_feed_following(
             post_data['media'] = media_list_processed
             author_avatar_path = post_data.get('author_avatar') # Get path stored by CRUD
             post_data['author_avatar_url'] = utils.get_minio_url(author_avatar_path)
-            viewer_vote = None; is_favorited = False # Fetch viewer status
-            try: viewer_vote = crud.get_viewer_vote_status(cursor, current_user_id, post_id=post_id)
-            except Exception as e: print(f"WARN feed: vote status check failed P:{post_id}: {e}")
-            try: is_favorited = crud.get_viewer_favorite_status(cursor, current_user_id, post_id=post_id)
-            except Exception as e: print(f"WARN feed: fav status check failed P:{post_id}: {e}")
-            post_data['viewer_vote_type'] = 'UP' if viewer_vote is True else ('DOWN' if viewer_vote is False else None)
-            post_data['viewer_has_favorited'] = is_favorited
+            # viewer_vote_type / viewer_has_favorited already set by crud.hydrate_posts
             post_data.setdefault('upvotes', 0); post_data.setdefault('downvotes', 0); post_data.setdefault('reply_count', 0); post_data.setdefault('favorite_count', 0); post_data.setdefault('image_url', None)
             try: processed_feed.append(schemas.PostDisplay(**post_data))
             except Exception as pydantic_err: print(f"ERROR: Pydantic validation failed for following feed post {post_id}: {pydantic_err}\nData: {post_data}")
         return processed_feed
     except psycopg2.Error as db_err: print(f"DB Error fetching following feed for user {current_user_id}: {db_err}"); raise HTTPException(status_code=500, detail="Database error fetching feed.")
     except Exception as e: print(f"Unexpected error fetching following feed for user {current_user_id}: {e}"); traceback.print_exc(); raise HTTPException(status_code=500, detail="An error occurred while fetching the feed.")
-    finally:
-        if conn: conn.close()
 
 
 # --- ADD DISCOVER ENDPOINT ---
 @router.get("/discover", response_model=List[schemas.PostDisplay])
-async def get_feed_discover(
+def get_feed_discover(
         # Auth is optional for discover feed
+        response: Response,
         current_user_id: Optional[int] = Depends(auth.get_current_user_optional),
         limit: int = Query(20, ge=1, le=100),
         offset: int = Query(0, ge=0),
+        page_cursor: Optional[str] = Query(None, alias="cursor", description="X-Next-Cursor from the previous page; overrides offset"),
+        conn = Depends(get_db), # Request-scoped pooled connection
 ):
     """
     Fetches posts for discovery, potentially ranked by recent activity.
     """
-    conn = None
+    before = utils.parse_page_cursor(page_cursor)
     try:
-        conn = get_db_connection()
         cursor = conn.cursor()
 
         # Call the new CRUD function
-        feed_items_db = crud.get_discover_feed(cursor, current_user_id, limit, offset)
+        feed_items_db = crud.get_discover_feed(cursor, current_user_id, limit, offset, before=before)
+        next_cursor = utils.next_page_cursor(feed_items_db, limit, score='activity_score')
+        if next_cursor: response.headers["X-Next-Cursor"] = next_cursor
 
         # Process results (same augmentation logic as following feed)
         processed_feed: List[schemas.PostDisplay] = []
@@ -90,16 +91,7 @@ async def get_feed_discover(
             author_avatar_path = post_data.get('author_avatar')
             post_data['author_avatar_url'] = utils.get_minio_url(author_avatar_path)
 
-            # Fetch viewer vote/favorite status only if user is logged in
-            viewer_vote = None; is_favorited = False
-            if current_user_id is not None:
-                try: viewer_vote = crud.get_viewer_vote_status(cursor, current_user_id, post_id=post_id)
-                except Exception as e: print(f"WARN discover feed: vote status check failed P:{post_id}: {e}")
-                try: is_favorited = crud.get_viewer_favorite_status(cursor, current_user_id, post_id=post_id)
-                except Exception as e: print(f"WARN discover feed: fav status check failed P:{post_id}: {e}")
-
-            post_data['viewer_vote_type'] = 'UP' if viewer_vote is True else ('DOWN' if viewer_vote is False else None)
-            post_data['viewer_has_favorited'] = is_favorited
+            # Viewer vote/favorite status comes from crud.hydrate_posts (unset for anonymous viewers)
 
             # Ensure defaults
             post_data.setdefault('upvotes', 0); post_data.setdefault('downvotes', 0); post_data.setdefault('reply_count', 0); post_data.setdefault('favorite_count', 0); post_data.setdefault('image_url', None)
@@ -117,6 +109,4 @@ async def get_feed_discover(
     except Exception as e:
         print(f"Unexpected error fetching discover feed: {e}")
         traceback.print_exc()
-        raise HTTPException(status_code=500, detail="An error occurred while fetching the discover feed.")
-    finally:
-        if conn: conn.close()
\ No newline at end of file
+        raise HTTPException(status_code=500, detail="An error occurred while fetching the discover feed.")
\ No newline at end of file
@@ -0,0 +1,57 @@
+# src/routers/me.py
+
+from fastapi import APIRouter, Depends, HTTPException, status, Query
+from typing import List, Optional
+import psycopg2
+import traceback
+
+from .. import schemas, crud, auth
+from ..database import get_db
+
+router = APIRouter(
+    prefix="/me",
+    tags=["Me"],
+)
+
+# Max IDs per list in one relationships request
+MAX_RELATIONSHIP_IDS = 200
+
+def _parse_id_list(raw: Optional[str], name: str) -> List[int]:
+    """Parses a comma-separated ID list ("1,2,3")."""
+    if not raw: return []
+    try: ids = [int(part) for part in raw.split(",") if part.strip()]
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=f"'{name}' must be a comma-separated list of integer IDs")
+    if len(ids) > MAX_RELATIONSHIP_IDS:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=f"'{name}' accepts at most {MAX_RELATIONSHIP_IDS} IDs")
+    return ids
+
+@router.get("/relationships", response_model=schemas.ViewerRelationships)
+def get_my_relationships(
+        current_user_id: int = Depends(auth.get_current_user),
+        posts: Optional[str] = Query(None, description="Comma-separated post IDs: vote / favorite status"),
+        replies: Optional[str] = Query(None, description="Comma-separated reply IDs: vote / favorite status"),
+        users: Optional[str] = Query(None, description="Comma-separated user IDs: whether you follow them"),
+        communities: Optional[str] = Query(None, description="Comma-separated community IDs: membership"),
+        events: Optional[str] = Query(None, description="Comma-separated event IDs: participation"),
+        conn = Depends(get_db), # Request-scoped pooled connection
+):
+    """
+    The current user's relationship to many posts, replies, users, communities and events at once,
+    for clients prefetching viewer state. One graph query per relationship kind requested.
+    """
+    id_lists = {
+        'post_ids': _parse_id_list(posts, 'posts'), 'reply_ids': _parse_id_list(replies, 'replies'),
+        'user_ids': _parse_id_list(users, 'users'), 'community_ids': _parse_id_list(communities, 'communities'),
+        'event_ids': _parse_id_list(events, 'events'),
+    }
+    try:
+        cursor = conn.cursor()
+        return crud.get_viewer_relationships(cursor, current_user_id, **id_lists)
+    except psycopg2.Error as db_err:
+        print(f"DB Error fetching relationships for user {current_user_id}: {db_err}")
+        raise HTTPException(status_code=500, detail="Database error fetching relationships.")
+    except Exception as e:
+        print(f"Error fetching relationships for user {current_user_id}: {e}")
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail="Failed to fetch relationships.")
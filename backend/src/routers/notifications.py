@@ -1,5 +1,5 @@
 # backend/src/routers/notifications.py
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
 from typing import List, Optional
 
 from .. import schemas, crud, auth, utils # utils might be needed for image URLs
@@ -14,19 +14,24 @@ router = APIRouter(
 )
 
 @router.get("", response_model=List[schemas.NotificationDisplay])
-async def get_my_notifications(
+def get_my_notifications(
+    response: Response,
     current_user_id: int = Depends(auth.get_current_user),
     limit: int = Query(20, ge=1, le=100),
     offset: int = Query(0, ge=0),
-    unread_only: Optional[bool] = Query(None, description="Filter by unread status (true=unread, false=read, null=all)")
+    unread_only: Optional[bool] = Query(None, description="Filter by unread status (true=unread, false=read, null=all)"),
+    page_cursor: Optional[str] = Query(None, alias="cursor", description="X-Next-Cursor from the previous page; overrides offset")
 ):
     conn = None
+    before = utils.parse_page_cursor(page_cursor)
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
         notifications_db = crud.get_notifications_for_user(
-            cursor, user_id=current_user_id, limit=limit, offset=offset, unread_only=unread_only
+            cursor, user_id=current_user_id, limit=limit, offset=offset, unread_only=unread_only, before=before
         )
+        next_cursor = utils.next_page_cursor(notifications_db, limit, time_key='last_activity_at')
+        if next_cursor: response.headers["X-Next-Cursor"] = next_cursor
         # The CRUD function already structures the data well, including actor and related entity info.
         return [schemas.NotificationDisplay(**notif) for notif in notifications_db]
     except psycopg2.Error as db_err:
@@ -40,7 +45,7 @@ async def get_my_notifications(
         if conn: conn.close()
 
 @router.post("/read", status_code=status.HTTP_200_OK)
-async def mark_notifications_read_route(
+def mark_notifications_read_route(
     update_request: schemas.NotificationReadUpdate,
     current_user_id: int = Depends(auth.get_current_user)
 ):
@@ -78,7 +83,7 @@ async def mark_notifications_read_route(
 
 
 @router.post("/read-all", status_code=status.HTTP_200_OK)
-async def mark_all_my_notifications_read_route(
+def mark_all_my_notifications_read_route(
     current_user_id: int = Depends(auth.get_current_user)
 ):
     conn = None
@@ -102,7 +107,7 @@ async def mark_all_my_notifications_read_route(
 
 
 @router.get("/unread-count", response_model=schemas.UnreadNotificationCount)
-async def get_my_unread_notification_count_route(
+def get_my_unread_notification_count_route(
     current_user_id: int = Depends(auth.get_current_user)
 ):
     conn = None
@@ -110,6 +115,7 @@ async def get_my_unread_notification_count_route(
         conn = get_db_connection()
         cursor = conn.cursor()
         count = crud.get_unread_notification_count(cursor, user_id=current_user_id)
+        conn.commit() # Keeps the counter row seeded on first call
         return schemas.UnreadNotificationCount(count=count)
     except psycopg2.Error as db_err:
         print(f"DB Error getting unread notification count for user {current_user_id}: {db_err}")
@@ -123,7 +129,7 @@ async def get_my_unread_notification_count_route(
 
 # --- Device Token Management ---
 @router.post("/device-tokens", status_code=status.HTTP_201_CREATED, response_model=schemas.UserDeviceTokenDisplay)
-async def register_device_token_route(
+def register_device_token_route(
     token_data: schemas.UserDeviceTokenCreate,
     current_user_id: int = Depends(auth.get_current_user)
 ):
@@ -154,7 +160,7 @@ async def register_device_token_route(
         if conn: conn.close()
 
 @router.delete("/device-tokens", status_code=status.HTTP_204_NO_CONTENT)
-async def unregister_device_token_route(
+def unregister_device_token_route(
     device_token: str = Query(...), # Pass token as query param for DELETE
     current_user_id: int = Depends(auth.get_current_user)
 ):
@@ -1,8 +1,9 @@
 # src/routers/posts.py
 
-from fastapi import APIRouter, Depends, HTTPException, status, Form, UploadFile, File, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Form, UploadFile, File, Query, Response
 from typing import List, Optional, Dict, Any, Literal # Added Query, Literal
 import psycopg2
+import anyio # Calls back into the event loop from threadpool handlers
 import os
 import traceback
 import json # For WebSocket payload
@@ -19,26 +20,48 @@ router = APIRouter(
     dependencies=[Depends(security.get_api_key)] # Apply API Key globally
 )
 
-# --- Placeholder for /trending ---
+# --- GET /trending ---
 @router.get("/trending", response_model=List[schemas.PostDisplay])
-async def get_trending_posts(
+def get_trending_posts(
+        response: Response,
         current_user_id: Optional[int] = Depends(auth.get_current_user_optional),
         limit: int = Query(20, ge=1, le=100), # Use Query for params
-        offset: int = Query(0, ge=0)
+        offset: int = Query(0, ge=0),
+        page_cursor: Optional[str] = Query(None, alias="cursor", description="X-Next-Cursor from the previous page; overrides offset")
 ):
-    """
-    [PLACEHOLDER] Fetches trending posts based on recent activity.
-    Current implementation returns an empty list.
-    """
-    print("WARN: /posts/trending endpoint is a placeholder and not implemented.")
-    # TODO: Implement actual trending logic in crud._feed.get_discover_feed
-    # and call it here if using this endpoint for discover/trending.
-    # For now, just return empty to pass the test expecting 200 OK.
-    return []
+    """ Fetches trending posts: top of the hot-score ranking (same source as /feed/discover). """
+    conn = None
+    before = utils.parse_page_cursor(page_cursor)
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        posts_db = crud.get_discover_feed(cursor, current_user_id, limit, offset, before=before)
+        next_cursor = utils.next_page_cursor(posts_db, limit, score='activity_score')
+        if next_cursor: response.headers["X-Next-Cursor"] = next_cursor
+
+        processed_posts = []
+        for post in posts_db:
+            post_data = dict(post)
+            post_data['author_avatar_url'] = utils.get_minio_url(post_data.get('author_avatar'))
+            post_data.setdefault('upvotes', 0); post_data.setdefault('downvotes', 0); post_data.setdefault('reply_count', 0); post_data.setdefault('favorite_count', 0); post_data.setdefault('image_url', None)
+            try:
+                processed_posts.append(schemas.PostDisplay(**post_data))
+            except Exception as pydantic_err:
+                print(f"ERROR: Pydantic validation failed for trending post {post_data.get('id')}: {pydantic_err}\nData: {post_data}")
+        return processed_posts
+    except psycopg2.Error as db_err:
+        print(f"DB Error fetching trending posts: {db_err}")
+        raise HTTPException(status_code=500, detail="Database error fetching trending posts")
+    except Exception as e:
+        print(f"❌ Error fetching trending posts: {e}")
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail="Error fetching trending posts")
+    finally:
+        if conn: conn.close()
 
 # --- GET /{post_id} ---
 @router.get("/{post_id}", response_model=schemas.PostDisplay)
-async def get_post_details(
+def get_post_details(
         post_id: int,
         current_user_id: Optional[int] = Depends(auth.get_current_user_optional)
 ):
@@ -67,9 +90,9 @@ async def get_post_details(
         # Fetch community info (if linked) using graph
         comm_id = None; comm_name = None
         try:
-            cypher_q_comm = f"MATCH (c:Community)-[:HAS_POST]->(:Post {{id: {post_id}}}) RETURN c.id as id, c.name as name LIMIT 1"
+            cypher_q_comm = "MATCH (c:Community)-[:HAS_POST]->(:Post {id: $post_id}) RETURN c.id as id, c.name as name LIMIT 1"
             expected_comm = [('id', 'agtype'), ('name', 'agtype')]
-            comm_res = crud.execute_cypher(cursor, cypher_q_comm, fetch_one=True, expected_columns=expected_comm)
+            comm_res = crud.execute_cypher(cursor, cypher_q_comm, fetch_one=True, expected_columns=expected_comm, params={'post_id': post_id})
             if comm_res and isinstance(comm_res, dict):
                 comm_id = comm_res.get('id'); comm_name = comm_res.get('name')
         except Exception as e: print(f"WARN: Failed fetching community link for P:{post_id}: {e}")
@@ -116,50 +139,34 @@ async def get_post_details(
 
 # --- GET /posts (List) ---
 @router.get("", response_model=List[schemas.PostDisplay])
-async def get_posts(
+def get_posts(
+        response: Response,
         current_user_id: Optional[int] = Depends(auth.get_current_user_optional),
         community_id: Optional[int] = Query(None), # Use Query for query params
         user_id: Optional[int] = Query(None),
         limit: int = Query(20, ge=1, le=100),
-        offset: int = Query(0, ge=0)
+        offset: int = Query(0, ge=0),
+        page_cursor: Optional[str] = Query(None, alias="cursor", description="X-Next-Cursor from the previous page; overrides offset")
 ):
     """ Fetches posts, optionally filtered. Includes graph counts & viewer status. """
     conn = None
+    before = utils.parse_page_cursor(page_cursor)
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
-        # get_posts_db fetches relational data + graph counts + basic author/community info
+        # get_posts_db returns hydrated posts: author/avatar, community, counts, media, viewer status
         posts_db = crud.get_posts_db(
             cursor, community_id=community_id, user_id=user_id,
-            limit=limit, offset=offset
+            limit=limit, offset=offset, viewer_id=current_user_id, before=before
         )
+        next_cursor = utils.next_page_cursor(posts_db, limit)
+        if next_cursor: response.headers["X-Next-Cursor"] = next_cursor
 
         processed_posts = []
         for post in posts_db:
             post_data = dict(post)
             post_id = post_data['id']
-            author_id = post_data['user_id'] # Included from get_posts_db query
-
-            # Generate author avatar URL
-            # get_posts_db query includes author_id, fetch avatar media
-            author_avatar_media = crud.get_user_profile_picture_media(cursor, author_id)
-            post_data['author_avatar_url'] = utils.get_minio_url(author_avatar_media.get('minio_object_name') if author_avatar_media else None)
-
-            # Fetch and generate Media URLs
-            try:
-                media_items = crud.get_media_items_for_post(cursor, post_id)
-                post_data['media'] = [ {**item, 'url': utils.get_minio_url(item.get('minio_object_name'))} for item in media_items ]
-            except Exception as e: print(f"WARN list: Failed getting media P:{post_id}: {e}"); post_data['media'] = []
-
-            # Get viewer status
-            viewer_vote = None; is_favorited = False
-            if current_user_id is not None:
-                try: viewer_vote = crud.get_viewer_vote_status(cursor, current_user_id, post_id=post_id)
-                except Exception as e: print(f"WARN list: vote status check failed P:{post_id}: {e}")
-                try: is_favorited = crud.get_viewer_favorite_status(cursor, current_user_id, post_id=post_id)
-                except Exception as e: print(f"WARN list: fav status check failed P:{post_id}: {e}")
-            post_data['viewer_vote_type'] = 'UP' if viewer_vote is True else ('DOWN' if viewer_vote is False else None)
-            post_data['viewer_has_favorited'] = is_favorited
+            post_data['author_avatar_url'] = utils.get_minio_url(post_data.get('author_avatar'))
 
             # Ensure defaults
             post_data.setdefault('upvotes', 0); post_data.setdefault('downvotes', 0); post_data.setdefault('reply_count', 0); post_data.setdefault('favorite_count', 0); post_data.setdefault('image_url', None)
@@ -183,7 +190,7 @@ async def get_posts(
 
 # --- POST / (Create Post) ---
 @router.post("", status_code=status.HTTP_201_CREATED, response_model=schemas.PostDisplay)
-async def create_post(
+def create_post(
         current_user_id: int = Depends(auth.get_current_user),
         title: str = Form(...),
         content: str = Form(...),
@@ -215,7 +222,7 @@ async def create_post(
         for file_upload in files:
             if file_upload and file_upload.filename:
                 object_name_prefix = f"media/posts/{post_id}"
-                upload_info = await utils.upload_file_to_minio(file_upload, object_name_prefix)
+                upload_info = anyio.from_thread.run(utils.upload_file_to_minio, file_upload, object_name_prefix)
                 if upload_info:
                     minio_objects_created.append(upload_info['minio_object_name'])
                     media_id = crud.create_media_item(cursor, uploader_user_id=current_user_id, **upload_info)
@@ -229,6 +236,7 @@ async def create_post(
             # --- Notify Community Members ---
             # CAVEAT: This can be slow for large communities. Consider async fan-out.
             community_member_ids = crud.get_community_member_ids(cursor, community_id, limit=10000, offset=0) # Arbitrary high limit
+            community_member_ids = crud.filter_recipients_by_preference(cursor, community_member_ids, 'community_post')
             content_preview = f"New post in {comm_exists.get('name', 'your community')}: \"{title[:50]}...\""
             print(f"Attempting to notify {len(community_member_ids)} members of community {community_id} about new post {post_id}")
             for member_id in community_member_ids:
@@ -291,13 +299,15 @@ async def create_post(
 
         response_object = schemas.PostDisplay(**created_post_data)
         conn.commit() # Commit post, media, community link, and notifications
+        crud.schedule_timeline_fanout(post_id) # Followers' home timelines, off the request path
+        crud.schedule_media_variants(media_ids_created) # Thumbnails/resized images, off the request path
 
         if community_id is not None:
             room_key = f"community_{community_id}"
             broadcast_payload = {"type": "new_post", "data": { "post_id": post_id, "community_id": community_id, "user_id": current_user_id, "title": title }}
             print(f"Broadcasting new post notification to room: {room_key}")
             try:
-                await manager.broadcast(json.dumps(broadcast_payload), room_key)
+                anyio.from_thread.run(manager.publish, json.dumps(broadcast_payload), room_key)
             except Exception as ws_err: print(f"WARN: Failed to broadcast new post to {room_key}: {ws_err}")
         else:
             print(f"New post {post_id} created (not in community), no broadcast target.")
@@ -324,7 +334,7 @@ async def create_post(
 
 # --- DELETE /{post_id} ---
 @router.delete("/{post_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_post(
+def delete_post(
         post_id: int,
         current_user_id: int = Depends(auth.get_current_user)
 ):
@@ -380,7 +390,7 @@ async def delete_post(
 
 # --- POST /{post_id}/favorite ---
 @router.post("/{post_id}/favorite", status_code=status.HTTP_200_OK, response_model=Dict[str, Any])
-async def favorite_post(
+def favorite_post(
         post_id: int,
         current_user_id: int = Depends(auth.get_current_user)
 ):
@@ -407,7 +417,7 @@ async def favorite_post(
 
 # --- DELETE /{post_id}/favorite ---
 @router.delete("/{post_id}/favorite", status_code=status.HTTP_200_OK, response_model=Dict[str, Any])
-async def unfavorite_post(
+def unfavorite_post(
         post_id: int,
         current_user_id: int = Depends(auth.get_current_user)
 ):
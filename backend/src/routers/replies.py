@@ -1,8 +1,9 @@
 # src/routers/replies.py
 
-from fastapi import APIRouter, Depends, HTTPException, status, Form, File, UploadFile, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Form, File, UploadFile, Query, Response
 from typing import List, Optional, Dict, Any
 import psycopg2
+import anyio # Calls back into the event loop from threadpool handlers
 import traceback
 import json # For WebSocket payload
 
@@ -19,7 +20,7 @@ router = APIRouter(
 )
 
 @router.post("", status_code=status.HTTP_201_CREATED, response_model=schemas.ReplyDisplay)
-async def create_reply(
+def create_reply(
         current_user_id: int = Depends(auth.get_current_user), # Require auth
         post_id: int = Form(...),
         content: str = Form(...),
@@ -63,7 +64,7 @@ async def create_reply(
         for file_upload in files: # Renamed 'file' to 'file_upload' to avoid conflict
             if file_upload and file_upload.filename:
                 object_name_prefix = f"media/replies/{reply_id}"
-                upload_info = await utils.upload_file_to_minio(file_upload, object_name_prefix)
+                upload_info = anyio.from_thread.run(utils.upload_file_to_minio, file_upload, object_name_prefix)
                 if upload_info:
                     minio_objects_created.append(upload_info['minio_object_name'])
                     media_id = crud.create_media_item(cursor, uploader_user_id=current_user_id, **upload_info)
@@ -148,14 +149,15 @@ async def create_reply(
         response_object = schemas.ReplyDisplay(**created_reply_data)
 
         conn.commit() # Commit reply, media links, and notifications
+        crud.schedule_media_variants(media_ids_created)
 
         # --- 4. Broadcast WebSocket Event ---
         room_key = None
         community_id_for_broadcast = None
         try:
-            cypher_q_comm = f"MATCH (c:Community)-[:HAS_POST]->(:Post {{id: {post_id}}}) RETURN c.id as id LIMIT 1"
+            cypher_q_comm = "MATCH (c:Community)-[:HAS_POST]->(:Post {id: $post_id}) RETURN c.id as id LIMIT 1"
             expected_comm = [('id', 'agtype')]
-            comm_res = crud.execute_cypher(cursor, cypher_q_comm, fetch_one=True, expected_columns=expected_comm)
+            comm_res = crud.execute_cypher(cursor, cypher_q_comm, fetch_one=True, expected_columns=expected_comm, params={'post_id': post_id})
             if comm_res and comm_res.get('id'):
                 community_id_for_broadcast = comm_res['id']
                 room_key = f"community_{community_id_for_broadcast}"
@@ -174,7 +176,7 @@ async def create_reply(
                 }
             }
             print(f"Broadcasting new reply notification to room: {room_key}")
-            try: await manager.broadcast(json.dumps(broadcast_payload), room_key)
+            try: anyio.from_thread.run(manager.publish, json.dumps(broadcast_payload), room_key)
             except Exception as ws_err: print(f"WARN: Failed to broadcast new reply to {room_key}: {ws_err}")
         else: print(f"No specific room key found for post {post_id}, cannot broadcast reply {reply_id}.")
 
@@ -203,17 +205,28 @@ async def create_reply(
 
 
 @router.get("/{post_id}", response_model=List[schemas.ReplyDisplay])
-async def get_replies_for_post(
+def get_replies_for_post(
         post_id: int,
-        current_user_id: Optional[int] = Depends(auth.get_current_user_optional)
+        response: Response,
+        current_user_id: Optional[int] = Depends(auth.get_current_user_optional),
+        limit: Optional[int] = Query(None, ge=1, le=500, description="Page size; omit for every reply"),
+        offset: int = Query(0, ge=0),
+        page_cursor: Optional[str] = Query(None, alias="cursor", description="X-Next-Cursor from the previous page; overrides offset")
 ):
-    """ Fetches replies for a post, including media and viewer status. """
+    """ Fetches replies for a post (oldest first), including media and viewer status. """
     conn = None
+    after = utils.parse_page_cursor(page_cursor)
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
         # Fetches relational data + graph counts + author info
-        replies_db = crud.get_replies_for_post_db(cursor, post_id)
+        replies_db = crud.get_replies_for_post_db(cursor, post_id, limit=limit, offset=offset, after=after)
+        if limit is not None:
+            next_cursor = utils.next_page_cursor(replies_db, limit)
+            if next_cursor: response.headers["X-Next-Cursor"] = next_cursor
+
+        # Viewer vote/favorite status for the whole page in two graph queries
+        viewer_statuses = crud.get_item_viewer_statuses(cursor, current_user_id, [r['id'] for r in replies_db], "Reply")
 
         processed_replies = []
         for reply in replies_db:
@@ -230,15 +243,7 @@ async def get_replies_for_post(
                 reply_data['media'] = [ {**item, 'url': utils.get_minio_url(item.get('minio_object_name'))} for item in media_items ]
             except Exception as e: print(f"WARN GET /replies: Failed fetching media for reply {reply_id}: {e}"); reply_data['media'] = []
 
-            # Get viewer status
-            viewer_vote = None; is_favorited = False
-            if current_user_id is not None:
-                try: viewer_vote = crud.get_viewer_vote_status(cursor, current_user_id, post_id=None, reply_id=reply_id)
-                except Exception as e: print(f"WARN GET /replies: vote status check failed R:{reply_id}: {e}")
-                try: is_favorited = crud.get_viewer_favorite_status(cursor, current_user_id, post_id=None, reply_id=reply_id)
-                except Exception as e: print(f"WARN GET /replies: fav status check failed R:{reply_id}: {e}")
-            reply_data['viewer_vote_type'] = 'UP' if viewer_vote is True else ('DOWN' if viewer_vote is False else None)
-            reply_data['viewer_has_favorited'] = is_favorited
+            reply_data.update(viewer_statuses.get(reply_id, {'viewer_vote_type': None, 'viewer_has_favorited': False}))
 
             # Ensure defaults
             reply_data.setdefault('upvotes', 0); reply_data.setdefault('downvotes', 0); reply_data.setdefault('favorite_count', 0); reply_data.setdefault('media', [])
@@ -263,7 +268,7 @@ async def get_replies_for_post(
 
 
 @router.delete("/{reply_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_reply(
+def delete_reply(
         reply_id: int,
         current_user_id: int = Depends(auth.get_current_user)
 ):
@@ -315,7 +320,7 @@ async def delete_reply(
 # --- Favorite/Unfavorite Reply Endpoints ---
 
 @router.post("/{reply_id}/favorite", status_code=status.HTTP_200_OK, response_model=Dict[str, Any])
-async def favorite_reply(
+def favorite_reply(
         reply_id: int,
         current_user_id: int = Depends(auth.get_current_user)
 ):
@@ -342,7 +347,7 @@ async def favorite_reply(
 
 
 @router.delete("/{reply_id}/favorite", status_code=status.HTTP_200_OK, response_model=Dict[str, Any])
-async def unfavorite_reply(
+def unfavorite_reply(
         reply_id: int,
         current_user_id: int = Depends(auth.get_current_user)
 ):
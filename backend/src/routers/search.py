@@ -1,6 +1,6 @@
 # src/routers/search.py
 
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
 from typing import List, Optional, Dict, Any, Literal
 import psycopg2
 
@@ -31,24 +31,33 @@ def get_media_object_name_by_id(cursor, media_id: int) -> Optional[str]:
 
 
 @router.get("", response_model=schemas.SearchResponse)
-async def perform_search(
+def perform_search(
+    response: Response,
     q: str = Query(..., min_length=1, description="Search query term"),
     type: Optional[Literal['user', 'community', 'post']] = Query(None, description="Filter results by type"),
     limit: int = Query(20, ge=1, le=100),
     offset: int = Query(0, ge=0),
+    page_cursor: Optional[str] = Query(None, alias="cursor", description="X-Next-Cursor from the previous page; overrides offset"),
     # Optional auth to personalize results later if needed
     # current_user_id: Optional[int] = Depends(auth.get_current_user_optional)
 ):
     """Performs a full-text search across users, communities, and posts."""
     conn = None
+    before = utils.parse_page_cursor(page_cursor)
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
 
         # Call CRUD search function
         search_results_db = crud.search_all(
-            cursor, search_query=q, entity_type=type, limit=limit, offset=offset
+            cursor, search_query=q, entity_type=type, limit=limit, offset=offset, before=before
         )
+        if len(search_results_db) >= limit:
+            # Keyed on the sort columns, not the displayed created_at (which may be NULL)
+            last = search_results_db[-1]
+            response.headers["X-Next-Cursor"] = utils.encode_page_cursor(
+                last['sort_created_at'], last['id'], rank=last['rank'], type=last['type']
+            )
 
         # Process results to generate image URLs and format snippet
         processed_results: List[schemas.SearchResultItem] = []
@@ -15,7 +15,7 @@ router = APIRouter(
 )
 
 @router.get("/notifications", response_model=schemas.NotificationSettings)
-async def read_notification_settings(current_user_id: int = Depends(auth.get_current_user)):
+def read_notification_settings(current_user_id: int = Depends(auth.get_current_user)):
     """Fetches the current user's notification settings."""
     conn = None
     try:
@@ -39,7 +39,7 @@ async def read_notification_settings(current_user_id: int = Depends(auth.get_cur
         if conn: conn.close()
 
 @router.put("/notifications", response_model=schemas.NotificationSettings)
-async def write_notification_settings(
+def write_notification_settings(
         settings_data: schemas.NotificationSettings, # Expect full settings object
         current_user_id: int = Depends(auth.get_current_user)
 ):
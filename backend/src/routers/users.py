@@ -18,7 +18,7 @@ router = APIRouter(
 )
 
 @router.get("/{user_id}", response_model=schemas.UserDisplay)
-async def get_user_profile_route(
+def get_user_profile_route(
         user_id: int,
         requesting_user_id: Optional[int] = Depends(get_current_user_optional)
 ):
@@ -103,7 +103,7 @@ async def get_user_profile_route(
         if conn: conn.close()
 
 @router.post("/{user_id}/follow", status_code=status.HTTP_200_OK, response_model=Dict[str, Any])
-async def follow_user_route(
+def follow_user_route(
         user_id: int, # This is the user_id to be followed (target_user_id)
         current_user_id: int = Depends(get_current_user) # This is the actor (follower_id)
 ):
@@ -186,7 +186,7 @@ async def follow_user_route(
         if conn: conn.close()
 
 @router.delete("/{user_id}/follow", status_code=status.HTTP_200_OK, response_model=Dict[str, Any])
-async def unfollow_user_route(
+def unfollow_user_route(
         user_id: int, # User to unfollow
         current_user_id: int = Depends(get_current_user)
 ):
@@ -231,7 +231,7 @@ async def unfollow_user_route(
         if conn: conn.close()
 
 @router.get("/{user_id}/followers", response_model=List[schemas.UserBase])
-async def get_followers_route(
+def get_followers_route(
         user_id: int,
         requesting_user_id: Optional[int] = Depends(get_current_user_optional)
 ):
@@ -279,7 +279,7 @@ async def get_followers_route(
         if conn: conn.close()
 
 @router.get("/{user_id}/following", response_model=List[schemas.UserBase])
-async def get_following_route(
+def get_following_route(
         user_id: int,
         requesting_user_id: Optional[int] = Depends(get_current_user_optional)
 ):
@@ -342,7 +342,7 @@ async def get_following_route(
         if conn: conn.close()
 
 @router.get("/me/communities", response_model=List[schemas.CommunityDisplay])
-async def get_my_joined_communities(current_user_id: int = Depends(auth.get_current_user)):
+def get_my_joined_communities(current_user_id: int = Depends(auth.get_current_user)):
     conn = None
     try:
         conn = get_db_connection(); cursor = conn.cursor()
@@ -381,7 +381,7 @@ async def get_my_joined_communities(current_user_id: int = Depends(auth.get_curr
         if conn: conn.close()
 
 @router.get("/me/events", response_model=List[schemas.EventDisplay])
-async def get_my_joined_events(current_user_id: int = Depends(auth.get_current_user)):
+def get_my_joined_events(current_user_id: int = Depends(auth.get_current_user)):
     conn = None
     try:
         conn = get_db_connection(); cursor = conn.cursor()
@@ -416,7 +416,7 @@ async def get_my_joined_events(current_user_id: int = Depends(auth.get_current_u
         if conn: conn.close()
 
 @router.get("/me/stats", response_model=schemas.UserStats)
-async def get_user_stats(current_user_id: int = Depends(get_current_user)):
+def get_user_stats(current_user_id: int = Depends(get_current_user)):
     conn = None
     try:
         conn = get_db_connection(); cursor = conn.cursor()
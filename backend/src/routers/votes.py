@@ -14,7 +14,7 @@ router = APIRouter(
 )
 
 @router.post("", status_code=status.HTTP_200_OK, response_model=Dict[str, Any])
-async def manage_vote(
+def manage_vote(
         vote_data: schemas.VoteCreate,
         current_user_id: int = Depends(auth.get_current_user)
 ):
@@ -33,63 +33,22 @@ async def manage_vote(
     try:
         conn = get_db_connection(); cursor = conn.cursor()
 
-        # 1. Get current vote state FROM A FRESH CURSOR to ensure visibility
-        current_db_vote_type: Optional[bool] = None
-        # This is important if the previous operation in the same test function committed.
-        with get_db_connection() as fresh_conn: # Create a new connection context
-            with fresh_conn.cursor() as fresh_cursor:
-                current_db_vote_type = crud.get_viewer_vote_status(
-                    fresh_cursor, current_user_id, post_id=post_id, reply_id=reply_id
-                )
-
-        #print(f"DEBUG manage_vote: User {current_user_id} on {target_type_str} {target_id} - Current DB vote: {current_db_vote_type}, Requested vote: {requested_vote_type}")
-
-        action_taken_api_string = "" # For the API response "action" field
-        successful_operation = False # Overall success of the user's intent
-
-        # FIX: Make sure to correctly compare boolean values
-        # The problem might be with the comparison of None and boolean values
-        if current_db_vote_type is not None and current_db_vote_type == requested_vote_type:
-            # User clicked the same vote button again (e.g., upvoted, clicks upvote again) -> remove vote
-            #print(f"  Attempting to remove existing vote for {target_type_str} {target_id}")
-            db_op_removed = crud.remove_vote_db(cursor, current_user_id, post_id, reply_id)
-            if db_op_removed:
-                action_taken_api_string = "removed"
-                successful_operation = True
-                print(f"  Vote successfully removed.")
-            else:
-                # This means there was no vote to remove (edge didn't exist or delete failed for other reason)
-                # If no vote existed, the state is already "removed", so user intent is met.
-                action_taken_api_string = "removed" # Or "not_voted_initially"
-                successful_operation = True # State is as if removed
-                print(f"  No existing vote found to remove, or DB remove_vote_db returned False.")
-        else:
-            # New vote or changing existing vote
-            print(f"  Attempting to cast/update vote for {target_type_str} {target_id} to {requested_vote_type}")
-            db_op_cast = crud.cast_vote_db(cursor, current_user_id, post_id, reply_id, requested_vote_type)
-            if db_op_cast:
-                action_taken_api_string = "cast/updated"
-                successful_operation = True
-                print(f"  Vote successfully cast/updated.")
-            else:
-                action_taken_api_string = "cast_or_update_failed"
-                successful_operation = False # CRUD call failed
-                print(f"  CRUD cast_vote_db returned False.")
-
+        # One upsert returns the previous vote and the new counters; sending the same vote again removes it
+        result = crud.toggle_vote_db(cursor, current_user_id, post_id, reply_id, requested_vote_type)
         conn.commit()
-        #print(f"DEBUG manage_vote: Transaction committed. Router action: '{action_taken_api_string}'")
 
-        counts = {}
-        # Fetch counts using a new cursor to ensure we see committed data
-        with get_db_connection() as count_conn:
-            with count_conn.cursor() as count_cursor:
-                if target_id is not None:
-                    if post_id: counts = crud.get_post_counts(count_cursor, post_id)
-                    elif reply_id: counts = crud.get_reply_counts(count_cursor, reply_id)
+        if result is None:
+            print(f"  Vote target {target_type_str} {target_id} (or user) not found.")
+            return {"message": "Vote action: cast_or_update_failed", "action": "cast_or_update_failed", "success": False, "new_counts": {}}
 
-        print(f"✅ Vote action '{action_taken_api_string}' completed. API Response Success: {successful_operation}. Counts: {counts}")
+        action_taken_api_string = result["action"]
+        counts = result["counts"]
+        print(f"✅ Vote action '{action_taken_api_string}' completed for {target_type_str} {target_id}. Counts: {counts}")
 
-        return {"message": f"Vote action: {action_taken_api_string}", "action": action_taken_api_string, "success": successful_operation, "new_counts": counts}
+        return {
+            "message": f"Vote action: {action_taken_api_string}", "action": action_taken_api_string, "success": True,
+            "vote_type": result["vote_type"], "new_counts": counts
+        }
 
     except ValueError as ve:
         if conn: conn.rollback()
@@ -109,6 +68,56 @@ async def manage_vote(
         if conn: conn.close()
 
 
+@router.post("/batch", status_code=status.HTTP_200_OK, response_model=Dict[str, Any])
+def manage_votes_batch(
+        batch: schemas.VoteBatchCreate,
+        current_user_id: int = Depends(auth.get_current_user)
+):
+    """
+    Applies queued vote changes (e.g. made offline) in one transaction. Each item sets the final
+    state (vote_type true/false, or null to remove), so replaying a batch is idempotent.
+    """
+    for index, item in enumerate(batch.votes):
+        if (item.post_id is None) == (item.reply_id is None):
+            raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                                detail=f"votes[{index}]: must vote on exactly one of post_id or reply_id")
+
+    conn = None
+    try:
+        conn = get_db_connection(); cursor = conn.cursor()
+        results = []
+        for item in batch.votes:
+            result = crud.set_vote_db(cursor, current_user_id, item.post_id, item.reply_id, item.vote_type)
+            results.append({
+                "post_id": item.post_id, "reply_id": item.reply_id,
+                "success": result is not None,
+                "previous_vote_type": result["previous_vote_type"] if result else None,
+                "vote_type": result["vote_type"] if result else None,
+                "new_counts": result["counts"] if result else {},
+            })
+        conn.commit()
+
+        applied = sum(1 for r in results if r["success"])
+        print(f"✅ Vote batch for user {current_user_id}: {applied}/{len(results)} applied.")
+        return {"message": f"{applied} of {len(results)} vote changes applied", "applied": applied, "results": results}
+
+    except ValueError as ve:
+        if conn: conn.rollback()
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(ve))
+    except psycopg2.Error as db_err:
+        if conn: conn.rollback()
+        print(f"❌ Vote batch DB Error: {db_err} (Code: {db_err.pgcode})")
+        traceback.print_exc()
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Database error during batch voting.")
+    except Exception as e:
+        if conn: conn.rollback()
+        print(f"❌ Vote batch error [{type(e).__name__}]: {e}")
+        traceback.print_exc()
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"An unexpected error occurred during batch voting: {e}")
+    finally:
+        if conn: conn.close()
+
+
 # Fix for _vote.py - Need to update the functions to correctly update vote counts
 
 def cast_vote_db(
@@ -124,25 +133,22 @@ def cast_vote_db(
         raise ValueError("Vote target missing: Must provide post_id or reply_id")
 
     now_iso = datetime.now(timezone.utc).isoformat()
-    created_at_cypher = utils.quote_cypher_string(now_iso)
-    # utils.quote_cypher_string will convert Python True/False to Cypher true/false
-    vote_type_cypher = utils.quote_cypher_string(vote_type)
 
     # First check if this is a vote change (e.g., from upvote to downvote)
     # If so, we need to update counts differently
     existing_vote = get_viewer_vote_status(cursor, user_id, post_id, reply_id)
 
     cypher_q = f"""
-        MATCH (u:User {{id: {user_id}}})
-        MATCH (target:{target_label} {{id: {target_id}}})
+        MATCH (u:User {{id: $user_id}})
+        MATCH (target:{target_label} {{id: $target_id}})
         MERGE (u)-[r:VOTED]->(target)
-        SET r.vote_type = {vote_type_cypher}, r.created_at = {created_at_cypher}
+        SET r.vote_type = $vote_type, r.created_at = $created_at
         RETURN r.vote_type as set_vote_type 
     """
     expected_cols = [('set_vote_type', 'agtype')]
     try:
-        #print(f"CRUD: Casting/Updating vote (U:{user_id} on {target_label}:{target_id} to {vote_type}) with Cypher: SET r.vote_type = {vote_type_cypher}")
-        result_map = execute_cypher(cursor, cypher_q, fetch_one=True, expected_columns=expected_cols)
+        graph_params = {'user_id': user_id, 'target_id': target_id, 'vote_type': bool(vote_type), 'created_at': now_iso}
+        result_map = execute_cypher(cursor, cypher_q, fetch_one=True, expected_columns=expected_cols, params=graph_params)
 
         #print(f"CRUD cast_vote_db: Raw result from graph SET: {result_map}")
 
@@ -197,7 +203,7 @@ def remove_vote_db(
     # One way is to try to delete and return the count of deleted edges.
     # `WITH r DELETE r RETURN count(r)` should work with AGE if count(r) refers to the matched edge.
     cypher_q = f"""
-        MATCH (u:User {{id: {user_id}}})-[r:VOTED]->(target:{target_label} {{id: {target_id}}})
+        MATCH (u:User {{id: $user_id}})-[r:VOTED]->(target:{target_label} {{id: $target_id}})
         WITH r // Ensure 'r' is bound before DELETE for count to work as expected
         DELETE r
         RETURN count(r) as deleted_count 
@@ -205,7 +211,7 @@ def remove_vote_db(
     expected_cols = [('deleted_count', 'agtype')]
     try:
         print(f"CRUD: Removing vote (U:{user_id} -> {target_label}:{target_id})...")
-        result_map = execute_cypher(cursor, cypher_q, fetch_one=True, expected_columns=expected_cols)
+        result_map = execute_cypher(cursor, cypher_q, fetch_one=True, expected_columns=expected_cols, params={'user_id': user_id, 'target_id': target_id})
 
         deleted_count_raw = result_map.get('deleted_count') if result_map else 0
         deleted_count = 0
@@ -261,15 +267,16 @@ def update_vote_counts(
 
     # Create a cypher query to update the counts
     cypher_q = f"""
-        MATCH (target:{target_label} {{id: {target_id}}})
-        SET target.upvotes = COALESCE(target.upvotes, 0) + {upvote_change},
-            target.downvotes = COALESCE(target.downvotes, 0) + {downvote_change}
+        MATCH (target:{target_label} {{id: $target_id}})
+        SET target.upvotes = COALESCE(target.upvotes, 0) + $upvote_change,
+            target.downvotes = COALESCE(target.downvotes, 0) + $downvote_change
         RETURN target.upvotes as new_upvotes, target.downvotes as new_downvotes
     """
     expected_cols = [('new_upvotes', 'agtype'), ('new_downvotes', 'agtype')]
 
     try:
-        result = execute_cypher(cursor, cypher_q, fetch_one=True, expected_columns=expected_cols)
+        result = execute_cypher(cursor, cypher_q, fetch_one=True, expected_columns=expected_cols,
+                                params={'target_id': target_id, 'upvote_change': upvote_change, 'downvote_change': downvote_change})
         print(f"CRUD: Updated {target_label} {target_id} vote counts: {result}")
         return True
     except Exception as e:
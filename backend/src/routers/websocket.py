@@ -10,8 +10,10 @@ from datetime import datetime, timezone
 
 # Use the central crud import
 from .. import schemas, crud, auth, security
-from ..database import get_db_connection, update_last_seen
+from ..database import get_db_connection, run_in_db_executor, schedule_last_seen_update
 from ..connection_manager import manager
+from ..chat_writer import chat_writer
+from ..presence import user_room
 
 router = APIRouter(tags=["WebSocket"])
 
@@ -22,7 +24,7 @@ async def validate_token_direct(token: Optional[str]) -> Optional[int]:
         payload = jwt.decode(token, auth.SECRET_KEY, algorithms=[auth.ALGORITHM]); user_id = payload.get("user_id")
         if user_id is None: print("WS Token Direct Validate: Payload missing user_id."); return None
         user_id_int = int(user_id); print(f"WS Token Direct Validate: User {user_id_int} validated.")
-        try: update_last_seen(user_id_int) # Update last seen on successful WS connect
+        try: schedule_last_seen_update(user_id_int) # Update last seen on successful WS connect (off-loop)
         except Exception as e: print(f"WS Warning: Failed last_seen update: {e}")
         return user_id_int
     except Exception as e: print(f"WS Token Direct Validate: Error - {e}"); return None
@@ -33,6 +35,96 @@ async def validate_api_key_direct(api_key: Optional[str]) -> bool:
     if not api_key: print("WS API Key Direct Validate: No key provided."); return False
     is_valid = (api_key == security.VALID_API_KEY); print(f"WS API Key Direct Validate: Provided key validation result: {is_valid}"); return is_valid
 
+VALID_ROOM_TYPES = ("community", "event")
+# Rooms one multiplexed /ws socket may join at once
+WS_MAX_ROOMS_PER_SOCKET = int(os.getenv("WS_MAX_ROOMS_PER_SOCKET", 100))
+
+def parse_room_key(room: object) -> Optional[str]:
+    """'community_5' / 'event_7' -> the same string when valid, else None."""
+    if not isinstance(room, str): return None
+    room_type, _, room_id = room.partition("_")
+    if room_type not in VALID_ROOM_TYPES or not room_id.isdigit(): return None
+    return f"{room_type}_{int(room_id)}"
+
+async def authenticate_socket(websocket: WebSocket, token: Optional[str], api_key: Optional[str]) -> Optional[int]:
+    """API key + JWT check after accept(); closes the socket (1008) and returns None on failure."""
+    if not await validate_api_key_direct(api_key):
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="Invalid API Key"); return None
+    user_id = await validate_token_direct(token)
+    if user_id is None:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="Invalid Token"); return None
+    return user_id
+
+def _send_error(websocket: WebSocket, error: str, room_key: Optional[str] = None):
+    frame = {"error": error, "type": "error"}
+    if room_key is not None: frame["room"] = room_key
+    manager.send_to(websocket, json.dumps(frame))
+
+async def save_and_publish_chat(websocket: WebSocket, sender_user_id: int, room_key: str, content: object, tag_errors: bool = False):
+    """Validates, persists (group commit) and broadcasts one chat message; errors go back to the sender only."""
+    error_room = room_key if tag_errors else None # /ws clients need to know which room an error is about
+    if not content or not isinstance(content, str) or not content.strip():
+        print(f"WS Warning: User {sender_user_id} sent invalid message content.")
+        _send_error(websocket, "Invalid message content.", error_room); return
+
+    # --- Save message via the group-commit chat writer (batched INSERT + one commit) ---
+    try:
+        room_type, _, room_id = room_key.partition("_")
+        msg_community_id = int(room_id) if room_type == "community" else None
+        msg_event_id = int(room_id) if room_type == "event" else None
+
+        created_message_dict = await chat_writer.submit(
+            sender_user_id, content.strip(), msg_community_id, msg_event_id
+        )
+
+        if created_message_dict:
+            print(f"✅ WS Message from User {sender_user_id} saved (ID: {created_message_dict.get('message_id', 'N/A')}). Broadcasting...")
+            broadcast_obj = schemas.ChatMessageData(**created_message_dict)
+            broadcast_json = broadcast_obj.model_dump_json() if hasattr(broadcast_obj, 'model_dump_json') else broadcast_obj.json()
+
+            await manager.publish(broadcast_json, room_key) # Local enqueue + backplane; never waits on clients
+            print(f"📢 WS Broadcast queued for {room_key}.")
+        else:
+            print(f"WS Error: Failed to save message to DB for User {sender_user_id} (CRUD returned None).")
+            _send_error(websocket, "Failed to save message.", error_room)
+
+    except psycopg2.Error as db_error:
+        print(f"WS DB Error (psycopg2) saving message from User {sender_user_id}: {db_error}")
+        _send_error(websocket, "Database error processing message.", error_room)
+    except Exception as db_e:
+        print(f"WS Generic Error saving message from User {sender_user_id}: {db_e}")
+        traceback.print_exc()
+        _send_error(websocket, "Failed processing message data.", error_room)
+    # --- End DB interaction ---
+
+def _load_unread_count(user_id: int) -> int:
+    conn = None
+    try:
+        conn = get_db_connection(); cursor = conn.cursor()
+        count = crud.get_unread_notification_count(cursor, user_id)
+        conn.commit() # Seeds the counter row on first use
+        crud.remember_unread_count(user_id, count)
+        return count
+    finally:
+        if conn: conn.close()
+
+async def join_user_room(websocket: WebSocket, user_id: int):
+    """
+    Subscribes the socket to its user's private room and sends the current unread count, so clients never poll.
+    The count comes from crud's per-worker cache; only a user not seen recently costs a counter-row read.
+    """
+    await manager.connect(websocket, user_room(user_id), user_id)
+    count = crud.get_cached_unread_count(user_id)
+    if count is None:
+        try: count = await run_in_db_executor(_load_unread_count, user_id)
+        except Exception as e: print(f"WS Warning: unread count for User {user_id} unavailable: {e}"); return
+    manager.send_to(websocket, json.dumps({"type": "unread_count", "count": count}))
+
+def _pong(websocket: WebSocket, room_key: Optional[str] = None):
+    frame = {"type": "pong"}
+    if room_key is not None: frame["online_count"] = manager.presence.online_count(room_key)
+    manager.send_to(websocket, json.dumps(frame))
+
 @router.websocket("/ws/{room_type}/{room_id}")
 async def websocket_endpoint(
         websocket: WebSocket,
@@ -51,91 +143,46 @@ async def websocket_endpoint(
         accepted = True
         print(f"WS connection accepted (pre-auth) for {room_type}_{room_id}.")
 
-        # Validate API Key first
-        is_api_key_valid = await validate_api_key_direct(api_key)
-        if not is_api_key_valid:
-            await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="Invalid API Key"); return
-
-        # Validate JWT Token
-        user_id = await validate_token_direct(token)
-        if user_id is None:
-            await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="Invalid Token"); return
+        # Validate API Key, then JWT Token
+        user_id = await authenticate_socket(websocket, token, api_key)
+        if user_id is None: return
 
         print(f"WS connection authenticated post-accept for User {user_id}.")
 
         # --- Validate Room and Connect ---
-        valid_room_types = ["community", "event"]
-        if room_type not in valid_room_types:
+        if room_type not in VALID_ROOM_TYPES:
             await websocket.close(code=status.WS_1003_UNSUPPORTED_DATA, reason="Invalid room type"); return
 
         room_key = f"{room_type}_{room_id}"
         print(f"WS Determined room key: {room_key}")
 
         await manager.connect(websocket, room_key, user_id)
+        # The shipped client still uses this endpoint, so it gets notification pushes here too. A client with one
+        # socket per room receives each frame once per socket; both frame types are idempotent (notifications are
+        # keyed by id, unread_count carries the absolute count), so it can drop repeats.
+        await join_user_room(websocket, user_id)
         print(f"WS Manager connect successful for User {user_id} / {room_key}. Entering loop.")
 
         # --- Message Handling Loop ---
         while True:
-            # print(f"--- WS DEBUG --- User {user_id} / {room_key} waiting for message...")
             data = await websocket.receive_text()
+            manager.touch(websocket) # Any frame counts as a heartbeat for presence
             sender_user_id = user_id # Use ID established at connection time
             print(f"WS Received in {room_key} from User {sender_user_id}: {data[:100]}...") # Log truncated
 
             try:
                 message_data = json.loads(data)
-                content = message_data.get('content')
-
-                if not content or not isinstance(content, str) or not content.strip():
-                    print(f"WS Warning: User {sender_user_id} sent invalid message content.")
-                    await websocket.send_text(json.dumps({"error": "Invalid message content.", "type": "error"}))
-                    continue
-
-                # --- Save message to DB using central CRUD import ---
-                conn = None
-                try:
-                    conn = get_db_connection()
-                    cursor = conn.cursor()
-                    msg_community_id = room_id if room_type == "community" else None
-                    msg_event_id = room_id if room_type == "event" else None
-
-                    # Call the chat CRUD function (operates on public.chat_messages)
-                    created_message_dict = crud.create_chat_message_db(
-                        cursor, user_id=sender_user_id, content=content.strip(),
-                        community_id=msg_community_id, event_id=msg_event_id
-                    )
-                    conn.commit() # Commit successful insert
-
-                    if created_message_dict:
-                        print(f"✅ WS Message from User {sender_user_id} saved (ID: {created_message_dict.get('message_id', 'N/A')}). Broadcasting...")
-                        broadcast_obj = schemas.ChatMessageData(**created_message_dict)
-                        broadcast_json = broadcast_obj.model_dump_json() if hasattr(broadcast_obj, 'model_dump_json') else broadcast_obj.json()
-
-                        await manager.broadcast(broadcast_json, room_key)
-                        print(f"📢 WS Broadcast completed for {room_key}.")
-                    else:
-                        print(f"WS Error: Failed to save message to DB for User {sender_user_id} (CRUD returned None).")
-                        await websocket.send_text(json.dumps({"error": "Failed to save message.", "type": "error"}))
-
-                except psycopg2.Error as db_error:
-                    if conn: conn.rollback()
-                    print(f"WS DB Error (psycopg2) saving message from User {sender_user_id}: {db_error}")
-                    await websocket.send_text(json.dumps({"error": f"Database error processing message.", "type": "error"}))
-                except Exception as db_e:
-                    if conn: conn.rollback()
-                    print(f"WS Generic Error saving message from User {sender_user_id}: {db_e}")
-                    traceback.print_exc()
-                    await websocket.send_text(json.dumps({"error": "Failed processing message data.", "type": "error"}))
-                finally:
-                    if conn: conn.close()
-                # --- End DB interaction ---
+                if isinstance(message_data, dict) and message_data.get('type') == 'ping':
+                    _pong(websocket, room_key); continue
+                await save_and_publish_chat(websocket, sender_user_id, room_key, message_data.get('content'))
 
             except json.JSONDecodeError:
                 print(f"WS Error: Received invalid JSON from User {sender_user_id}.")
-                await websocket.send_text(json.dumps({"error": "Invalid message format.", "type": "error"}))
+                _send_error(websocket, "Invalid message format.")
             except Exception as proc_e:
                 print(f"WS Error processing received data content from User {sender_user_id}: {proc_e}")
                 traceback.print_exc()
-                await websocket.send_text(json.dumps({"error": "Error processing message content.", "type": "error"}))
+                _send_error(websocket, "Error processing message content.")
             # --- End Inner processing ---
 
     except WebSocketDisconnect as ws_exc:
@@ -155,4 +202,75 @@ async def websocket_endpoint(
         else:
             client_host = websocket.client.host if websocket.client else 'Unknown'
             client_port = websocket.client.port if websocket.client else '?'
-            print(f"WS Cleaned up connection via finally (User/Room Unknown) from {client_host}:{client_port}")
\ No newline at end of file
+            print(f"WS Cleaned up connection via finally (User/Room Unknown) from {client_host}:{client_port}")
+
+
+# --- Multiplexed socket: one connection, many rooms ---
+# Frames from the client:
+#   {"type": "subscribe", "room": "community_5"}    -> {"type": "subscribed", "room": ..., "online_count": n}
+#   {"type": "unsubscribe", "room": "community_5"}  -> {"type": "unsubscribed", "room": ...}
+#   {"type": "message", "room": "community_5", "content": "..."}
+#   {"type": "ping"}                                -> {"type": "pong"}
+# Room traffic arrives exactly as on /ws/{room_type}/{room_id}; chat frames carry community_id/event_id,
+# post/reply frames carry community_id, presence_update frames carry "room_key".
+@router.websocket("/ws")
+async def multiplexed_websocket_endpoint(
+        websocket: WebSocket,
+        token: Optional[str] = Query(None), # Auth token
+        api_key: Optional[str] = Query(None) # API Key
+):
+    user_id: Optional[int] = None
+    accepted = False
+
+    try:
+        await websocket.accept()
+        accepted = True
+        user_id = await authenticate_socket(websocket, token, api_key) # Once per connection, not per room
+        if user_id is None: return
+        await join_user_room(websocket, user_id) # Notifications + unread count pushes; not unsubscribable
+        print(f"WS multiplexed connection authenticated for User {user_id}.")
+
+        while True:
+            data = await websocket.receive_text()
+            manager.touch(websocket)
+            try:
+                frame = json.loads(data)
+                if not isinstance(frame, dict): raise ValueError("frame must be an object")
+                frame_type = frame.get('type')
+                if frame_type == 'ping':
+                    _pong(websocket); continue
+
+                room_key = parse_room_key(frame.get('room'))
+                if room_key is None:
+                    _send_error(websocket, "Invalid room."); continue
+
+                if frame_type == 'subscribe':
+                    joined = manager.rooms_for(websocket) - {user_room(user_id)}
+                    if room_key not in joined and len(joined) >= WS_MAX_ROOMS_PER_SOCKET:
+                        _send_error(websocket, f"Too many rooms (max {WS_MAX_ROOMS_PER_SOCKET}).", room_key); continue
+                    await manager.connect(websocket, room_key, user_id)
+                    manager.send_to(websocket, json.dumps({"type": "subscribed", "room": room_key, "online_count": manager.presence.online_count(room_key)}))
+                elif frame_type == 'unsubscribe':
+                    manager.leave(websocket, room_key)
+                    manager.send_to(websocket, json.dumps({"type": "unsubscribed", "room": room_key}))
+                elif frame_type == 'message':
+                    if room_key not in manager.rooms_for(websocket):
+                        _send_error(websocket, "Not subscribed to room.", room_key); continue
+                    await save_and_publish_chat(websocket, user_id, room_key, frame.get('content'), tag_errors=True)
+                else:
+                    _send_error(websocket, "Unknown frame type.", room_key)
+
+            except ValueError: # Includes json.JSONDecodeError
+                print(f"WS Error: Received invalid frame from User {user_id}.")
+                _send_error(websocket, "Invalid message format.")
+
+    except WebSocketDisconnect as ws_exc:
+        print(f"WebSocket disconnected (User {user_id}, multiplexed): Code {ws_exc.code}")
+    except Exception:
+        print(f"--- !!! UNHANDLED EXCEPTION in multiplexed WS Handler (User {user_id}) !!! ---")
+        traceback.print_exc()
+        if accepted and websocket.client_state == websocket.client_state.CONNECTED:
+            try: await websocket.close(code=status.WS_1011_INTERNAL_ERROR, reason="Internal server error")
+            except: pass
+    finally:
+        manager.disconnect(websocket) # Leaves every subscribed room; no-op if never registered
@@ -47,6 +47,13 @@ class TokenData(BaseModel): # For decoding token payload & login response
     user_id: int
     image_url: Optional[str] = None # Include image URL on login/signup
 
+class MediaVariantDisplay(BaseModel):
+    name: str # thumb | medium | large
+    url: str # Pre-signed URL from MinIO
+    width: Optional[int] = None
+    height: Optional[int] = None
+    mime_type: Optional[str] = None
+
 class MediaItemDisplay(BaseModel):
     id: int
     url: Optional[str] # Pre-signed URL from MinIO
@@ -57,6 +64,7 @@ class MediaItemDisplay(BaseModel):
     height: Optional[int] = None
     duration_seconds: Optional[float] = None
     created_at: datetime
+    variants: List[MediaVariantDisplay] = [] # Resized renditions of images, smallest first
 
     class Config: from_attributes = True
 
@@ -236,6 +244,38 @@ class VoteCreate(BaseModel):
     #     return v
 
 
+class VoteBatchItem(BaseModel):
+    post_id: Optional[int] = None
+    reply_id: Optional[int] = None
+    vote_type: Optional[bool] = None # Final state: true=up, false=down, null=no vote
+
+class VoteBatchCreate(BaseModel):
+    # Applied in order in one transaction; later items for the same target win
+    votes: List[VoteBatchItem] = Field(..., min_length=1, max_length=100)
+
+
+# --- Viewer relationship schemas (GET /me/relationships) ---
+class ItemViewerStatus(BaseModel):
+    viewer_vote_type: Optional[str] = None # 'UP', 'DOWN' or None
+    viewer_has_favorited: bool = False
+
+class UserViewerStatus(BaseModel):
+    is_following: bool = False
+
+class CommunityViewerStatus(BaseModel):
+    is_member: bool = False
+
+class EventViewerStatus(BaseModel):
+    is_participating: bool = False
+
+class ViewerRelationships(BaseModel):
+    posts: Dict[int, ItemViewerStatus] = {}
+    replies: Dict[int, ItemViewerStatus] = {}
+    users: Dict[int, UserViewerStatus] = {}
+    communities: Dict[int, CommunityViewerStatus] = {}
+    events: Dict[int, EventViewerStatus] = {}
+
+
 class VoteDisplay(BaseModel):
     id: int
     user_id: int
@@ -414,9 +454,13 @@ class NotificationDisplay(BaseModel):
     type: NotificationTypeEnum
     is_read: bool
     created_at: datetime
+    last_activity_at: Optional[datetime] = None # Moves with new activity on a coalesced group; the list's sort key
     content_preview: Optional[str] = None
-    actor: Optional[NotificationActorInfo] = None
+    actor: Optional[NotificationActorInfo] = None # Latest actor
     related_entity: Optional[NotificationRelatedEntityInfo] = None
+    # Coalesced groups ("alice and 41 others liked your post"): distinct actors and the latest few
+    actor_count: int = 1
+    sample_actors: List[NotificationActorInfo] = []
 
     class Config:
         from_attributes = True
@@ -9,6 +9,8 @@ from typing import Optional, Dict, Any
 import strawberry
 from strawberry.fastapi import GraphQLRouter
 import traceback # Ensure imported
+import anyio
+import asyncio
 
 # --- Router Imports ---
 from .routers import (
@@ -17,19 +19,72 @@ from .routers import (
     chat as chat_router, websocket as websocket_router, users as users_router,
     settings as settings_router, block as block_router, search as search_router,
     feed as feed_router,
-    notifications as notifications_router # <-- ADD THIS
+    notifications as notifications_router, # <-- ADD THIS
+    me as me_router
 )
 # --- GraphQL Imports ---
 from .graphql.schema import schema as gql_schema
 from .graphql.context import get_graphql_context
 # --- Other Imports ---
-from . import security, utils
+from . import security, utils, database, crud, image_variants, storage
 from . import auth as base_auth_module
 from .connection_manager import manager as ws_manager
+from .chat_writer import chat_writer
+from .push_dispatch import dispatcher as push_dispatcher
 
 load_dotenv()
 app = FastAPI(title="Fiore API")
 
+# --- DB Pool Lifecycle ---
+# --- Background hot-score refresh for /feed/discover (crud._scores) ---
+_post_score_task: Optional[asyncio.Task] = None
+
+async def _refresh_post_scores_forever():
+    while True:
+        await database.run_in_background_executor(crud.run_post_score_refresh)
+        await asyncio.sleep(crud.HOT_SCORE_REFRESH_SECONDS)
+
+# --- Background drift fix for cached unread-notification counters ---
+_unread_reconcile_task: Optional[asyncio.Task] = None
+
+async def _reconcile_unread_counts_forever():
+    while True:
+        await asyncio.sleep(crud.UNREAD_COUNT_RECONCILE_SECONDS)
+        await database.run_in_background_executor(crud.run_unread_count_reconcile)
+
+@app.on_event("startup")
+async def open_db_pool():
+    global _post_score_task, _unread_reconcile_task
+    try: database.get_pool() # Pre-open DB_POOL_MIN_SIZE connections
+    except Exception as e: print(f"❌ Failed to initialize DB connection pool: {e}")
+    # Sync (def) route handlers run in AnyIO's worker threads; their share of the pool (see database.DB_POOL_MAX_SIZE)
+    anyio.to_thread.current_default_thread_limiter().total_tokens = database.DB_SYNC_HANDLER_THREADS
+    if crud.HOT_SCORE_REFRESH_SECONDS > 0: _post_score_task = asyncio.create_task(_refresh_post_scores_forever())
+    if crud.UNREAD_COUNT_RECONCILE_SECONDS > 0: _unread_reconcile_task = asyncio.create_task(_reconcile_unread_counts_forever())
+    crud.set_notification_publisher(ws_manager.publish_many_threadsafe) # Unread counts pushed to user_<id> sockets after commit, one batch per commit
+    try: await ws_manager.start_backplane() # Cross-worker room fan-out (WS_BACKPLANE)
+    except Exception as e: print(f"❌ Failed to start WebSocket backplane: {e}")
+    chat_writer.start() # Group-commit flusher for WebSocket chat messages
+    if push_dispatcher.enabled: # PUSH_PROVIDER
+        push_dispatcher.start()
+        crud.set_device_push_dispatcher(push_dispatcher.enqueue_many) # New notifications batched out to device tokens after commit
+    await ws_manager.start_presence() # Debounced presence frames, heartbeat expiry, shared counts (WS_BACKPLANE=postgres)
+
+@app.on_event("shutdown")
+async def close_db_pool():
+    if _post_score_task: _post_score_task.cancel()
+    if _unread_reconcile_task: _unread_reconcile_task.cancel()
+    await chat_writer.stop() # Flush queued chat messages while the pool is still open
+    crud.set_device_push_dispatcher(None)
+    await push_dispatcher.stop() # Send queued pushes; token pruning still needs the pool
+    await ws_manager.stop_presence()
+    await ws_manager.stop_backplane()
+    image_variants.shutdown_media_executor()
+    storage.shutdown_storage_executor()
+    database.shutdown_db_executor()
+    database.shutdown_background_executor()
+    database.close_pool()
+
 # --- CORS ---
 # ... (keep existing CORS setup) ...
 origins = [
@@ -42,6 +97,7 @@ origins = [
 app.add_middleware(
     CORSMiddleware, allow_origins=origins, allow_credentials=True,
     allow_methods=["*"], allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"], # Keyset pagination token for list endpoints
 )
 
 # --- Mount REST Routers (REMOVED prefixes where routers define their own) ---
@@ -68,6 +124,7 @@ app.include_router(block_router.router, tags=["Blocking"], dependencies=common_a
 app.include_router(chat_router.router, tags=["Chat"], dependencies=[api_key_dependency]) # Prefix defined in router
 app.include_router(websocket_router.router, tags=["WebSocket"]) # No prefix needed
 app.include_router(notifications_router.router, tags=["Notifications"], dependencies=common_auth_dependencies)
+app.include_router(me_router.router, tags=["Me"], dependencies=common_auth_dependencies) # Prefix defined in router
 
 # --- Root Endpoint ---
 @app.get("/", tags=["Root"])
@@ -75,4 +132,39 @@ async def read_root():
     """Root endpoint providing basic API status and documentation links."""
     return { "message": "Fiore API is running!", "docs": "/docs", "redoc": "/redoc", "graphql": "/graphql"}
 
-print("✅ FastAPI application configured.")
\ No newline at end of file
+@app.get("/metrics/db-pool", tags=["Root"], dependencies=[api_key_dependency])
+async def read_db_pool_metrics():
+    """Connection pool saturation and checkout wait-time stats."""
+    return database.get_pool_stats()
+
+@app.get("/metrics/cypher-cache", tags=["Root"], dependencies=[api_key_dependency])
+async def read_cypher_cache_metrics():
+    """Prepared Cypher statement cache hit/miss counters."""
+    return crud.get_cypher_cache_stats()
+
+@app.get("/metrics/presigned-url-cache", tags=["Root"], dependencies=[api_key_dependency])
+async def read_presigned_url_cache_metrics():
+    """MinIO presigned URL cache hit/miss counters."""
+    return utils.get_presigned_url_cache_stats()
+
+@app.get("/metrics/websockets", tags=["Root"], dependencies=[api_key_dependency])
+async def read_websocket_metrics():
+    """WebSocket connections, outbound queue depth, slow-consumer drop counters and backplane traffic."""
+    return ws_manager.get_metrics()
+
+@app.get("/metrics/chat-writer", tags=["Root"], dependencies=[api_key_dependency])
+async def read_chat_writer_metrics():
+    """Chat group-commit batch sizes, pending queue and fallback counters plus username cache stats."""
+    return {**chat_writer.get_metrics(), "username_cache": crud.get_username_cache_stats()}
+
+@app.get("/metrics/push", tags=["Root"], dependencies=[api_key_dependency])
+async def read_push_metrics():
+    """Device push dispatch: queue depth, provider requests, delivered/pruned/retried/failed counts."""
+    return push_dispatcher.get_metrics()
+
+@app.get("/metrics/notification-preferences", tags=["Root"], dependencies=[api_key_dependency])
+async def read_notification_preference_metrics():
+    """Per-user notify_* flag cache used by create_notification and fan-out: hits, misses, evictions, size."""
+    return crud.get_notification_preference_cache_stats()
+
+print("✅ FastAPI application configured.")
\ No newline at end of file
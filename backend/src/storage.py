@@ -0,0 +1,228 @@
+# backend/src/storage.py
+import os
+import shutil
+import asyncio
+import functools
+import threading
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Optional, List, Callable, TypeVar, BinaryIO, Any
+from urllib.parse import quote
+
+import urllib3
+from minio import Minio
+from dotenv import load_dotenv
+
+load_dotenv()
+
+T = TypeVar("T")
+
+# =========================================
+# Object storage facade (MinIO or local filesystem)
+# =========================================
+# Nothing touches the network at import time: the backend is built on first use and the bucket
+# is checked/created before the first write. Blocking calls run in a bounded thread pool
+# (run_in_storage_executor / the async helpers below), never on the event loop.
+
+# --- MinIO ---
+MINIO_ENDPOINT = os.getenv("MINIO_ENDPOINT")
+MINIO_ACCESS_KEY = os.getenv("MINIO_ACCESS_KEY")
+MINIO_SECRET_KEY = os.getenv("MINIO_SECRET_KEY")
+MINIO_BUCKET = os.getenv("MINIO_BUCKET", "fiore") # Defaulted to fiore, you used 'connections' in test
+MINIO_USE_SSL = os.getenv("MINIO_USE_SSL", "False").lower() == "true"
+# Known region: presigning never has to look up the bucket location over the network
+MINIO_REGION = os.getenv("MINIO_REGION", "us-east-1")
+
+# --- Backend selection ---
+# "minio" (default when MINIO_* is set) or "local" (files under STORAGE_LOCAL_DIR; tests/benchmarks/dev)
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "minio").lower()
+STORAGE_LOCAL_DIR = os.getenv("STORAGE_LOCAL_DIR", "storage_data")
+STORAGE_LOCAL_BASE_URL = os.getenv("STORAGE_LOCAL_BASE_URL") # e.g. http://localhost:8000/files; defaults to file://
+
+# --- HTTP client tuning ---
+# Keep-alive connections to MinIO; should cover MINIO_UPLOAD_PARALLEL_PARTS x STORAGE_MAX_WORKERS plus reads/deletes
+STORAGE_HTTP_POOL_SIZE = int(os.getenv("STORAGE_HTTP_POOL_SIZE", 32))
+STORAGE_CONNECT_TIMEOUT = float(os.getenv("STORAGE_CONNECT_TIMEOUT", 5))
+STORAGE_READ_TIMEOUT = float(os.getenv("STORAGE_READ_TIMEOUT", 60))
+# Connection errors and 5xx responses are retried with exponential backoff (backoff x 2^n seconds)
+STORAGE_MAX_RETRIES = int(os.getenv("STORAGE_MAX_RETRIES", 3))
+STORAGE_RETRY_BACKOFF = float(os.getenv("STORAGE_RETRY_BACKOFF", 0.2))
+# Threads running blocking storage calls; kept apart from AnyIO's limiter because sync handlers
+# wait on uploads from AnyIO worker threads
+STORAGE_MAX_WORKERS = int(os.getenv("STORAGE_MAX_WORKERS", os.getenv("MINIO_UPLOAD_MAX_WORKERS", 4)))
+
+
+class MinioBackend:
+    """MinIO/S3 bucket behind the storage facade."""
+
+    def __init__(self, client: Minio, bucket: str = MINIO_BUCKET):
+        self.client = client
+        self.bucket = bucket
+        self._bucket_ready = False
+        self._bucket_lock = threading.Lock()
+
+    def ensure_bucket(self):
+        """Creates the bucket on first write; a failure is retried on the next write."""
+        if self._bucket_ready: return
+        with self._bucket_lock:
+            if self._bucket_ready: return
+            if not self.client.bucket_exists(self.bucket):
+                self.client.make_bucket(self.bucket)
+                print(f"✅ MinIO bucket '{self.bucket}' created.")
+            self._bucket_ready = True
+
+    def put_stream(self, object_name: str, fileobj: BinaryIO, size: int, content_type: str,
+                   part_size: int = 0, parallel_parts: int = 3):
+        # put_object reads `size` bytes part by part (multipart once size > part_size)
+        self.ensure_bucket()
+        return self.client.put_object(self.bucket, object_name, fileobj, length=size, content_type=content_type,
+                                      part_size=part_size, num_parallel_uploads=parallel_parts)
+
+    def get_bytes(self, object_name: str) -> bytes:
+        response = self.client.get_object(self.bucket, object_name)
+        try: return response.read()
+        finally: response.close(); response.release_conn()
+
+    def remove(self, object_name: str):
+        self.client.remove_object(self.bucket, object_name) # Missing keys are not an error in S3
+
+    def list_names(self, prefix: str) -> List[str]:
+        return [obj.object_name for obj in self.client.list_objects(self.bucket, prefix=prefix, recursive=True)]
+
+    def presigned_url(self, object_name: str, expires: timedelta, request_date: Optional[datetime] = None) -> str:
+        return self.client.presigned_get_object(self.bucket, object_name, expires=expires, request_date=request_date)
+
+
+class LocalBackend:
+    """Directory tree standing in for a bucket (tests, benchmarks, local development)."""
+
+    def __init__(self, root: str = STORAGE_LOCAL_DIR, base_url: Optional[str] = STORAGE_LOCAL_BASE_URL):
+        self.root = os.path.realpath(root)
+        self.base_url = (base_url or f"file://{self.root}").rstrip("/")
+
+    def _path(self, object_name: str) -> str:
+        path = os.path.realpath(os.path.join(self.root, object_name))
+        if not path.startswith(self.root + os.sep): raise ValueError(f"Object name escapes storage root: {object_name}")
+        return path
+
+    def ensure_bucket(self):
+        os.makedirs(self.root, exist_ok=True)
+
+    def put_stream(self, object_name: str, fileobj: BinaryIO, size: int, content_type: str,
+                   part_size: int = 0, parallel_parts: int = 3):
+        path = self._path(object_name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write-then-rename so readers never see a partial object
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".upload-")
+        try:
+            with os.fdopen(fd, "wb") as out:
+                remaining = size
+                while remaining > 0:
+                    chunk = fileobj.read(min(remaining, 1024 * 1024))
+                    if not chunk: raise IOError(f"Short read uploading {object_name}: {remaining} bytes missing")
+                    out.write(chunk); remaining -= len(chunk)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path): os.remove(tmp_path)
+            raise
+
+    def get_bytes(self, object_name: str) -> bytes:
+        with open(self._path(object_name), "rb") as f: return f.read()
+
+    def remove(self, object_name: str):
+        try: os.remove(self._path(object_name))
+        except FileNotFoundError: pass
+
+    def list_names(self, prefix: str) -> List[str]:
+        names = []
+        search_dir = os.path.dirname(self._path(prefix + "x")) # Directory holding the prefix
+        if not os.path.isdir(search_dir): return names
+        for dirpath, _, filenames in os.walk(search_dir):
+            for filename in filenames:
+                name = os.path.relpath(os.path.join(dirpath, filename), self.root).replace(os.sep, "/")
+                if name.startswith(prefix) and not filename.startswith(".upload-"): names.append(name)
+        return sorted(names)
+
+    def presigned_url(self, object_name: str, expires: timedelta, request_date: Optional[datetime] = None) -> str:
+        signed_at = (request_date or datetime.now(timezone.utc)).strftime("%Y%m%dT%H%M%SZ")
+        return f"{self.base_url}/{quote(object_name)}?date={signed_at}&expires={int(expires.total_seconds())}"
+
+
+# --- Lazy backend ---
+_backend: Optional[Any] = None
+_backend_initialized = False
+_backend_lock = threading.Lock()
+
+def _build_minio_client() -> Minio:
+    http_client = urllib3.PoolManager(
+        maxsize=STORAGE_HTTP_POOL_SIZE, block=False,
+        timeout=urllib3.Timeout(connect=STORAGE_CONNECT_TIMEOUT, read=STORAGE_READ_TIMEOUT),
+        retries=urllib3.Retry(total=STORAGE_MAX_RETRIES, backoff_factor=STORAGE_RETRY_BACKOFF,
+                              status_forcelist=[500, 502, 503, 504]),
+    )
+    return Minio(MINIO_ENDPOINT, access_key=MINIO_ACCESS_KEY, secret_key=MINIO_SECRET_KEY,
+                 secure=MINIO_USE_SSL, region=MINIO_REGION, http_client=http_client)
+
+def get_storage() -> Optional[Any]:
+    """The configured backend (MinioBackend / LocalBackend), or None when storage is disabled."""
+    global _backend, _backend_initialized
+    if not _backend_initialized:
+        with _backend_lock:
+            if not _backend_initialized:
+                if STORAGE_BACKEND == "local":
+                    _backend = LocalBackend()
+                    print(f"✅ Local object storage at {_backend.root}")
+                elif MINIO_ENDPOINT and MINIO_ACCESS_KEY and MINIO_SECRET_KEY:
+                    try:
+                        _backend = MinioBackend(_build_minio_client())
+                        print(f"✅ MinIO client initialized for endpoint: {MINIO_ENDPOINT}")
+                    except Exception as e:
+                        print(f"❌ Failed to initialize MinIO client: {e}")
+                else:
+                    print("⚠️ MinIO environment variables not fully set. MinIO integration disabled.")
+                _backend_initialized = True
+    return _backend
+
+def set_storage(backend: Optional[Any]):
+    """Swaps the backend (tests, benchmarks)."""
+    global _backend, _backend_initialized
+    with _backend_lock:
+        _backend, _backend_initialized = backend, True
+
+def is_configured() -> bool:
+    return get_storage() is not None
+
+# --- Executor ---
+_storage_executor: Optional[ThreadPoolExecutor] = None
+_storage_executor_lock = threading.Lock()
+
+def get_storage_executor() -> ThreadPoolExecutor:
+    global _storage_executor
+    if _storage_executor is None:
+        with _storage_executor_lock:
+            if _storage_executor is None:
+                _storage_executor = ThreadPoolExecutor(max_workers=STORAGE_MAX_WORKERS, thread_name_prefix="storage")
+    return _storage_executor
+
+def shutdown_storage_executor():
+    global _storage_executor
+    with _storage_executor_lock:
+        if _storage_executor is not None:
+            _storage_executor.shutdown(wait=True)
+            _storage_executor = None
+
+async def run_in_storage_executor(fn: Callable[..., T], *args, **kwargs) -> T:
+    """Runs a blocking storage call without blocking the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_storage_executor(), functools.partial(fn, *args, **kwargs))
+
+# --- Async helpers ---
+async def put_object(object_name: str, fileobj: BinaryIO, size: int, content_type: str, **kwargs):
+    return await run_in_storage_executor(get_storage().put_stream, object_name, fileobj, size, content_type, **kwargs)
+
+async def get_object(object_name: str) -> bytes:
+    return await run_in_storage_executor(get_storage().get_bytes, object_name)
+
+async def remove_object(object_name: str):
+    return await run_in_storage_executor(get_storage().remove, object_name)
@@ -6,48 +6,40 @@ import base64
 import io
 import json # <-- Add json import
 from PIL import Image
-from fastapi import UploadFile
+from fastapi import UploadFile, HTTPException
 from typing import Optional, Dict, Any # <-- Add Any
-from minio import Minio
 from minio.error import S3Error
 from dotenv import load_dotenv
 from datetime import date, timedelta, datetime, timezone
 import mimetypes # To guess mime type if not provided
+import threading
+from collections import OrderedDict
 from .database import get_db_connection
+from . import image_variants, storage
+from .storage import MINIO_ENDPOINT, MINIO_ACCESS_KEY, MINIO_SECRET_KEY, MINIO_BUCKET, MINIO_USE_SSL # Re-exported for routers
 
 load_dotenv()
 
 IMAGE_DIR = "user_images" # Keep for potential fallback or local caching if needed
 
-# --- MinIO Configuration & Client (Keep as is) ---
-MINIO_ENDPOINT = os.getenv("MINIO_ENDPOINT")
-MINIO_ACCESS_KEY = os.getenv("MINIO_ACCESS_KEY")
-MINIO_SECRET_KEY = os.getenv("MINIO_SECRET_KEY")
-MINIO_BUCKET = os.getenv("MINIO_BUCKET", "fiore") # Defaulted to fiore, you used 'connections' in test
-MINIO_USE_SSL = os.getenv("MINIO_USE_SSL", "False").lower() == "true"
+# --- MinIO Configuration & Client ---
+# Lives in storage.py: built lazily on first use, no network calls at import time.
 
-minio_client = None
-if MINIO_ENDPOINT and MINIO_ACCESS_KEY and MINIO_SECRET_KEY:
-    try:
-        minio_client = Minio(
-            MINIO_ENDPOINT,
-            access_key=MINIO_ACCESS_KEY,
-            secret_key=MINIO_SECRET_KEY,
-            secure=MINIO_USE_SSL
-        )
-        found = minio_client.bucket_exists(MINIO_BUCKET)
-        if not found:
-            minio_client.make_bucket(MINIO_BUCKET)
-        else:
-            print(f"MinIO Bucket '{MINIO_BUCKET}' already exists.")
-        print(f"✅ MinIO client initialized for endpoint: {MINIO_ENDPOINT}")
-    except Exception as e:
-        print(f"❌ Failed to initialize MinIO client: {e}")
-        minio_client = None
-else:
-    print("⚠️ MinIO environment variables not fully set. MinIO integration disabled.")
+# --- Streaming uploads ---
+# Bodies are streamed from the UploadFile spool (disk-backed past 1 MiB) to MinIO: objects larger
+# than one part go up as a multipart upload with MINIO_UPLOAD_PARALLEL_PARTS parts in flight, so
+# memory per upload is bounded by part size x parallel parts, not by file size.
+MINIO_UPLOAD_PART_SIZE = max(int(os.getenv("MINIO_UPLOAD_PART_SIZE", 8 * 1024 * 1024)), 5 * 1024 * 1024) # S3 minimum part is 5 MiB
+MINIO_UPLOAD_PARALLEL_PARTS = int(os.getenv("MINIO_UPLOAD_PARALLEL_PARTS", 3))
+MINIO_UPLOAD_MAX_BYTES = int(os.getenv("MINIO_UPLOAD_MAX_BYTES", 100 * 1024 * 1024))
+# Uploads run in storage.get_storage_executor(), which is kept apart from AnyIO's thread limiter
 
-# --- MinIO Upload Utility (Keep as is) ---
+def _spooled_size(fileobj) -> int:
+    """Size of an UploadFile's spool without reading it; leaves the position at 0."""
+    fileobj.seek(0, os.SEEK_END); size = fileobj.tell(); fileobj.seek(0)
+    return size
+
+# --- MinIO Upload Utility ---
 async def upload_file_to_minio(
         file: UploadFile,
         # Define base path structure based on type
@@ -56,10 +48,11 @@ async def upload_file_to_minio(
         generate_uuid_filename: bool = True
 ) -> Optional[Dict[str, Any]]:
     """
-    Uploads file to MinIO under a structured path.
+    Streams file to MinIO under a structured path (see "Streaming uploads" above).
     Returns dict with object_name, mime_type, size, original_filename or None on failure.
+    Raises HTTPException(413) for files over MINIO_UPLOAD_MAX_BYTES.
     """
-    if not minio_client or not file or not file.filename:
+    if not storage.is_configured() or not file or not file.filename:
         print("MinIO client not available or invalid file.")
         return None
 
@@ -80,13 +73,18 @@ async def upload_file_to_minio(
         path_parts.append(unique_filename)
         object_name = "/".join(path_parts)
 
-        contents = await file.read(); file_size = len(contents)
+        file_size = await storage.run_in_storage_executor(_spooled_size, file.file)
+        if file_size > MINIO_UPLOAD_MAX_BYTES:
+            raise HTTPException(status_code=413, detail=f"File '{original_filename}' exceeds the {MINIO_UPLOAD_MAX_BYTES // (1024 * 1024)} MB upload limit")
         content_type = file.content_type;
         if not content_type or content_type == 'application/octet-stream': content_type, _ = mimetypes.guess_type(original_filename); content_type = content_type or 'application/octet-stream'
 
-        minio_client.put_object(MINIO_BUCKET, object_name, io.BytesIO(contents), length=file_size, content_type=content_type)
+        await storage.put_object(object_name, file.file, file_size, content_type,
+                                 part_size=MINIO_UPLOAD_PART_SIZE, parallel_parts=MINIO_UPLOAD_PARALLEL_PARTS)
         print(f"✅ Successfully uploaded {object_name} ({content_type}, {file_size} bytes) to MinIO bucket {MINIO_BUCKET}")
         return {"minio_object_name": object_name, "mime_type": content_type, "file_size_bytes": file_size, "original_filename": original_filename}
+    except HTTPException:
+        raise
     except S3Error as e:
         print(f"❌ MinIO S3 Error during upload: {e}")
         return None
@@ -96,16 +94,71 @@ async def upload_file_to_minio(
     finally:
         await file.close()
 
-# --- MinIO URL Generation (Keep as is) ---
+# --- Presigned URL cache ---
+# URLs are signed as of the start of a time bucket, so every request in the same bucket gets the
+# same URL (browsers/CDNs can cache the image) and we sign each object once per bucket.
+# A cached URL is only served while it stays valid for at least MINIO_URL_MIN_VALIDITY_SECONDS.
+MINIO_URL_BUCKET_SECONDS = int(os.getenv("MINIO_URL_BUCKET_SECONDS", 3600))
+MINIO_URL_MIN_VALIDITY_SECONDS = int(os.getenv("MINIO_URL_MIN_VALIDITY_SECONDS", 6 * 3600))
+MINIO_URL_CACHE_SIZE = int(os.getenv("MINIO_URL_CACHE_SIZE", 10000))
+
+_url_cache: "OrderedDict[tuple, tuple]" = OrderedDict() # (object_name, expires_in_hours) -> (bucket_start, url)
+_url_cache_lock = threading.Lock()
+_url_cache_stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+def _url_bucket_start(now: datetime, ttl_seconds: int) -> Optional[datetime]:
+    """Signing time for the current bucket, or None if a bucketed URL could not meet the validity floor."""
+    # Worst case remaining validity is ttl - bucket width; shrink the bucket to honour the floor
+    bucket_seconds = min(MINIO_URL_BUCKET_SECONDS, ttl_seconds - MINIO_URL_MIN_VALIDITY_SECONDS)
+    if bucket_seconds <= 0: return None
+    epoch_seconds = int(now.timestamp())
+    return datetime.fromtimestamp(epoch_seconds - epoch_seconds % bucket_seconds, tz=timezone.utc)
+
+def invalidate_minio_url(object_name: str) -> int:
+    """Drops cached URLs for an object (e.g. after it is deleted). Returns entries removed."""
+    with _url_cache_lock:
+        stale = [key for key in _url_cache if key[0] == object_name]
+        for key in stale: del _url_cache[key]
+        _url_cache_stats["invalidations"] += len(stale)
+    return len(stale)
+
+def get_presigned_url_cache_stats() -> Dict[str, Any]:
+    with _url_cache_lock:
+        stats = dict(_url_cache_stats); stats["size"] = len(_url_cache)
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_ratio"] = round(stats["hits"] / lookups, 3) if lookups else 0.0
+    stats["max_size"] = MINIO_URL_CACHE_SIZE
+    return stats
+
+# --- MinIO URL Generation ---
 def get_minio_url(object_name: Optional[str], expires_in_hours: int = 24) -> Optional[str]:
-    if not minio_client or not object_name:
+    backend = storage.get_storage()
+    if not backend or not object_name:
         return None
+    ttl_seconds = int(expires_in_hours * 3600)
+    key = (object_name, expires_in_hours)
+    bucket_start = _url_bucket_start(datetime.now(timezone.utc), ttl_seconds) if MINIO_URL_CACHE_SIZE > 0 else None
+    if bucket_start is not None:
+        with _url_cache_lock:
+            cached = _url_cache.get(key)
+            if cached and cached[0] == bucket_start:
+                _url_cache.move_to_end(key)
+                _url_cache_stats["hits"] += 1
+                return cached[1]
+            _url_cache_stats["misses"] += 1
     try:
-        presigned_url = minio_client.presigned_get_object(
-            MINIO_BUCKET,
+        presigned_url = backend.presigned_url(
             object_name,
-            expires=timedelta(hours=expires_in_hours)
+            expires=timedelta(hours=expires_in_hours),
+            request_date=bucket_start # None = sign as of now (uncached)
         )
+        if bucket_start is not None:
+            with _url_cache_lock:
+                _url_cache[key] = (bucket_start, presigned_url)
+                _url_cache.move_to_end(key)
+                while len(_url_cache) > MINIO_URL_CACHE_SIZE:
+                    _url_cache.popitem(last=False)
+                    _url_cache_stats["evictions"] += 1
         return presigned_url
     except S3Error as e:
         print(f"❌ MinIO presign URL Error for {object_name}: Code={e.code}, Message={e.message}")
@@ -114,14 +167,42 @@ def get_minio_url(object_name: Optional[str], expires_in_hours: int = 24) -> Opt
         print(f"❌ General Error generating presigned URL for {object_name}: {e}")
         return None
 
+def get_media_variant_urls(variant_objects: Optional[Dict[str, Any]], expires_in_hours: int = 24) -> list:
+    """
+    Display form of media_items.variant_objects (see image_variants.py): a list of
+    {name, url, width, height, mime_type}, smallest first, so clients can pick the
+    smallest rendition that covers their slot. Empty until the variants job has run.
+    """
+    if not variant_objects: return []
+    variants = []
+    for name, info in variant_objects.items():
+        url = get_minio_url(info.get('object_name'), expires_in_hours)
+        if url: variants.append({'name': name, 'url': url, 'width': info.get('width'), 'height': info.get('height'), 'mime_type': info.get('mime_type')})
+    return sorted(variants, key=lambda v: (v['width'] or 0) * (v['height'] or 0))
+
 # --- MinIO Delete Utility (Keep as is) ---
+def _delete_media_variants(backend, object_name: str):
+    """Best effort: removes the image variants stored under the original's prefix."""
+    mime_type, _ = mimetypes.guess_type(object_name)
+    if mime_type not in image_variants.MEDIA_VARIANT_MIME_TYPES: return
+    try:
+        for variant_name in backend.list_names(image_variants.variant_prefix(object_name)):
+            invalidate_minio_url(variant_name)
+            backend.remove(variant_name)
+    except Exception as e:
+        print(f"❌ Error deleting image variants of {object_name}: {e}")
+
 def delete_from_minio(object_name: str) -> bool:
-    if not minio_client or not object_name:
+    """Blocking; from async code use delete_from_minio_async."""
+    backend = storage.get_storage()
+    if not backend or not object_name:
         print(f"MinIO delete skipped: Client not ready or no object name ({object_name}).")
         return False
+    invalidate_minio_url(object_name)
     try:
         print(f"Attempting to delete MinIO object: {object_name} from bucket {MINIO_BUCKET}")
-        minio_client.remove_object(MINIO_BUCKET, object_name)
+        backend.remove(object_name)
+        _delete_media_variants(backend, object_name)
         print(f"✅ Successfully deleted MinIO object: {object_name}")
         return True
     except S3Error as e:
@@ -134,6 +215,9 @@ def delete_from_minio(object_name: str) -> bool:
         print(f"❌ General error during MinIO delete of {object_name}: {e}")
         return False
 
+async def delete_from_minio_async(object_name: str) -> bool:
+    return await storage.run_in_storage_executor(delete_from_minio, object_name)
+
 # --- Location Parsing/Formatting (Keep as is) ---
 def parse_point_string(point_str: str) -> Optional[Dict[str, float]]:
     try:
@@ -223,16 +307,6 @@ def parse_agtype(value: Any) -> Any:
     if isinstance(value, (int, float)): return value
     return value
 
-# --- Helper to safely quote strings for embedding in Cypher ---
-def quote_cypher_string(value):
-    if value is None: return 'null'
-    if isinstance(value, (datetime, date)): return f"'{value.isoformat()}'" # ISO format for timestamp/date
-    if isinstance(value, bool): return 'true' if value else 'false' # Cypher booleans
-    if isinstance(value, (int, float)): return str(value) # Numbers as is
-    # For strings, escape single quotes for Cypher and wrap in single quotes
-    str_val = str(value).replace("'", "\\'") # Cypher single quote escape
-    return f"'{str_val}'"
-
 def delete_media_item_db_and_file(media_id: int, minio_object_name: Optional[str]) -> bool:
     """
     Attempts to delete a media item record from the DB and its corresponding file from MinIO.
@@ -278,4 +352,42 @@ def delete_media_item_db_and_file(media_id: int, minio_object_name: Optional[str
         print("UTILS: Skipping MinIO file deletion (no object name provided).")
 
     print(f"UTILS: Overall deletion status for Media ID {media_id} - DB Deleted: {db_deleted}, File Deleted: {file_deleted}")
-    return db_deleted
\ No newline at end of file
+    return db_deleted
+
+async def delete_media_item_db_and_file_async(media_id: int, minio_object_name: Optional[str]) -> bool:
+    return await storage.run_in_storage_executor(delete_media_item_db_and_file, media_id, minio_object_name)
+
+
+# --- Keyset pagination cursors ---
+# Opaque, URL-safe tokens holding the sort key of the last row of a page, e.g.
+# {"created_at": "...", "id": 42} or {"score": 3.5, "created_at": "...", "id": 42}.
+def encode_page_cursor(created_at: datetime, item_id: int, **extra: Any) -> str:
+    payload = {"created_at": created_at.isoformat() if isinstance(created_at, (datetime, date)) else created_at, "id": int(item_id), **extra}
+    raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_page_cursor(token: str) -> Dict[str, Any]:
+    """Inverse of encode_page_cursor. Raises ValueError for malformed tokens."""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        payload["created_at"] = datetime.fromisoformat(payload["created_at"])
+        payload["id"] = int(payload["id"])
+        return payload
+    except Exception as e:
+        raise ValueError(f"Invalid pagination cursor: {e}") from e
+
+def next_page_cursor(items: list, limit: int, time_key: str = "created_at", **extra_keys: str) -> Optional[str]:
+    """
+    Cursor for the page after `items` (None when the page was not full). time_key is the item's sort timestamp
+    (carried in the cursor's created_at field); extra_keys maps cursor field -> item key.
+    """
+    if not items or len(items) < limit: return None
+    last = items[-1]
+    return encode_page_cursor(last[time_key], last["id"], **{k: last.get(src) for k, src in extra_keys.items()})
+
+def parse_page_cursor(token: Optional[str]) -> Optional[Dict[str, Any]]:
+    """Decodes the `cursor` query param for a route; malformed tokens are a 400."""
+    if not token: return None
+    try: return decode_page_cursor(token)
+    except ValueError as e: raise HTTPException(status_code=400, detail=str(e))
@@ -1,4 +1,5 @@
 # tests/helpers.py
+import asyncio
 import requests
 import json
 import traceback
@@ -135,3 +136,103 @@ def print_test_summary():
     else: print("\n--- NO TESTS WERE EXECUTED ---")
     if results["skipped"]: print("\n--- SKIPPED TESTS ---"); [print(f"{i+1}. {s['name']}") for i, s in enumerate(results["skipped"])]
     print("="*74 + "\n")
+
+
+# --- In-process fakes (unit tests, no server / DB needed) ---
+class FakeConnection:
+    """Pooled-connection stand-in: after_commit() hooks run on commit()."""
+    def __init__(self): self.callbacks = []
+    def after_commit(self, callback): self.callbacks.append(callback)
+    def commit(self):
+        callbacks, self.callbacks = self.callbacks, []
+        for callback in callbacks: callback()
+
+
+class RecordingCursor:
+    """psycopg2 cursor stand-in: records every statement; subclasses answer them in respond()."""
+
+    def __init__(self):
+        self.connection = FakeConnection()
+        self.statements = []
+        self.rowcount = 0
+        self._rows = []
+
+    def execute(self, sql, params=None):
+        self.statements.append(sql)
+        self._rows = self.respond(sql, params) or []
+
+    def respond(self, sql, params): return []
+
+    def fetchall(self): return self._rows
+    def fetchone(self): return self._rows[0] if self._rows else None
+
+    def ran(self, fragment): return any(fragment in sql for sql in self.statements)
+
+
+class CounterCursor(RecordingCursor):
+    """Keeps one user's unread counter in memory; notification UPDATEs return `changed` rows."""
+
+    def __init__(self, counter=None, changed=0):
+        super().__init__()
+        self.counter = counter
+        self.changed = changed
+
+    def respond(self, sql, params):
+        if "UPDATE public.notification_unread_counts" in sql and "WHERE user_id" in sql:
+            if self.counter is None: return []
+            self.counter = max(self.counter + params[0], 0)
+            return [{'unread_count': self.counter}]
+        if "INSERT INTO public.notification_unread_counts" in sql and "COUNT(*)" in sql:
+            self.counter = 5 # Seeded from the notifications table
+            return [{'unread_count': self.counter}]
+        if "INSERT INTO public.notification_unread_counts" in sql:
+            self.counter = 0; return []
+        if "SELECT unread_count FROM" in sql:
+            return [{'unread_count': self.counter}] if self.counter is not None else []
+        if "UPDATE public.notifications" in sql:
+            return [{'id': i} for i in range(self.changed)]
+        return []
+
+
+class UsersCursor(RecordingCursor):
+    """Serves notify_* flags from an in-memory users table and counts preference reads."""
+
+    def __init__(self, users):
+        super().__init__()
+        self.users = users # user_id -> {column: bool | None}
+        self.reads = 0
+
+    def respond(self, sql, params):
+        from src.crud._settings import NOTIFICATION_FLAG_COLUMNS # Only the unit tests import src
+        if sql.startswith("SELECT id, notify_"):
+            self.reads += 1
+            return [{'id': uid, **{c: self.users[uid].get(c) for c in NOTIFICATION_FLAG_COLUMNS}}
+                    for uid in params[0] if uid in self.users]
+        if sql.startswith("UPDATE public.users SET"):
+            user_id = params[-1]
+            for clause, value in zip(sql[len("UPDATE public.users SET "):].split(" WHERE")[0].split(", "), params):
+                self.users[user_id][clause.split(" =")[0]] = value
+            self.rowcount = 1
+        return []
+
+
+class FakeSocket:
+    """WebSocket stand-in; a blocked socket holds every send until `gate` is set."""
+
+    def __init__(self, blocked: bool = False):
+        self.sent = []
+        self.closed_with = None
+        self.gate = asyncio.Event()
+        if not blocked: self.gate.set()
+
+    async def send_text(self, message: str):
+        await self.gate.wait()
+        self.sent.append(message)
+
+    async def close(self, code: int = 1000, reason: str = ""):
+        self.closed_with = code
+
+
+async def drain():
+    """Lets queued sender / broadcast tasks run."""
+    for _ in range(20): await asyncio.sleep(0)
@@ -0,0 +1,83 @@
+# tests/test_backplane.py
+# Cross-worker relay checks for the WebSocket backplane. Fake sockets / connections, no Postgres needed.
+import asyncio
+import json
+
+from src import backplane
+from src.backplane import PostgresBackplane, channel_name
+from src.connection_manager import ConnectionManager
+
+from .helpers import FakeSocket, drain
+
+
+class FakeCursor:
+    def __init__(self, log): self.log = log
+    def execute(self, sql, params=None): self.log.append((sql, params))
+    def close(self): pass
+
+
+class FakeConn:
+    closed = False
+    def __init__(self): self.log = []
+    def cursor(self): return FakeCursor(self.log)
+
+
+def test_rooms_subscribe_on_first_socket_and_relay_other_workers_once():
+    async def scenario():
+        manager = ConnectionManager(backplane=PostgresBackplane(connect_kwargs={}))
+        bp = manager.backplane
+        await backplane.Backplane.start(bp, manager._relay) # Loop + deliver only; no listener thread
+        a, b = FakeSocket(), FakeSocket()
+        await manager.connect(a, "community_1", 1)
+        await manager.connect(b, "community_1", 2)
+        assert bp.get_metrics()["subscribed_rooms"] == 1
+
+        envelope = {"id": "m1", "origin": "other-node", "room": "community_1", "message": "hi"}
+        bp._on_message(dict(envelope))
+        bp._on_message(dict(envelope)) # Redelivered
+        bp._on_message({**envelope, "id": "m2", "origin": bp.node_id}) # Our own echo
+        await drain()
+        assert a.sent == ["hi"] and b.sent == ["hi"]
+        assert bp.stats["relayed"] == 1 and bp.stats["duplicates"] == 2
+
+        manager.disconnect(a, "community_1"); manager.disconnect(b, "community_1")
+        assert bp.get_metrics()["subscribed_rooms"] == 0
+        bp._on_message({**envelope, "id": "m3"}) # Arrives after the last socket left
+        await drain()
+        assert bp.stats["relayed"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_publish_notifies_room_channel_and_parks_oversized_messages():
+    bp = PostgresBackplane(connect_kwargs={})
+    bp._publish_conn = FakeConn()
+    envelope = {"id": "m1", "origin": bp.node_id, "room": "community_1", "message": "hi"}
+    bp._notify(channel_name("community_1"), envelope)
+    sql, params = bp._publish_conn.log[-1]
+    assert "pg_notify" in sql and params[0] == "ws_community_1" and json.loads(params[1])["message"] == "hi"
+
+    big = {**envelope, "id": "m2", "message": "x" * (backplane.NOTIFY_MAX_PAYLOAD_BYTES + 1)}
+    bp._notify("ws_community_1", big)
+    statements = [sql for sql, _ in bp._publish_conn.log[1:]]
+    assert any("INSERT INTO public.ws_backplane_payloads" in sql for sql in statements)
+    notified = json.loads(bp._publish_conn.log[-1][1][1])
+    assert notified["ref"] is True and "message" not in notified and bp.stats["oversize_payloads"] == 1
+
+
+def test_publish_many_sends_one_statement_and_parks_only_oversized_messages():
+    bp = PostgresBackplane(connect_kwargs={})
+    bp._publish_conn = FakeConn()
+    big = "x" * (backplane.NOTIFY_MAX_PAYLOAD_BYTES + 1)
+    bp._notify_many([(channel_name(f"user_{i}"), {"id": f"m{i}", "origin": bp.node_id, "room": f"user_{i}", "message": message})
+                     for i, message in enumerate(["a", big, "c"])])
+    batched = [params for sql, params in bp._publish_conn.log if "unnest" in sql]
+    assert len(batched) == 1 and batched[0][0] == ["ws_user_0", "ws_user_2"]
+    assert [json.loads(p)["message"] for p in batched[0][1]] == ["a", "c"]
+    assert bp.stats["published"] == 3 and bp.stats["oversize_payloads"] == 1
+
+
+def test_channel_names_are_safe_identifiers():
+    assert channel_name("event_5") == "ws_event_5"
+    odd = channel_name('Room "x"; DROP')
+    assert odd.startswith("ws_") and odd[3:].isalnum() and len(odd) <= 63
@@ -0,0 +1,63 @@
+# tests/test_chat_writer.py
+# Group-commit checks for the WebSocket chat writer. The DB step is replaced by a fake, no Postgres needed.
+import asyncio
+
+import psycopg2
+import pytest
+
+from src import chat_writer as chat_writer_module
+from src.chat_writer import ChatWriter
+
+
+@pytest.fixture
+def fake_persist(monkeypatch):
+    calls = []
+
+    def persist(messages):
+        calls.append([m["content"] for m in messages])
+        if any(m["content"] == "bad" for m in messages):
+            raise psycopg2.IntegrityError("room gone")
+        return [{**m, "message_id": i, "username": f"user{m['user_id']}"} for i, m in enumerate(messages)]
+
+    monkeypatch.setattr(chat_writer_module, "_persist_batch", persist)
+    return calls
+
+
+def test_concurrent_messages_share_one_insert_and_keep_order(fake_persist):
+    async def scenario():
+        writer = ChatWriter()
+        results = await asyncio.gather(*(writer.submit(i, f"m{i}", 1, None) for i in range(5)))
+        await writer.stop()
+        return writer, results
+
+    writer, results = asyncio.run(scenario())
+    assert fake_persist == [["m0", "m1", "m2", "m3", "m4"]]
+    assert [r["content"] for r in results] == ["m0", "m1", "m2", "m3", "m4"]
+    assert writer.stats["batches"] == 1 and writer.stats["saved"] == 5
+
+
+def test_failed_batch_retries_singly_so_only_the_bad_message_fails(fake_persist):
+    async def scenario():
+        writer = ChatWriter()
+        results = await asyncio.gather(
+            writer.submit(1, "ok", 1, None), writer.submit(2, "bad", 1, None), return_exceptions=True
+        )
+        await writer.stop()
+        return writer, results
+
+    writer, results = asyncio.run(scenario())
+    assert results[0]["content"] == "ok"
+    assert isinstance(results[1], psycopg2.IntegrityError)
+    assert writer.stats["fallback_batches"] == 1 and writer.stats["failed"] == 1
+
+
+def test_batches_are_capped(fake_persist, monkeypatch):
+    monkeypatch.setattr(chat_writer_module, "CHAT_WRITE_MAX_BATCH", 2)
+
+    async def scenario():
+        writer = ChatWriter()
+        await asyncio.gather(*(writer.submit(i, f"m{i}", None, 7) for i in range(5)))
+        await writer.stop()
+
+    asyncio.run(scenario())
+    assert [len(batch) for batch in fake_persist] == [2, 2, 1]
@@ -0,0 +1,73 @@
+# tests/test_connection_manager.py
+# Outbound queue / slow-consumer checks for ConnectionManager. Fake sockets, no server needed.
+import asyncio
+
+from src import connection_manager
+from src.connection_manager import ConnectionManager
+
+from .helpers import FakeSocket, drain
+
+
+def test_slow_consumer_does_not_delay_room_and_is_disconnected(monkeypatch):
+    monkeypatch.setattr(connection_manager, "WS_SEND_QUEUE_SIZE", 3)
+    monkeypatch.setattr(connection_manager, "WS_SLOW_CONSUMER_POLICY", "disconnect")
+
+    async def scenario():
+        manager = ConnectionManager()
+        fast, slow = FakeSocket(), FakeSocket(blocked=True)
+        await manager.connect(fast, "community_1", 1)
+        await manager.connect(slow, "community_1", 2)
+        for i in range(6):
+            await manager.broadcast(f"m{i}", "community_1")
+            await drain()
+        assert fast.sent == [f"m{i}" for i in range(6)]
+        assert slow.closed_with == 1013 and slow not in manager.active_connections["community_1"]
+        metrics = manager.get_metrics()
+        assert metrics["connections"] == 1 and metrics["slow_consumer_disconnects"] == 1
+        manager.disconnect(fast, "community_1")
+        assert manager.get_metrics()["rooms"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_drop_oldest_keeps_newest_messages(monkeypatch):
+    monkeypatch.setattr(connection_manager, "WS_SEND_QUEUE_SIZE", 2)
+    monkeypatch.setattr(connection_manager, "WS_SLOW_CONSUMER_POLICY", "drop_oldest")
+
+    async def scenario():
+        manager = ConnectionManager()
+        ws = FakeSocket(blocked=True)
+        await manager.connect(ws, "event_1", 1)
+        await manager.broadcast("m0", "event_1")
+        await drain() # Writer takes m0 and blocks on send
+        for i in range(1, 5): await manager.broadcast(f"m{i}", "event_1")
+        ws.gate.set(); await drain()
+        assert ws.sent == ["m0", "m3", "m4"] and manager.get_metrics()["dropped"] == 2
+        manager.disconnect(ws, "event_1")
+
+    asyncio.run(scenario())
+
+
+def test_one_socket_joins_many_rooms_through_one_queue():
+    async def scenario():
+        manager = ConnectionManager()
+        ws = FakeSocket()
+        manager.register(ws, 1)
+        await manager.connect(ws, "community_1", 1)
+        await manager.connect(ws, "event_2", 1)
+        await manager.connect(ws, "event_2", 1) # Repeated subscribe is a no-op
+        assert manager.rooms_for(ws) == {"community_1", "event_2"}
+        assert manager.get_metrics()["connections"] == 1 and manager.get_metrics()["subscriptions"] == 2
+
+        await manager.broadcast("c", "community_1")
+        await manager.broadcast("e", "event_2")
+        await drain()
+        assert ws.sent == ["c", "e"]
+
+        manager.leave(ws, "community_1")
+        assert manager.send_to(ws, "still here") # Socket stays registered after leaving a room
+        assert manager.get_metrics()["rooms"] == 1 and manager.presence.rooms_for_user(1) == {"event_2"}
+        manager.disconnect(ws)
+        assert manager.get_metrics()["rooms"] == 0 and manager.get_metrics()["connections"] == 0
+
+    asyncio.run(scenario())
@@ -0,0 +1,53 @@
+# tests/test_following_feed.py
+# Cursor walk of /feed/following across the home-timeline cap. In-memory posts/timeline, no DB needed.
+from datetime import datetime, timedelta, timezone
+
+from src import crud, utils
+from src.crud import _feed, _timeline
+
+from .helpers import RecordingCursor
+
+UTC_PLUS_2 = timezone(timedelta(hours=2))
+BASE = datetime(2024, 3, 1, 12, 0, 0, tzinfo=UTC_PLUS_2)
+# Whole-second timestamps (no microseconds in isoformat()), a non-UTC offset and a tie broken by id
+POSTS = {
+    1: BASE, 2: BASE + timedelta(seconds=1), 3: BASE + timedelta(seconds=1),
+    4: BASE + timedelta(seconds=2, microseconds=500), 5: BASE + timedelta(seconds=3),
+    6: BASE + timedelta(seconds=3), 7: BASE + timedelta(seconds=4),
+}
+TIMELINE_CAP = 4
+
+
+class FeedCursor(RecordingCursor):
+    """home_timelines holds the newest TIMELINE_CAP posts; public.posts holds all of them."""
+
+    def respond(self, sql, params):
+        newest = sorted(POSTS.items(), key=lambda item: (item[1], item[0]), reverse=True)
+        if "count(*)" in sql and "home_timelines" in sql:
+            return [{'n': TIMELINE_CAP}]
+        if "FROM public.home_timelines" in sql:
+            rows = newest[:TIMELINE_CAP]
+            if "(created_at, post_id) <" in sql: rows = [r for r in rows if (r[1], r[0]) < (params[1], params[2])]
+            return [{'post_id': pid, 'created_at': ts} for pid, ts in rows[:params[-1]]]
+        if "FROM public.posts" in sql and "user_id = ANY(%s)" in sql:
+            rows = newest
+            if "(created_at, id) <" in sql: rows = [r for r in rows if (r[1], r[0]) < (params[1], params[2])]
+            limit, offset = params[-2], params[-1]
+            return [{'id': pid} for pid, _ in rows[offset:offset + limit]]
+        return []
+
+
+def test_cursor_walk_crosses_the_timeline_cap_without_gaps_or_repeats(monkeypatch):
+    monkeypatch.setattr(_timeline, "TIMELINE_MAX_ENTRIES", TIMELINE_CAP)
+    monkeypatch.setattr(_timeline, "get_celebrity_author_ids", lambda cursor: [])
+    monkeypatch.setattr(_feed, "_followed_author_ids", lambda cursor, viewer_id: [1])
+    monkeypatch.setattr(_feed, "hydrate_posts", lambda cursor, ids, viewer_id: [{'id': i, 'created_at': POSTS[i]} for i in ids])
+
+    seen, before = [], None
+    for _ in range(5):
+        page = crud.get_following_feed(FeedCursor(), viewer_id=9, limit=3, before=before)
+        seen += [p['id'] for p in page]
+        token = utils.next_page_cursor(page, 3)
+        if token is None: break
+        before = utils.decode_page_cursor(token)
+    assert seen == [7, 6, 5, 4, 3, 2, 1]
@@ -0,0 +1,42 @@
+# tests/test_image_variants.py
+# Rendering checks for image_variants.render_variants. Pure bytes in/out, no server/MinIO needed.
+import io
+
+from PIL import Image
+
+from src import image_variants
+
+SIZES = {"thumb": 160, "medium": 640, "large": 1280}
+
+
+def _jpeg(size, orientation=None):
+    exif = Image.Exif()
+    exif[0x010F] = "TestCam" # Make
+    if orientation: exif[0x0112] = orientation
+    out = io.BytesIO()
+    Image.new("RGB", size, (120, 30, 200)).save(out, "JPEG", exif=exif.tobytes())
+    return out.getvalue()
+
+
+def test_variants_are_resized_upright_and_exif_free():
+    rendered = image_variants.render_variants(_jpeg((4000, 3000), orientation=6), SIZES)
+    assert (rendered["width"], rendered["height"]) == (3000, 4000) # Rotated 90 degrees
+    dims = {v["name"]: (v["width"], v["height"]) for v in rendered["variants"]}
+    assert dims == {"large": (960, 1280), "medium": (480, 640), "thumb": (120, 160)}
+    for variant in rendered["variants"]:
+        with Image.open(io.BytesIO(variant["data"])) as img:
+            assert img.format == "WEBP" and img.size == dims[variant["name"]]
+            assert not img.getexif() and "xmp" not in img.info
+
+
+def test_small_images_are_not_upscaled():
+    rendered = image_variants.render_variants(_jpeg((500, 300)), SIZES, fmt="jpeg")
+    assert [(v["name"], v["width"], v["height"], v["mime_type"]) for v in rendered["variants"]] == [
+        ("large", 500, 300, "image/jpeg"), ("thumb", 160, 96, "image/jpeg")]
+
+
+def test_animated_and_oversized_images_are_skipped():
+    frames = [Image.new("RGB", (64, 64), color) for color in ((255, 0, 0), (0, 0, 255))]
+    gif = io.BytesIO(); frames[0].save(gif, "GIF", save_all=True, append_images=frames[1:])
+    assert image_variants.render_variants(gif.getvalue(), SIZES) is None
+    assert image_variants.render_variants(_jpeg((400, 400)), SIZES, max_pixels=100_000) is None
@@ -96,4 +96,50 @@ def test_vote_reply(authenticated_session, test_data_ids):
     upvotes_after_remove = resp_remove_upvote["new_counts"]["upvotes"]
     if upvotes_after_up > 0: # Only assert decrease if it was actually > 0
         assert upvotes_after_remove == upvotes_after_up - 1, f"Reply upvote count did not decrease. Before: {upvotes_after_up}, After: {upvotes_after_remove}"
-    print(f"    State after REMOVING VOTE on reply: Up={upvotes_after_remove}, Action='{resp_remove_upvote.get('action')}'")
\ No newline at end of file
+    print(f"    State after REMOVING VOTE on reply: Up={upvotes_after_remove}, Action='{resp_remove_upvote.get('action')}'")
+
+def test_vote_batch(authenticated_session, test_data_ids):
+    auth_info = authenticated_session; post_id = test_data_ids['post_id']; reply_id = test_data_ids['reply_id']; base_url = auth_info['base_url']; session = auth_info['session']
+    print(f"--- Test: Batch voting on Post {post_id} / Reply {reply_id} ---")
+
+    # Items set the final state, applied in order: the post ends downvoted, the reply ends with no vote
+    batch = {"votes": [
+        {"post_id": post_id, "vote_type": True},
+        {"post_id": post_id, "vote_type": False},
+        {"reply_id": reply_id, "vote_type": True},
+        {"reply_id": reply_id, "vote_type": None},
+    ]}
+    resp = make_api_request(session, "POST", f"{base_url}/votes/batch", "Batch Votes", json_data=batch, expected_status=[200])
+    assert resp is not None and resp.get("applied") == 4
+    post_result, reply_result = resp["results"][1], resp["results"][3]
+    assert post_result["vote_type"] is False and post_result["previous_vote_type"] is True
+    assert reply_result["vote_type"] is None and reply_result["previous_vote_type"] is True
+    assert post_result["new_counts"]["downvotes"] >= 1
+
+    # Replaying the same batch is idempotent
+    resp_replay = make_api_request(session, "POST", f"{base_url}/votes/batch", "Batch Votes (replay)", json_data=batch, expected_status=[200])
+    assert resp_replay["results"][1]["new_counts"] == post_result["new_counts"]
+
+    # Clean up: remove the post vote
+    make_api_request(session, "POST", f"{base_url}/votes/batch", "Batch Votes (cleanup)", json_data={"votes": [{"post_id": post_id, "vote_type": None}]}, expected_status=[200])
+
+    bad = {"votes": [{"post_id": post_id, "reply_id": reply_id, "vote_type": True}]}
+    make_api_request(session, "POST", f"{base_url}/votes/batch", "Batch Votes (invalid target)", json_data=bad, expected_status=[422])
+
+
+def test_my_relationships(authenticated_session, test_data_ids):
+    auth_info = authenticated_session; base_url = auth_info['base_url']; session = auth_info['session']
+    post_id = test_data_ids['post_id']; reply_id = test_data_ids['reply_id']; community_id = test_data_ids['community_id']
+    print("--- Test: Bulk viewer relationships ---")
+
+    url = f"{base_url}/me/relationships?posts={post_id},999999999&replies={reply_id}&communities={community_id}"
+    resp = make_api_request(session, "GET", url, "Get My Relationships", expected_status=[200])
+    assert resp is not None
+    assert set(resp["posts"]) == {str(post_id), "999999999"} # JSON object keys
+    missing_post = resp["posts"]["999999999"]
+    assert missing_post["viewer_vote_type"] is None and missing_post["viewer_has_favorited"] is False
+    assert str(reply_id) in resp["replies"]
+    assert isinstance(resp["communities"][str(community_id)]["is_member"], bool)
+    assert resp["users"] == {} and resp["events"] == {}
+
+    make_api_request(session, "GET", f"{base_url}/me/relationships?posts=abc", "Get My Relationships (bad ids)", expected_status=[422])
@@ -0,0 +1,145 @@
+# tests/test_notification_groups.py
+# Coalescing checks for crud.create_notification / get_notifications_for_user. Recording cursor, no DB needed.
+import json
+from datetime import datetime, timedelta, timezone
+
+from src import crud, utils
+
+from .helpers import RecordingCursor
+
+
+class GroupCursor(RecordingCursor):
+    """Answers the open-group UPDATE with `open_group_id` and the notifications page with `page`."""
+
+    def __init__(self, open_group_id=None, page=None):
+        super().__init__()
+        self.open_group_id = open_group_id
+        self.page = page or []
+
+    def respond(self, sql, params):
+        if "UPDATE public.notifications n SET" in sql:
+            return [{'id': self.open_group_id, 'actor_count': 2, 'created_at': None}] if self.open_group_id else []
+        if "INSERT INTO public.notifications" in sql:
+            return [{'id': 99, 'created_at': None}]
+        if "FROM public.notifications n" in sql:
+            return self.page
+        if "FROM public.users u" in sql:
+            return [{'id': uid, 'username': f'user{uid}', 'name': None, 'avatar_path': None} for uid in params[0]]
+        return []
+
+
+def test_second_vote_on_same_post_updates_open_group_in_place():
+    cursor = GroupCursor(open_group_id=7)
+    group_id = crud.create_notification(cursor, recipient_user_id=1, type='post_vote', actor_user_id=2,
+                                        related_entity_type='post', related_entity_id=5)
+    assert group_id == 7 and not cursor.ran("INSERT INTO public.notifications")
+
+
+def test_first_notification_and_uncoalesced_types_insert_a_row():
+    cursor = GroupCursor()
+    assert crud.create_notification(cursor, recipient_user_id=1, type='post_vote', actor_user_id=2,
+                                    related_entity_type='post', related_entity_id=5) == 99
+    assert cursor.ran("INSERT INTO public.notifications")
+
+    cursor = GroupCursor(open_group_id=7)
+    assert crud.create_notification(cursor, recipient_user_id=1, type='user_mention', actor_user_id=2) == 99
+    assert not cursor.ran("UPDATE public.notifications n SET")
+
+
+def test_coalescing_locks_the_group_key_and_counts_distinct_actors_in_full():
+    cursor = GroupCursor(open_group_id=7)
+    crud.create_notification(cursor, recipient_user_id=1, type='post_vote', actor_user_id=2,
+                             related_entity_type='post', related_entity_id=5)
+    lock = next(i for i, sql in enumerate(cursor.statements) if "pg_advisory_xact_lock" in sql)
+    update = next(i for i, sql in enumerate(cursor.statements) if "UPDATE public.notifications n SET" in sql)
+    assert lock < update # A concurrent first event waits, then finds this group instead of inserting another
+    assert "INSERT INTO public.notification_group_actors" in cursor.statements[update]
+    assert "ANY(n.sample_actor_ids)" not in cursor.statements[update] # The sample no longer decides actor_count
+
+
+def test_coalesced_frame_reuses_the_cached_count_without_a_read():
+    sent = []
+    crud.set_notification_publisher(sent.extend)
+    crud._notifications._unread_count_cache.clear()
+    try:
+        for cached in (None, 4):
+            if cached is not None: crud.remember_unread_count(1, cached)
+            cursor = GroupCursor(open_group_id=7)
+            crud.create_notification(cursor, recipient_user_id=1, type='post_vote', actor_user_id=2,
+                                     related_entity_type='post', related_entity_id=5)
+            assert not cursor.ran("notification_unread_counts")
+            cursor.connection.commit()
+    finally:
+        crud.set_notification_publisher(None)
+    frames = [json.loads(message) for message, _ in sent]
+    assert "unread_count" not in frames[0] and frames[1]["unread_count"] == 4
+
+
+def test_new_group_seeds_its_actor_set():
+    cursor = GroupCursor()
+    crud.create_notification(cursor, recipient_user_id=1, type='post_vote', actor_user_id=2,
+                             related_entity_type='post', related_entity_id=5)
+    insert = next(sql for sql in cursor.statements if "INSERT INTO public.notifications" in sql)
+    assert "INSERT INTO public.notification_group_actors" in insert
+
+
+def test_follow_groups_ignore_the_follower_entity():
+    cursor = GroupCursor(open_group_id=3)
+    crud.create_notification(cursor, recipient_user_id=1, type='new_follower', actor_user_id=8,
+                             related_entity_type='user', related_entity_id=8)
+    update = next(sql for sql in cursor.statements if "UPDATE public.notifications n SET" in sql)
+    assert "AND related_entity_id = %s" not in update
+
+
+def test_grouped_page_lists_sample_actors_with_one_extra_query():
+    row = {
+        'id': 7, 'type': 'post_vote', 'is_read': False, 'created_at': datetime.now(timezone.utc),
+        'content_preview': None, 'actor_count': 42, 'sample_actor_ids': [4, 3, 2],
+        'actor_user_id': 4, 'actor_username': 'user4', 'actor_name': None, 'actor_avatar_path': None,
+        'related_entity_type': 'post', 'related_entity_id': 5, 'related_entity_title': 'Hello',
+    }
+    cursor = GroupCursor(page=[row, {**row, 'id': 8, 'sample_actor_ids': [2]}])
+    page = crud.get_notifications_for_user(cursor, user_id=1, limit=20, offset=0)
+    assert len(cursor.statements) == 2
+    assert page[0]['actor_count'] == 42 and [a['id'] for a in page[0]['sample_actors']] == [4, 3, 2]
+    assert 'sample_actor_ids' not in page[0]
+
+
+def test_coalescing_between_page_fetches_neither_repeats_nor_skips_rows():
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    rows = {i: {'id': i, 'type': 'post_vote', 'is_read': False, 'created_at': start + timedelta(minutes=i),
+                'last_activity_at': start + timedelta(minutes=i), 'content_preview': None, 'actor_count': 1,
+                'sample_actor_ids': [], 'actor_user_id': None, 'related_entity_type': 'post', 'related_entity_id': i}
+            for i in range(1, 6)}
+
+    class TableCursor(GroupCursor):
+        """Serves /notifications pages from `rows`, ordered and filtered the way the SQL says."""
+        def respond(self, sql, params):
+            if "UPDATE public.notifications n SET" in sql:
+                group = rows[self.open_group_id]
+                assert "created_at = NOW()" not in sql
+                group['last_activity_at'] = start + timedelta(hours=1)
+                return [{k: group[k] for k in ('id', 'actor_count', 'created_at', 'last_activity_at')}]
+            if "FROM public.notifications n" in sql:
+                assert "ORDER BY n.last_activity_at DESC, n.id DESC" in sql
+                ordered = sorted(rows.values(), key=lambda r: (r['last_activity_at'], r['id']), reverse=True)
+                if "(n.last_activity_at, n.id) < (%s, %s)" in sql:
+                    ordered = [r for r in ordered if (r['last_activity_at'], r['id']) < (params[1], params[2])]
+                return [dict(r) for r in ordered[:params[-2]]]
+            return super().respond(sql, params)
+
+    def page(cursor, before=None):
+        items = crud.get_notifications_for_user(cursor, user_id=1, limit=2, offset=0, before=before)
+        token = utils.next_page_cursor(items, 2, time_key='last_activity_at')
+        return [n['id'] for n in items], utils.decode_page_cursor(token) if token else None
+
+    cursor = TableCursor(open_group_id=5)
+    first, before = page(cursor)
+    assert first == [5, 4]
+    crud.create_notification(cursor, recipient_user_id=1, type='post_vote', actor_user_id=2,
+                             related_entity_type='post', related_entity_id=5) # Row 5, already seen, gets a vote
+    second, before = page(cursor, before)
+    third, _ = page(cursor, before)
+    assert second == [3, 2] and third == [1]
+    assert rows[5]['created_at'] == start + timedelta(minutes=5) # Only last_activity_at moved
+    assert page(cursor)[0] == [5, 4] # A fresh walk shows the group on top
@@ -0,0 +1,64 @@
+# tests/test_notification_preferences.py
+# Cached notify_* lookups in crud._settings and the bulk recipient filter. Fake cursor, no DB needed.
+import pytest
+
+from src import crud
+from src.crud import _settings
+
+from .helpers import UsersCursor
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    _settings._preference_cache.clear()
+    yield
+    _settings._preference_cache.clear()
+
+
+def test_bulk_filter_reads_once_and_then_hits_the_cache():
+    cursor = UsersCursor({1: {'notify_new_post_in_community': True}, 2: {'notify_new_post_in_community': False}, 3: {}})
+    assert crud.filter_recipients_by_preference(cursor, [3, 1, 2], 'community_post') == [3, 1] # NULL counts as on
+    assert crud.filter_recipients_by_preference(cursor, [1, 2, 3], 'community_post') == [1, 3]
+    assert cursor.reads == 1
+
+
+def test_types_without_a_preference_column_skip_the_lookup():
+    cursor = UsersCursor({1: {}})
+    assert crud.filter_recipients_by_preference(cursor, [1, 2], 'new_follower') == [1, 2]
+    assert cursor.reads == 0
+
+
+def test_settings_read_applies_defaults_and_shares_the_cache():
+    cursor = UsersCursor({7: {'notify_event_reminder': False}})
+    settings = crud.get_notification_settings(cursor, 7)
+    assert settings['event_reminder'] is False
+    assert settings['new_post_in_community'] is True and settings['direct_message'] is False
+    assert crud.filter_recipients_by_preference(cursor, [7], 'event_reminder') == []
+    assert cursor.reads == 1
+    assert crud.get_notification_settings(cursor, 99) is None
+
+
+def test_update_invalidates_now_and_again_after_commit():
+    cursor = UsersCursor({5: {'notify_new_reply_to_post': True}})
+    assert crud.filter_recipients_by_preference(cursor, [5], 'post_reply') == [5]
+    assert crud.update_notification_settings(cursor, 5, {'new_reply_to_post': False})
+    assert crud.filter_recipients_by_preference(cursor, [5], 'post_reply') == []
+
+    # A read that raced the update re-cached the old flags; the after-commit hook drops them again
+    _settings._preference_cache.put_many({5: {**cursor.users[5], 'notify_new_reply_to_post': True}})
+    cursor.connection.commit()
+    assert crud.filter_recipients_by_preference(cursor, [5], 'post_reply') == []
+
+
+def test_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr(_settings._preference_cache, "max_size", 2)
+    cursor = UsersCursor({uid: {} for uid in range(4)})
+    crud.get_notification_preferences(cursor, [0, 1, 2, 3])
+    assert crud.get_notification_preference_cache_stats()['size'] == 2
+
+
+def test_expired_entries_are_reloaded(monkeypatch):
+    monkeypatch.setattr(_settings._preference_cache, "ttl_seconds", 0)
+    cursor = UsersCursor({1: {}})
+    crud.get_notification_preferences(cursor, [1]); crud.get_notification_preferences(cursor, [1])
+    assert cursor.reads == 2
@@ -0,0 +1,61 @@
+# tests/test_post_hydration.py
+# Query-count checks for crud.hydrate_posts. Runs against a recording cursor, no server/DB needed.
+import pytest
+from collections import OrderedDict
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+from src import crud
+
+from .helpers import RecordingCursor
+
+
+class PostsCursor(RecordingCursor):
+    """Returns post rows for the posts query."""
+
+    def __init__(self):
+        super().__init__()
+        # Looks like a pooled connection already initialized for AGE
+        self.connection = SimpleNamespace(age_initialized=True, cypher_stmt_cache=OrderedDict())
+
+    def respond(self, sql, params):
+        if "FROM public.posts p" in sql and "ANY(%s)" in sql:
+            return [{
+                'id': pid, 'user_id': 1, 'content': 'content', 'title': f'Post {pid}',
+                'created_at': datetime.now(timezone.utc),
+                'author_name': 'alice', 'author_id': 1, 'author_avatar': None,
+                'reply_count': 0, 'upvotes': 0, 'downvotes': 0, 'favorite_count': 0,
+            } for pid in params[0]]
+        return []
+
+    def data_queries(self):
+        # PREPARE/DEALLOCATE are statement-cache bookkeeping, not per-page work
+        return [s for s in self.statements if not s.lstrip().upper().startswith(("PREPARE", "DEALLOCATE"))]
+
+
+def _count_queries(post_ids, viewer_id):
+    cursor = PostsCursor()
+    hydrated = crud.hydrate_posts(cursor, post_ids, viewer_id)
+    return hydrated, len(cursor.data_queries())
+
+
+@pytest.mark.parametrize("viewer_id, expected_queries", [(None, 3), (7, 5)])
+def test_hydrate_posts_query_count_is_constant(viewer_id, expected_queries):
+    _, small_page = _count_queries(list(range(1, 3)), viewer_id)
+    _, large_page = _count_queries(list(range(1, 101)), viewer_id)
+    assert small_page == expected_queries
+    assert large_page == expected_queries
+
+
+def test_hydrate_posts_keeps_order_and_defaults():
+    hydrated, _ = _count_queries([5, 3, 9, 3], viewer_id=7)
+    assert [p['id'] for p in hydrated] == [5, 3, 9]
+    first = hydrated[0]
+    assert first['media'] == [] and first['community_id'] is None
+    assert first['upvotes'] == 0 and first['reply_count'] == 0
+    assert first['viewer_vote_type'] is None and first['viewer_has_favorited'] is False
+
+
+def test_hydrate_posts_empty_page_runs_no_queries():
+    hydrated, queries = _count_queries([], viewer_id=7)
+    assert hydrated == [] and queries == 0
@@ -0,0 +1,66 @@
+# tests/test_presence.py
+# Presence index / debounce / heartbeat checks for ConnectionManager. Fake sockets, no server needed.
+import asyncio
+import json
+import time
+
+from src import connection_manager, presence
+from src.connection_manager import ConnectionManager
+
+from .helpers import FakeSocket, drain
+
+
+def test_online_count_counts_users_not_sockets():
+    async def scenario():
+        manager = ConnectionManager()
+        tab1, tab2, other = FakeSocket(), FakeSocket(), FakeSocket()
+        await manager.connect(tab1, "community_1", 1)
+        await manager.connect(tab2, "community_1", 1)
+        await manager.connect(other, "event_2", 1)
+        assert manager.presence.online_count("community_1") == 1
+        assert manager.presence.rooms_for_user(1) == {"community_1", "event_2"}
+
+        manager.disconnect(tab1, "community_1")
+        assert manager.presence.online_count("community_1") == 1 # Second tab still open
+        manager.disconnect(tab2, "community_1"); manager.disconnect(other, "event_2")
+        assert manager.presence.online_count("community_1") == 0 and not manager.presence.is_online(1)
+
+    asyncio.run(scenario())
+
+
+def test_presence_changes_are_debounced_into_one_frame(monkeypatch):
+    monkeypatch.setattr(presence, "WS_PRESENCE_DEBOUNCE_SECONDS", 0.01)
+    monkeypatch.setattr(connection_manager, "WS_HEARTBEAT_TIMEOUT_SECONDS", 0)
+
+    async def scenario():
+        manager = ConnectionManager()
+        await manager.start_presence()
+        sockets = [FakeSocket() for _ in range(3)]
+        for user_id, ws in enumerate(sockets, start=1): await manager.connect(ws, "community_1", user_id)
+        await asyncio.sleep(0.05); await drain()
+        frames = [json.loads(m) for m in sockets[0].sent]
+        assert frames == [{"type": "presence_update", "room_key": "community_1", "online_count": 3}]
+        await manager.stop_presence()
+
+    asyncio.run(scenario())
+
+
+def test_sockets_without_heartbeat_are_closed_and_leave_presence():
+    async def scenario():
+        manager = ConnectionManager()
+        alive, idle = FakeSocket(), FakeSocket()
+        await manager.connect(alive, "community_1", 1)
+        await manager.connect(idle, "community_1", 2)
+        manager.active_connections["community_1"][idle].last_active = time.monotonic() - 3600
+        manager.touch(alive)
+        assert manager.expire_idle(60) == 1
+        await drain()
+        assert idle.closed_with == 1013 and alive.closed_with is None # Client reconnects on anything but 1000/1001
+        assert manager.presence.users_in_room("community_1") == {1}
+
+    asyncio.run(scenario())
+
+
+def test_presence_frame_matches_what_the_app_parses():
+    # frontend/lib/services/websocket_service.dart: data['type'] == 'presence_update', data['room_key'], data['online_count']
+    assert presence.presence_frame("event_4", 2) == '{"type": "presence_update", "room_key": "event_4", "online_count": 2}'
@@ -0,0 +1,70 @@
+# tests/test_presigned_url_cache.py
+# Presigned URL cache checks for utils.get_minio_url. Uses a fake MinIO client, no server/MinIO needed.
+import pytest
+from datetime import datetime, timedelta, timezone
+
+from src import utils, storage
+
+
+class FakeMinio:
+    """Signs deterministically from (object, request_date) and counts calls."""
+
+    def __init__(self):
+        self.sign_calls = 0
+        self.removed = []
+
+    def presigned_get_object(self, bucket, object_name, expires, request_date=None):
+        self.sign_calls += 1
+        signed_at = (request_date or datetime.now(timezone.utc)).isoformat()
+        return f"https://minio.test/{bucket}/{object_name}?date={signed_at}&expires={int(expires.total_seconds())}"
+
+    def remove_object(self, bucket, object_name):
+        self.removed.append(object_name)
+
+    def list_objects(self, bucket, prefix=None, recursive=False):
+        return []
+
+
+@pytest.fixture
+def fake_minio(monkeypatch):
+    client = FakeMinio()
+    monkeypatch.setattr(storage, "_backend", storage.MinioBackend(client, "fiore"))
+    monkeypatch.setattr(storage, "_backend_initialized", True)
+    monkeypatch.setattr(utils, "_url_cache", utils.OrderedDict())
+    monkeypatch.setattr(utils, "_url_cache_stats", {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0})
+    return client
+
+
+def test_same_bucket_returns_same_url_and_signs_once(fake_minio):
+    first = utils.get_minio_url("media/avatars/1.png")
+    assert all(utils.get_minio_url("media/avatars/1.png") == first for _ in range(50))
+    assert fake_minio.sign_calls == 1
+    stats = utils.get_presigned_url_cache_stats()
+    assert stats["hits"] == 50 and stats["misses"] == 1
+
+
+def test_bucketed_url_keeps_validity_floor():
+    now = datetime(2024, 1, 1, 13, 59, 59, tzinfo=timezone.utc)
+    ttl = 24 * 3600
+    bucket_start = utils._url_bucket_start(now, ttl)
+    assert bucket_start <= now
+    remaining = bucket_start + timedelta(seconds=ttl) - now
+    assert remaining.total_seconds() >= utils.MINIO_URL_MIN_VALIDITY_SECONDS
+    # A TTL shorter than the floor cannot be bucketed
+    assert utils._url_bucket_start(now, utils.MINIO_URL_MIN_VALIDITY_SECONDS) is None
+
+
+def test_cache_is_bounded(fake_minio, monkeypatch):
+    monkeypatch.setattr(utils, "MINIO_URL_CACHE_SIZE", 3)
+    for i in range(10): utils.get_minio_url(f"media/posts/{i}.jpg")
+    stats = utils.get_presigned_url_cache_stats()
+    assert stats["size"] == 3 and stats["evictions"] == 7
+
+
+def test_delete_invalidates_cached_url(fake_minio):
+    utils.get_minio_url("media/posts/9.jpg")
+    assert utils.delete_from_minio("media/posts/9.jpg") is True
+    assert fake_minio.removed == ["media/posts/9.jpg"]
+    assert utils.get_presigned_url_cache_stats()["invalidations"] == 1
+    utils.get_minio_url("media/posts/9.jpg")
+    assert fake_minio.sign_calls == 2
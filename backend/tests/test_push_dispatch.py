@@ -0,0 +1,112 @@
+# tests/test_push_dispatch.py
+# Batching / pruning checks for the device push dispatcher. Token loading and result recording are
+# replaced by in-memory fakes and the provider is the stub, no Postgres or push service needed.
+import asyncio
+
+import pytest
+
+from src import push_dispatch
+from src.push_dispatch import PushDispatcher, PushProvider, StubPushProvider, _build_message
+
+TOKENS = {
+    1: [{"id": 10, "user_id": 1, "device_token": "a-ios", "platform": "ios"},
+        {"id": 11, "user_id": 1, "device_token": "a-android", "platform": "android"}],
+    2: [{"id": 20, "user_id": 2, "device_token": "b-ios", "platform": "ios"}],
+}
+
+
+def _notification(i, user_id):
+    return {"id": i, "recipient_user_id": user_id, "type": "post_reply", "content_preview": f"reply {i}"}
+
+
+@pytest.fixture
+def recorded():
+    return {"loads": [], "results": []}
+
+
+def _dispatcher(provider, recorded):
+    def load_targets(batch):
+        recorded["loads"].append([n["id"] for n in batch])
+        return [_build_message(n, t) for n in batch for t in TOKENS.get(n["recipient_user_id"], ())]
+
+    def record_results(delivered, invalid):
+        recorded["results"].append((sorted(delivered), sorted(invalid)))
+
+    return PushDispatcher(provider, load_targets=load_targets, record_results=record_results)
+
+
+def _run(dispatcher, notifications):
+    async def scenario():
+        dispatcher.start()
+        for n in notifications: dispatcher.enqueue(n)
+        await dispatcher.stop()
+    asyncio.run(scenario())
+
+
+def test_notifications_are_batched_and_grouped_by_platform(recorded):
+    provider = StubPushProvider()
+    dispatcher = _dispatcher(provider, recorded)
+    _run(dispatcher, [_notification(1, 1), _notification(2, 2), _notification(3, 1)])
+
+    assert recorded["loads"] == [[1, 2, 3]] # One token lookup for the whole burst
+    assert sorted((r["platform"], len(r["messages"])) for r in provider.requests) == [("android", 2), ("ios", 3)]
+    assert recorded["results"] == [([10, 10, 11, 11, 20], [])]
+    assert dispatcher.stats["sent"] == 5
+
+
+def test_chunks_respect_batch_size(recorded, monkeypatch):
+    monkeypatch.setattr(push_dispatch, "PUSH_BATCH_SIZE", 2)
+    provider = StubPushProvider()
+    _run(_dispatcher(provider, recorded), [_notification(i, 1 if i % 2 else 2) for i in range(5)])
+    assert all(len(r["messages"]) <= 2 for r in provider.requests)
+    assert sum(len(r["messages"]) for r in provider.requests) == 7
+
+
+def test_invalid_tokens_are_pruned(recorded):
+    dispatcher = _dispatcher(StubPushProvider(invalid_tokens={"a-android"}), recorded)
+    _run(dispatcher, [_notification(1, 1)])
+    assert recorded["results"] == [([10], [11])]
+    assert dispatcher.stats["invalid_pruned"] == 1
+
+
+def test_retry_results_are_resent_until_max_attempts(recorded, monkeypatch):
+    monkeypatch.setattr(push_dispatch, "PUSH_RETRY_BACKOFF_MS", 0)
+    monkeypatch.setattr(push_dispatch, "PUSH_MAX_ATTEMPTS", 3)
+
+    class FlakyProvider(PushProvider):
+        def __init__(self): self.calls = 0
+        def send(self, platform, messages):
+            self.calls += 1
+            if self.calls == 1: raise ConnectionError("provider down")
+            return [push_dispatch.PUSH_RETRY if m["device_token"] == "b-ios" else push_dispatch.PUSH_OK for m in messages]
+
+    dispatcher = _dispatcher(FlakyProvider(), recorded)
+    _run(dispatcher, [_notification(1, 2), _notification(2, 1)])
+    # a-* delivered on the second attempt; b-ios still asking for a retry after the third
+    assert recorded["results"] == [([10, 11], [])]
+    assert dispatcher.stats["failed"] == 1
+
+
+def test_enqueue_before_start_is_a_no_op(recorded):
+    dispatcher = _dispatcher(StubPushProvider(), recorded)
+    dispatcher.enqueue(_notification(1, 1))
+    assert dispatcher.stats["queued"] == 0 and recorded["loads"] == []
+
+
+def test_disabled_dispatcher_never_starts():
+    dispatcher = PushDispatcher(None)
+    async def scenario():
+        dispatcher.start()
+        return dispatcher._task
+    assert asyncio.run(scenario()) is None
+
+
+def test_non_json_webhook_reply_fails_instead_of_retrying():
+    class HtmlResponse:
+        status_code, text = 200, "<html>ok</html>"
+        def json(self): raise ValueError("Expecting value")
+
+    provider = push_dispatch.WebhookPushProvider("http://push.invalid/send")
+    provider.session.post = lambda *args, **kwargs: HtmlResponse()
+    messages = [_build_message(_notification(1, 1), t) for t in TOKENS[1]]
+    assert provider.send("ios", messages) == [push_dispatch.PUSH_FAILED] * 2
@@ -0,0 +1,64 @@
+# tests/test_storage.py
+# Storage facade checks against storage.LocalBackend. No server/MinIO needed.
+import asyncio
+import io
+import tempfile
+
+import pytest
+from starlette.datastructures import UploadFile
+
+from src import storage, utils
+
+
+@pytest.fixture
+def local_storage(tmp_path, monkeypatch):
+    backend = storage.LocalBackend(str(tmp_path), base_url="http://files.test")
+    monkeypatch.setattr(storage, "_backend", backend)
+    monkeypatch.setattr(storage, "_backend_initialized", True)
+    monkeypatch.setattr(utils, "_url_cache", utils.OrderedDict())
+    return backend
+
+
+def _upload(data: bytes, filename: str) -> UploadFile:
+    spool = tempfile.SpooledTemporaryFile(max_size=1024)
+    spool.write(data); spool.seek(0)
+    return UploadFile(file=spool, filename=filename, headers={"content-type": "image/png"})
+
+
+def test_upload_roundtrip_and_delete(local_storage):
+    data = b"x" * 5000
+    info = asyncio.run(utils.upload_file_to_minio(_upload(data, "a.png"), "media/posts", item_id=7))
+    object_name = info["minio_object_name"]
+    assert object_name.startswith("media/posts/7/") and info["file_size_bytes"] == len(data)
+    assert asyncio.run(storage.get_object(object_name)) == data
+    assert utils.get_minio_url(object_name).startswith(f"http://files.test/{object_name}?")
+
+    local_storage.put_stream(object_name + ".variants/thumb.webp", io.BytesIO(b"t"), 1, "image/webp")
+    assert asyncio.run(utils.delete_from_minio_async(object_name)) is True
+    assert local_storage.list_names("media/posts/7/") == []
+
+
+def test_list_names_matches_prefix_only(local_storage):
+    for name in ("a/b.jpg", "a/b.jpg.variants/thumb.webp", "a/bc.jpg", "z/b.jpg"):
+        local_storage.put_stream(name, io.BytesIO(b"1"), 1, "image/jpeg")
+    assert local_storage.list_names("a/b.jpg") == ["a/b.jpg", "a/b.jpg.variants/thumb.webp"]
+    assert local_storage.list_names("a/b.jpg.variants/") == ["a/b.jpg.variants/thumb.webp"]
+
+
+def test_object_names_cannot_escape_root(local_storage):
+    with pytest.raises(ValueError):
+        local_storage.put_stream("../outside.txt", io.BytesIO(b"1"), 1, "text/plain")
+    local_storage.remove("missing/object.png") # Missing objects are not an error
+
+
+def test_backend_is_built_lazily_without_network(monkeypatch):
+    monkeypatch.setattr(storage, "_backend", None)
+    monkeypatch.setattr(storage, "_backend_initialized", False)
+    monkeypatch.setattr(storage, "STORAGE_BACKEND", "minio")
+    monkeypatch.setattr(storage, "MINIO_ENDPOINT", "minio.invalid:9000")
+    monkeypatch.setattr(storage, "MINIO_ACCESS_KEY", "key")
+    monkeypatch.setattr(storage, "MINIO_SECRET_KEY", "secret")
+    backend = storage.get_storage()
+    assert isinstance(backend, storage.MinioBackend) and backend._bucket_ready is False
+    # Presigning is local: the region is configured, so no bucket-location lookup
+    assert "X-Amz-Signature" in backend.presigned_url("a.png", utils.timedelta(hours=1))
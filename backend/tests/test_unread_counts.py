@@ -0,0 +1,98 @@
+# tests/test_unread_counts.py
+# Unread counter upkeep and after-commit pushes in crud._notifications. Fake cursor/connection, no DB needed.
+import json
+
+import pytest
+
+from src import crud
+
+from .helpers import CounterCursor
+
+
+@pytest.fixture
+def pushes():
+    sent = []
+    crud.set_notification_publisher(lambda items: sent.extend((room_key, message) for message, room_key in items))
+    yield sent
+    crud.set_notification_publisher(None)
+
+
+def test_marking_read_decrements_and_pushes_only_after_commit(pushes):
+    cursor = CounterCursor(counter=10, changed=3)
+    assert crud.mark_notifications_as_read(cursor, user_id=4, notification_ids=[1, 2, 3, 9]) == 3
+    assert cursor.counter == 7 and pushes == []
+    cursor.connection.commit()
+    assert pushes == [("user_4", '{"type": "unread_count", "count": 7}')]
+
+
+def test_committed_counts_are_cached_for_socket_joins(pushes):
+    crud._notifications._unread_count_cache.clear()
+    cursor = CounterCursor(counter=10, changed=2)
+    crud.mark_notifications_as_read(cursor, user_id=6, notification_ids=[1, 2])
+    assert crud.get_cached_unread_count(6) is None # Not committed yet
+    cursor.connection.commit()
+    assert crud.get_cached_unread_count(6) == 8
+
+
+def test_unread_count_is_a_counter_read_after_first_seed():
+    cursor = CounterCursor()
+    assert crud.get_unread_notification_count(cursor, user_id=4) == 5 # Seeded once
+    cursor.statements.clear()
+    assert crud.get_unread_notification_count(cursor, user_id=4) == 5
+    assert len(cursor.statements) == 1 and "COUNT(*)" not in cursor.statements[0]
+
+
+def test_mark_all_resets_counter(pushes):
+    cursor = CounterCursor(counter=10, changed=10)
+    crud.mark_all_notifications_as_read(cursor, user_id=4)
+    cursor.connection.commit()
+    assert cursor.counter == 0 and pushes[-1][1] == '{"type": "unread_count", "count": 0}'
+
+
+def test_new_notification_is_pushed_with_unread_count_after_commit(pushes):
+    class NotifyCursor(CounterCursor):
+        def respond(self, sql, params):
+            if "INSERT INTO public.notifications" in sql: return [{'id': 42, 'created_at': None}]
+            return super().respond(sql, params)
+
+    cursor = NotifyCursor(counter=2)
+    crud.create_notification(cursor, recipient_user_id=4, type='user_mention', actor_user_id=9,
+                             related_entity_type='post', related_entity_id=5, content_preview="hi")
+    assert pushes == []
+    cursor.connection.commit()
+    assert len(pushes) == 1 # One combined frame, not a separate unread_count frame
+    room_key, message = pushes[0]
+    frame = json.loads(message)
+    assert room_key == "user_4" and frame["type"] == "notification" and frame["unread_count"] == 3
+    assert frame["notification"]["id"] == 42 and frame["notification"]["related_entity"] == {"type": "post", "id": 5}
+
+
+def test_bulk_notifications_are_one_statement_and_one_push_batch():
+    class BulkCursor(CounterCursor):
+        def respond(self, sql, params):
+            return [{'created': [{'id': 50 + uid, 'recipient_user_id': uid, 'created_at': None, 'unread_count': uid}
+                                       for uid in (2, 3)], 'scanned': 3}]
+
+    batches, device = [], []
+    crud.set_notification_publisher(batches.append)
+    crud.set_device_push_dispatcher(device.append)
+    try:
+        cursor = BulkCursor()
+        assert crud.create_notifications_bulk(cursor, [2, 3, 9], 'event_update', actor_user_id=9,
+                                              related_entity_type='event', related_entity_id=7) == [52, 53]
+        seed, insert = cursor.statements
+        assert "ON CONFLICT (user_id) DO NOTHING" in seed and "COUNT(*)" in seed # Seeded before any increment
+        assert "GROUP BY recipient_user_id" in insert and "COUNT(*) FROM public.notifications" not in insert
+        assert batches == [] and device == []
+        cursor.connection.commit()
+    finally:
+        crud.set_notification_publisher(None); crud.set_device_push_dispatcher(None)
+    assert len(batches) == 1 and [room_key for _, room_key in batches[0]] == ["user_2", "user_3"]
+    assert json.loads(batches[0][1][0])["unread_count"] == 3
+    assert len(device) == 1 and [n['id'] for n in device[0]] == [52, 53]
+    assert crud.get_cached_unread_count(2) == 2
+
+
+def test_bulk_rejects_coalesced_types():
+    with pytest.raises(ValueError):
+        crud.create_notifications_bulk(CounterCursor(), [1, 2], 'post_reply')
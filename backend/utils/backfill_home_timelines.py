@@ -0,0 +1,56 @@
+# backend/utils/backfill_home_timelines.py
+"""
+Backfills materialized home timelines (public.home_timelines) from the follow graph.
+
+Run once after creating the tables (sql/home_timelines.sql), after changing
+TIMELINE_MAX_ENTRIES / TIMELINE_CELEBRITY_FOLLOWERS, or to repair timelines.
+
+Usage (from backend/):
+    python -m utils.backfill_home_timelines                       # refresh celebrities + every user
+    python -m utils.backfill_home_timelines --user-id 42          # a single user
+    python -m utils.backfill_home_timelines --skip-celebrity-refresh --commit-every 50
+"""
+import argparse
+
+from src import crud, database
+from src.crud._timeline import TIMELINE_CELEBRITY_FOLLOWERS, TIMELINE_MAX_ENTRIES
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--user-id", type=int, action="append", help="Only backfill these users (repeatable)")
+    parser.add_argument("--skip-celebrity-refresh", action="store_true", help="Keep the current celebrity author set")
+    parser.add_argument("--commit-every", type=int, default=100, help="Users per transaction")
+    args = parser.parse_args()
+
+    conn = database.get_db_connection()
+    try:
+        cursor = conn.cursor()
+        if not args.skip_celebrity_refresh:
+            celebrities = crud.refresh_celebrity_authors(cursor)
+            conn.commit()
+            print(f"Celebrity authors (> {TIMELINE_CELEBRITY_FOLLOWERS} followers): {len(celebrities)}")
+
+        user_ids = args.user_id
+        if not user_ids:
+            cursor.execute("SELECT id FROM public.users ORDER BY id;")
+            user_ids = [row['id'] for row in cursor.fetchall()]
+
+        total_entries = 0
+        for i, user_id in enumerate(user_ids, start=1):
+            total_entries += crud.backfill_home_timeline(cursor, user_id)
+            if i % args.commit_every == 0:
+                conn.commit()
+                print(f"  {i}/{len(user_ids)} users, {total_entries} entries")
+        conn.commit()
+        print(f"Backfilled {len(user_ids)} timelines ({total_entries} entries, cap {TIMELINE_MAX_ENTRIES}/user).")
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+        database.close_pool()
+
+
+if __name__ == "__main__":
+    main()
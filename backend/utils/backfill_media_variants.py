@@ -0,0 +1,55 @@
+# backend/utils/backfill_media_variants.py
+"""
+Renders thumb/medium/large variants for images uploaded before sql/media_variants.sql
+(media_items.variant_objects IS NULL). New uploads are handled by the API after commit.
+
+Usage (from backend/):
+    python -m utils.backfill_media_variants                 # every pending image
+    python -m utils.backfill_media_variants --limit 500
+    python -m utils.backfill_media_variants --media-id 42   # a single item (repeatable)
+"""
+import argparse
+from concurrent.futures import as_completed
+
+from src import crud, database, image_variants
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--media-id", type=int, action="append", help="Only these media items (repeatable)")
+    parser.add_argument("--limit", type=int, default=None, help="Process at most this many items")
+    args = parser.parse_args()
+
+    try:
+        media_ids = args.media_id
+        if not media_ids:
+            conn = database.get_db_connection()
+            try:
+                cursor = conn.cursor()
+                cursor.execute(
+                    "SELECT id FROM public.media_items WHERE variant_objects IS NULL AND mime_type = ANY(%s) ORDER BY id LIMIT %s;",
+                    (list(image_variants.MEDIA_VARIANT_MIME_TYPES), args.limit)
+                )
+                media_ids = [row['id'] for row in cursor.fetchall()]
+            finally:
+                conn.close()
+
+        # Same job the API schedules: one thread per render process
+        executor = image_variants.get_media_job_executor()
+        futures = {executor.submit(crud.generate_media_variants, media_id): media_id for media_id in media_ids}
+        rendered = failed = 0
+        for i, future in enumerate(as_completed(futures), start=1):
+            try:
+                if future.result() is not None: rendered += 1
+            except Exception as e:
+                failed += 1
+                print(f"  media {futures[future]} failed: {e}")
+            if i % 100 == 0: print(f"  {i}/{len(media_ids)} items")
+        print(f"Processed {len(media_ids)} media items: {rendered} with variants recorded, {failed} failed.")
+    finally:
+        image_variants.shutdown_media_executor()
+        database.close_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+# backend/utils/rebuild_engagement_counters.py
+"""
+Rebuilds / reconciles post_stats and reply_stats from the AGE graph.
+
+Counters are maintained incrementally by the vote/favorite/reply CRUD functions; run this after
+creating the tables (sql/engagement_counters.sql), after bulk imports, or periodically to repair drift.
+
+Usage (from backend/):
+    python -m utils.rebuild_engagement_counters                  # posts + replies
+    python -m utils.rebuild_engagement_counters --only posts --dry-run
+    python -m utils.rebuild_engagement_counters --batch-size 200
+"""
+import argparse
+
+from src import crud, database
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", choices=["posts", "replies"], help="Reconcile a single table")
+    parser.add_argument("--batch-size", type=int, default=500, help="Targets per graph count query")
+    parser.add_argument("--dry-run", action="store_true", help="Report drift without writing")
+    args = parser.parse_args()
+
+    labels = {"posts": ["Post"], "replies": ["Reply"]}.get(args.only, ["Post", "Reply"])
+    conn = database.get_db_connection()
+    try:
+        cursor = conn.cursor()
+        for label in labels:
+            summary = crud.reconcile_stats(cursor, label, batch_size=args.batch_size, dry_run=args.dry_run)
+            conn.commit()
+            print(f"{label}: checked={summary['checked']} drifted={summary['drifted']}"
+                  + (f" e.g. {summary['drifted_ids'][:10]}" if summary['drifted'] else ""))
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+        database.close_pool()
+
+
+if __name__ == "__main__":
+    main()
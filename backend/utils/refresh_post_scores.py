@@ -0,0 +1,29 @@
+# backend/utils/refresh_post_scores.py
+"""
+Rebuilds the hot-score table (public.post_scores) behind /feed/discover and /posts/trending.
+
+The API refreshes it every HOT_SCORE_REFRESH_SECONDS; run this once after creating the table
+(sql/post_scores.sql) or after changing the HOT_SCORE_* weights / half-life / window.
+
+Usage (from backend/):
+    python -m utils.refresh_post_scores
+"""
+import argparse
+
+from src import crud, database
+from src.crud._scores import HOT_SCORE_HALF_LIFE_HOURS, HOT_SCORE_WINDOW_HOURS
+
+
+def main():
+    argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter).parse_args()
+    try:
+        result = crud.run_post_score_refresh()
+        if result is None: raise SystemExit("Post score refresh failed (see error above).")
+        print(f"Rescored {result['rescored']} posts, evicted {result['evicted']} "
+              f"(window {HOT_SCORE_WINDOW_HOURS}h, half-life {HOT_SCORE_HALF_LIFE_HOURS}h).")
+    finally:
+        database.close_pool()
+
+
+if __name__ == "__main__":
+    main()